@@ -0,0 +1,213 @@
+import os
+import json
+import math
+import time
+import secrets
+import asyncio
+import contextlib
+from metrics import metrics as default_metrics
+from locks import FileLock, atomic_write_json, process_alive
+
+# Constants
+POLL_INTERVAL_SECONDS = 0.05  # First wait between queue checks, doubled up to MAX_POLL_INTERVAL_SECONDS
+MAX_POLL_INTERVAL_SECONDS = 0.5
+STALE_TICKET_SECONDS = 6 * 3600  # Tickets this old are dropped even if their pid looks alive (pid reuse)
+RUNNING = 'running'
+QUEUED = 'queued'
+
+
+class AdmissionRejected(Exception):
+    """Raised when a node cannot take on more synthesis work; retry_after is in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Limit the synthesis work in flight on one node, across all its worker processes.
+
+    Work is measured in characters and chunks. Below the soft limits a request
+    starts at once; above them it waits in a queue until running work drains
+    (for at most max_queue_wait seconds); requests that would push running plus
+    queued work over the hard limits are rejected straight away. A node with
+    nothing running or queued admits any single request, however large.
+    A limit of 0 disables it.
+
+    The tickets of every worker live in one JSON ledger guarded by a FileLock,
+    so the limits hold per node rather than per process. Tickets of processes
+    that died are dropped the next time the ledger is read.
+    """
+
+    def __init__(self, ledger_path, soft_chars=0, hard_chars=0, soft_chunks=0, hard_chunks=0,
+                 max_queue_wait=30, chars_per_second=2000, metrics=None):
+        self.ledger_path = ledger_path
+        self.soft_chars = soft_chars
+        self.hard_chars = hard_chars
+        self.soft_chunks = soft_chunks
+        self.hard_chunks = hard_chunks
+        self.max_queue_wait = max_queue_wait
+        self.chars_per_second = chars_per_second
+        self.metrics = metrics or default_metrics
+
+    @property
+    def enabled(self):
+        return any((self.soft_chars, self.hard_chars, self.soft_chunks, self.hard_chunks))
+
+    def _load(self):
+        try:
+            with open(self.ledger_path, 'r') as f:
+                tickets = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        stale_before = time.time() - STALE_TICKET_SECONDS
+        alive = {}
+        return {ticket_id: ticket for ticket_id, ticket in tickets.items()
+                if ticket['created'] >= stale_before
+                and alive.setdefault(ticket['pid'], process_alive(ticket['pid']))}
+
+    def _update(self, change):
+        """Apply change(tickets) to the ledger under the node-wide lock and return its result."""
+        with FileLock(self.ledger_path + '.lock'):
+            tickets = self._load()
+            result = change(tickets)
+            atomic_write_json(self.ledger_path, tickets)
+        totals = self._totals(tickets)
+        self.metrics.set_gauge('admission_inflight_chars', totals[RUNNING][0])
+        self.metrics.set_gauge('admission_inflight_chunks', totals[RUNNING][1])
+        self.metrics.set_gauge('admission_queued_chars', totals[QUEUED][0])
+        return result
+
+    @staticmethod
+    def _totals(tickets, exclude=None):
+        totals = {RUNNING: [0, 0], QUEUED: [0, 0]}
+        for ticket_id, ticket in tickets.items():
+            if ticket_id != exclude:
+                totals[ticket['state']][0] += ticket['chars']
+                totals[ticket['state']][1] += ticket['chunks']
+        return totals
+
+    @staticmethod
+    def _over(value, limit):
+        return bool(limit) and value > limit
+
+    def _fits_running(self, running, chars, chunks):
+        if running == [0, 0]:
+            return True
+        return not (self._over(running[0] + chars, self.soft_chars) or self._over(running[1] + chunks, self.soft_chunks))
+
+    def retry_after(self, excess_chars):
+        """Estimate how long the node needs to drain excess_chars of work."""
+        return max(1, math.ceil(excess_chars / self.chars_per_second))
+
+    def _enter(self, ticket_id, chars, chunks):
+        def change(tickets):
+            totals = self._totals(tickets)
+            running, queued = totals[RUNNING], totals[QUEUED]
+            idle = running == [0, 0] and queued == [0, 0]
+            if not idle and (self._over(running[0] + queued[0] + chars, self.hard_chars)
+                             or self._over(running[1] + queued[1] + chunks, self.hard_chunks)):
+                return self.retry_after(running[0] + queued[0] + chars - (self.soft_chars or self.hard_chars))
+            # Newcomers do not overtake work that is already waiting
+            state = RUNNING if queued == [0, 0] and self._fits_running(running, chars, chunks) else QUEUED
+            tickets[ticket_id] = {'pid': os.getpid(), 'chars': chars, 'chunks': chunks,
+                                  'state': state, 'created': time.time()}
+            return state
+        return self._update(change)
+
+    def _poll(self, ticket_id):
+        def change(tickets):
+            ticket = tickets.get(ticket_id)
+            if ticket is None:  # Dropped as stale; take it back as running
+                return None
+            running = self._totals(tickets)[RUNNING]
+            if self._fits_running(running, ticket['chars'], ticket['chunks']):
+                ticket['state'] = RUNNING
+            return ticket['state']
+        return self._update(change)
+
+    def _waiting_retry_after(self, chars):
+        with FileLock(self.ledger_path + '.lock'):
+            running = self._totals(self._load())[RUNNING]
+        return self.retry_after(running[0] + chars - self.soft_chars if self.soft_chars else running[0])
+
+    def _start(self, ticket_id, chars, chunks):
+        """Register a ticket; return its state or raise AdmissionRejected."""
+        state = self._enter(ticket_id, chars, chunks)
+        if not isinstance(state, str):
+            self.metrics.increment('admission_rejected_total')
+            raise AdmissionRejected("Too much synthesis work is in progress", state)
+        if state == QUEUED:
+            self.metrics.increment('admission_queued_total')
+        return state
+
+    def _finish_wait(self, ticket_id, chars, state, waited):
+        self.metrics.increment('admission_queue_wait_seconds_total', waited)
+        self.metrics.set_gauge('admission_last_queue_wait_seconds', waited)
+        if state != QUEUED:
+            self.metrics.increment('admission_admitted_total')
+            return
+        retry_after = self._waiting_retry_after(chars)
+        self.release(ticket_id)
+        self.metrics.increment('admission_rejected_total')
+        raise AdmissionRejected("Timed out waiting for running synthesis work to finish", retry_after)
+
+    def acquire(self, chars, chunks):
+        """Wait until the work may start and return a ticket for release()."""
+        if not self.enabled:
+            return None
+        ticket_id = secrets.token_hex(16)
+        try:
+            state = self._start(ticket_id, chars, chunks)
+            start = time.time()
+            delay = POLL_INTERVAL_SECONDS
+            while state == QUEUED and time.time() - start < self.max_queue_wait:
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_POLL_INTERVAL_SECONDS)
+                state = self._poll(ticket_id) or RUNNING
+            self._finish_wait(ticket_id, chars, state, time.time() - start)
+        except BaseException:  # Interrupted waits must not leave their ticket queued
+            self.release(ticket_id)
+            raise
+        return ticket_id
+
+    async def acquire_async(self, chars, chunks):
+        """Like acquire(), but waits without blocking the event loop."""
+        if not self.enabled:
+            return None
+        # The ledger is a locked file; touch it from the default executor
+        loop = asyncio.get_running_loop()
+        ticket_id = secrets.token_hex(16)
+        registered = loop.run_in_executor(None, self._start, ticket_id, chars, chunks)
+        try:
+            state = await asyncio.shield(registered)
+            start = time.time()
+            delay = POLL_INTERVAL_SECONDS
+            while state == QUEUED and time.time() - start < self.max_queue_wait:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_POLL_INTERVAL_SECONDS)
+                state = await loop.run_in_executor(None, self._poll, ticket_id) or RUNNING
+            await loop.run_in_executor(None, self._finish_wait, ticket_id, chars, state, time.time() - start)
+        except BaseException:
+            # Released synchronously, as the task may be cancelled again; a registration
+            # still running in the executor is released as soon as it completes
+            if registered.done():
+                self.release(ticket_id)
+            else:
+                registered.add_done_callback(lambda _: self.release(ticket_id))
+            raise
+        return ticket_id
+
+    def release(self, ticket_id):
+        """Mark the work of a ticket as finished."""
+        if ticket_id is None:
+            return
+        self._update(lambda tickets: tickets.pop(ticket_id, None))
+
+    @contextlib.contextmanager
+    def admit(self, chars, chunks):
+        ticket_id = self.acquire(chars, chunks)
+        try:
+            yield
+        finally:
+            self.release(ticket_id)
@@ -0,0 +1,111 @@
+"""Alignment of input text offsets with audio time for generated speech.
+
+Every chunk sent to the API covers a known (start, end) character range of
+the input text (see generator.ChunkPlan), and its audio length is read from
+the MP3 frame headers, so the index costs no decoding. Within a chunk,
+positions are interpolated linearly by character, which is close enough to
+jump to a paragraph or highlight the sentence being spoken.
+
+Stored next to the MP3 as <stem>.align.json:
+
+    {"version": 1, "text_length": ..., "duration": ...,
+     "segments": [[start, end, audio_start, duration], ...]}
+"""
+import os
+import json
+import bisect
+import mp3_frames
+
+# Constants
+ALIGNMENT_SUFFIX = '.align.json'
+VERSION = 1
+
+
+def alignment_name(audio_filename):
+    return os.path.splitext(audio_filename)[0] + ALIGNMENT_SUFFIX
+
+
+class Alignment:
+    """Chunk-level text/audio alignment with O(log n) lookups in both directions.
+
+    segments is a list of (start, end, audio_start, duration) in document order.
+    """
+
+    def __init__(self, segments, text_length=None):
+        self.segments = [tuple(segment) for segment in segments]
+        self.text_length = text_length if text_length is not None else (self.segments[-1][1] if self.segments else 0)
+        self._text_starts = [segment[0] for segment in self.segments]
+        self._audio_starts = [segment[2] for segment in self.segments]
+
+    @classmethod
+    def from_chunks(cls, boundaries, durations, text_length=None):
+        """Build the alignment from chunk (start, end) offsets and their audio durations in seconds."""
+        segments = []
+        elapsed = 0.0
+        for (start, end), seconds in zip(boundaries, durations):
+            segments.append((start, end, round(elapsed, 3), round(seconds, 3)))
+            elapsed += seconds
+        return cls(segments, text_length)
+
+    @classmethod
+    def from_chunk_files(cls, boundaries, paths, text_length=None):
+        """Build the alignment from chunk offsets and the chunks' MP3 files."""
+        return cls.from_chunks(boundaries, [mp3_frames.read_playing_duration(path) for path in paths], text_length)
+
+    @property
+    def duration(self):
+        if not self.segments:
+            return 0.0
+        _, _, audio_start, seconds = self.segments[-1]
+        return audio_start + seconds
+
+    def segment_for_offset(self, offset):
+        """Return the index of the segment holding a character offset (the previous one between chunks)."""
+        return max(bisect.bisect_right(self._text_starts, offset) - 1, 0)
+
+    def segment_for_time(self, seconds):
+        """Return the index of the segment playing at a time."""
+        return max(bisect.bisect_right(self._audio_starts, seconds) - 1, 0)
+
+    def time_for_offset(self, offset):
+        """Return the audio time in seconds at which a character offset is spoken."""
+        if not self.segments:
+            return 0.0
+        start, end, audio_start, seconds = self.segments[self.segment_for_offset(offset)]
+        fraction = min(max((offset - start) / (end - start), 0.0), 1.0) if end > start else 0.0
+        return round(audio_start + fraction * seconds, 3)
+
+    def offset_for_time(self, seconds):
+        """Return the character offset being spoken at an audio time."""
+        if not self.segments:
+            return 0
+        start, end, audio_start, duration = self.segments[self.segment_for_time(seconds)]
+        fraction = min(max((seconds - audio_start) / duration, 0.0), 1.0) if duration > 0 else 0.0
+        return start + int(fraction * (end - start))
+
+    def to_dict(self):
+        return {
+            'version': VERSION,
+            'text_length': self.text_length,
+            'duration': round(self.duration, 3),
+            'segments': [list(segment) for segment in self.segments],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != VERSION:
+            raise ValueError("Unsupported alignment version")
+        return cls(data['segments'], data.get('text_length'))
+
+
+def write_alignment(path, alignment):
+    """Write an alignment file (atomically)."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(alignment.to_dict(), f, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+
+def read_alignment(data):
+    """Parse the bytes of an alignment file."""
+    return Alignment.from_dict(json.loads(data))
@@ -1,66 +1,236 @@
 import os
 import time
+import math
+import importlib.util
 import json
 import uuid
 import humanize
 import logging
+import functools
+import contextlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session, Response, g
 from flask_wtf import FlaskForm
 from flask_wtf.csrf import CSRFProtect
+from werkzeug.exceptions import RequestEntityTooLarge
 from wtforms import TextAreaField, SelectField, SubmitField, FileField
 from wtforms.validators import DataRequired, Length, Optional
 from openai import OpenAI
 from generator import (
-    split_text_into_chunks, 
     generate_speech, 
-    calculate_cost, 
-    SUPPORTED_VOICES,
-    combine_audio_files
+    generate_chunk_cached, 
+    plan_chunks, 
+    SUPPORTED_VOICES
 )
+from text_store import TextStore, compute_text_id, is_valid_text_id
+from session_store import SqliteSessionInterface, DEFAULT_TTL_SECONDS as SESSION_DEFAULT_TTL
+from uploads import SpoolingRequest, spool_stream_to_tempfile, decode_base64_to_tempfile
+from pdf_cache import PdfTextCache, hash_pdf_file, DEFAULT_TTL_SECONDS as PDF_CACHE_DEFAULT_TTL
+from history_index import HistoryIndex, MAX_PER_PAGE as HISTORY_SEARCH_MAX_PER_PAGE
+from janitor import OutputJanitor, touch_access_time, DEFAULT_INTERVAL_SECONDS as JANITOR_DEFAULT_INTERVAL
+from metrics import metrics
+from storage import create_storage, parse_range_header
+from locks import FileLock, atomic_write_json, CHUNK_TEMP_PREFIX
+from chunk_cache import ChunkAudioCache
+from admission import AdmissionController, AdmissionRejected
+from chunk_queue import ChunkQueue, StorageChunkStore
+from transcode import Transcoder, TranscodeError, parse_variant, FORMATS as TRANSCODE_FORMATS
+from hls import HlsWriter, delete_hls, is_hls_name, playlist_name, PLAYLIST_MIMETYPE, SEGMENT_MIMETYPE
+import waveform
+import alignment
+import mp3_frames
+from regenerate import plan_regeneration, cut_chunk
+from batch import BatchStore, BatchRunner, RUNNING as BATCH_RUNNING, FAILED as BATCH_FAILED, DEFAULT_TTL_SECONDS as BATCH_DEFAULT_TTL
+from traces import TraceRecorder
+from webhooks import WebhookDispatcher, validate_callback_url, MAX_ATTEMPTS as WEBHOOK_DEFAULT_MAX_ATTEMPTS
 from dotenv import load_dotenv
-import PyPDF2
+import pdf_extract
 import io
-import base64
 
 # Constants
 MAX_TEXT_LENGTH = 1000000  # Maximum text length allowed (increased from 25,000)
 MAX_UPLOAD_SIZE_MB = 150  # Maximum file upload size in MB (increased from 20MB)
-MAX_CHUNK_SIZE = 4000  # Maximum size of text chunks for processing
 HISTORY_TEXT_PREVIEW_LENGTH = 1000  # Length of text preview in history and UI displays
-COST_PER_CHAR_STANDARD = 0.000015  # Cost per character for standard model
-COST_PER_CHAR_HD = 0.000030  # Cost per character for HD model
+HISTORY_SEARCH_PER_PAGE = 20  # Default page size for history search results
+DOCUMENT_TEXT_CACHE_SIZE = 16  # Uploaded documents kept decompressed in memory for previews
+TRANSCRIPT_WINDOW_CHARS = 10000  # Input text rendered with the result page; the rest is fetched while scrolling
+TRANSCRIPT_MAX_WINDOW_CHARS = 100000  # Largest window /api/text returns in one response
+ALIGNMENT_CACHE_SIZE = 256  # Parsed alignment indexes kept in memory
+HISTORY_TEXT_HOLDER = 'history'  # Names under which users of a shared stored text hold it (see TextStore)
+DOCUMENT_TEXT_HOLDER = 'document'
+DOCUMENT_DEFAULT_TTL = 7 * 24 * 3600
+TRACED_ENDPOINTS = ('index', 'api_generate', 'preview', 'get_audio')  # Requests recorded for tts-bench replay
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.request_class = SpoolingRequest  # Large multipart uploads go to named temp files
+app.session_interface = SqliteSessionInterface()
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-for-testing')
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
 app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE_MB * 1024 * 1024  # Convert MB to bytes
 app.config['HISTORY_FILE'] = os.path.join(app.config['UPLOAD_FOLDER'], 'history.json')
-app.config['SESSION_TYPE'] = 'filesystem'  # For larger text that won't fit in URL
+app.config['TEXT_STORE_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'texts')  # Full input texts, by hash
+app.config['PDF_CACHE_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'pdf_cache')  # PDF hash -> extracted text id
+app.config['DOCUMENTS_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'documents')  # Uploaded document metadata
+app.config['DOCUMENT_TTL'] = int(os.environ.get('DOCUMENT_TTL', DOCUMENT_DEFAULT_TTL))  # Seconds an unused document is kept
+app.config['PDF_CACHE_TTL'] = int(os.environ.get('PDF_CACHE_TTL', PDF_CACHE_DEFAULT_TTL))  # Seconds an unread PDF text is kept
+app.config['HISTORY_INDEX_FILE'] = os.path.join(app.config['UPLOAD_FOLDER'], 'history_index.sqlite3')
+app.config['CHUNK_CACHE_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'chunk_cache')  # Synthesized chunk audio, shared by workers
+app.config['CHUNK_CACHE_MAX_BYTES'] = int(os.environ.get('CHUNK_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # 0 disables the chunk cache
+app.config['SESSION_FILE'] = os.path.join(app.config['UPLOAD_FOLDER'], 'sessions.sqlite3')  # Server-side session data; the cookie holds only an id
+app.config['SESSION_TTL'] = int(os.environ.get('SESSION_TTL', SESSION_DEFAULT_TTL))  # Seconds an unused session is kept
+app.config['OUTPUT_MAX_BYTES'] = int(os.environ.get('OUTPUT_MAX_BYTES', 0))  # Audio quota, 0 for unlimited
+app.config['OUTPUT_MAX_AGE'] = int(os.environ.get('OUTPUT_MAX_AGE', 0))  # Audio TTL in seconds, 0 for unlimited
+app.config['OUTPUT_SWEEP_UNREFERENCED'] = os.environ.get('OUTPUT_SWEEP_UNREFERENCED', '0') == '1'  # Delete audio no history entry refers to
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'local')  # 'local' or 's3'
+app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET')
+app.config['S3_PREFIX'] = os.environ.get('S3_PREFIX', '')
+app.config['S3_ENDPOINT_URL'] = os.environ.get('S3_ENDPOINT_URL')  # For MinIO or other S3-compatible servers
+app.config['S3_PRESIGNED_URLS'] = os.environ.get('S3_PRESIGNED_URLS', '1') != '0'  # Otherwise stream through the app
+app.config['JANITOR_INTERVAL'] = int(os.environ.get('JANITOR_INTERVAL', JANITOR_DEFAULT_INTERVAL))  # 0 disables the janitor
+# Synthesis work accepted per node: queued above the soft limits, rejected with 429 above the hard limits (0 disables)
+app.config['ADMISSION_SOFT_CHARS'] = int(os.environ.get('ADMISSION_SOFT_CHARS', 2000000))
+app.config['ADMISSION_HARD_CHARS'] = int(os.environ.get('ADMISSION_HARD_CHARS', 4000000))
+app.config['ADMISSION_SOFT_CHUNKS'] = int(os.environ.get('ADMISSION_SOFT_CHUNKS', 500))
+app.config['ADMISSION_HARD_CHUNKS'] = int(os.environ.get('ADMISSION_HARD_CHUNKS', 1000))
+app.config['ADMISSION_MAX_QUEUE_WAIT'] = float(os.environ.get('ADMISSION_MAX_QUEUE_WAIT', 30))  # Seconds before a queued request gets 429
+app.config['ADMISSION_CHARS_PER_SECOND'] = float(os.environ.get('ADMISSION_CHARS_PER_SECOND', 2000))  # Node throughput for Retry-After
+app.config['ADMISSION_ROUTES'] = json.loads(os.environ.get('ADMISSION_ROUTES', '{}'))  # Per-endpoint overrides, e.g. {"api_generate": {"soft_chars": 500000}}
 
-# Set up logging
-app.logger.setLevel(logging.DEBUG)
-handler = logging.StreamHandler()
-handler.setLevel(logging.DEBUG)
-app.logger.addHandler(handler)
-app.logger.debug("Debug logging enabled")
+app.config['CHUNK_QUEUE_URL'] = os.environ.get('CHUNK_QUEUE_URL')  # e.g. redis://host:6379/0 to synthesize chunks on worker nodes
+app.config['CHUNK_QUEUE_VISIBILITY_TIMEOUT'] = int(os.environ.get('CHUNK_QUEUE_VISIBILITY_TIMEOUT', 300))  # Seconds before a claimed chunk is re-delivered
+app.config['TRANSCODE_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'variants')  # Audio transcoded to other formats/bitrates
+app.config['TRANSCODE_MAX_BYTES'] = int(os.environ.get('TRANSCODE_MAX_BYTES', 1024 * 1024 * 1024))
+app.config['TRANSCODE_WORKERS'] = int(os.environ.get('TRANSCODE_WORKERS', 2))  # ffmpeg processes run at once on the host
+app.config['FFMPEG_BINARY'] = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+app.config['HLS_OUTPUT'] = os.environ.get('HLS_OUTPUT', '0') == '1'  # Also publish an HLS playlist of every generation
+app.config['BATCH_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'batches')  # One manifest per /api/generate-batch call
+app.config['BATCH_MAX_ITEMS'] = int(os.environ.get('BATCH_MAX_ITEMS', 100))
+app.config['BATCH_CHUNK_WORKERS'] = int(os.environ.get('BATCH_CHUNK_WORKERS', 8))  # Chunks of all batch items synthesized at once
+app.config['BATCH_ITEM_WORKERS'] = int(os.environ.get('BATCH_ITEM_WORKERS', 4))  # Batch items in progress at once
+app.config['BATCH_TTL'] = int(os.environ.get('BATCH_TTL', BATCH_DEFAULT_TTL))  # Seconds batch manifests are kept
+app.config['WEBHOOK_SECRET'] = os.environ.get('WEBHOOK_SECRET')  # Signs completion webhooks; callback_url is refused without it
+app.config['WEBHOOK_WORKERS'] = int(os.environ.get('WEBHOOK_WORKERS', 4))  # Webhook deliveries in flight at once
+app.config['WEBHOOK_MAX_ATTEMPTS'] = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', WEBHOOK_DEFAULT_MAX_ATTEMPTS))
+app.config['WEBHOOK_DEAD_LETTER_FILE'] = os.path.join(app.config['UPLOAD_FOLDER'], 'webhooks_dead_letter.jsonl')  # Undeliverable events
+app.config['REQUEST_TRACE_FILE'] = os.environ.get('REQUEST_TRACE_FILE')  # Record request sizes and timings as JSON lines for tts-bench replay
+app.config['WEBHOOK_ALLOW_PRIVATE'] = os.environ.get('WEBHOOK_ALLOW_PRIVATE', '0') == '1'  # Allow callbacks to private/loopback hosts
+# Store waveform peaks next to every output (needs NumPy) so pages draw it without decoding audio
+app.config['WAVEFORM_PEAKS'] = os.environ.get('WAVEFORM_PEAKS', '1') == '1' and importlib.util.find_spec('numpy') is not None
 
-# Ensure the output directory exists
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'DEBUG')
+app.config['WARM_UP'] = os.environ.get('WARM_UP', '1') != '0'  # Let create_app() load templates and caches up front
 
-# Create history file if it doesn't exist
-if not os.path.exists(app.config['HISTORY_FILE']):
-    with open(app.config['HISTORY_FILE'], 'w') as f:
-        json.dump([], f)
+# Importing this module only reads configuration. Logging is set up by create_app(); the
+# output folder, the OpenAI client and the caches are created on first use or by warm_up().
 
 csrf = CSRFProtect(app)
 
-# Create OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+
+class LazyOpenAIClient:
+    """Stands in for the OpenAI client, creating the real one on first use"""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        return self._client
+
+    def reset(self):
+        self._client = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+client = LazyOpenAIClient()
+
+
+def _reset_openai_client():
+    """Give each forked worker its own client, so no HTTP connections are shared across processes"""
+    client.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_openai_client)
+
+_initialized_folders = set()
+
+
+def ensure_output_folder():
+    """Create the output folder and an empty history file the first time they are needed"""
+    key = (app.config['UPLOAD_FOLDER'], app.config['HISTORY_FILE'])
+    if key in _initialized_folders:
+        return
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    if not os.path.exists(app.config['HISTORY_FILE']):
+        with history_lock():
+            if not os.path.exists(app.config['HISTORY_FILE']):
+                atomic_write_json(app.config['HISTORY_FILE'], [])
+    _initialized_folders.add(key)
+
+
+def configure_logging():
+    """Send app log records at LOG_LEVEL to stderr (only once, however often it is called)"""
+    if getattr(app, '_log_handler', None) is not None:
+        return
+    level = logging.getLevelName(str(app.config['LOG_LEVEL']).upper())
+    app.logger.setLevel(level)
+    handler = logging.StreamHandler()
+    handler.setLevel(level)
+    app.logger.addHandler(handler)
+    app._log_handler = handler
+    app.logger.debug(f"Logging at {app.config['LOG_LEVEL']}")
+
+
+def warm_up():
+    """Do the one-time work of a worker up front and return the seconds each step took
+
+    Meant to run once before forking (gunicorn --preload), so every worker inherits
+    compiled templates and loaded caches. The OpenAI client is left to the first request:
+    it needs OPENAI_API_KEY and would be discarded in each forked worker anyway.
+    """
+    timings = {}
+
+    def step(name, func):
+        start = time.perf_counter()
+        func()
+        timings[name] = time.perf_counter() - start
+
+    step('output_folder', ensure_output_folder)
+    step('templates', lambda: [app.jinja_env.get_template(name) for name in app.jinja_env.list_templates()])
+    step('storage', get_storage)
+    step('history_index', get_history_index_or_none)
+    step('voice_samples', get_voice_sample_versions)
+    app.logger.info("Warm-up finished in {:.3f}s ({})".format(
+        sum(timings.values()), ', '.join(f"{name} {seconds:.3f}s" for name, seconds in timings.items())))
+    return timings
+
+
+def create_app(config=None):
+    """Configure the application and return it, e.g. gunicorn --preload 'app:create_app()'
+
+    The routes live on the module-level app, so this configures that instance rather than
+    building a new one. With WARM_UP enabled (the default) warm_up() runs before returning.
+    """
+    if config:
+        app.config.update(config)
+    configure_logging()
+    ensure_output_folder()
+    if app.config['WARM_UP']:
+        warm_up()
+    return app
+
 
 class TTSForm(FlaskForm):
     text = TextAreaField('Text to Convert', validators=[
@@ -83,16 +253,461 @@ class TTSForm(FlaskForm):
     submit = SubmitField('Generate Speech')
 
 
-def save_to_history(text, voice, model, filename, file_size, source_type="Text", original_filename="Direct text input"):
-    """Save a generation to the history file"""
+def get_text_store():
+    """Return the content-addressed store that keeps the full input texts"""
+    return TextStore(app.config['TEXT_STORE_FOLDER'])
+
+
+def load_full_text(text_id):
+    """Load a full text from the text store, or None if it is not available"""
+    if not text_id:
+        return None
+    return get_text_store().get(text_id)
+
+
+def get_request_param(name, default=None):
+    """Read a request parameter from the JSON body or form data, then the query string"""
+    if request.is_json:
+        value = (request.get_json(silent=True) or {}).get(name)
+    else:
+        value = request.form.get(name)
+    return request.args.get(name, default) if value is None else value
+
+
+def extract_text_from_request_body():
+    """Extract text from a raw application/pdf request body, spooled to disk block by block"""
+    with spool_stream_to_tempfile(request.stream) as pdf_file:
+        return extract_text_from_pdf(pdf_file)
+
+
+def extract_text_from_base64_pdf(pdf_base64):
+    """Extract text from base64 PDF data, decoded incrementally into a temporary file
+
+    The JSON body and the base64 string are already in memory here; large PDFs
+    should be sent as raw application/pdf bodies or multipart files instead.
+    """
+    with decode_base64_to_tempfile(pdf_base64) as pdf_file:
+        return extract_text_from_pdf(pdf_file)
+
+
+@functools.lru_cache(maxsize=DOCUMENT_TEXT_CACHE_SIZE)
+def _load_document_text(text_store_folder, document_id):
+    # Stored texts are immutable (content-addressed), so they can be cached by id.
+    # A miss raises instead, as lru_cache does not keep exceptions: the text may be stored later.
+    text = TextStore(text_store_folder).get(document_id)
+    if text is None:
+        raise LookupError(document_id)
+    return text
+
+
+def get_document_text(document_id):
+    """Return the text of an uploaded document, or None if the id is unknown"""
+    # The cached text outlives a pruned document, so check it is still stored
+    if not document_id or not get_text_store().exists(document_id):
+        return None
     try:
-        with open(app.config['HISTORY_FILE'], 'r') as f:
-            history = json.load(f)
+        return _load_document_text(app.config['TEXT_STORE_FOLDER'], document_id)
+    except LookupError:
+        return None
+
+
+def document_metadata_path(document_id):
+    return os.path.join(app.config['DOCUMENTS_FOLDER'], f"{document_id}.json")
+
+
+def save_document(text, source_type="Text", original_filename="API text input"):
+    """Store an uploaded document once and return its id"""
+    document_id = get_text_store().put(text, holder=DOCUMENT_TEXT_HOLDER)
+    os.makedirs(app.config['DOCUMENTS_FOLDER'], exist_ok=True)
+    atomic_write_json(document_metadata_path(document_id), {
+        'document_id': document_id,
+        'source_type': source_type,
+        'original_filename': original_filename,
+        'text_length': len(text),
+        'created': datetime.now().isoformat()
+    })
+    return document_id
+
+
+def get_document_metadata(document_id):
+    """Return the stored metadata for a document, or None if the id is unknown"""
+    if not get_text_store().exists(document_id):
+        return None
+    try:
+        with open(document_metadata_path(document_id), 'r') as f:
+            return json.load(f)
     except (json.JSONDecodeError, FileNotFoundError):
-        history = []
+        return {'document_id': document_id, 'source_type': 'Text', 'original_filename': 'API text input'}
+
+
+def apply_text_edits(text, edits):
+    """Apply a list of {offset, delete, insert} edits to a text, in order"""
+    if isinstance(edits, str):
+        edits = json.loads(edits) if edits else []
+    if edits is None:
+        return text
+    if not isinstance(edits, list):
+        raise ValueError("edits must be a list of {offset, delete, insert} objects")
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise ValueError("Each edit must be an {offset, delete, insert} object")
+        offset = edit.get('offset', 0)
+        delete = edit.get('delete', 0)
+        insert = edit.get('insert', '')
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in (offset, delete)):
+            raise ValueError("Edit offset and delete must be integers")
+        if not isinstance(insert, str):
+            raise ValueError("Edit insert must be a string")
+        if offset < 0 or delete < 0 or offset + delete > len(text):
+            raise ValueError(f"Edit out of range: offset={offset}, delete={delete}, length={len(text)}")
+        text = text[:offset] + insert + text[offset + delete:]
+    return text
+
+
+def resolve_document_text(document_id, edits=None):
+    """Return the text of a document with optional edits applied"""
+    text = get_document_text(document_id)
+    if text is None:
+        raise LookupError(f"Unknown document: {document_id}")
+    try:
+        os.utime(document_metadata_path(document_id))  # Documents in use are not pruned
+    except OSError:
+        pass
+    return apply_text_edits(text, edits)
+
+
+def build_text_preview(text, model):
+    """Return the length, chunk plan and approximate cost for a text"""
+    # The same cached plan is used when the text is generated
+    plan = plan_chunks(text)
     
-    # Add the new entry
-    history.append({
+    return {
+        'text_length': plan.text_length,
+        'num_chunks': plan.num_chunks,
+        'chunk_lengths': plan.char_counts,
+        'cost': plan.cost(model),
+        'estimated_duration': plan.estimated_duration
+    }
+
+
+_storages = {}
+_chunk_queues = {}
+_transcoders = {}
+
+
+def get_storage():
+    """Return the backend that holds finished audio (local output folder or S3)"""
+    key = tuple(app.config[name] for name in ('STORAGE_BACKEND', 'UPLOAD_FOLDER', 'S3_BUCKET', 'S3_PREFIX',
+                                              'S3_ENDPOINT_URL', 'S3_PRESIGNED_URLS'))
+    if key not in _storages:
+        _storages[key] = create_storage(app.config)
+    return _storages[key]
+
+
+def store_audio(filename, output_path):
+    """Hand a finished audio file to the storage backend and return its size"""
+    file_size = os.path.getsize(output_path)
+    storage = get_storage()
+    storage.put_file(filename, output_path)
+    for name in sidecar_names(filename):
+        sidecar_path = os.path.join(os.path.dirname(output_path), name)
+        if os.path.exists(sidecar_path):
+            storage.put_file(name, sidecar_path)
+    return file_size
+
+
+def sidecar_names(filename):
+    """Return the names of the files generation may write next to an audio file, stored and deleted with it"""
+    return [waveform.peaks_name(filename), alignment.alignment_name(filename)]
+
+
+def get_peaks_path(output_path):
+    """Return where generation writes the waveform peaks of an output, or None when they are off"""
+    if not app.config['WAVEFORM_PEAKS']:
+        return None
+    return os.path.splitext(output_path)[0] + waveform.PEAKS_SUFFIX
+
+
+def get_alignment_path(output_path):
+    """Return where generation writes the text/audio alignment index of an output"""
+    return os.path.splitext(output_path)[0] + alignment.ALIGNMENT_SUFFIX
+
+
+def delete_audio_artifacts(storage, filename):
+    """Remove what is stored alongside an audio file: its HLS playlist and segments, peaks and alignment"""
+    delete_hls(storage, filename)
+    for name in sidecar_names(filename):
+        storage.delete(name)
+        # Written by a generation that failed before reaching storage
+        local_path = os.path.join(app.config['UPLOAD_FOLDER'], name)
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+
+def audio_duration(output_path):
+    """Return the playing time in seconds of a finished output that is still on local disk, or None if unknown"""
+    try:
+        with open(get_alignment_path(output_path), 'rb') as f:
+            return round(alignment.read_alignment(f.read()).duration, 3)
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        return round(mp3_frames.read_playing_duration(output_path), 3)
+    except OSError:
+        return None
+
+
+_webhook_dispatchers = {}
+
+
+def get_webhook_dispatcher():
+    """Return the process-wide dispatcher of completion webhooks"""
+    key = (app.config['WEBHOOK_SECRET'], app.config['WEBHOOK_DEAD_LETTER_FILE'], app.config['WEBHOOK_WORKERS'],
+           app.config['WEBHOOK_MAX_ATTEMPTS'], app.config['WEBHOOK_ALLOW_PRIVATE'])
+    if key not in _webhook_dispatchers:
+        _webhook_dispatchers[key] = WebhookDispatcher(app.config['WEBHOOK_SECRET'], app.config['WEBHOOK_DEAD_LETTER_FILE'],
+                                                      workers=app.config['WEBHOOK_WORKERS'],
+                                                      max_attempts=app.config['WEBHOOK_MAX_ATTEMPTS'],
+                                                      allow_private=app.config['WEBHOOK_ALLOW_PRIVATE'])
+    return _webhook_dispatchers[key]
+
+
+def parse_callback_url(value):
+    """Validate a request's callback_url; returns None when none was given and raises ValueError if it is unusable"""
+    if not value:
+        return None
+    if not app.config['WEBHOOK_SECRET']:
+        raise ValueError("callback_url is not supported: webhooks are not configured on this server")
+    return validate_callback_url(value, allow_private=app.config['WEBHOOK_ALLOW_PRIVATE'])
+
+
+def send_webhook(callback_url, event, payload):
+    """Queue a webhook event for a client's callback_url, if it gave one"""
+    if callback_url:
+        get_webhook_dispatcher().dispatch(callback_url, event, payload)
+
+
+_pdf_text_caches = {}
+
+
+def get_pdf_text_cache():
+    """Return the process-wide cache of extracted PDF text (in-memory LRU backed by disk)"""
+    cache_folder = app.config['PDF_CACHE_FOLDER']
+    if cache_folder not in _pdf_text_caches:
+        _pdf_text_caches[cache_folder] = PdfTextCache(cache_folder, get_text_store())
+    return _pdf_text_caches[cache_folder]
+
+
+def get_history_index():
+    """Return the full-text search index over history, building it from history.json on first use"""
+    index = HistoryIndex(app.config['HISTORY_INDEX_FILE'])
+    if not index.is_built():
+        # Writers update the index under the history lock, so rebuild under it too
+        with history_lock():
+            if not index.is_built():
+                try:
+                    with open(app.config['HISTORY_FILE'], 'r') as f:
+                        history = json.load(f)
+                except (json.JSONDecodeError, FileNotFoundError):
+                    history = []
+                index.rebuild(history, load_text=load_full_text)
+    return index
+
+
+def get_history_index_or_none():
+    """Return the history search index, or None (logged) if it cannot be opened"""
+    try:
+        return get_history_index()
+    except Exception as e:
+        app.logger.error(f"Error opening history index: {str(e)}")
+        return None
+
+
+def get_admission_controller(route):
+    """Return the admission controller for an endpoint, with its per-route overrides applied
+
+    All routes share one ledger, so every limit is checked against the node's total work.
+    """
+    limits = {
+        'soft_chars': app.config['ADMISSION_SOFT_CHARS'],
+        'hard_chars': app.config['ADMISSION_HARD_CHARS'],
+        'soft_chunks': app.config['ADMISSION_SOFT_CHUNKS'],
+        'hard_chunks': app.config['ADMISSION_HARD_CHUNKS'],
+        'max_queue_wait': app.config['ADMISSION_MAX_QUEUE_WAIT'],
+        'chars_per_second': app.config['ADMISSION_CHARS_PER_SECOND'],
+    }
+    limits.update(app.config['ADMISSION_ROUTES'].get(route, {}))
+    return AdmissionController(os.path.join(app.config['UPLOAD_FOLDER'], 'admission.json'), **limits)
+
+
+def get_chunk_queue():
+    """Return the distributed chunk queue, or None when chunks are synthesized in-process"""
+    url = app.config.get('CHUNK_QUEUE_URL')
+    if not url:
+        return None
+    key = (url, app.config['CHUNK_QUEUE_VISIBILITY_TIMEOUT'], get_storage())
+    if key not in _chunk_queues:
+        _chunk_queues[key] = ChunkQueue.from_url(url, StorageChunkStore(get_storage()),
+                                                 visibility_timeout=app.config['CHUNK_QUEUE_VISIBILITY_TIMEOUT'])
+    return _chunk_queues[key]
+
+
+def get_chunk_cache():
+    """Return the on-disk cache of synthesized chunk audio, or None when it is disabled"""
+    if app.config['CHUNK_CACHE_MAX_BYTES'] <= 0:
+        return None
+    return ChunkAudioCache(app.config['CHUNK_CACHE_FOLDER'])
+
+
+def get_transcoder():
+    """Return the transcoder whose variant cache and in-flight transcodes this process shares"""
+    key = (app.config['TRANSCODE_FOLDER'], app.config['TRANSCODE_WORKERS'], app.config['FFMPEG_BINARY'])
+    if key not in _transcoders:
+        _transcoders[key] = Transcoder(*key)
+    return _transcoders[key]
+
+
+def open_stored_audio(filename):
+    """Return (local path, release) for stored audio; remote objects are downloaded to a temporary file"""
+    storage = get_storage()
+    if storage.is_local:
+        return storage.path_for(filename), lambda: None
+    temp_fd, temp_path = tempfile.mkstemp(suffix='.mp3')
+    with os.fdopen(temp_fd, 'wb') as f:
+        for block in storage.iter_range(filename):
+            f.write(block)
+    return temp_path, lambda: os.remove(temp_path)
+
+
+def get_audio_variant(filename, audio_format, bitrate=None):
+    """Return (path, mimetype, download name) of an audio file transcoded to a format and bitrate
+
+    Raises ValueError for an invalid name or variant, FileNotFoundError for missing
+    audio and TranscodeError when ffmpeg fails.
+    """
+    audio_format, bitrate = parse_variant(audio_format, bitrate)
+    size = get_storage().size(filename)
+    if not size:
+        raise FileNotFoundError(filename)
+    
+    path = get_transcoder().get(filename, size, lambda: open_stored_audio(filename), audio_format, bitrate)
+    extension, mimetype, _, _ = TRANSCODE_FORMATS[audio_format]
+    download_name = f"{os.path.splitext(filename)[0]}{'-' + bitrate if bitrate else ''}.{extension}"
+    return path, mimetype, download_name
+
+
+def get_hls_writer(filename):
+    """Return the HLS writer for a new audio file, or None when HLS output is off"""
+    if not app.config['HLS_OUTPUT']:
+        return None
+    return HlsWriter(get_storage(), filename)
+
+
+_batch_chunk_executors = {}
+_batch_runners = {}
+
+
+def get_batch_store():
+    return BatchStore(app.config['BATCH_FOLDER'])
+
+
+def get_batch_chunk_executor():
+    """Return the executor every batch item's chunks are synthesized on: the shared concurrency budget"""
+    workers = app.config['BATCH_CHUNK_WORKERS']
+    if workers not in _batch_chunk_executors:
+        _batch_chunk_executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-chunk')
+    return _batch_chunk_executors[workers]
+
+
+def get_batch_runner():
+    """Return the process-wide runner of batch items"""
+    key = (app.config['BATCH_FOLDER'], app.config['BATCH_ITEM_WORKERS'])
+    if key not in _batch_runners:
+        _batch_runners[key] = BatchRunner(get_batch_store(), run_batch_item, app.config['BATCH_ITEM_WORKERS'],
+                                          on_item_finished=notify_batch_item_finished)
+    return _batch_runners[key]
+
+
+def run_batch_item(item_input):
+    """Generate the audio of one batch item and return its manifest fields"""
+    text = get_text_store().get(item_input['text_id'])
+    if text is None:
+        raise LookupError("The item's text is no longer stored")
+    filename = f"{uuid.uuid4()}.mp3"
+    output_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    plan = plan_chunks(text)
+    try:
+        with get_admission_controller('api_generate_batch').admit(len(text), plan.num_chunks):
+            generate_speech(text, output_path, voice=item_input['voice'], model=item_input['model'], client=client,
+                            plan=plan, chunk_cache=get_chunk_cache(), hls_writer=get_hls_writer(filename),
+                            peaks_path=get_peaks_path(output_path), alignment_path=get_alignment_path(output_path),
+                            executor=get_batch_chunk_executor())
+        duration = audio_duration(output_path)
+        file_size, _ = record_generation(text, item_input['voice'], item_input['model'], filename, output_path,
+                                         item_input['source_type'], item_input['original_filename'])
+    except Exception:
+        delete_audio_artifacts(get_storage(), filename)
+        raise
+    return {'filename': filename, 'file_size': file_size, 'num_chunks': plan.num_chunks, 'duration': duration}
+
+
+def notify_batch_item_finished(manifest, index):
+    """Send a batch's webhooks for a finished item, and for the batch once its last item finishes"""
+    if not manifest.get('callback_url'):
+        return
+    # Runs on a batch worker: URLs are built for the host the batch was submitted to
+    with app.test_request_context(base_url=manifest['base_url']):
+        manifest = batch_manifest_for_api(manifest)
+        status_url = url_for('api_batch', batch_id=manifest['batch_id'], _external=True)
+    item = manifest['items'][index]
+    payload = {
+        "batch_id": manifest['batch_id'],
+        "index": index,
+        "text_length": item['text_length'],
+        "processing_time": item['elapsed_seconds'],
+    }
+    if item['status'] == BATCH_FAILED:
+        send_webhook(manifest['callback_url'], 'generation.failed', dict(payload, error=item['error']))
+    else:
+        send_webhook(manifest['callback_url'], 'generation.completed', dict(
+            payload, file_id=os.path.splitext(item['filename'])[0], filename=item['filename'], url=item['url'],
+            download_url=item['download_url'], duration=item.get('duration')))
+    if manifest['status'] != BATCH_RUNNING:
+        send_webhook(manifest['callback_url'], 'batch.completed', {
+            "batch_id": manifest['batch_id'],
+            "status": manifest['status'],
+            "counts": manifest['counts'],
+            "status_url": status_url,
+        })
+
+
+def history_lock():
+    """Return the cross-process lock that guards history.json and its search index"""
+    return FileLock(app.config['HISTORY_FILE'] + '.lock')
+
+
+@contextlib.contextmanager
+def locked_history():
+    """Hold the cross-process history lock and yield the entries; changes are written back atomically
+    
+    Every read-modify-write of history.json goes through here, so concurrent workers
+    never lose each other's entries. Plain readers need no lock because the file is
+    replaced atomically.
+    """
+    with history_lock():
+        try:
+            with open(app.config['HISTORY_FILE'], 'r') as f:
+                history = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            history = []
+        yield history
+        atomic_write_json(app.config['HISTORY_FILE'], history)
+
+
+def save_to_history(text, voice, model, filename, file_size, source_type="Text", original_filename="Direct text input", text_id=None):
+    """Save a generation to the history file"""
+    # Build the new entry
+    entry = {
         'timestamp': datetime.now().isoformat(),
         'text': text[:HISTORY_TEXT_PREVIEW_LENGTH] + ('...' if len(text) > HISTORY_TEXT_PREVIEW_LENGTH else ''),
         'voice': voice,
@@ -100,12 +715,42 @@ def save_to_history(text, voice, model, filename, file_size, source_type="Text",
         'filename': filename,
         'file_size': file_size,
         'source_type': source_type,
-        'original_filename': original_filename
-    })
-    
-    # Save back to file
-    with open(app.config['HISTORY_FILE'], 'w') as f:
-        json.dump(history, f)
+        'original_filename': original_filename,
+        'text_id': text_id,
+        'text_length': len(text),
+        'num_chunks': plan_chunks(text).num_chunks
+    }
+    index = get_history_index_or_none()
+    with locked_history() as history:
+        history.append(entry)
+        
+        # Index the full text so it can be searched later
+        if index is not None:
+            try:
+                index.add(entry, text)
+            except Exception as e:
+                app.logger.error(f"Error indexing history entry {filename}: {str(e)}")
+
+
+def record_generation(text, voice, model, filename, output_path, source_type, original_filename):
+    """Store finished audio and its full text, add it to history and return (file_size, text_id)"""
+    file_size = store_audio(filename, output_path)
+    text_id = get_text_store().put(text, holder=HISTORY_TEXT_HOLDER)
+    save_to_history(text, voice, model, filename, file_size, source_type=source_type, original_filename=original_filename, text_id=text_id)
+    return file_size, text_id
+
+
+def get_history_for_api():
+    """Get the generation history in a JSON-serializable form"""
+    history_data = get_history()
+    # Convert datetime objects to ISO format for JSON serialization
+    for item in history_data:
+        if isinstance(item['timestamp'], datetime):
+            item['timestamp'] = item['timestamp'].isoformat()
+        # Add file_id from filename
+        if 'filename' in item:
+            item['file_id'] = os.path.splitext(item['filename'])[0]
+    return history_data
 
 
 def get_history():
@@ -129,44 +774,189 @@ def get_history():
 
 def remove_from_history(filename):
     """Remove an entry from the history file"""
-    try:
-        with open(app.config['HISTORY_FILE'], 'r') as f:
-            history = json.load(f)
-        
-        # Filter out the entry with the given filename
-        history = [item for item in history if item['filename'] != filename]
+    return remove_entries_from_history([filename])
+
+
+def remove_entries_from_history(filenames):
+    """Remove the entries for several audio files from the history file in one write"""
+    filenames = set(filenames)
+    index = get_history_index_or_none()
+    with locked_history() as history:
+        # Filter out the entries with the given filenames
+        removed = [item for item in history if item['filename'] in filenames]
+        history[:] = [item for item in history if item['filename'] not in filenames]
         
-        with open(app.config['HISTORY_FILE'], 'w') as f:
-            json.dump(history, f)
+        # Release stored texts that no remaining entry refers to; documents, batches
+        # and the PDF cache may still hold them
+        remaining_ids = {item.get('text_id') for item in history}
+        for item in removed:
+            if item.get('text_id') and item['text_id'] not in remaining_ids:
+                get_text_store().release(item['text_id'], HISTORY_TEXT_HOLDER)
+            delete_audio_artifacts(get_storage(), item['filename'])
         
-        return True
+        if index is not None:
+            try:
+                for filename in filenames:
+                    index.remove(filename)
+            except Exception as e:
+                app.logger.error(f"Error removing {', '.join(sorted(filenames))} from history index: {str(e)}")
+    
+    return True
+
+
+def get_history_filenames():
+    """Return the set of audio filenames that history entries refer to"""
+    try:
+        with open(app.config['HISTORY_FILE'], 'r') as f:
+            return {item['filename'] for item in json.load(f)}
     except (json.JSONDecodeError, FileNotFoundError):
-        return False
+        return set()
+
+
+def prune_transcode_cache():
+    """Keep the transcoded variant cache within TRANSCODE_MAX_BYTES; return the bytes reclaimed"""
+    return get_transcoder().prune(app.config['TRANSCODE_MAX_BYTES'])
+
+
+def batch_text_holder(batch_id):
+    return f"batch-{batch_id}"
+
+
+def release_batch_texts(manifest):
+    """Release the stored texts a removed batch manifest held"""
+    store = get_text_store()
+    for text_id in {item['input']['text_id'] for item in manifest['items']}:
+        store.release(text_id, batch_text_holder(manifest['batch_id']))
+
+
+def prune_batch_manifests():
+    """Remove batch manifests older than BATCH_TTL, and release their texts; return the bytes reclaimed"""
+    return get_batch_store().prune(app.config['BATCH_TTL'], on_remove=release_batch_texts)
+
+
+def prune_documents():
+    """Remove documents unused for DOCUMENT_TTL and release their texts; return the bytes reclaimed"""
+    folder = app.config['DOCUMENTS_FOLDER']
+    if not os.path.isdir(folder):
+        return 0
+    cutoff = time.time() - app.config['DOCUMENT_TTL']
+    store = get_text_store()
+    reclaimed = 0
+    for name in os.listdir(folder):
+        document_id = name[:-len('.json')]
+        if not name.endswith('.json') or not is_valid_text_id(document_id):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime >= cutoff:
+                continue
+            os.remove(path)
+        except OSError:
+            continue
+        reclaimed += stat.st_size
+        size = store.stored_size(document_id)
+        if store.release(document_id, DOCUMENT_TEXT_HOLDER):
+            reclaimed += size
+    return reclaimed
+
+
+def prune_pdf_cache():
+    """Remove PDF texts unread for PDF_CACHE_TTL; return the bytes reclaimed"""
+    return get_pdf_text_cache().prune(app.config['PDF_CACHE_TTL'])
+
+
+def prune_chunk_cache():
+    """Keep the shared chunk audio cache within CHUNK_CACHE_MAX_BYTES; return the bytes reclaimed"""
+    chunk_cache = get_chunk_cache()
+    return chunk_cache.prune(app.config['CHUNK_CACHE_MAX_BYTES']) if chunk_cache else 0
+
+
+def get_janitor():
+    """Return the output folder janitor configured from the app config"""
+    return OutputJanitor(
+        app.config['UPLOAD_FOLDER'],
+        max_bytes=app.config['OUTPUT_MAX_BYTES'],
+        max_age=app.config['OUTPUT_MAX_AGE'],
+        # History entries only map to local files when audio is stored locally
+        list_referenced=get_history_filenames if get_storage().is_local else None,
+        on_remove=remove_entries_from_history,
+        temp_patterns=[(tempfile.gettempdir(), CHUNK_TEMP_PREFIX + '*')],
+        sweep_unreferenced=app.config['OUTPUT_SWEEP_UNREFERENCED'],
+        extra_collectors=[prune_chunk_cache, prune_transcode_cache, prune_batch_manifests, prune_documents,
+                          prune_pdf_cache]
+    )
+
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+
+@app.before_request
+def prepare_output_folder():
+    ensure_output_folder()
+
+
+@app.before_request
+def start_request_trace():
+    g.trace_start = time.time()
+
+
+@app.after_request
+def record_request_trace(response):
+    """Append a traced request to REQUEST_TRACE_FILE, when set"""
+    path = app.config['REQUEST_TRACE_FILE']
+    if path and request.endpoint in TRACED_ENDPOINTS and 'trace_start' in g:
+        try:
+            TraceRecorder(path).record(
+                t=round(g.trace_start, 3),
+                endpoint=request.endpoint,
+                method=request.method,
+                status=response.status_code,
+                elapsed=round(time.time() - g.trace_start, 3),
+                text_length=g.get('text_length'),
+                pdf=request.mimetype == 'application/pdf' or bool(request.files.get('pdf_file')),
+                range='Range' in request.headers,
+            )
+        except OSError as e:
+            app.logger.error(f"Error recording request trace: {str(e)}")
+    return response
+
+
+@app.before_request
+def start_background_janitor():
+    """Start the janitor on the first request; its first pass sweeps files orphaned by crashed workers"""
+    global _janitor
+    if _janitor is not None or app.config.get('TESTING') or app.config['JANITOR_INTERVAL'] <= 0:
+        return
+    with _janitor_lock:
+        if _janitor is None:
+            _janitor = get_janitor()
+            _janitor.start(app.config['JANITOR_INTERVAL'])
 
 
 def clear_all_history():
     """Remove all entries from the history file and delete all audio files"""
-    try:
-        # Get the current history to find files to delete
-        with open(app.config['HISTORY_FILE'], 'r') as f:
-            history = json.load(f)
-        
-        # Delete all audio files from the output directory
+    index = get_history_index_or_none()
+    with locked_history() as history:
+        # Delete all audio files from storage
+        storage = get_storage()
         for item in history:
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], item['filename'])
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            storage.delete(item['filename'])
+            delete_audio_artifacts(storage, item['filename'])
+            if item.get('text_id'):
+                get_text_store().release(item['text_id'], HISTORY_TEXT_HOLDER)
         
         # Clear the history file
-        with open(app.config['HISTORY_FILE'], 'w') as f:
-            json.dump([], f)
+        history[:] = []
         
-        return True
-    except (json.JSONDecodeError, FileNotFoundError):
-        # Create an empty history file if it doesn't exist
-        with open(app.config['HISTORY_FILE'], 'w') as f:
-            json.dump([], f)
-        return True
+        if index is not None:
+            try:
+                index.clear()
+            except Exception as e:
+                app.logger.error(f"Error clearing history index: {str(e)}")
+    
+    return True
 
 
 @app.template_filter('now')
@@ -186,14 +976,20 @@ def index():
         # Extract text either from form input or PDF file
         text = form.text.data or ""
         pdf_file = request.files.get('pdf_file')
+        pdf_document = get_document_metadata(request.form.get('pdf_document_id', ''))
         
         # If both text and PDF are empty, show an error
-        if not text and not pdf_file:
+        if not text and not pdf_file and not pdf_document:
             flash("Please provide either text or upload a PDF file", "danger")
             return redirect(url_for('index'))
         
+        # A PDF already uploaded for the preview is reused instead of being sent again
+        if pdf_document and not (pdf_file and pdf_file.filename):
+            pdf_text = get_document_text(pdf_document['document_id'])
+            text = text + "\n\n" + pdf_text if text else pdf_text
+        
         # If PDF file is provided, extract text from it
-        if pdf_file and pdf_file.filename:
+        elif pdf_file and pdf_file.filename:
             try:
                 pdf_text = extract_text_from_pdf(pdf_file)
                 # If form text is empty, use the PDF text
@@ -202,6 +998,8 @@ def index():
                 # If both are provided, append PDF text to form text
                 else:
                     text += "\n\n" + pdf_text
+            except RequestEntityTooLarge:
+                raise
             except Exception as e:
                 flash(f"Error processing PDF: {str(e)}", "danger")
                 return redirect(url_for('index'))
@@ -215,6 +1013,7 @@ def index():
         if len(text) > MAX_TEXT_LENGTH:
             flash(f"Text is too long. Maximum is {MAX_TEXT_LENGTH:,} characters.", "danger")
             return redirect(url_for('index'))
+        g.text_length = len(text)
         
         # Generate a unique filename
         filename = f"{uuid.uuid4()}.mp3"
@@ -222,62 +1021,51 @@ def index():
         
         start_time = time.time()
         try:
-            # Process text and generate audio
-            if len(text) <= MAX_CHUNK_SIZE:
-                # Single chunk processing for short text
-                generate_speech(text, output_path, voice=voice, model=model)
-                num_chunks = 1
-            else:
-                # Multi-chunk processing for longer text
-                # Split text into chunks
-                chunks = [text[i:i+MAX_CHUNK_SIZE] for i in range(0, len(text), MAX_CHUNK_SIZE)]
-                num_chunks = len(chunks)
-                
-                # Generate temporary audio files for each chunk
-                temp_files = []
-                for i, chunk in enumerate(chunks):
-                    temp_filename = f"temp_{uuid.uuid4()}.mp3"
-                    temp_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-                    generate_speech(chunk, temp_path, voice=voice, model=model)
-                    temp_files.append(temp_path)
-                
-                # Combine audio files
-                combine_audio_files(temp_files, output_path)
-                
-                # Clean up temporary files
-                for temp_file in temp_files:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
+            # Process text and generate audio with the same chunk plan shown in the preview
+            plan = plan_chunks(text)
+            num_chunks = plan.num_chunks
+            with get_admission_controller('index').admit(len(text), num_chunks):
+                generate_speech(text, output_path, voice=voice, model=model, client=client, plan=plan, chunk_cache=get_chunk_cache(),
+                                chunk_queue=get_chunk_queue(), hls_writer=get_hls_writer(filename),
+                                peaks_path=get_peaks_path(output_path), alignment_path=get_alignment_path(output_path))
             
             # Calculate processing time
             processing_time = time.time() - start_time
             
-            # Get file size
-            file_size = os.path.getsize(output_path)
+            # Move the finished audio to storage and get its size
+            file_size = store_audio(filename, output_path)
             
             # Save to history
             source_type = "PDF" if pdf_file and pdf_file.filename else "Text"
             original_filename = pdf_file.filename if pdf_file and pdf_file.filename else "Direct text input"
+            if pdf_document and source_type == "Text":
+                source_type = pdf_document.get('source_type', 'PDF')
+                original_filename = pdf_document.get('original_filename', original_filename)
             
-            save_to_history(text, voice, model, filename, file_size, source_type=source_type, original_filename=original_filename)
+            # Keep the full text server-side; only its id travels in URLs and cookies
+            text_id = get_text_store().put(text, holder=HISTORY_TEXT_HOLDER)
+            save_to_history(text, voice, model, filename, file_size, source_type=source_type, original_filename=original_filename, text_id=text_id)
             
-            # Store the text in session for cases where it's too long for URL
-            session['last_generated_text'] = text
+            session['last_generated_text_id'] = text_id
             session['last_generated_filename'] = filename
             
-            # Redirect to result page - now including text parameter
+            # Redirect to result page, referencing the stored text by id
             return redirect(url_for('result', 
                                    filename=filename, 
                                    voice=voice, 
                                    model=model, 
-                                   text=text,  # Add text to URL params
+                                   text_id=text_id,
                                    text_length=len(text),
                                    num_chunks=num_chunks,
                                    source_type=source_type,
                                    original_filename=original_filename,
                                    processing_time=f"{processing_time:.2f} seconds"))
             
+        except AdmissionRejected as e:
+            flash(f"The server is busy. Please try again in {e.retry_after} seconds.", "warning")
+            return render_template('index.html', form=form), 429, {'Retry-After': str(e.retry_after)}
         except Exception as e:
+            delete_audio_artifacts(get_storage(), filename)
             flash(f"Error generating speech: {str(e)}", "danger")
             return redirect(url_for('index'))
     
@@ -293,19 +1081,34 @@ def result():
     original_filename = request.args.get('original_filename', 'Direct text input')
     show_success = request.args.get('show_success', 'true').lower() != 'false'  # Default to true
     
-    # Try to get text from URL params first, then fallback to session if URL param is empty
-    text = request.args.get('text', '')
-    if not text and 'last_generated_text' in session:
+    # Prefer the full text from the text store, referenced by id. Only its first
+    # window is read here; the page fetches the rest from /api/text while scrolling.
+    store = get_text_store()
+    text_id = request.args.get('text_id')
+    text = ''
+    if not store.exists(text_id):
+        text_id = None
+        # Fall back to legacy text URL params, then to the session
+        text = request.args.get('text', '')
+    if not text_id and not text and session.get('last_generated_filename') == filename \
+            and store.exists(session.get('last_generated_text_id')):
+        text_id = session.get('last_generated_text_id')
+    if not text_id and not text and 'last_generated_text' in session:
         text = session.get('last_generated_text', '')
         app.logger.info(f"Retrieved full text from session, length: {len(text)} characters")
         # Clear from session after use to save space
         session.pop('last_generated_text', None)
     
     # If still no text, try to get from history
-    if not text:
+    if not text_id and not text:
         history_data = get_history()
         for item in history_data:
             if item['filename'] == filename:
+                if store.exists(item.get('text_id')):
+                    app.logger.info(f"Found full text for {filename} in text store")
+                    text_id = item['text_id']
+                    break
+                
                 history_text = item['text']
                 app.logger.info(f"Found history entry for {filename}")
                 
@@ -317,26 +1120,54 @@ def result():
                 text = history_text
                 break
     
+    if text_id:
+        total_length = store.length(text_id) or 0
+        text = store.read_range(text_id, 0, TRANSCRIPT_WINDOW_CHARS) or ''
+    else:
+        total_length = len(text)
+        text = text[:TRANSCRIPT_WINDOW_CHARS]
+    
     text_length = request.args.get('text_length', '0')
     num_chunks = request.args.get('num_chunks', '1')
     processing_time = request.args.get('processing_time', '0 seconds')
     
     # Get file size
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    file_size = get_storage().size(filename)
     file_size_formatted = humanize.naturalsize(file_size)
     
+    # Long audio plays from its HLS playlist when it has one; the waveform is drawn from stored peaks
+    # and the transcript follows playback through the alignment index
+    hls_url = None
+    peaks_url = None
+    alignment_url = None
+    if filename:
+        try:
+            if get_storage().exists(playlist_name(filename)):
+                hls_url = url_for('hls_file', name=playlist_name(filename))
+            if get_storage().exists(waveform.peaks_name(filename)):
+                peaks_url = url_for('api_peaks', filename=filename)
+            if text_id and get_storage().exists(alignment.alignment_name(filename)):
+                alignment_url = url_for('api_alignment', filename=filename)
+        except ValueError:
+            pass
+    
     # Log if text is still empty for debugging
     if not text:
         app.logger.error(f"Text is still empty for result page with filename {filename}")
     else:
-        app.logger.info(f"Text for result page has {len(text)} characters")
+        app.logger.info(f"Text for result page has {total_length} characters")
     
     return render_template('result.html', 
                           filename=filename,
                           voice=voice,
                           model=model,
                           text=text,
+                          text_id=text_id,
+                          total_length=total_length,
+                          hls_url=hls_url,
+                          peaks_url=peaks_url,
+                          alignment_url=alignment_url,
+                          transcript_window=TRANSCRIPT_WINDOW_CHARS,
                           text_length=text_length,
                           num_chunks=num_chunks,
                           processing_time=processing_time,
@@ -358,9 +1189,20 @@ def preview():
     """Calculate and return a cost/resource preview"""
     text = request.form.get('text', '')
     model = request.form.get('model', 'tts-1')
+    document_id = request.form.get('document_id')
+    
+    # A previously uploaded document (plus small edits) stands in for the full upload
+    if document_id:
+        try:
+            document_text = resolve_document_text(document_id, request.form.get('edits'))
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
+        except ValueError as e:
+            return jsonify({'error': f'Invalid edits: {str(e)}'}), 400
+        text = text + "\n\n" + document_text if text else document_text
     
     # Check if a PDF file was uploaded
-    if 'pdf_file' in request.files:
+    elif 'pdf_file' in request.files:
         pdf_file = request.files['pdf_file']
         
         # Check if it's a valid file with a filename
@@ -376,48 +1218,212 @@ def preview():
                         text += "\n\n" + pdf_text
                     else:
                         text = pdf_text
+                except RequestEntityTooLarge:
+                    raise
                 except Exception as e:
                     return jsonify({'error': f'Error processing PDF: {str(e)}'})
     
     # If there's no text after processing, return an error
     if not text:
         return jsonify({'error': 'No text provided'})
+    g.text_length = len(text)
     
-    text_length = len(text)
-    num_chunks = (text_length // MAX_CHUNK_SIZE) + (1 if text_length % MAX_CHUNK_SIZE > 0 else 0)
-    
-    # Calculate approximate cost
-    cost_per_char = COST_PER_CHAR_STANDARD if model == 'tts-1' else COST_PER_CHAR_HD
-    cost = text_length * cost_per_char
+    preview_data = build_text_preview(text, model)
     
     return jsonify({
-        'text_length': text_length,
-        'num_chunks': num_chunks,
-        'cost': cost
+        'text_length': preview_data['text_length'],
+        'num_chunks': preview_data['num_chunks'],
+        'chunk_lengths': preview_data['chunk_lengths'],
+        'cost': preview_data['cost'],
+        'estimated_duration': preview_data['estimated_duration']
     })
 
 
+def serve_audio(filename, as_attachment):
+    """Serve audio from storage: local files directly, remote objects by presigned URL or ranged streaming"""
+    if request.args.get('format') or request.args.get('bitrate'):
+        return serve_audio_variant(filename, as_attachment)
+    storage = get_storage()
+    try:
+        if storage.is_local:
+            file_path = storage.path_for(filename)
+            touch_access_time(file_path)  # Recently played files are evicted last
+            return send_file(file_path, mimetype='audio/mpeg', as_attachment=as_attachment)
+        
+        url = storage.download_url(filename, as_attachment=as_attachment)
+        if url:
+            return redirect(url)
+        
+        size = storage.size(filename)
+    except ValueError:
+        return jsonify({"error": "Invalid filename"}), 400
+    if not size:
+        return jsonify({"error": "Audio file not found"}), 404
+    
+    try:
+        byte_range = parse_range_header(request.headers.get('Range'), size)
+    except ValueError:
+        return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+    start, end = byte_range or (0, size - 1)
+    
+    response = Response(storage.iter_range(filename, start, end), mimetype='audio/mpeg',
+                        status=206 if byte_range else 200, direct_passthrough=True)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Length'] = str(end - start + 1)
+    if byte_range:
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if as_attachment:
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def serve_audio_variant(filename, as_attachment):
+    """Serve audio transcoded to the requested ?format=&bitrate=, from the variant cache"""
+    try:
+        path, mimetype, download_name = get_audio_variant(filename, request.args.get('format'),
+                                                          request.args.get('bitrate'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({"error": "Audio file not found"}), 404
+    except TranscodeError as e:
+        app.logger.error(f"Error transcoding {filename}: {str(e)}")
+        return jsonify({"error": "Could not transcode audio"}), 500
+    return send_file(path, mimetype=mimetype, as_attachment=as_attachment, download_name=download_name)
+
+
 @app.route('/get-audio/<filename>')
 def get_audio(filename):
     """Stream audio file to the browser"""
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    return send_file(file_path, mimetype='audio/mpeg', as_attachment=False)
+    return serve_audio(filename, as_attachment=False)
 
 
 @app.route('/download/<filename>')
 def download_audio(filename):
     """Download audio file"""
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    return send_file(file_path, mimetype='audio/mpeg', as_attachment=True)
+    return serve_audio(filename, as_attachment=True)
+
+
+@app.route('/hls/<name>')
+def hls_file(name):
+    """Serve an HLS playlist or segment from storage"""
+    storage = get_storage()
+    try:
+        if not is_hls_name(name) or not storage.exists(name):
+            return jsonify({"error": "Not found"}), 404
+        if name.endswith('.m3u8'):
+            # Playlists grow while synthesis runs; segments never change once listed
+            response = Response(b''.join(storage.iter_range(name)), mimetype=PLAYLIST_MIMETYPE)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        if storage.is_local:
+            response = send_file(storage.path_for(name), mimetype=SEGMENT_MIMETYPE)
+        else:
+            url = storage.download_url(name)
+            if url:
+                return redirect(url)
+            response = Response(storage.iter_range(name), mimetype=SEGMENT_MIMETYPE, direct_passthrough=True)
+    except ValueError:
+        return jsonify({"error": "Invalid name"}), 400
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@app.route('/api/peaks/<filename>')
+def api_peaks(filename):
+    """API endpoint returning the stored waveform peaks of an audio file.
+
+    Query parameters: level (index into levels, default the coarsest), and
+    start/end in seconds to return only part of the level. Peaks are flat
+    [min, max, min, max, ...] values from -127 to 127.
+    """
+    storage = get_storage()
+    name = waveform.peaks_name(filename)
+    try:
+        if not storage.exists(name):
+            return jsonify({"error": "Peaks not found"}), 404
+    except ValueError:
+        return jsonify({"error": "Invalid filename"}), 400
+
+    def read_range(start, end):
+        return b''.join(storage.iter_range(name, start, end))
+
+    header = waveform.read_header(read_range)
+    levels = header['levels']
+    try:
+        level = int(request.args.get('level', len(levels) - 1))
+        start = float(request.args.get('start', 0))
+        end = request.args.get('end')
+        end = float(end) if end is not None else None
+    except ValueError:
+        return jsonify({"error": "level must be an integer and start/end numbers of seconds"}), 400
+    if not 0 <= level < len(levels) or start < 0 or (end is not None and end < start):
+        return jsonify({"error": "Invalid level or time range"}), 400
+
+    peaks_per_second = header['sample_rate'] / levels[level]['samples_per_peak']
+    first = int(start * peaks_per_second)
+    last = math.ceil(end * peaks_per_second) if end is not None else None
+    response = jsonify({
+        "filename": filename,
+        "sample_rate": header['sample_rate'],
+        "duration": header['samples'] / header['sample_rate'] if header['sample_rate'] else 0,
+        "levels": [{"samples_per_peak": info['samples_per_peak'], "length": info['count']} for info in levels],
+        "level": level,
+        "start_index": first,
+        "peaks": waveform.read_level(read_range, header, level, first, last),
+    })
+    # Peaks are written once with the audio and never change
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.set_etag(f"{name}-{storage.size(name)}-{level}-{first}-{last}")
+    return response.make_conditional(request)
+
+
+@functools.lru_cache(maxsize=ALIGNMENT_CACHE_SIZE)
+def load_alignment(name, size):
+    """Return a parsed alignment index; keyed by size too, as the object is only ever written whole"""
+    return alignment.read_alignment(b''.join(get_storage().iter_range(name)))
+
+
+@app.route('/api/alignment/<filename>')
+def api_alignment(filename):
+    """API endpoint mapping input text offsets to audio time and back.
+
+    Without parameters the whole index is returned. With offset (characters)
+    or time (seconds) only that position is looked up, by binary search.
+    """
+    storage = get_storage()
+    name = alignment.alignment_name(filename)
+    try:
+        size = storage.size(name)
+    except ValueError:
+        return jsonify({"error": "Invalid filename"}), 400
+    if not size:
+        return jsonify({"error": "Alignment not found"}), 404
+    index = load_alignment(name, size)
+
+    try:
+        if 'offset' in request.args:
+            offset = int(request.args['offset'])
+            segment = index.segment_for_offset(offset)
+            response = jsonify({"offset": offset, "time": index.time_for_offset(offset), "segment": segment})
+        elif 'time' in request.args:
+            seconds = float(request.args['time'])
+            segment = index.segment_for_time(seconds)
+            response = jsonify({"time": seconds, "offset": index.offset_for_time(seconds), "segment": segment})
+        else:
+            response = jsonify(dict(index.to_dict(), filename=filename))
+    except ValueError:
+        return jsonify({"error": "offset must be an integer and time a number of seconds"}), 400
+    # The index is written once with the audio and never changes
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 
 @app.route('/delete/<filename>')
 def delete_audio(filename):
     """Delete an audio file and its history entry"""
     try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        get_storage().delete(filename)
         
         # Remove from history
         remove_from_history(filename)
@@ -450,6 +1456,12 @@ def api_health():
     return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
 
 
+@app.route('/api/metrics')
+def api_metrics():
+    """Return process-wide counters and gauges (janitor reclaimed bytes, runs, ...)"""
+    return jsonify(metrics.snapshot())
+
+
 @app.route('/api/preview-cost', methods=['POST'])
 def api_preview_cost():
     """API endpoint for cost preview"""
@@ -460,12 +1472,13 @@ def api_preview_cost():
     text = data.get('text', '')
     model = data.get('model', 'tts-1')
     
-    text_length = len(text)
-    estimated_cost = calculate_cost(text_length, model)
+    plan = plan_chunks(text)
     
     return jsonify({
-        "text_length": text_length,
-        "estimated_cost": estimated_cost,
+        "text_length": plan.text_length,
+        "estimated_cost": plan.cost(model),
+        "num_chunks": plan.num_chunks,
+        "estimated_duration": plan.estimated_duration,
         "model": model
     })
 
@@ -473,8 +1486,33 @@ def api_preview_cost():
 @app.route('/api/generate', methods=['POST'])
 def api_generate():
     """API endpoint for generating speech"""
+    document_id = None if request.mimetype == 'application/pdf' else get_request_param('document_id')
+    
+    # Raw PDF bytes as the request body; options come from the query string
+    if request.mimetype == 'application/pdf':
+        try:
+            text = extract_text_from_request_body()
+        except RequestEntityTooLarge:
+            raise
+        except Exception as e:
+            return jsonify({"error": f"Error processing PDF: {str(e)}"}), 400
+        source_type = "PDF"
+        original_filename = request.args.get('filename', 'API PDF upload')
+    # A previously uploaded document, optionally with small edits
+    elif document_id:
+        edits = get_request_param('edits')
+        try:
+            text = resolve_document_text(document_id, edits)
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"error": f"Invalid edits: {str(e)}"}), 400
+        
+        metadata = get_document_metadata(document_id)
+        source_type = metadata.get('source_type', 'Text')
+        original_filename = metadata.get('original_filename', 'API text input')
     # For JSON data
-    if request.is_json:
+    elif request.is_json:
         data = request.json
         if not data or ('text' not in data and 'pdf_base64' not in data):
             return jsonify({"error": "Either text or PDF data is required"}), 400
@@ -482,12 +1520,8 @@ def api_generate():
         # Extract text from PDF if provided
         if 'pdf_base64' in data and data['pdf_base64']:
             try:
-                # Decode base64 PDF data
-                pdf_data = base64.b64decode(data['pdf_base64'])
-                pdf_file = io.BytesIO(pdf_data)
-                
-                # Extract text from PDF
-                pdf_text = extract_text_from_pdf(pdf_file)
+                # Decode base64 PDF data to disk and extract text from it
+                pdf_text = extract_text_from_base64_pdf(data['pdf_base64'])
                 
                 # Use extracted text or append to provided text
                 if 'text' in data and data['text']:
@@ -497,6 +1531,8 @@ def api_generate():
                     
                 source_type = "PDF"
                 original_filename = data.get('filename', 'API PDF upload')
+            except RequestEntityTooLarge:
+                raise
             except Exception as e:
                 return jsonify({"error": f"Error processing PDF: {str(e)}"}), 400
         else:
@@ -521,6 +1557,8 @@ def api_generate():
                     
                 source_type = "PDF"
                 original_filename = pdf_file.filename
+            except RequestEntityTooLarge:
+                raise
             except Exception as e:
                 return jsonify({"error": f"Error processing PDF: {str(e)}"}), 400
         else:
@@ -530,48 +1568,426 @@ def api_generate():
     # Validate final text
     if not text:
         return jsonify({"error": "No text could be extracted from the provided sources"}), 400
+    g.text_length = len(text)
     
     # Get other parameters
-    voice = request.json.get('voice', 'alloy') if request.is_json else request.form.get('voice', 'alloy')
-    model = request.json.get('model', 'tts-1') if request.is_json else request.form.get('model', 'tts-1')
+    voice = get_request_param('voice', 'alloy')
+    model = get_request_param('model', 'tts-1')
+    try:
+        callback_url = parse_callback_url(get_request_param('callback_url'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     # Generate a unique filename
     file_id = str(uuid.uuid4())
     filename = f"{file_id}.mp3"
     output_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     
+    start_time = time.monotonic()
     try:
-        # Generate the speech
-        generate_speech(text, output_path, voice=voice, model=model, client=client)
-        file_size = os.path.getsize(output_path)
-        save_to_history(text, voice, model, filename, file_size, source_type=source_type, original_filename=original_filename)
+        # Generate the speech once the node has capacity for it
+        plan = plan_chunks(text)
+        hls_writer = get_hls_writer(filename)
+        with get_admission_controller('api_generate').admit(len(text), plan.num_chunks):
+            generate_speech(text, output_path, voice=voice, model=model, client=client, plan=plan, chunk_cache=get_chunk_cache(),
+                            chunk_queue=get_chunk_queue(), hls_writer=hls_writer, peaks_path=get_peaks_path(output_path),
+                            alignment_path=get_alignment_path(output_path))
+        duration = audio_duration(output_path)
+        file_size, text_id = record_generation(text, voice, model, filename, output_path, source_type, original_filename)
         
-        return jsonify({
+        response = {
             "success": True,
             "file_id": file_id,
             "filename": filename,
+            "text_id": text_id,
             "text_length": len(text),
             "source_type": source_type,
             "original_filename": original_filename,
             "url": url_for('get_audio', filename=filename, _external=True)
+        }
+        if hls_writer is not None:
+            response["hls_url"] = url_for('hls_file', name=hls_writer.playlist_name, _external=True)
+        send_webhook(callback_url, 'generation.completed', {
+            "file_id": file_id,
+            "filename": filename,
+            "url": response["url"],
+            "duration": duration,
+            "text_length": len(text),
+            "processing_time": round(time.monotonic() - start_time, 3),
+        })
+        return jsonify(response)
+    except AdmissionRejected as e:
+        return jsonify({"error": str(e), "retry_after": e.retry_after}), 429, {'Retry-After': str(e.retry_after)}
+    except Exception as e:
+        delete_audio_artifacts(get_storage(), filename)
+        send_webhook(callback_url, 'generation.failed', {
+            "file_id": file_id,
+            "error": str(e),
+            "text_length": len(text),
+            "processing_time": round(time.monotonic() - start_time, 3),
         })
+        return jsonify({"error": str(e)}), 500
+
+
+def parse_batch_item(item):
+    """Validate one /api/generate-batch item; returns its text and the rest of the input it runs from"""
+    if not isinstance(item, dict):
+        raise ValueError("Each item must be an object")
+    if item.get('document_id'):
+        text = resolve_document_text(item['document_id'], item.get('edits'))
+        metadata = get_document_metadata(item['document_id'])
+        source_type = metadata.get('source_type', 'Text')
+        original_filename = metadata.get('original_filename', 'API text input')
+    else:
+        text = item.get('text') or ''
+        source_type, original_filename = 'Text', 'API text input'
+    if not text:
+        raise ValueError("No text provided")
+    if len(text) > MAX_TEXT_LENGTH:
+        raise ValueError(f"Text exceeds maximum length of {MAX_TEXT_LENGTH} characters")
+    audio_format, bitrate = None, None
+    if item.get('format') or item.get('bitrate'):
+        audio_format, bitrate = parse_variant(item.get('format') or 'mp3', item.get('bitrate'))
+    return text, {
+        'text_length': len(text),
+        'voice': item.get('voice') or 'alloy',
+        'model': item.get('model') or 'tts-1',
+        'format': audio_format,
+        'bitrate': bitrate,
+        'source_type': source_type,
+        'original_filename': original_filename,
+    }
+
+
+def batch_manifest_for_api(manifest):
+    """Return a manifest with the URLs of finished items and without the items' internal inputs"""
+    items = []
+    for item in manifest['items']:
+        item = dict(item)
+        item_input = item.pop('input')
+        item.pop('pid', None)
+        for key in ('voice', 'model', 'format', 'bitrate', 'text_length'):
+            item[key] = item_input[key]
+        if item.get('filename'):
+            variant = {key: item_input[key] for key in ('format', 'bitrate') if item_input[key]}
+            item['url'] = url_for('get_audio', filename=item['filename'], _external=True, **variant)
+            item['download_url'] = url_for('download_audio', filename=item['filename'], _external=True, **variant)
+        if item['status'] == BATCH_FAILED:
+            item['retry_url'] = url_for('api_retry_batch_item', batch_id=manifest['batch_id'], index=item['index'],
+                                        _external=True)
+        items.append(item)
+    manifest = dict(manifest, items=items)
+    manifest.pop('base_url', None)
+    return manifest
+
+
+@app.route('/api/generate-batch', methods=['POST'])
+def api_generate_batch():
+    """API endpoint accepting many generation items at once.
+
+    Items run in the background; all of their chunks share one pool of
+    BATCH_CHUNK_WORKERS. Returns 202 with the batch id and its manifest, which
+    /api/batches/<batch_id> keeps reporting as items finish. With a
+    callback_url, a webhook is also sent for every finished item and for the
+    batch as a whole.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > app.config['BATCH_MAX_ITEMS']:
+        return jsonify({"error": f"A batch holds at most {app.config['BATCH_MAX_ITEMS']} items"}), 400
+    
+    parsed = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            parsed.append(parse_batch_item(item))
+        except (LookupError, ValueError) as e:
+            errors.append({"index": index, "error": str(e)})
+    if errors:
+        return jsonify({"error": "Invalid items", "items": errors}), 400
+    try:
+        callback_url = parse_callback_url(data.get('callback_url'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Items run from stored texts, held for as long as the manifest, so a retry needs nothing from the client
+    inputs = [dict(item_input, text_id=compute_text_id(text)) for text, item_input in parsed]
+    store = get_batch_store()
+    manifest = store.create(inputs, callback_url=callback_url, base_url=request.url_root)
+    for text, _ in parsed:
+        get_text_store().put(text, holder=batch_text_holder(manifest['batch_id']))
+    get_batch_runner().submit_batch(manifest)
+    status_url = url_for('api_batch', batch_id=manifest['batch_id'], _external=True)
+    response = jsonify(dict(batch_manifest_for_api(manifest), status_url=status_url))
+    return response, 202, {'Location': status_url}
+
+
+@app.route('/api/batches/<batch_id>')
+def api_batch(batch_id):
+    """API endpoint returning a batch manifest: per-item status, URLs, timings and failures"""
+    try:
+        manifest = get_batch_store().load(batch_id)
+    except ValueError:
+        return jsonify({"error": "Invalid batch id"}), 400
+    if manifest is None:
+        return jsonify({"error": "Batch not found"}), 404
+    return jsonify(batch_manifest_for_api(manifest))
+
+
+@app.route('/api/batches/<batch_id>/items/<int:index>/retry', methods=['POST'])
+def api_retry_batch_item(batch_id, index):
+    """API endpoint queuing a failed batch item again"""
+    try:
+        manifest = get_batch_store().load(batch_id)
+    except ValueError:
+        return jsonify({"error": "Invalid batch id"}), 400
+    if manifest is None or index >= len(manifest['items']):
+        return jsonify({"error": "Batch item not found"}), 404
+    if not get_text_store().exists(manifest['items'][index]['input']['text_id']):
+        return jsonify({"error": "The item's text is no longer stored; submit it again"}), 410
+    if get_batch_runner().retry(batch_id, index) is None:
+        return jsonify({"error": "Only failed items can be retried"}), 409
+    status_url = url_for('api_batch', batch_id=batch_id, _external=True)
+    return jsonify({"batch_id": batch_id, "index": index, "status_url": status_url}), 202, {'Location': status_url}
+
+
+@app.route('/api/history/<filename>/regenerate', methods=['POST'])
+def api_regenerate(filename):
+    """API endpoint re-synthesizing only the chunks of a history entry whose text changed.
+
+    The body holds the new text, or edits ({offset, delete, insert} list) to the
+    entry's stored text. The result is a new audio file that replaces the entry.
+    """
+    entry = next((item for item in get_history() if item['filename'] == filename), None)
+    store = get_text_store()
+    if entry is None or not store.exists(entry.get('text_id')):
+        return jsonify({"error": "No history entry with a stored text for this file"}), 404
+    old_text = store.get(entry['text_id'])
+    
+    text = get_request_param('text')
+    if text is None:
+        try:
+            text = apply_text_edits(old_text, get_request_param('edits'))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid edits: {str(e)}"}), 400
+    if not text:
+        return jsonify({"error": "No text provided"}), 400
+    if len(text) > MAX_TEXT_LENGTH:
+        return jsonify({"error": f"Text exceeds maximum length of {MAX_TEXT_LENGTH} characters"}), 400
+    voice, model = entry['voice'], entry['model']
+    
+    # The previous output's alignment index is its chunk manifest: boundaries and audio times
+    storage = get_storage()
+    try:
+        manifest = alignment.read_alignment(b''.join(storage.iter_range(alignment.alignment_name(filename))))
+        old_boundaries = [tuple(segment[:2]) for segment in manifest.segments]
+    except Exception:
+        manifest = None
+        old_boundaries = plan_chunks(old_text).boundaries
+    plan, reused = plan_regeneration(old_text, old_boundaries, text)
+    
+    # Kept chunks evicted from the chunk cache are cut from the previous output, opened once
+    previous_audio = {}
+    
+    def reuse_from_previous_output(old_index):
+        def reuse(output_path):
+            if manifest is None:
+                return False
+            if 'path' not in previous_audio:
+                previous_audio['path'], previous_audio['release'] = open_stored_audio(filename)
+            _, _, audio_start, duration = manifest.segments[old_index]
+            return cut_chunk(previous_audio['path'], audio_start, duration, output_path)
+        return reuse
+    
+    new_file_id = str(uuid.uuid4())
+    new_filename = f"{new_file_id}.mp3"
+    output_path = os.path.join(app.config['UPLOAD_FOLDER'], new_filename)
+    changed = [i for i in range(plan.num_chunks) if i not in reused]
+    changed_chars = sum(plan.char_counts[i] for i in changed)
+    try:
+        # Only the changed chunks count against the node's capacity
+        with get_admission_controller('api_generate').admit(changed_chars, max(len(changed), 1)):
+            generate_speech(text, output_path, voice=voice, model=model, client=client, plan=plan,
+                            chunk_cache=get_chunk_cache(), hls_writer=get_hls_writer(new_filename),
+                            peaks_path=get_peaks_path(output_path), alignment_path=get_alignment_path(output_path),
+                            reuse={new: reuse_from_previous_output(old) for new, old in reused.items()})
+        _, text_id = record_generation(text, voice, model, new_filename, output_path,
+                                       entry.get('source_type', 'Text'), entry.get('original_filename', 'API text input'))
+    except AdmissionRejected as e:
+        return jsonify({"error": str(e), "retry_after": e.retry_after}), 429, {'Retry-After': str(e.retry_after)}
     except Exception as e:
+        delete_audio_artifacts(get_storage(), new_filename)
         return jsonify({"error": str(e)}), 500
+    finally:
+        if 'release' in previous_audio:
+            previous_audio['release']()
+    
+    # The new output replaces the entry; the old one is removed with its stored artifacts
+    storage.delete(filename)
+    remove_from_history(filename)
+    app.logger.info(f"Regenerated {filename} as {new_filename}: {len(changed)} of {plan.num_chunks} chunks changed")
+    return jsonify({
+        "success": True,
+        "file_id": new_file_id,
+        "filename": new_filename,
+        "previous_filename": filename,
+        "text_id": text_id,
+        "text_length": len(text),
+        "num_chunks": plan.num_chunks,
+        "chunks_reused": len(reused),
+        "chunks_changed": len(changed),
+        "url": url_for('get_audio', filename=new_filename, _external=True)
+    })
+
+
+@app.route('/api/documents', methods=['POST'])
+def api_create_document():
+    """API endpoint to upload text or a PDF once and get a reusable document id"""
+    if request.mimetype == 'application/pdf':
+        model = request.args.get('model', 'tts-1')
+        try:
+            text = extract_text_from_request_body()
+        except RequestEntityTooLarge:
+            raise
+        except Exception as e:
+            return jsonify({"error": f"Error processing PDF: {str(e)}"}), 400
+        source_type = "PDF"
+        original_filename = request.args.get('filename', 'API PDF upload')
+    elif request.is_json:
+        data = request.json or {}
+        model = data.get('model', 'tts-1')
+        if data.get('pdf_base64'):
+            try:
+                text = extract_text_from_base64_pdf(data['pdf_base64'])
+            except RequestEntityTooLarge:
+                raise
+            except Exception as e:
+                return jsonify({"error": f"Error processing PDF: {str(e)}"}), 400
+            source_type = "PDF"
+            original_filename = data.get('filename', 'API PDF upload')
+        else:
+            text = data.get('text', '')
+            source_type = "Text"
+            original_filename = "API text input"
+    else:
+        model = request.form.get('model', 'tts-1')
+        pdf_file = request.files.get('pdf_file')
+        if pdf_file and pdf_file.filename:
+            try:
+                text = extract_text_from_pdf(pdf_file)
+            except RequestEntityTooLarge:
+                raise
+            except Exception as e:
+                return jsonify({"error": f"Error processing PDF: {str(e)}"}), 400
+            source_type = "PDF"
+            original_filename = pdf_file.filename
+        else:
+            text = request.form.get('text', '')
+            source_type = "Text"
+            original_filename = "API text input"
+    
+    if not text:
+        return jsonify({"error": "No text could be extracted from the provided sources"}), 400
+    if len(text) > MAX_TEXT_LENGTH:
+        return jsonify({"error": f"Text is too long. Maximum is {MAX_TEXT_LENGTH:,} characters."}), 400
+    
+    document_id = save_document(text, source_type=source_type, original_filename=original_filename)
+    
+    response = {
+        "document_id": document_id,
+        "source_type": source_type,
+        "original_filename": original_filename,
+        "model": model
+    }
+    response.update(build_text_preview(text, model))
+    return jsonify(response), 201
+
+
+@app.route('/api/documents/<document_id>')
+def api_get_document(document_id):
+    """API endpoint returning the length, chunk plan and cost of an uploaded document"""
+    metadata = get_document_metadata(document_id)
+    if metadata is None:
+        return jsonify({"error": f"Unknown document: {document_id}"}), 404
+    
+    model = request.args.get('model', 'tts-1')
+    response = dict(metadata, model=model)
+    response.update(build_text_preview(get_document_text(document_id), model))
+    return jsonify(response)
+
+
+@app.route('/api/text/<text_id>')
+def api_text(text_id):
+    """API endpoint returning a window of a stored input text, by character offset"""
+    store = get_text_store()
+    total_length = store.length(text_id)
+    if total_length is None:
+        return jsonify({"error": f"Unknown text: {text_id}"}), 404
+    
+    try:
+        offset = int(request.args.get('offset', 0))
+        length = int(request.args.get('length', TRANSCRIPT_WINDOW_CHARS))
+    except ValueError:
+        return jsonify({"error": "offset and length must be integers"}), 400
+    if offset < 0 or length < 1:
+        return jsonify({"error": "offset must be 0 or more and length at least 1"}), 400
+    length = min(length, TRANSCRIPT_MAX_WINDOW_CHARS)
+    
+    text = store.read_range(text_id, offset, length) or ''
+    end = offset + len(text)
+    response = jsonify({
+        "text_id": text_id,
+        "offset": offset,
+        "length": len(text),
+        "total_length": total_length,
+        "text": text,
+        "next_offset": end if end < total_length else None,
+    })
+    # Stored texts never change, so a window can be cached for good
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    response.set_etag(f"{text_id}-{offset}-{length}")
+    return response.make_conditional(request)
 
 
 @app.route('/api/history')
 def api_history():
     """API endpoint for getting generation history"""
-    history_data = get_history()
-    # Convert datetime objects to ISO format for JSON serialization
-    for item in history_data:
-        if isinstance(item['timestamp'], datetime):
-            item['timestamp'] = item['timestamp'].isoformat()
-        # Add file_id from filename
-        if 'filename' in item:
-            item['file_id'] = os.path.splitext(item['filename'])[0]
+    return jsonify(get_history_for_api())
+
+
+@app.route('/api/history/search')
+def api_history_search():
+    """API endpoint for ranked, paginated full-text search over history"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter 'q' is required"}), 400
+    
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', HISTORY_SEARCH_PER_PAGE))
+    except ValueError:
+        return jsonify({"error": "page and per_page must be integers"}), 400
+    if page < 1 or per_page < 1:
+        return jsonify({"error": "page and per_page must be positive"}), 400
+    per_page = min(per_page, HISTORY_SEARCH_MAX_PER_PAGE)
+    
+    start_time = time.time()
+    total, results = get_history_index().search(query, page=page, per_page=per_page)
+    
+    for item in results:
+        item['file_id'] = os.path.splitext(item['filename'])[0]
+        item['url'] = url_for('get_audio', filename=item['filename'], _external=True)
     
-    return jsonify(history_data)
+    return jsonify({
+        "query": query,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "results": results,
+        "took_ms": round((time.time() - start_time) * 1000, 2)
+    })
 
 
 @app.route('/api/check-environment')
@@ -584,6 +2000,81 @@ def api_check_environment():
     })
 
 
+# Introduction read by each voice sample; changing one regenerates only that sample
+VOICE_SAMPLE_INTROS = {
+    "alloy": "Hello, I'm Alloy. I'm a versatile, general-purpose voice that's great for explanations, presentations, and everyday content.",
+    "echo": "Hi there, I'm Echo. My smooth, natural delivery is perfect for narration, storytelling, and educational material.",
+    "fable": "Greetings, I'm Fable. My authoritative tone is ideal for documentaries, podcasts, and more formal content.",
+    "onyx": "Hello, I'm Onyx. My deep, engaging voice works well for announcements, marketing, and professional presentations.",
+    "nova": "Hi, I'm Nova. My warm, pleasant tone is great for friendly content, customer service, and approachable narratives.",
+    "shimmer": "Hello, I'm Shimmer. My clear, articulate delivery is excellent for instructional content, tutorials, and detailed explanations."
+}
+VOICE_SAMPLE_MODEL = "tts-1-hd"
+VOICE_SAMPLE_MAX_AGE = 365 * 24 * 3600  # Versioned sample URLs never change content
+VOICE_SAMPLE_MANIFEST = 'manifest.json'  # voice -> cache key of the audio on disk
+
+_voice_sample_versions = {'mtime': None, 'versions': {}}
+
+
+def get_samples_dir():
+    return os.path.join(app.static_folder, 'audio', 'samples')
+
+
+def voice_sample_key(voice):
+    """Return the chunk cache key, which doubles as the ETag, of a voice's sample"""
+    intro_text = VOICE_SAMPLE_INTROS.get(voice, f"Hello, I'm the {voice} voice.")
+    return ChunkAudioCache.key_for(VOICE_SAMPLE_MODEL, voice, intro_text)
+
+
+def load_voice_sample_manifest(samples_dir):
+    try:
+        with open(os.path.join(samples_dir, VOICE_SAMPLE_MANIFEST), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_voice_sample_versions():
+    """Return the manifest of generated samples, re-read only when it changes"""
+    try:
+        mtime = os.path.getmtime(os.path.join(get_samples_dir(), VOICE_SAMPLE_MANIFEST))
+    except OSError:
+        return {}
+    if _voice_sample_versions['mtime'] != mtime:
+        _voice_sample_versions['versions'] = load_voice_sample_manifest(get_samples_dir())
+        _voice_sample_versions['mtime'] = mtime
+    return _voice_sample_versions['versions']
+
+
+def voice_sample_url(voice):
+    """URL of a voice sample, versioned so browsers can cache it indefinitely"""
+    version = get_voice_sample_versions().get(voice)
+    if version:
+        return url_for('voice_sample', voice=voice, v=version[:16])
+    return url_for('voice_sample', voice=voice)
+
+
+def generate_voice_sample(voice, samples_dir, current_key, chunk_cache):
+    """Write one voice sample into samples_dir; return how it was obtained"""
+    output_path = os.path.join(samples_dir, f"{voice}.mp3")
+    key = voice_sample_key(voice)
+    if current_key == key and os.path.exists(output_path):
+        return "unchanged"
+
+    intro_text = VOICE_SAMPLE_INTROS.get(voice, f"Hello, I'm the {voice} voice.")
+    cached = chunk_cache is not None and os.path.exists(chunk_cache.path_for(key))
+    temp_fd, temp_path = tempfile.mkstemp(dir=samples_dir, suffix='.tmp')
+    os.close(temp_fd)
+    try:
+        if not generate_chunk_cached(client, intro_text, temp_path, VOICE_SAMPLE_MODEL, voice, chunk_cache=chunk_cache):
+            raise RuntimeError("no audio was returned")
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return "cached" if cached else "generated"
+
+
 @app.route('/generate-voice-samples')
 def generate_voice_samples():
     """Generate sample audio files for each available voice"""
@@ -592,41 +2083,30 @@ def generate_voice_samples():
         flash('Sample generation is disabled.', 'danger')
         return redirect(url_for('index'))
     
-    # Voice-specific introduction messages
-    voice_intros = {
-        "alloy": "Hello, I'm Alloy. I'm a versatile, general-purpose voice that's great for explanations, presentations, and everyday content.",
-        "echo": "Hi there, I'm Echo. My smooth, natural delivery is perfect for narration, storytelling, and educational material.",
-        "fable": "Greetings, I'm Fable. My authoritative tone is ideal for documentaries, podcasts, and more formal content.",
-        "onyx": "Hello, I'm Onyx. My deep, engaging voice works well for announcements, marketing, and professional presentations.",
-        "nova": "Hi, I'm Nova. My warm, pleasant tone is great for friendly content, customer service, and approachable narratives.",
-        "shimmer": "Hello, I'm Shimmer. My clear, articulate delivery is excellent for instructional content, tutorials, and detailed explanations."
-    }
-    
-    samples_dir = os.path.join(app.static_folder, 'audio', 'samples')
+    samples_dir = get_samples_dir()
     os.makedirs(samples_dir, exist_ok=True)
+    manifest = load_voice_sample_manifest(samples_dir)
+    chunk_cache = get_chunk_cache()
     
-    generated_samples = []
+    # Samples are independent requests, so all voices are synthesized at once
+    with ThreadPoolExecutor(max_workers=len(SUPPORTED_VOICES)) as executor:
+        futures = {
+            voice: executor.submit(generate_voice_sample, voice, samples_dir, manifest.get(voice), chunk_cache)
+            for voice in SUPPORTED_VOICES
+        }
     
-    for voice in SUPPORTED_VOICES:
-        output_path = os.path.join(samples_dir, f"{voice}.mp3")
-        # Always regenerate to ensure the latest introduction is used
+    generated_samples = []
+    for voice, future in futures.items():
         try:
-            intro_text = voice_intros.get(voice, f"Hello, I'm the {voice} voice.")
-            response = client.audio.speech.create(
-                model="tts-1-hd",
-                voice=voice,
-                input=intro_text
-            )
-            
-            # Save the audio file
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-                
-            generated_samples.append(f"{voice}.mp3 (generated)")
-            app.logger.info(f"Generated sample for {voice}")
+            status = future.result()
+            manifest[voice] = voice_sample_key(voice)
+            generated_samples.append(f"{voice}.mp3 ({status})")
+            app.logger.info(f"Voice sample for {voice}: {status}")
         except Exception as e:
+            manifest.pop(voice, None)
             app.logger.error(f"Error generating sample for {voice}: {str(e)}")
             generated_samples.append(f"{voice}.mp3 (error: {str(e)})")
+    atomic_write_json(os.path.join(samples_dir, VOICE_SAMPLE_MANIFEST), manifest)
     
     return render_template(
         'result.html', 
@@ -636,25 +2116,49 @@ def generate_voice_samples():
     )
 
 
+@app.route('/voice-samples/<voice>.mp3')
+def voice_sample(voice):
+    """Serve a voice sample with an ETag; versioned URLs are cached for a year"""
+    if voice not in SUPPORTED_VOICES:
+        return jsonify({"error": "Unknown voice"}), 404
+    samples_dir = get_samples_dir()
+    if not os.path.exists(os.path.join(samples_dir, f"{voice}.mp3")):
+        return jsonify({"error": "Sample not found"}), 404
+    
+    etag = get_voice_sample_versions().get(voice)
+    versioned = bool(etag) and request.args.get('v') == etag[:16]
+    response = send_file(os.path.join(samples_dir, f"{voice}.mp3"), mimetype='audio/mpeg',
+                         etag=etag or True, max_age=VOICE_SAMPLE_MAX_AGE if versioned else 0)
+    if versioned:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        # Unversioned URLs are revalidated so a regenerated sample is picked up
+        response.cache_control.no_cache = True
+    return response
+
+
 def extract_text_from_pdf(pdf_file):
     """Extract text from a PDF file"""
-    text = ""
     try:
         # If pdf_file is a tuple (from a test), extract the BytesIO object
         if isinstance(pdf_file, tuple):
             pdf_file = pdf_file[0]
         
-        # Use PyPDF2 to read the PDF
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        num_pages = len(pdf_reader.pages)
+        # The same document is only parsed once across preview, generation and re-submission
+        pdf_hash = hash_pdf_file(pdf_file)
+        if pdf_hash:
+            cached_text = get_pdf_text_cache().get(pdf_hash)
+            if cached_text is not None:
+                app.logger.info(f"PDF text cache hit for {pdf_hash[:12]}")
+                return cached_text
         
-        for page_num in range(num_pages):
-            page = pdf_reader.pages[page_num]
-            page_text = page.extract_text()
-            if page_text:  # Only add if text was extracted
-                text += page_text + "\n\n"
+        # Long documents are split into page ranges across worker processes
+        text = pdf_extract.extract_text(pdf_file)
         
-        return text.strip()
+        if pdf_hash:
+            get_pdf_text_cache().put(pdf_hash, text)
+        return text
     except Exception as e:
         app.logger.error(f"Error extracting text from PDF: {str(e)}")
         raise Exception(f"Failed to extract text from PDF: {str(e)}")
@@ -669,8 +2173,13 @@ def download_text(filename):
         title = "text"
         is_truncated = False
         
-        if 'last_generated_text' in session and session.get('last_generated_filename') == filename:
+        if session.get('last_generated_filename') == filename:
+            original_text = load_full_text(session.get('last_generated_text_id'))
+        
+        if not original_text and 'last_generated_text' in session and session.get('last_generated_filename') == filename:
             original_text = session.get('last_generated_text')
+        
+        if original_text:
             app.logger.info(f"Found text in session for {filename}, length: {len(original_text)} chars")
         
         # If not found in session, try to get from history
@@ -678,15 +2187,19 @@ def download_text(filename):
             history_data = get_history()
             for item in history_data:
                 if item['filename'] == filename:
-                    # Try to use the text from history (may be truncated)
-                    history_text = item['text']
-                    if history_text.endswith('...'):
-                        app.logger.warning(f"Text for {filename} from history is truncated")
+                    # Prefer the full text from the text store
+                    history_text = load_full_text(item.get('text_id'))
+                    if history_text:
+                        app.logger.info(f"Found full text in text store for {filename}, text length: {len(history_text)}")
                         original_text = history_text
+                    # Otherwise use the text from history (may be truncated)
+                    elif item['text'].endswith('...'):
+                        app.logger.warning(f"Text for {filename} from history is truncated")
+                        original_text = item['text']
                         is_truncated = True
                     else:
-                        app.logger.info(f"Found text in history for {filename}, text length: {len(history_text)}")
-                        original_text = history_text
+                        app.logger.info(f"Found text in history for {filename}, text length: {len(item['text'])}")
+                        original_text = item['text']
                     
                     title = item.get('original_filename', 'text').replace(' ', '_')
                     if title.lower().endswith('.pdf'):
@@ -727,6 +2240,7 @@ def inject_constants():
         'MAX_TEXT_LENGTH': MAX_TEXT_LENGTH,
         'MAX_UPLOAD_SIZE_MB': MAX_UPLOAD_SIZE_MB,
         'HISTORY_TEXT_PREVIEW_LENGTH': HISTORY_TEXT_PREVIEW_LENGTH,
+        'voice_sample_url': voice_sample_url,
     }
 
 
@@ -734,4 +2248,4 @@ if __name__ == '__main__':
     # Listen on all interfaces in Docker, but only localhost in development
     host = '0.0.0.0' if os.environ.get('DOCKER_ENV') else '127.0.0.1'
     port = int(os.environ.get('PORT', 5000))
-    app.run(debug=True, host=host, port=port) 
\ No newline at end of file
+    create_app().run(debug=True, host=host, port=port) 
\ No newline at end of file
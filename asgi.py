@@ -0,0 +1,396 @@
+"""ASGI entry point: async API routes in front of the existing Flask UI.
+
+The generation, preview, history and audio routes run as async handlers on a
+shared AsyncOpenAI client, so a long synthesis waits on the network without
+holding a thread. Every other path (the HTML UI, documents, search, ...) is
+served by the Flask app through a WSGI adapter.
+
+The async POST routes accept application/json or raw application/pdf bodies
+only and answer anything else with 415. Cross-site HTML forms cannot send
+either type, and a cross-site script needs a CORS preflight for them, which
+this app never grants, so unlike the Flask routes they take no CSRF token.
+Bodies are capped at MAX_CONTENT_LENGTH, like Flask's.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5001
+"""
+import os
+import json
+import time
+import uuid
+import contextlib
+import tempfile
+import httpx
+from a2wsgi import WSGIMiddleware
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse, RedirectResponse, Response, FileResponse
+from starlette.routing import Route, Mount
+from generator import generate_speech, generate_speech_async, iter_speech_async, plan_chunks
+from storage import parse_range_header
+from janitor import touch_access_time
+from admission import AdmissionRejected
+from transcode import TranscodeError
+from app import (
+    app as flask_app,
+    create_app,
+    MAX_TEXT_LENGTH,
+    get_storage,
+    get_audio_variant,
+    get_chunk_cache,
+    get_chunk_queue,
+    get_peaks_path,
+    get_alignment_path,
+    delete_audio_artifacts,
+    audio_duration,
+    parse_callback_url,
+    send_webhook,
+    get_admission_controller,
+    get_history_for_api,
+    get_document_metadata,
+    resolve_document_text,
+    extract_text_from_base64_pdf,
+    extract_text_from_pdf,
+    record_generation,
+)
+
+# Constants
+MAX_UPSTREAM_CONNECTIONS = int(os.environ.get('ASGI_MAX_CONNECTIONS', 500))  # Concurrent requests to the TTS API
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 10))  # Threads serving the Flask UI
+BODY_SPOOL_SUFFIX = '.pdf'
+JSON_CONTENT_TYPE = 'application/json'
+PDF_CONTENT_TYPE = 'application/pdf'
+
+_async_client = None
+
+
+def get_async_client():
+    """Return the process-wide AsyncOpenAI client (created on first use, inside the event loop)"""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=os.environ.get('OPENAI_API_KEY'),
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(max_connections=MAX_UPSTREAM_CONNECTIONS,
+                                                                    max_keepalive_connections=MAX_UPSTREAM_CONNECTIONS))
+        )
+    return _async_client
+
+
+def error(message, status_code):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def busy(e):
+    return JSONResponse({"error": str(e), "retry_after": e.retry_after}, status_code=429,
+                        headers={'Retry-After': str(e.retry_after)})
+
+
+def too_large():
+    return error(f"Request body exceeds {flask_app.config['MAX_CONTENT_LENGTH']} bytes", 413)
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+def content_type(request):
+    return request.headers.get('content-type', '').split(';')[0].strip().lower()
+
+
+async def iter_body(request):
+    """Yield the request body block by block, raising RequestTooLarge past MAX_CONTENT_LENGTH"""
+    limit = flask_app.config['MAX_CONTENT_LENGTH']
+    declared = request.headers.get('content-length', '')
+    if limit and declared.isdigit() and int(declared) > limit:
+        raise RequestTooLarge()
+    received = 0
+    async for block in request.stream():
+        received += len(block)
+        if limit and received > limit:
+            raise RequestTooLarge()
+        yield block
+
+
+async def read_json(request):
+    """Return the parsed JSON body, or an error response for other content types and oversized or invalid bodies"""
+    if content_type(request) != JSON_CONTENT_TYPE:
+        return error(f"Send a {JSON_CONTENT_TYPE} body", 415)
+    try:
+        body = b''.join([block async for block in iter_body(request)])
+    except RequestTooLarge:
+        return too_large()
+    try:
+        return json.loads(body)
+    except ValueError:
+        return error("Invalid JSON body", 400)
+
+
+async def read_generation_source(request):
+    """Return (text, source_type, original_filename, options) for a generation request, or an error response"""
+    if content_type(request) == PDF_CONTENT_TYPE:
+        # Raw PDF body: spool it to disk without holding it in memory, or blocking the event loop
+        with tempfile.NamedTemporaryFile('w+b', suffix=BODY_SPOOL_SUFFIX) as pdf_file:
+            try:
+                async for block in iter_body(request):
+                    await run_in_threadpool(pdf_file.write, block)
+            except RequestTooLarge:
+                return too_large()
+            await run_in_threadpool(pdf_file.seek, 0)
+            try:
+                text = await run_in_threadpool(extract_text_from_pdf, pdf_file)
+            except Exception as e:
+                return error(f"Error processing PDF: {str(e)}", 400)
+        options = dict(request.query_params)
+        return text, "PDF", options.get('filename', 'API PDF upload'), options
+
+    if content_type(request) != JSON_CONTENT_TYPE:
+        return error(f"Send a {JSON_CONTENT_TYPE} or raw {PDF_CONTENT_TYPE} body", 415)
+    data = await read_json(request)
+    if isinstance(data, Response):
+        return data
+    if not isinstance(data, dict):
+        return error("Either text or PDF data is required", 400)
+
+    if data.get('document_id'):
+        try:
+            text = await run_in_threadpool(resolve_document_text, data['document_id'], data.get('edits'))
+        except LookupError as e:
+            return error(str(e), 404)
+        except ValueError as e:
+            return error(f"Invalid edits: {str(e)}", 400)
+        metadata = await run_in_threadpool(get_document_metadata, data['document_id'])
+        return text, metadata.get('source_type', 'Text'), metadata.get('original_filename', 'API text input'), data
+
+    if 'text' not in data and 'pdf_base64' not in data:
+        return error("Either text or PDF data is required", 400)
+
+    if data.get('pdf_base64'):
+        try:
+            pdf_text = await run_in_threadpool(extract_text_from_base64_pdf, data['pdf_base64'])
+        except Exception as e:
+            return error(f"Error processing PDF: {str(e)}", 400)
+        text = data['text'] + "\n\n" + pdf_text if data.get('text') else pdf_text
+        return text, "PDF", data.get('filename', 'API PDF upload'), data
+
+    return data.get('text', ''), "Text", "API text input", data
+
+
+async def api_generate(request):
+    """Generate speech, store it and add it to history (same contract as the Flask route)"""
+    source = await read_generation_source(request)
+    if isinstance(source, Response):
+        return source
+    text, source_type, original_filename, options = source
+
+    if not text:
+        return error("No text could be extracted from the provided sources", 400)
+    if len(text) > MAX_TEXT_LENGTH:
+        return error(f"Text is too long. Maximum is {MAX_TEXT_LENGTH:,} characters.", 400)
+
+    voice = options.get('voice', 'alloy')
+    model = options.get('model', 'tts-1')
+    try:
+        callback_url = await run_in_threadpool(parse_callback_url, options.get('callback_url'))
+    except ValueError as e:
+        return error(str(e), 400)
+
+    file_id = str(uuid.uuid4())
+    filename = f"{file_id}.mp3"
+    output_path = os.path.join(flask_app.config['UPLOAD_FOLDER'], filename)
+
+    plan = await run_in_threadpool(plan_chunks, text)
+    admission = get_admission_controller('api_generate')
+    start_time = time.monotonic()
+    try:
+        ticket = await admission.acquire_async(len(text), plan.num_chunks)
+    except AdmissionRejected as e:
+        return busy(e)
+    try:
+        chunk_queue = get_chunk_queue()
+        if chunk_queue is not None and plan.num_chunks > 1:
+            # Queue workers synthesize the chunks; this request only waits for them and stitches
+            await run_in_threadpool(generate_speech, text, output_path, model=model, voice=voice, plan=plan,
+                                    chunk_queue=chunk_queue, peaks_path=get_peaks_path(output_path),
+                                    alignment_path=get_alignment_path(output_path))
+        else:
+            await generate_speech_async(text, output_path, voice=voice, model=model, client=get_async_client(),
+                                        plan=plan, chunk_cache=get_chunk_cache(), peaks_path=get_peaks_path(output_path),
+                                        alignment_path=get_alignment_path(output_path))
+        duration = await run_in_threadpool(audio_duration, output_path)
+        _, text_id = await run_in_threadpool(record_generation, text, voice, model, filename, output_path,
+                                             source_type, original_filename)
+    except Exception as e:
+        await run_in_threadpool(delete_audio_artifacts, get_storage(), filename)
+        send_webhook(callback_url, 'generation.failed', {
+            "file_id": file_id,
+            "error": str(e),
+            "text_length": len(text),
+            "processing_time": round(time.monotonic() - start_time, 3),
+        })
+        return error(str(e), 500)
+    finally:
+        await run_in_threadpool(admission.release, ticket)
+
+    url = str(request.url_for('get_audio', filename=filename))
+    send_webhook(callback_url, 'generation.completed', {
+        "file_id": file_id,
+        "filename": filename,
+        "url": url,
+        "duration": duration,
+        "text_length": len(text),
+        "processing_time": round(time.monotonic() - start_time, 3),
+    })
+    return JSONResponse({
+        "success": True,
+        "file_id": file_id,
+        "filename": filename,
+        "text_id": text_id,
+        "text_length": len(text),
+        "source_type": source_type,
+        "original_filename": original_filename,
+        "url": url
+    })
+
+
+async def api_generate_stream(request):
+    """Stream MP3 audio back while later chunks are still being synthesized (nothing is stored)"""
+    source = await read_generation_source(request)
+    if isinstance(source, Response):
+        return source
+    text, _, _, options = source
+
+    if not text:
+        return error("No text could be extracted from the provided sources", 400)
+    if len(text) > MAX_TEXT_LENGTH:
+        return error(f"Text is too long. Maximum is {MAX_TEXT_LENGTH:,} characters.", 400)
+
+    plan = await run_in_threadpool(plan_chunks, text)
+    admission = get_admission_controller('api_generate_stream')
+    try:
+        ticket = await admission.acquire_async(len(text), plan.num_chunks)
+    except AdmissionRejected as e:
+        return busy(e)
+
+    async def audio():
+        # The work counts as in flight until the last chunk is sent or the client goes away
+        try:
+            async for block in iter_speech_async(text, model=options.get('model', 'tts-1'),
+                                                 voice=options.get('voice', 'alloy'), client=get_async_client(), plan=plan):
+                yield block
+        finally:
+            await run_in_threadpool(admission.release, ticket)
+
+    return StreamingResponse(audio(), media_type='audio/mpeg', headers={'X-Chunk-Count': str(plan.num_chunks)})
+
+
+async def api_preview_cost(request):
+    """Return the length, chunk count, duration and cost estimate for a text"""
+    data = await read_json(request)
+    if isinstance(data, Response):
+        return data
+    if not isinstance(data, dict) or 'text' not in data:
+        return error("Text is required", 400)
+
+    model = data.get('model', 'tts-1')
+    plan = await run_in_threadpool(plan_chunks, data.get('text', ''))
+    return JSONResponse({
+        "text_length": plan.text_length,
+        "estimated_cost": plan.cost(model),
+        "num_chunks": plan.num_chunks,
+        "estimated_duration": plan.estimated_duration,
+        "model": model
+    })
+
+
+async def api_history(request):
+    """Return the generation history"""
+    return JSONResponse(await run_in_threadpool(get_history_for_api))
+
+
+async def serve_audio_variant(request, as_attachment):
+    """Serve audio transcoded to ?format=&bitrate=; ffmpeg runs in the threadpool on a cache miss"""
+    filename = request.path_params['filename']
+    try:
+        path, media_type, download_name = await run_in_threadpool(
+            get_audio_variant, filename, request.query_params.get('format'), request.query_params.get('bitrate'))
+    except ValueError as e:
+        return error(str(e), 400)
+    except FileNotFoundError:
+        return error("Audio file not found", 404)
+    except TranscodeError as e:
+        flask_app.logger.error(f"Error transcoding {filename}: {str(e)}")
+        return error("Could not transcode audio", 500)
+    return FileResponse(path, media_type=media_type, filename=download_name,
+                        content_disposition_type='attachment' if as_attachment else 'inline')
+
+
+async def serve_audio(request, as_attachment):
+    if request.query_params.get('format') or request.query_params.get('bitrate'):
+        return await serve_audio_variant(request, as_attachment)
+    filename = request.path_params['filename']
+    storage = get_storage()
+    try:
+        if storage.is_local:
+            file_path = storage.path_for(filename)
+            if not os.path.exists(file_path):
+                return error("Audio file not found", 404)
+            touch_access_time(file_path)  # Recently played files are evicted last
+            return FileResponse(file_path, media_type='audio/mpeg',
+                                filename=filename if as_attachment else None)
+
+        url = await run_in_threadpool(storage.download_url, filename, as_attachment)
+        if url:
+            return RedirectResponse(url, status_code=302)
+        size = await run_in_threadpool(storage.size, filename)
+    except ValueError:
+        return error("Invalid filename", 400)
+    if not size:
+        return error("Audio file not found", 404)
+
+    try:
+        byte_range = parse_range_header(request.headers.get('range'), size)
+    except ValueError:
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+    start, end = byte_range or (0, size - 1)
+
+    headers = {'Accept-Ranges': 'bytes', 'Content-Length': str(end - start + 1)}
+    if byte_range:
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if as_attachment:
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return StreamingResponse(iterate_in_threadpool(storage.iter_range(filename, start, end)),
+                             status_code=206 if byte_range else 200, media_type='audio/mpeg', headers=headers)
+
+
+async def get_audio(request):
+    """Stream an audio file (supports HTTP ranges)"""
+    return await serve_audio(request, as_attachment=False)
+
+
+async def download_audio(request):
+    """Download an audio file"""
+    return await serve_audio(request, as_attachment=True)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(starlette_app):
+    """Configure and warm up the Flask app once per server process, before it takes requests"""
+    await run_in_threadpool(create_app)
+    yield
+
+
+def create_asgi_app():
+    """Build the ASGI application: async routes first, the Flask app for everything else"""
+    return Starlette(lifespan=lifespan, routes=[
+        Route('/api/generate', api_generate, methods=['POST']),
+        Route('/api/generate-stream', api_generate_stream, methods=['POST']),
+        Route('/api/preview-cost', api_preview_cost, methods=['POST']),
+        Route('/api/history', api_history, methods=['GET']),
+        Route('/get-audio/{filename}', get_audio, methods=['GET'], name='get_audio'),
+        Route('/download/{filename}', download_audio, methods=['GET'], name='download_audio'),
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ])
+
+
+application = create_asgi_app()
@@ -0,0 +1,227 @@
+"""Batches of generation requests, tracked in a manifest per batch.
+
+A batch is accepted at once and its items run in the background. Each
+manifest is a JSON file written atomically under a FileLock, so any worker
+on the host can report a batch's progress, and an item that failed can be
+queued again on its own without resubmitting the batch. Queued and running
+items record the pid of the worker that owns them; items whose worker died
+are reported as failed, so they can be retried.
+"""
+import os
+import re
+import json
+import time
+import logging
+import secrets
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from locks import FileLock, atomic_write_json, process_alive
+
+# Constants
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+BATCH_ID_BYTES = 16
+BATCH_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600  # Manifests of batches untouched for this long are removed
+ABANDONED_ITEM_SECONDS = 6 * 3600  # Unfinished items this old are failed even if their pid looks alive (pid reuse)
+ABANDONED_ERROR = "The worker running this item stopped before it finished"
+
+logger = logging.getLogger(__name__)
+
+
+def is_valid_batch_id(batch_id):
+    return bool(batch_id) and bool(BATCH_ID_PATTERN.match(batch_id))
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def summarize(manifest):
+    """Set a manifest's per-status counts and overall status from its items."""
+    counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+    for item in manifest['items']:
+        counts[item['status']] += 1
+    manifest['counts'] = counts
+    if counts[QUEUED] or counts[RUNNING]:
+        manifest['status'] = RUNNING
+        manifest['finished_at'] = None
+    else:
+        manifest['status'] = FAILED if counts[FAILED] else DONE
+        manifest['finished_at'] = manifest.get('finished_at') or _now()
+    return manifest
+
+
+def fail_abandoned(manifest):
+    """Mark queued or running items whose worker is gone (or that are too old) as failed; return how many."""
+    stale_before = time.time() - ABANDONED_ITEM_SECONDS
+    alive = {}
+    failed = 0
+    for item in manifest['items']:
+        if item['status'] not in (QUEUED, RUNNING):
+            continue
+        since = datetime.fromisoformat(item['started_at'] or item['queued_at']).timestamp()
+        pid = item.get('pid')
+        if since >= stale_before and (pid is None or alive.setdefault(pid, process_alive(pid))):
+            continue
+        item.update(status=FAILED, error=ABANDONED_ERROR, finished_at=_now())
+        failed += 1
+    if failed:
+        summarize(manifest)
+    return failed
+
+
+class BatchStore:
+    """Batch manifests, one JSON file per batch in a folder."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, batch_id):
+        if not is_valid_batch_id(batch_id):
+            raise ValueError(f"Invalid batch id: {batch_id!r}")
+        return os.path.join(self.root, f"{batch_id}.json")
+
+    def create(self, inputs, **fields):
+        """Create a manifest with one queued item per input and return it.
+
+        inputs are the JSON-serializable dicts the items run from; fields are
+        stored at the top level of the manifest, such as a callback URL.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        batch_id = secrets.token_urlsafe(BATCH_ID_BYTES)
+        items = []
+        for index, item_input in enumerate(inputs):
+            item = {'index': index, 'status': QUEUED, 'attempts': 0, 'queued_at': _now(), 'started_at': None,
+                    'finished_at': None, 'elapsed_seconds': None, 'error': None, 'pid': os.getpid(),
+                    'input': item_input}
+            items.append(item)
+        manifest = summarize(dict(fields, batch_id=batch_id, created_at=_now(), items=items))
+        with FileLock(self.path_for(batch_id) + '.lock'):
+            atomic_write_json(self.path_for(batch_id), manifest)
+        return manifest
+
+    def load(self, batch_id):
+        """Return a manifest, or None if the batch is unknown.
+
+        Items abandoned by a worker that died are recorded as failed first.
+        """
+        path = self.path_for(batch_id)
+        manifest = self._read(path)
+        if manifest is None or not fail_abandoned(manifest):
+            return manifest
+        with FileLock(path + '.lock'):
+            manifest = self._read(path)
+            if manifest is not None and fail_abandoned(manifest):
+                atomic_write_json(path, manifest)
+        return manifest
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update_item(self, batch_id, index, expect_status=None, **fields):
+        """Update fields of one item under the batch's lock and return the manifest.
+
+        With expect_status, nothing is changed (and None is returned) unless the
+        item is in that status, so concurrent retries cannot queue it twice.
+        None is also returned if the manifest has been removed.
+        """
+        path = self.path_for(batch_id)
+        with FileLock(path + '.lock'):
+            manifest = self._read(path)
+            if manifest is None:
+                return None
+            if expect_status is not None and manifest['items'][index]['status'] != expect_status:
+                return None
+            manifest['items'][index].update(fields)
+            summarize(manifest)
+            atomic_write_json(path, manifest)
+        return manifest
+
+    def prune(self, ttl=DEFAULT_TTL_SECONDS, on_remove=None):
+        """Remove manifests (and their lock files) not updated for ttl seconds; return the bytes reclaimed.
+
+        on_remove(manifest), if given, is called for each manifest removed.
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - ttl
+        reclaimed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime >= cutoff:
+                    continue
+                manifest = None
+                if on_remove is not None and name.endswith('.json'):
+                    with open(path) as f:
+                        manifest = json.load(f)
+                os.remove(path)
+                reclaimed += stat.st_size
+                if manifest is not None:
+                    on_remove(manifest)
+            except (OSError, ValueError):
+                pass
+        return reclaimed
+
+
+class BatchRunner:
+    """Runs batch items on a pool of item workers.
+
+    run_item(input) does the work and returns fields for the manifest, such
+    as the output's file name; an exception marks the item failed with its
+    message. The chunks of running items are meant to go to one executor
+    shared by all of them, so this pool only bounds how many items are
+    planned, stitched and stored at once.
+
+    on_item_finished(manifest, index), if given, is called after each item is
+    recorded as done or failed, with the manifest as that update left it.
+    """
+
+    def __init__(self, store, run_item, item_workers=4, on_item_finished=None):
+        self.store = store
+        self.run_item = run_item
+        self.on_item_finished = on_item_finished
+        self.executor = ThreadPoolExecutor(max_workers=item_workers, thread_name_prefix='batch-item')
+
+    def retry(self, batch_id, index):
+        """Queue a failed item again; returns None if the item has not failed."""
+        manifest = self.store.update_item(batch_id, index, expect_status=FAILED, status=QUEUED, queued_at=_now(),
+                                          pid=os.getpid(), started_at=None, finished_at=None, elapsed_seconds=None, error=None)
+        if manifest is None:
+            return None
+        return self.executor.submit(self._run, batch_id, index)
+
+    def submit_batch(self, manifest):
+        return [self.executor.submit(self._run, manifest['batch_id'], item['index']) for item in manifest['items']]
+
+    def _run(self, batch_id, index):
+        manifest = self.store.load(batch_id)
+        item = manifest['items'][index] if manifest is not None else None
+        if item is None or self.store.update_item(batch_id, index, status=RUNNING, started_at=_now(),
+                                                  pid=os.getpid(), attempts=item['attempts'] + 1) is None:
+            logger.warning(f"Batch {batch_id} was removed before item {index} ran")
+            return False
+        start = time.monotonic()
+        try:
+            result = self.run_item(item['input'])
+        except Exception as e:
+            manifest = self.store.update_item(batch_id, index, status=FAILED, error=str(e), finished_at=_now(),
+                                              elapsed_seconds=round(time.monotonic() - start, 3))
+        else:
+            manifest = self.store.update_item(batch_id, index, status=DONE, finished_at=_now(),
+                                              elapsed_seconds=round(time.monotonic() - start, 3), **result)
+        if manifest is None:
+            logger.warning(f"Batch {batch_id} was removed while item {index} ran")
+            return False
+        if self.on_item_finished is not None:
+            self.on_item_finished(manifest, index)
+        return manifest['items'][index]['status'] == DONE
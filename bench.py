@@ -0,0 +1,514 @@
+"""tts-bench: drive a running web app with simulated users, or replay a recorded trace.
+
+    tts-bench fake-upstream --port 8808
+    OPENAI_BASE_URL=http://127.0.0.1:8808/v1 OPENAI_API_KEY=sk-bench python app.py
+    tts-bench load --url http://127.0.0.1:5000 --users 20 --duration 60 --sizes 500:6,5000:3,50000:1 --pdf-ratio 0.2
+    tts-bench replay output/trace.jsonl --url http://127.0.0.1:5000 --speed 2
+
+load runs closed-loop users: each sends its next request (the index form,
+/api/generate, /preview or /get-audio, picked by --mix) as soon as the last
+one returns. replay is open-loop: requests start at the recorded
+inter-arrival times (divided by --speed), with the recorded endpoints, input
+sizes and PDF share, whatever the server's latency. Traces are recorded by
+the app when REQUEST_TRACE_FILE is set (see traces.py).
+
+The report gives throughput, error rates and latency percentiles per endpoint,
+and the change in the server's /api/metrics counters over the run.
+fake-upstream stands in for the OpenAI speech API, so runs cost nothing and
+upstream latency and errors can be dialed in.
+"""
+import re
+import sys
+import math
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from traces import read_trace
+
+# Constants
+ACTIONS = ('index', 'api_generate', 'preview', 'get_audio')
+DEFAULT_MIX = 'index=1,api_generate=3,preview=2,get_audio=4'
+DEFAULT_SIZES = '300:5,2500:3,20000:1.5,150000:0.5'  # Text length buckets (chars:weight)
+SIZE_JITTER = 0.25  # Lengths vary by up to this fraction around their bucket
+PDF_PAGE_CHARS = 1500
+REQUEST_TIMEOUT = 600
+PERCENTILES = (50, 90, 95, 99)
+WORDS = ('the quick brown fox jumps over a lazy dog while seven wizards quietly judge '
+         'boxing matches from distant towers and every listener hears the story unfold').split()
+CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+FRAME_HEADER = b'\xff\xfb\x90\x64'  # MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames of 1152 samples
+FRAME = FRAME_HEADER + b'\x00' * 413
+FRAMES_PER_SECOND = 44100 / 1152
+SPOKEN_CHARS_PER_SECOND = 15
+
+
+def parse_weights(spec, convert=str):
+    """Parse 'key=weight,...' (or 'key:weight,...') into {key: weight}."""
+    weights = {}
+    for part in spec.split(','):
+        key, _, weight = part.strip().replace(':', '=').partition('=')
+        weights[convert(key)] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError(f"No positive weights in {spec!r}")
+    return weights
+
+
+def pick(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def make_text(length, rng):
+    """Return sentence-like text of exactly length characters."""
+    parts = []
+    size = 0
+    while size < length:
+        sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + '. '
+        parts.append(sentence)
+        size += len(sentence)
+    text = ''.join(parts)[:length]
+    return text[:-1] + '.' if text.endswith(' ') else text
+
+
+def make_pdf(text):
+    """Return the bytes of a minimal PDF holding text, one line of PDF_PAGE_CHARS per page."""
+    pages = [text[i:i + PDF_PAGE_CHARS] for i in range(0, len(text), PDF_PAGE_CHARS)] or ['']
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for page in pages:
+        escaped = page.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        stream = f"BT /F1 10 Tf 36 760 Td ({escaped}) Tj ET".encode('latin-1', 'replace')
+        kids.append(len(objects) + 1)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects) + 2} 0 R >>".encode())
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode()
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class Results:
+    """Latency and outcome of every request, collected from all user threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # action -> [(latency, ok, status)]
+        self.filenames = []  # Audio generated during the run, fetched by get_audio
+
+    def add(self, action, latency, ok, status):
+        with self._lock:
+            self.samples.setdefault(action, []).append((latency, ok, status))
+
+    def add_filename(self, filename):
+        with self._lock:
+            self.filenames.append(filename)
+
+    def recent_filename(self, rng):
+        with self._lock:
+            return rng.choice(self.filenames[-50:]) if self.filenames else None
+
+    def summary(self, elapsed):
+        """Return {action: stats} plus an 'all' row; latencies are in seconds."""
+        rows = {}
+        everything = []
+        for action, samples in sorted(self.samples.items()):
+            rows[action] = self._stats(samples, elapsed)
+            everything.extend(samples)
+        rows['all'] = self._stats(everything, elapsed)
+        return rows
+
+    @staticmethod
+    def _stats(samples, elapsed):
+        latencies = sorted(latency for latency, _, _ in samples)
+        errors = sum(1 for _, ok, _ in samples if not ok)
+        statuses = {}
+        for _, _, status in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        row = {'requests': len(samples), 'errors': errors,
+               'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+               'throughput': round(len(samples) / elapsed, 3) if elapsed > 0 else 0.0,
+               'statuses': statuses, 'max': latencies[-1] if latencies else None}
+        for p in PERCENTILES:
+            row[f'p{p}'] = percentile(latencies, p)
+        return row
+
+
+class User:
+    """One simulated user: a cookie-keeping HTTP session against the app."""
+
+    def __init__(self, base_url, results, rng, voice='alloy', model='tts-1'):
+        self.http = httpx.Client(base_url=base_url, timeout=REQUEST_TIMEOUT)
+        self.results = results
+        self.rng = rng
+        self.voice = voice
+        self.model = model
+        self.csrf_token = None
+
+    def close(self):
+        self.http.close()
+
+    def run(self, action, text_length=None, pdf=False, byte_range=False):
+        """Send one request of an action, record its outcome and return whether it succeeded."""
+        start = time.perf_counter()
+        try:
+            ok, status = getattr(self, action)(text_length, pdf, byte_range)
+        except httpx.HTTPError as e:
+            ok, status = False, e.__class__.__name__
+        self.results.add(action, time.perf_counter() - start, ok, status)
+        return ok
+
+    def _csrf(self):
+        """Return headers with the session's CSRF token, which the app requires on every POST."""
+        if self.csrf_token is None:
+            match = CSRF_PATTERN.search(self.http.get('/').text)
+            self.csrf_token = match.group(1) if match else ''
+        return {'X-CSRFToken': self.csrf_token} if self.csrf_token else {}
+
+    def _input(self, text_length, pdf):
+        text = make_text(text_length or 300, self.rng)
+        return text, make_pdf(text) if pdf else None
+
+    def index(self, text_length, pdf, byte_range):
+        if text_length is None:  # A page load
+            response = self.http.get('/')
+            return response.status_code == 200, response.status_code
+        headers = self._csrf()
+        text, pdf_bytes = self._input(text_length, pdf)
+        data = {'voice': self.voice, 'model': self.model, 'text': '' if pdf_bytes else text}
+        files = {'pdf_file': ('bench.pdf', pdf_bytes, 'application/pdf')} if pdf_bytes else None
+        response = self.http.post('/', data=data, files=files, headers=headers)
+        location = response.headers.get('Location', '')
+        if response.status_code == 302 and '/result' in location:
+            filename = httpx.URL(location).params.get('filename')
+            if filename:
+                self.results.add_filename(filename)
+            return True, response.status_code
+        return False, response.status_code
+
+    def api_generate(self, text_length, pdf, byte_range):
+        headers = self._csrf()
+        text, pdf_bytes = self._input(text_length, pdf)
+        if pdf_bytes:
+            response = self.http.post('/api/generate', content=pdf_bytes, params={'voice': self.voice, 'model': self.model,
+                                                                                  'filename': 'bench.pdf'},
+                                      headers=dict(headers, **{'Content-Type': 'application/pdf'}))
+        else:
+            response = self.http.post('/api/generate', json={'text': text, 'voice': self.voice, 'model': self.model},
+                                      headers=headers)
+        if response.status_code == 200:
+            self.results.add_filename(response.json()['filename'])
+            return True, 200
+        return False, response.status_code
+
+    def preview(self, text_length, pdf, byte_range):
+        headers = self._csrf()
+        text, pdf_bytes = self._input(text_length, pdf)
+        if pdf_bytes:
+            response = self.http.post('/preview', data={'model': self.model}, headers=headers,
+                                      files={'pdf_file': ('bench.pdf', pdf_bytes, 'application/pdf')})
+        else:
+            response = self.http.post('/preview', data={'text': text, 'model': self.model}, headers=headers)
+        ok = response.status_code == 200 and 'error' not in response.json()
+        return ok, response.status_code
+
+    def get_audio(self, text_length, pdf, byte_range):
+        filename = self.results.recent_filename(self.rng)
+        if filename is None:
+            return False, 'no-audio'
+        headers = {'Range': 'bytes=0-65535'} if byte_range else {}
+        with self.http.stream('GET', f'/get-audio/{filename}', headers=headers) as response:
+            for _ in response.iter_bytes():
+                pass
+        return response.status_code in (200, 206), response.status_code
+
+
+def fetch_metrics(base_url):
+    """Return the server's /api/metrics snapshot, or None if it cannot be read."""
+    try:
+        return httpx.get(f"{base_url.rstrip('/')}/api/metrics", timeout=10).json()
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+def metrics_delta(before, after):
+    """Return counter increases over a run and the gauges at its end."""
+    if not before or not after:
+        return None
+    counters = {name: value - before['counters'].get(name, 0) for name, value in after['counters'].items()
+                if value != before['counters'].get(name, 0)}
+    return {'counters': counters, 'gauges': after['gauges']}
+
+
+def seed_audio(base_url, results, rng):
+    """Generate one short output, so get_audio has something to fetch from the start."""
+    user = User(base_url, results, rng)
+    try:
+        ok = user.api_generate(200, False, False)[0]
+    except httpx.HTTPError:
+        ok = False
+    finally:
+        user.close()
+    if not ok:
+        print("warning: could not generate seed audio; get_audio requests will fail", file=sys.stderr)
+
+
+def run_load(base_url, users=10, duration=None, requests=None, mix=DEFAULT_MIX, sizes=DEFAULT_SIZES,
+             pdf_ratio=0.0, seed=None, voice='alloy', model='tts-1'):
+    """Run closed-loop users until duration seconds or requests in total; return the report."""
+    if duration is None and requests is None:
+        raise ValueError("Give a duration or a number of requests")
+    mix = parse_weights(mix) if isinstance(mix, str) else mix
+    sizes = parse_weights(sizes, int) if isinstance(sizes, str) else sizes
+    unknown = set(mix) - set(ACTIONS)
+    if unknown:
+        raise ValueError(f"Unknown actions: {', '.join(sorted(unknown))}")
+    results = Results()
+    master = random.Random(seed)
+    if 'get_audio' in mix:
+        seed_audio(base_url, results, random.Random(master.random()))
+
+    budget = {'left': requests}
+    budget_lock = threading.Lock()
+    deadline = time.monotonic() + duration if duration is not None else None
+
+    def take():
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        with budget_lock:
+            if budget['left'] is None:
+                return True
+            if budget['left'] <= 0:
+                return False
+            budget['left'] -= 1
+            return True
+
+    def simulate(rng):
+        user = User(base_url, results, rng, voice, model)
+        try:
+            while take():
+                size = pick(rng, sizes)
+                text_length = max(int(size * rng.uniform(1 - SIZE_JITTER, 1 + SIZE_JITTER)), 1)
+                user.run(pick(rng, mix), text_length, rng.random() < pdf_ratio, rng.random() < 0.5)
+        finally:
+            user.close()
+
+    before = fetch_metrics(base_url)
+    start = time.monotonic()
+    threads = [threading.Thread(target=simulate, args=(random.Random(master.random()),), daemon=True)
+               for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    return build_report('load', elapsed, results, before, fetch_metrics(base_url))
+
+
+def run_replay(base_url, trace_path, speed=1.0, max_in_flight=256, seed=None, voice='alloy', model='tts-1'):
+    """Replay a recorded trace open-loop at speed times its original pace; return the report."""
+    records = [record for record in read_trace(trace_path) if record['endpoint'] in ACTIONS]
+    if not records:
+        raise ValueError(f"No replayable requests in {trace_path}")
+    results = Results()
+    master = random.Random(seed)
+    if any(record['endpoint'] == 'get_audio' for record in records):
+        seed_audio(base_url, results, random.Random(master.random()))
+
+    local = threading.local()
+    users = []
+    users_lock = threading.Lock()
+
+    def send(record, rng):
+        if not hasattr(local, 'user'):
+            local.user = User(base_url, results, rng, voice, model)
+            with users_lock:
+                users.append(local.user)
+        text_length = record.get('text_length')
+        if record['endpoint'] == 'index' and record.get('method') == 'GET':
+            text_length = None
+        elif record['endpoint'] != 'get_audio' and not text_length:
+            return  # A request the server rejected before reading any text
+        local.user.run(record['endpoint'], text_length, bool(record.get('pdf')), bool(record.get('range')))
+
+    before = fetch_metrics(base_url)
+    first = records[0]['t']
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='replay') as executor:
+        for record in records:
+            delay = start + (record['t'] - first) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, record, random.Random(master.random()))
+    elapsed = time.monotonic() - start
+    for user in users:
+        user.close()
+    return build_report('replay', elapsed, results, before, fetch_metrics(base_url))
+
+
+def build_report(mode, elapsed, results, before, after):
+    return {'mode': mode, 'elapsed': round(elapsed, 3), 'endpoints': results.summary(elapsed),
+            'server_metrics': metrics_delta(before, after)}
+
+
+def print_report(report, out=sys.stdout):
+    def ms(seconds):
+        return '-' if seconds is None else f"{seconds * 1000:.0f}"
+
+    print(f"{report['mode']}: {report['elapsed']:.1f}s", file=out)
+    header = f"{'endpoint':<14}{'requests':>9}{'errors':>8}{'err %':>7}{'req/s':>8}"
+    header += ''.join(f"{f'p{p} ms':>10}" for p in PERCENTILES) + f"{'max ms':>10}"
+    print(header, file=out)
+    for name, row in report['endpoints'].items():
+        line = f"{name:<14}{row['requests']:>9}{row['errors']:>8}{row['error_rate'] * 100:>7.1f}{row['throughput']:>8.2f}"
+        line += ''.join(f"{ms(row[f'p{p}']):>10}" for p in PERCENTILES) + f"{ms(row['max']):>10}"
+        print(line, file=out)
+    server = report['server_metrics']
+    if server is None:
+        print("server metrics: unavailable", file=out)
+        return
+    print("server counters (change over the run):", file=out)
+    for name, value in sorted(server['counters'].items()):
+        print(f"  {name:<40}{value:>12}", file=out)
+    print("server gauges:", file=out)
+    for name, value in sorted(server['gauges'].items()):
+        print(f"  {name:<40}{value:>12}", file=out)
+
+
+class FakeUpstream:
+    """An OpenAI-compatible speech endpoint returning silent MP3 sized like real speech.
+
+    Each request takes latency seconds plus one second per chars_per_second
+    characters, and fails with a 500 at error_rate.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.2, chars_per_second=2000.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                upstream.requests += 1
+                if not self.path.rstrip('/').endswith('/audio/speech'):
+                    return self._reply(404, b'{"error": {"message": "Not found"}}', 'application/json')
+                text = body.get('input') or ''
+                time.sleep(upstream.latency + len(text) / upstream.chars_per_second)
+                if upstream.rng.random() < upstream.error_rate:
+                    return self._reply(500, b'{"error": {"message": "Injected upstream error"}}', 'application/json')
+                frames = max(int(len(text) / SPOKEN_CHARS_PER_SECOND * FRAMES_PER_SECOND), 1)
+                self._reply(200, FRAME * frames, 'audio/mpeg')
+
+            def _reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='tts-bench', description='Load-test the text-to-speech web app')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('load', help='run concurrent simulated users')
+    load.add_argument('--url', default='http://127.0.0.1:5000', help='base URL of the running app')
+    load.add_argument('--users', type=int, default=10, help='concurrent simulated users')
+    load.add_argument('--duration', type=float, help='seconds to run')
+    load.add_argument('--requests', type=int, help='total requests to send (instead of --duration)')
+    load.add_argument('--mix', default=DEFAULT_MIX, help=f'endpoint weights (default {DEFAULT_MIX})')
+    load.add_argument('--sizes', default=DEFAULT_SIZES, help=f'text length buckets, chars:weight (default {DEFAULT_SIZES})')
+    load.add_argument('--pdf-ratio', type=float, default=0.0, help='share of inputs sent as PDFs')
+
+    replay = commands.add_parser('replay', help='replay a trace recorded with REQUEST_TRACE_FILE')
+    replay.add_argument('trace', help='trace file (JSON lines)')
+    replay.add_argument('--url', default='http://127.0.0.1:5000', help='base URL of the running app')
+    replay.add_argument('--speed', type=float, default=1.0, help='replay this many times faster than recorded')
+    replay.add_argument('--max-in-flight', type=int, default=256, help='concurrent requests at most')
+
+    for command in (load, replay):
+        command.add_argument('--voice', default='alloy')
+        command.add_argument('--model', default='tts-1')
+        command.add_argument('--seed', type=int, help='random seed, for repeatable runs')
+        command.add_argument('--json', action='store_true', help='print the report as JSON')
+
+    upstream = commands.add_parser('fake-upstream', help='serve a fake OpenAI speech API')
+    upstream.add_argument('--host', default='127.0.0.1')
+    upstream.add_argument('--port', type=int, default=8808)
+    upstream.add_argument('--latency', type=float, default=0.2, help='seconds added to every request')
+    upstream.add_argument('--chars-per-second', type=float, default=2000.0, help='synthesis speed')
+    upstream.add_argument('--error-rate', type=float, default=0.0, help='share of requests failing with 500')
+    args = parser.parse_args(argv)
+
+    if args.command == 'fake-upstream':
+        server = FakeUpstream(args.host, args.port, args.latency, args.chars_per_second, args.error_rate)
+        print(f"Fake upstream listening; start the app with OPENAI_BASE_URL={server.base_url}")
+        try:
+            server.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    try:
+        if args.command == 'load':
+            report = run_load(args.url, args.users, args.duration, args.requests, args.mix, args.sizes,
+                              args.pdf_ratio, args.seed, args.voice, args.model)
+        else:
+            report = run_replay(args.url, args.trace, args.speed, args.max_in_flight, args.seed, args.voice,
+                                args.model)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0 if report['endpoints']['all']['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
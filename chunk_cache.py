@@ -0,0 +1,116 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+from metrics import metrics as default_metrics
+
+# Constants
+CACHE_FILE_SUFFIX = '.mp3'
+STALE_TEMP_SECONDS = 3600  # Unfinished writes older than this are removed by prune()
+
+
+class ChunkAudioCache:
+    """On-disk cache of synthesized chunk audio, shared by all worker processes.
+
+    Entries are keyed by the SHA-256 of (model, voice, chunk text) and laid out
+    as root/<key[:2]>/<key>.mp3. Writes go to a temporary file and are renamed
+    into place, so concurrent workers never see a partial entry; when two
+    workers synthesize the same chunk the last rename wins with identical audio.
+    """
+
+    def __init__(self, root, metrics=None):
+        self.root = root
+        self.metrics = metrics or default_metrics
+
+    @staticmethod
+    def key_for(model, voice, chunk_text):
+        """Return the cache key of a chunk."""
+        digest = hashlib.sha256()
+        for part in (model, voice, chunk_text):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key + CACHE_FILE_SUFFIX)
+
+    def get_to(self, key, output_path):
+        """Copy a cached chunk to output_path; return False on a miss."""
+        path = self.path_for(key)
+        try:
+            shutil.copyfile(path, output_path)
+        except FileNotFoundError:
+            self.metrics.increment('chunk_cache_misses_total')
+            return False
+        try:
+            # Record the hit for LRU pruning (many filesystems do not update atime)
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except OSError:
+            pass
+        self.metrics.increment('chunk_cache_hits_total')
+        return True
+
+    def put_from(self, key, source_path):
+        """Store a copy of freshly synthesized chunk audio."""
+        path = self.path_for(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(temp_fd)
+        try:
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def prune(self, max_bytes):
+        """Remove least recently used entries until the cache fits in max_bytes; return bytes reclaimed."""
+        reclaimed, total_bytes = prune_lru(self.root, max_bytes, (CACHE_FILE_SUFFIX,))
+        self.metrics.set_gauge('chunk_cache_bytes', total_bytes)
+        self.metrics.increment('chunk_cache_reclaimed_bytes_total', reclaimed)
+        return reclaimed
+
+
+def prune_lru(root, max_bytes, entry_suffixes, keep_suffixes=()):
+    """Remove least recently used files under root until they fit in max_bytes.
+
+    Files not ending in one of entry_suffixes are temporary files of writes in
+    progress; they are only removed once stale. Files ending in one of
+    keep_suffixes are never touched. Returns (bytes reclaimed, bytes kept).
+    """
+    entries = []
+    reclaimed = 0
+    stale_before = time.time() - STALE_TEMP_SECONDS
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if keep_suffixes and filename.endswith(keep_suffixes):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+                if not filename.endswith(entry_suffixes):
+                    # Temporary files of writes that never finished
+                    if stat.st_mtime < stale_before:
+                        os.remove(path)
+                        reclaimed += stat.st_size
+                    continue
+            except OSError:
+                continue
+            entries.append((path, stat))
+
+    total_bytes = sum(stat.st_size for _, stat in entries)
+    for path, stat in sorted(entries, key=lambda entry: entry[1].st_atime):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total_bytes -= stat.st_size
+        reclaimed += stat.st_size
+    return reclaimed, total_bytes
@@ -0,0 +1,271 @@
+"""Distributed chunk synthesis over a Redis work queue.
+
+A coordinating request splits a document as usual and publishes one task per
+chunk. Worker processes on any node claim tasks, synthesize them, put the
+audio in shared storage (the configured audio storage backend) and report
+back; the coordinator downloads the chunks in order and the caller stitches
+them.
+
+Delivery is at-least-once. A claimed task stays in a processing list with a
+deadline; if its worker crashes or stalls past the visibility timeout, the
+task is moved back to the pending list and delivered again. Chunk audio is
+stored under a name derived from the job and chunk index, so a task that
+runs twice simply overwrites identical audio.
+
+Run workers with:
+    python chunk_queue.py --threads 4
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+from generator import generate_chunk_cached, chunk_temp_dir
+from metrics import metrics as default_metrics
+
+# Constants
+DEFAULT_PREFIX = 'tts'
+VISIBILITY_TIMEOUT_SECONDS = 300  # A claimed chunk not finished by then is delivered again
+MAX_ATTEMPTS = 3  # Failed syntheses are retried this many times in total before the job fails
+JOB_TIMEOUT_SECONDS = 3600
+RESULT_TTL_SECONDS = 24 * 3600  # Results of abandoned jobs expire
+POLL_SECONDS = 1
+CHUNK_OBJECT_PREFIX = 'temp_chunk-'  # The janitor treats temp_* audio as scratch files
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkJobError(Exception):
+    """Raised by the coordinator when a chunk could not be synthesized."""
+
+
+class StorageChunkStore:
+    """Keeps chunk audio in a storage backend (LocalStorage on a shared volume, or S3)."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def name_for(job_id, index):
+        return f"{CHUNK_OBJECT_PREFIX}{job_id}-{index}.mp3"
+
+    def put(self, name, local_path):
+        """Upload a chunk; the local file is consumed."""
+        self.storage.put_file(name, local_path)
+
+    def get_to(self, name, output_path):
+        with open(output_path, 'wb') as f:
+            for block in self.storage.iter_range(name):
+                f.write(block)
+
+    def delete(self, name):
+        self.storage.delete(name)
+
+
+class ChunkQueue:
+    """Chunk tasks and results kept in Redis (any client speaking the Redis protocol).
+
+    Keys: <prefix>:pending and <prefix>:processing are lists of task JSON,
+    <prefix>:deadlines is a sorted set of claimed tasks by visibility deadline
+    and <prefix>:job:<id>:results is a list of per-chunk results.
+    """
+
+    def __init__(self, redis_client, store, prefix=DEFAULT_PREFIX, visibility_timeout=VISIBILITY_TIMEOUT_SECONDS,
+                 max_attempts=MAX_ATTEMPTS, metrics=None):
+        self.redis = redis_client
+        self.store = store
+        self.prefix = prefix
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.metrics = metrics or default_metrics
+
+    @classmethod
+    def from_url(cls, url, store, **kwargs):
+        try:
+            import redis  # Optional dependency, imported here so app startup does not pay for it
+        except ImportError:
+            raise RuntimeError("The redis package is required for distributed generation")
+        return cls(redis.Redis.from_url(url), store, **kwargs)
+
+    def _key(self, *parts):
+        return ':'.join((self.prefix,) + parts)
+
+    # Worker side
+
+    def claim(self, timeout=POLL_SECONDS):
+        """Take the next task, or return None if none arrived within timeout seconds."""
+        raw = self.redis.blmove(self._key('pending'), self._key('processing'), timeout, 'RIGHT', 'LEFT')
+        if raw is None:
+            return None
+        self.redis.zadd(self._key('deadlines'), {raw: time.time() + self.visibility_timeout})
+        return raw
+
+    def _ack(self, raw):
+        """Drop a claimed task; returns False if it was already re-delivered to someone else."""
+        removed = self.redis.lrem(self._key('processing'), 1, raw)
+        self.redis.zrem(self._key('deadlines'), raw)
+        return bool(removed)
+
+    def _report(self, job_id, result):
+        results_key = self._key('job', job_id, 'results')
+        self.redis.rpush(results_key, json.dumps(result))
+        self.redis.expire(results_key, RESULT_TTL_SECONDS)
+
+    def process(self, raw, client, chunk_cache=None):
+        """Synthesize one claimed task, upload its audio and report the result."""
+        task = json.loads(raw)
+        job_id, index = task['job'], task['index']
+        if self.redis.exists(self._key('job', job_id, 'cancelled')):
+            self._ack(raw)
+            return
+
+        try:
+            with chunk_temp_dir() as temp_dir:
+                temp_path = os.path.join(temp_dir, 'chunk.mp3')
+                if not generate_chunk_cached(client, task['text'], temp_path, task['model'], task['voice'], chunk_cache):
+                    raise ChunkJobError(f"No audio was returned for chunk {index + 1}")
+                name = StorageChunkStore.name_for(job_id, index)
+                self.store.put(name, temp_path)
+        except Exception as e:
+            logger.error(f"Chunk {index + 1} of job {job_id} failed: {str(e)}")
+            if self._ack(raw):
+                if task['attempt'] + 1 < self.max_attempts:
+                    task['attempt'] += 1
+                    self.redis.rpush(self._key('pending'), json.dumps(task))
+                    self.metrics.increment('chunk_queue_retries_total')
+                else:
+                    self._report(job_id, {'index': index, 'error': str(e)})
+            return
+
+        self._ack(raw)
+        self._report(job_id, {'index': index, 'name': name})
+        self.metrics.increment('chunk_queue_processed_total')
+
+    def work(self, client, chunk_cache=None, stop_event=None):
+        """Claim and process tasks until stop_event is set."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                self.requeue_expired()
+                raw = self.claim()
+                if raw is not None:
+                    self.process(raw, client, chunk_cache)
+            except Exception as e:
+                logger.error(f"Chunk worker error: {str(e)}")
+                stop_event.wait(POLL_SECONDS)
+
+    # Shared
+
+    def requeue_expired(self, now=None):
+        """Deliver again every claimed task whose visibility deadline has passed; return how many."""
+        now = now if now is not None else time.time()
+        requeued = 0
+        for raw in self.redis.lrange(self._key('processing'), 0, -1):
+            deadline = self.redis.zscore(self._key('deadlines'), raw)
+            if deadline is None:
+                # Claimed by a worker that died before recording a deadline
+                self.redis.zadd(self._key('deadlines'), {raw: now + self.visibility_timeout}, nx=True)
+                continue
+            if deadline > now:
+                continue
+            # Only the caller whose LREM succeeds puts the task back
+            if self.redis.lrem(self._key('processing'), 1, raw):
+                self.redis.zrem(self._key('deadlines'), raw)
+                self.redis.rpush(self._key('pending'), raw)
+                requeued += 1
+        if requeued:
+            self.metrics.increment('chunk_queue_redelivered_total', requeued)
+            logger.info(f"Re-delivered {requeued} chunk tasks past their visibility timeout")
+        return requeued
+
+    # Coordinator side
+
+    def run_job(self, chunks, model, voice, timeout=JOB_TIMEOUT_SECONDS, directory=None):
+        """Publish chunks, wait for every result and return local chunk files in order.
+
+        The files are created in directory (the system temp directory by default);
+        the caller owns (and must remove) them.
+        """
+        job_id = uuid.uuid4().hex
+        tasks = [json.dumps({'job': job_id, 'index': index, 'text': chunk, 'model': model, 'voice': voice,
+                             'attempt': 0})
+                 for index, chunk in enumerate(chunks)]
+        self.redis.lpush(self._key('pending'), *tasks)
+        self.metrics.increment('chunk_queue_published_total', len(tasks))
+
+        results_key = self._key('job', job_id, 'results')
+        names = {}
+        deadline = time.time() + timeout
+        try:
+            while len(names) < len(chunks):
+                if time.time() > deadline:
+                    raise ChunkJobError(f"Timed out with {len(names)}/{len(chunks)} chunks synthesized")
+                # The coordinator also re-delivers, so crashed workers are noticed without a separate reaper
+                self.requeue_expired()
+                item = self.redis.blpop(results_key, POLL_SECONDS)
+                if item is None:
+                    continue
+                result = json.loads(item[1])
+                if 'error' in result:
+                    raise ChunkJobError(f"Chunk {result['index'] + 1} failed: {result['error']}")
+                names[result['index']] = result['name']
+
+            chunk_files = []
+            try:
+                for index in range(len(chunks)):
+                    temp_fd, temp_path = tempfile.mkstemp(suffix='.mp3', dir=directory)
+                    os.close(temp_fd)
+                    chunk_files.append(temp_path)
+                    self.store.get_to(names[index], temp_path)
+            except Exception:
+                for path in chunk_files:
+                    os.remove(path)
+                raise
+            return chunk_files
+        except Exception:
+            # Workers skip the remaining tasks of a failed job
+            self.redis.set(self._key('job', job_id, 'cancelled'), 1, ex=RESULT_TTL_SECONDS)
+            raise
+        finally:
+            self.redis.delete(results_key)
+            for index in range(len(chunks)):
+                try:
+                    self.store.delete(StorageChunkStore.name_for(job_id, index))
+                except Exception:
+                    pass
+
+
+def main():
+    import argparse
+    from app import create_app, get_chunk_queue, get_chunk_cache, client
+
+    parser = argparse.ArgumentParser(description='Run chunk synthesis workers for distributed generation')
+    parser.add_argument('--threads', type=int, default=4, help='chunks synthesized concurrently by this process')
+    args = parser.parse_args()
+
+    app = create_app({'WARM_UP': False})  # Workers render no pages and read no history
+    with app.app_context():
+        queue = get_chunk_queue()
+        chunk_cache = get_chunk_cache()
+    if queue is None:
+        parser.error("CHUNK_QUEUE_URL is not set")
+
+    stop_event = threading.Event()
+    threads = [threading.Thread(target=queue.work, args=(client, chunk_cache, stop_event), daemon=True)
+               for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    print(f"Chunk worker {os.getpid()} running {args.threads} threads; press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+/**
+ * Tests for upload-once document previews
+ */
+
+// Import the functions to test
+const mainJS = require('../static/js/main.js');
+
+describe('Document Preview', () => {
+  let mockElements;
+
+  beforeEach(() => {
+    jest.clearAllMocks();
+    mainJS.uploadedDocuments.text = null;
+    mainJS.uploadedDocuments.pdf = null;
+
+    mockElements = {
+      'text-input': { value: '', addEventListener: jest.fn() },
+      'model-select': { value: 'tts-1', addEventListener: jest.fn() },
+      'pdf-file': { files: [], addEventListener: jest.fn() },
+      'pdf-document-id': { value: '' },
+      'preview-length': { textContent: '0' },
+      'preview-chunks': { textContent: '0' },
+      'preview-cost': { textContent: '0.0000' }
+    };
+
+    document.getElementById = jest.fn((id) => mockElements[id] || null);
+    document.querySelector = jest.fn((selector) => {
+      if (selector === 'input[name="csrf_token"]') {
+        return { value: 'mock-csrf-token' };
+      }
+      return null;
+    });
+
+    global.fetch = jest.fn((url) => Promise.resolve({
+      status: 200,
+      json: () => Promise.resolve(url === '/api/documents'
+        ? { document_id: 'doc-1', text_length: 25000, num_chunks: 7, cost: 0.375 }
+        : { text_length: 25001, num_chunks: 7, cost: 0.375015 })
+    }));
+  });
+
+  describe('computeTextEdit', () => {
+    test('should describe an insertion', () => {
+      expect(mainJS.computeTextEdit('hello world', 'hello brave world'))
+        .toEqual({ offset: 6, delete: 0, insert: 'brave ' });
+    });
+
+    test('should describe a deletion at the end', () => {
+      expect(mainJS.computeTextEdit('aaa', 'aa')).toEqual({ offset: 2, delete: 1, insert: '' });
+    });
+
+    test('should describe a replacement', () => {
+      expect(mainJS.computeTextEdit('the cat sat', 'the dog sat'))
+        .toEqual({ offset: 4, delete: 3, insert: 'dog' });
+    });
+  });
+
+  test('short text is sent in full to /preview', async () => {
+    mockElements['text-input'].value = 'Short text';
+
+    await mainJS.updateCostPreview();
+
+    expect(global.fetch).toHaveBeenCalledTimes(1);
+    expect(global.fetch.mock.calls[0][0]).toBe('/preview');
+  });
+
+  test('long text is uploaded once and then previewed through edits', async () => {
+    const longText = 'a'.repeat(25000);
+    mockElements['text-input'].value = longText;
+
+    await mainJS.updateCostPreview();
+    expect(global.fetch.mock.calls[0][0]).toBe('/api/documents');
+    expect(mockElements['preview-chunks'].textContent).toBe(7);
+
+    mockElements['text-input'].value = longText + 'b';
+    await mainJS.updateCostPreview();
+
+    expect(global.fetch).toHaveBeenCalledTimes(2);
+    expect(global.fetch.mock.calls[1][0]).toBe('/preview');
+    const body = global.fetch.mock.calls[1][1].body;
+    expect(body.get('document_id')).toBe('doc-1');
+    expect(JSON.parse(body.get('edits'))).toEqual([{ offset: 25000, delete: 0, insert: 'b' }]);
+    expect(body.get('text')).toBeNull();
+  });
+
+  test('PDF is uploaded once and model changes only send its id', async () => {
+    const pdf = { name: 'doc.pdf', size: 1024 };
+    mockElements['pdf-file'].files = [pdf];
+    global.FormData = jest.fn().mockImplementation(() => ({ append: jest.fn() }));
+
+    await mainJS.updateCostPreview();
+    expect(global.fetch.mock.calls[0][0]).toBe('/api/documents');
+    expect(mockElements['pdf-document-id'].value).toBe('doc-1');
+
+    mockElements['model-select'].value = 'tts-1-hd';
+    await mainJS.updateCostPreview();
+
+    expect(global.fetch).toHaveBeenCalledTimes(2);
+    expect(global.fetch.mock.calls[1][0]).toBe('/preview');
+    expect(global.fetch.mock.calls[1][1].body.get('document_id')).toBe('doc-1');
+  });
+});
@@ -1,15 +1,25 @@
 from pathlib import Path
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import os
 import sys
 import argparse
 import tempfile
+import shutil
 import math
+import asyncio
+import hashlib
+import threading
+import contextlib
+import concurrent.futures
+from collections import OrderedDict
 from unittest.mock import MagicMock, patch
 from dotenv import load_dotenv
 from pydub import AudioSegment
 from colorama import init, Fore, Style
+import waveform
+import alignment
 import time
+from locks import FileLock, TEMP_DIR_LOCK_NAME, CHUNK_TEMP_PREFIX
 
 # Initialize colorama for cross-platform colored terminal output
 init()
@@ -24,6 +34,9 @@ COST_PER_1K_CHARS = {
     "tts-1-hd": 0.030    # $0.030 per 1K characters for high-definition model
 }
 SUPPORTED_VOICES = ["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
+CHARS_PER_SECOND = 15  # Approximate speaking rate (~150 words per minute) for duration estimates
+CHUNK_PLAN_CACHE_SIZE = 64  # Number of chunk plans kept in memory, keyed by text hash
+ASYNC_CHUNK_CONCURRENCY = 4  # Chunks of one text synthesized at the same time by the async engine
 
 def get_api_key(args=None):
     """Get API key from command line arguments or environment variables."""
@@ -56,46 +69,130 @@ def get_input_text(input_file_path, default_text="Your text here."):
         print(f"Error reading file '{input_file_path}': {str(e)}. Using default text.")
         return default_text
 
+class ChunkPlan:
+    """How a text is split into API requests, computed once per text.
+
+    boundaries holds (start, end) character offsets into the original text, so
+    every consumer (CLI, web routes, preview, history) agrees on the exact chunks
+    that will be sent, their sizes, the cost and the estimated duration.
+    """
+
+    def __init__(self, text_id, text_length, boundaries, max_chars=MAX_CHARS_PER_REQUEST):
+        self.text_id = text_id
+        self.text_length = text_length
+        self.boundaries = boundaries
+        self.max_chars = max_chars
+
+    @property
+    def num_chunks(self):
+        return len(self.boundaries)
+
+    @property
+    def char_counts(self):
+        return [end - start for start, end in self.boundaries]
+
+    @property
+    def estimated_duration(self):
+        """Estimated audio duration in seconds."""
+        return sum(self.char_counts) / CHARS_PER_SECOND
+
+    def cost(self, model='tts-1'):
+        """Estimated cost of synthesizing the whole text with the given model."""
+        return calculate_cost(self.text_length, model)
+
+    def chunk_texts(self, text):
+        """Return the text of each chunk."""
+        return [text[start:end] for start, end in self.boundaries]
+
+    def to_dict(self, model='tts-1'):
+        """Return a JSON-serializable summary of the plan."""
+        return {
+            'text_length': self.text_length,
+            'num_chunks': self.num_chunks,
+            'chunk_lengths': self.char_counts,
+            'boundaries': [list(boundary) for boundary in self.boundaries],
+            'cost': self.cost(model),
+            'estimated_duration': self.estimated_duration
+        }
+
+
+def _trim_end(text, start, end):
+    """Move end back over trailing whitespace (but not past start)."""
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+def compute_chunk_boundaries(text, max_chars=MAX_CHARS_PER_REQUEST):
+    """Split text into (start, end) offsets of at most max_chars characters.
+
+    Chunks end at the last sentence boundary ('. ') that fits, otherwise at the
+    last space, otherwise exactly at max_chars. Whitespace between chunks is
+    not sent to the API.
+    """
+    text_length = len(text)
+    # If text is already under the limit, it is a single chunk
+    if text_length <= max_chars:
+        return [(0, text_length)]
+
+    boundaries = []
+    start = 0
+    while start < text_length:
+        # Skip whitespace at the start of a chunk
+        while start < text_length and text[start].isspace():
+            start += 1
+        if start >= text_length:
+            break
+
+        limit = start + max_chars
+        if limit >= text_length:
+            boundaries.append((start, _trim_end(text, start, text_length)))
+            break
+
+        # Prefer a sentence boundary, then a word boundary, then a hard split
+        split_at = text.rfind('. ', start, limit + 1)
+        if split_at > start:
+            split_at += 1
+        else:
+            split_at = text.rfind(' ', start, limit + 1)
+            if split_at <= start:
+                split_at = limit
+
+        end = _trim_end(text, start, split_at)
+        if end > start:
+            boundaries.append((start, end))
+        start = split_at
+
+    return boundaries
+
+
+_chunk_plan_cache = OrderedDict()
+_chunk_plan_lock = threading.Lock()
+
+
+def plan_chunks(text, max_chars=MAX_CHARS_PER_REQUEST):
+    """Return the ChunkPlan for a text, cached by the text's SHA-256 hash."""
+    text_id = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    key = (text_id, max_chars)
+
+    with _chunk_plan_lock:
+        plan = _chunk_plan_cache.get(key)
+        if plan is not None:
+            _chunk_plan_cache.move_to_end(key)
+            return plan
+
+    plan = ChunkPlan(text_id, len(text), compute_chunk_boundaries(text, max_chars), max_chars)
+
+    with _chunk_plan_lock:
+        _chunk_plan_cache[key] = plan
+        while len(_chunk_plan_cache) > CHUNK_PLAN_CACHE_SIZE:
+            _chunk_plan_cache.popitem(last=False)
+    return plan
+
+
 def split_text_into_chunks(text, max_chars=MAX_CHARS_PER_REQUEST):
     """Split text into chunks of maximum size."""
-    # If text is already under the limit, return it as a single chunk
-    if len(text) <= max_chars:
-        return [text]
-    
-    chunks = []
-    # Try to split at sentence boundaries (periods followed by space)
-    sentences = text.split('. ')
-    current_chunk = ""
-    
-    for sentence in sentences:
-        # Add period back except for the last sentence if it doesn't end with a period
-        if sentence != sentences[-1] or text.endswith('.'):
-            sentence = sentence + '. '
-            
-        # If adding this sentence would exceed the limit, start a new chunk
-        if len(current_chunk) + len(sentence) > max_chars:
-            # If the sentence itself is too long, split it at word boundaries
-            if len(sentence) > max_chars:
-                words = sentence.split(' ')
-                for word in words:
-                    if len(current_chunk) + len(word) + 1 > max_chars:  # +1 for space
-                        chunks.append(current_chunk.strip())
-                        current_chunk = word + ' '
-                    else:
-                        current_chunk += word + ' '
-            else:
-                # Finish current chunk and start new one with this sentence
-                chunks.append(current_chunk.strip())
-                current_chunk = sentence
-        else:
-            # Add sentence to current chunk
-            current_chunk += sentence
-    
-    # Add the last chunk if not empty
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    
-    return chunks
+    return plan_chunks(text, max_chars).chunk_texts(text)
 
 def generate_speech_for_chunk(client, chunk_text, output_file_path, model='tts-1', voice='alloy', max_retries=3, retry_delay=2):
     """Generate speech for a single text chunk."""
@@ -158,8 +255,70 @@ def generate_speech_for_chunk(client, chunk_text, output_file_path, model='tts-1
             print(f"Unexpected error: {str(e)}")
             raise
 
-def stitch_audio_files(chunk_files, output_file_path):
-    """Combine multiple audio files into a single file."""
+def generate_chunk_cached(client, chunk_text, output_file_path, model='tts-1', voice='alloy', chunk_cache=None,
+                          reuse=None):
+    """Generate speech for a chunk, reusing audio from a shared ChunkAudioCache when available.
+
+    reuse, if given, is tried after the cache and before the API: a callable that
+    writes audio known to match the chunk to output_file_path and returns True.
+    """
+    if chunk_cache is None and reuse is None:
+        return generate_speech_for_chunk(client, chunk_text, output_file_path, model, voice)
+
+    key = chunk_cache.key_for(model, voice, chunk_text) if chunk_cache is not None else None
+    if key is not None and chunk_cache.get_to(key, output_file_path):
+        return True
+    if reuse is not None and reuse_safely(reuse, output_file_path):
+        success = True
+    else:
+        success = generate_speech_for_chunk(client, chunk_text, output_file_path, model, voice)
+    if success and key is not None:
+        chunk_cache.put_from(key, output_file_path)
+    return success
+
+@contextlib.contextmanager
+def chunk_temp_dir():
+    """Create a temp directory for one job's chunk files and remove it afterwards.
+
+    A lock file inside it is held while the job runs, so the janitor never
+    sweeps the chunks of a long job, however old they are.
+    """
+    directory = tempfile.mkdtemp(prefix=CHUNK_TEMP_PREFIX)
+    lock = FileLock(os.path.join(directory, TEMP_DIR_LOCK_NAME))
+    lock.acquire()
+    try:
+        yield directory
+    finally:
+        lock.release()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def write_peaks_safely(write, source, peaks_path):
+    """Write waveform peaks; a failure only costs the waveform, never the audio."""
+    try:
+        write(source, peaks_path)
+    except Exception as e:
+        print(f"Could not compute waveform peaks: {str(e)}")
+
+def reuse_safely(reuse, output_file_path):
+    """Run a chunk reuse callable; if it fails, the chunk is synthesized instead."""
+    try:
+        return reuse(output_file_path)
+    except Exception as e:
+        print(f"Could not reuse chunk audio: {str(e)}")
+        return False
+
+def write_alignment_safely(input_text, plan, chunk_files, alignment_path):
+    """Write the text/audio alignment index from the chunk files; a failure only costs the index."""
+    try:
+        boundaries = (plan if plan is not None else plan_chunks(input_text)).boundaries
+        index = alignment.Alignment.from_chunk_files(boundaries, chunk_files, len(input_text))
+        alignment.write_alignment(alignment_path, index)
+    except Exception as e:
+        print(f"Could not write the alignment index: {str(e)}")
+
+def stitch_audio_files(chunk_files, output_file_path, peaks_path=None):
+    """Combine multiple audio files into a single file, optionally writing its waveform peaks."""
     if not chunk_files:
         return False
     
@@ -167,6 +326,8 @@ def stitch_audio_files(chunk_files, output_file_path):
         # If there's only one chunk, just rename it
         if len(chunk_files) == 1:
             os.replace(chunk_files[0], output_file_path)
+            if peaks_path:
+                write_peaks_safely(waveform.write_peaks_for_mp3, output_file_path, peaks_path)
             return True
         
         # Otherwise, use pydub to combine audio files
@@ -176,6 +337,9 @@ def stitch_audio_files(chunk_files, output_file_path):
             combined += audio_segment
         
         combined.export(output_file_path, format="mp3")
+        if peaks_path:
+            # The PCM is already decoded here, so peaks cost one pass over it
+            write_peaks_safely(waveform.write_peaks_for_audio, combined, peaks_path)
         
         # Clean up temporary chunk files
         for chunk_file in chunk_files:
@@ -199,8 +363,9 @@ def calculate_cost(text_length, model='tts-1'):
 def display_processing_info(text, model):
     """Display processing information and cost estimate to the user."""
     text_length = len(text)
-    chunks = split_text_into_chunks(text)
-    estimated_cost = calculate_cost(text_length, model)
+    plan = plan_chunks(text)
+    chunks = plan.chunk_texts(text)
+    estimated_cost = plan.cost(model)
     
     print(f"\n{Fore.CYAN}====== Text-to-Speech Processing Information ======{Style.RESET_ALL}")
     print(f"Text length: {text_length} characters")
@@ -242,60 +407,249 @@ def combine_audio_files(input_files, output_file):
         print(f"Error combining audio files: {str(e)}")
         raise
 
-def generate_speech(input_text, speech_file_path, model='tts-1', voice='alloy', client=None):
-    """Generate speech from text and save to file, handling large inputs by splitting and stitching."""
-    if not client:
-        # Create client if not provided (for web interface integration)
-        client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-    
+def generate_speech(input_text, speech_file_path, model='tts-1', voice='alloy', client=None, plan=None, chunk_cache=None,
+                    chunk_queue=None, hls_writer=None, peaks_path=None, alignment_path=None, reuse=None,
+                    executor=None):
+    """Generate speech from text and save to file, handling large inputs by splitting and stitching.
+
+    A precomputed ChunkPlan can be passed to reuse the exact chunks shown in the preview,
+    and a ChunkAudioCache to reuse chunks synthesized earlier (by any process). With a
+    chunk_queue.ChunkQueue, the chunks of a multi-chunk text are synthesized by queue
+    workers on any node and only stitched here. An hls.HlsWriter is given each chunk as
+    soon as it is ready, so its playlist grows while the rest is synthesized. With
+    peaks_path, waveform peaks of the result are written there (see waveform.py). With
+    alignment_path, the text offsets and audio times of every chunk are written there
+    (see alignment.py), read from the chunks' frame headers before stitching. reuse maps
+    chunk indexes to callables giving audio for unchanged chunks (see regenerate.py); it
+    applies to chunks synthesized here, not by queue workers. With a concurrent.futures
+    executor, chunks are synthesized on it concurrently; its workers are the concurrency
+    budget shared by everything submitted to it.
+    """
     assert input_text, "Input text cannot be empty"
     assert speech_file_path, "Speech file path must be specified"
     assert model, "Model name must be specified"
     assert voice, "Voice name must be specified"
     
     # Split text into chunks if needed
-    chunks = split_text_into_chunks(input_text)
+    chunks = plan.chunk_texts(input_text) if plan is not None else split_text_into_chunks(input_text)
+    
+    if not client and (chunk_queue is None or len(chunks) == 1):
+        # Create client if not provided (for web interface integration)
+        client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
     
     # If only one chunk, process directly
     if len(chunks) == 1:
-        return generate_speech_for_chunk(client, chunks[0], speech_file_path, model, voice)
+        if executor is not None:
+            success = executor.submit(generate_chunk_cached, client, chunks[0], speech_file_path, model, voice,
+                                      chunk_cache, reuse.get(0) if reuse else None).result()
+        else:
+            success = generate_chunk_cached(client, chunks[0], speech_file_path, model, voice, chunk_cache,
+                                            reuse=reuse.get(0) if reuse else None)
+        if success and hls_writer is not None:
+            hls_writer.add_chunk(speech_file_path)
+            hls_writer.finish()
+        if success and peaks_path:
+            write_peaks_safely(waveform.write_peaks_for_mp3, speech_file_path, peaks_path)
+        if success and alignment_path:
+            write_alignment_safely(input_text, plan, [speech_file_path], alignment_path)
+        return success
     
-    # For multiple chunks, create temp files and process each chunk
+    # For multiple chunks, create temp files in a directory held for the job and process each chunk
     temp_files = []
-    try:
-        for i, chunk in enumerate(chunks):
-            print(f"Processing chunk {i+1}/{len(chunks)} ({len(chunk)} characters)...")
+    with chunk_temp_dir() as temp_dir:
+        if chunk_queue is not None:
+            print(f"Publishing {len(chunks)} chunks to the distributed queue...")
+            temp_files = chunk_queue.run_job(chunks, model, voice, directory=temp_dir)
+            if hls_writer is not None:
+                for temp_file in temp_files:
+                    hls_writer.add_chunk(temp_file)
+        elif executor is not None:
+            print(f"Submitting {len(chunks)} chunks to the shared executor...")
+            futures = []
+            for i, chunk in enumerate(chunks):
+                temp_fd, temp_path = tempfile.mkstemp(suffix='.mp3', dir=temp_dir)
+                os.close(temp_fd)
+                temp_files.append(temp_path)
+                futures.append(executor.submit(generate_chunk_cached, client, chunk, temp_path, model, voice,
+                                               chunk_cache, reuse.get(i) if reuse else None))
+            try:
+                # Chunks finish in any order; the HLS writer still gets them in document order
+                for i, future in enumerate(futures):
+                    if not future.result():
+                        raise Exception(f"Failed to generate speech for chunk {i+1}")
+                    if hls_writer is not None:
+                        hls_writer.add_chunk(temp_files[i])
+            except BaseException:
+                # Let running chunks finish before their temp files are removed
+                for future in futures:
+                    future.cancel()
+                concurrent.futures.wait(futures)
+                raise
+        else:
+            for i, chunk in enumerate(chunks):
+                print(f"Processing chunk {i+1}/{len(chunks)} ({len(chunk)} characters)...")
             
-            # Create a temporary file for this chunk
-            temp_fd, temp_path = tempfile.mkstemp(suffix='.mp3')
-            os.close(temp_fd)
+                # Create a temporary file for this chunk
+                temp_fd, temp_path = tempfile.mkstemp(suffix='.mp3', dir=temp_dir)
+                os.close(temp_fd)
             
-            # Generate speech for this chunk
-            success = generate_speech_for_chunk(client, chunk, temp_path, model, voice)
+                # Generate speech for this chunk
+                success = generate_chunk_cached(client, chunk, temp_path, model, voice, chunk_cache,
+                                                reuse=reuse.get(i) if reuse else None)
             
-            if success:
-                temp_files.append(temp_path)
-            else:
-                raise Exception(f"Failed to generate speech for chunk {i+1}")
+                if success:
+                    temp_files.append(temp_path)
+                    if hls_writer is not None:
+                        hls_writer.add_chunk(temp_path)
+                else:
+                    raise Exception(f"Failed to generate speech for chunk {i+1}")
+        
+        if alignment_path:
+            write_alignment_safely(input_text, plan, temp_files, alignment_path)
         
         # Stitch all the chunks together
         print(f"Stitching {len(temp_files)} audio files together...")
-        success = stitch_audio_files(temp_files, speech_file_path)
+        if peaks_path:
+            success = stitch_audio_files(temp_files, speech_file_path, peaks_path=peaks_path)
+        else:
+            success = stitch_audio_files(temp_files, speech_file_path)
         
         if success:
+            if hls_writer is not None:
+                hls_writer.finish()
             print(f"Speech generated successfully and saved to {speech_file_path}")
             return True
         else:
             raise Exception("Failed to stitch audio files together")
-    
-    except Exception as e:
-        # Clean up any temporary files
-        for temp_file in temp_files:
-            try:
-                os.remove(temp_file)
-            except:
-                pass
-        raise
+
+def _is_retryable(error):
+    """Return True for errors generate_speech_for_chunk also retries (timeouts, rate limits, dropped connections)."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, ValueError):
+        return "rate limit" in str(error).lower()
+    return "peer closed connection" in str(error)
+
+
+async def generate_speech_for_chunk_async(client, chunk_text, output_file_path, model='tts-1', voice='alloy', max_retries=3, retry_delay=2):
+    """Generate speech for a single text chunk with an AsyncOpenAI client."""
+    for retry in range(max_retries):
+        try:
+            async with client.audio.speech.with_streaming_response.create(
+                model=model,
+                voice=voice,
+                input=chunk_text
+            ) as response:
+                await response.stream_to_file(output_file_path)
+                return True
+        except Exception as e:
+            if retry < max_retries - 1 and _is_retryable(e):
+                await asyncio.sleep(retry_delay * (retry + 1))
+                continue
+            raise
+
+
+async def generate_chunk_cached_async(client, chunk_text, output_file_path, model='tts-1', voice='alloy', chunk_cache=None):
+    """Async counterpart of generate_chunk_cached."""
+    if chunk_cache is None:
+        return await generate_speech_for_chunk_async(client, chunk_text, output_file_path, model, voice)
+
+    key = chunk_cache.key_for(model, voice, chunk_text)
+    if chunk_cache.get_to(key, output_file_path):
+        return True
+    success = await generate_speech_for_chunk_async(client, chunk_text, output_file_path, model, voice)
+    if success:
+        chunk_cache.put_from(key, output_file_path)
+    return success
+
+
+async def fetch_chunk_audio_async(client, chunk_text, model='tts-1', voice='alloy', max_retries=3, retry_delay=2):
+    """Return the MP3 bytes for a single text chunk with an AsyncOpenAI client."""
+    for retry in range(max_retries):
+        try:
+            async with client.audio.speech.with_streaming_response.create(
+                model=model,
+                voice=voice,
+                input=chunk_text
+            ) as response:
+                return await response.read()
+        except Exception as e:
+            if retry < max_retries - 1 and _is_retryable(e):
+                await asyncio.sleep(retry_delay * (retry + 1))
+                continue
+            raise
+
+
+async def iter_speech_async(input_text, model='tts-1', voice='alloy', client=None, plan=None, max_concurrency=ASYNC_CHUNK_CONCURRENCY):
+    """Yield the MP3 bytes of each chunk in order, synthesizing up to max_concurrency chunks ahead.
+
+    MP3 frames can be concatenated, so the pieces can be streamed to a player
+    as soon as the first chunk is ready.
+    """
+    client = client or AsyncOpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+    chunks = plan.chunk_texts(input_text) if plan is not None else split_text_into_chunks(input_text)
+
+    pending = []
+    next_chunk = 0
+    try:
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < max_concurrency:
+                pending.append(asyncio.ensure_future(fetch_chunk_audio_async(client, chunks[next_chunk], model, voice)))
+                next_chunk += 1
+            yield await pending.pop(0)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def generate_speech_async(input_text, speech_file_path, model='tts-1', voice='alloy', client=None, plan=None, chunk_cache=None, max_concurrency=ASYNC_CHUNK_CONCURRENCY,
+                                peaks_path=None, alignment_path=None):
+    """Async counterpart of generate_speech: chunks are synthesized concurrently, then stitched in a thread."""
+    client = client or AsyncOpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+
+    assert input_text, "Input text cannot be empty"
+    assert speech_file_path, "Speech file path must be specified"
+
+    chunks = plan.chunk_texts(input_text) if plan is not None else split_text_into_chunks(input_text)
+    loop = asyncio.get_running_loop()
+    if len(chunks) == 1:
+        success = await generate_chunk_cached_async(client, chunks[0], speech_file_path, model, voice, chunk_cache)
+        if success and peaks_path:
+            await loop.run_in_executor(None, write_peaks_safely, waveform.write_peaks_for_mp3, speech_file_path, peaks_path)
+        if success and alignment_path:
+            await loop.run_in_executor(None, write_alignment_safely, input_text, plan, [speech_file_path], alignment_path)
+        return success
+
+    # Chunk files live in a directory held for the job, removed with everything in it afterwards
+    with chunk_temp_dir() as temp_dir:
+        temp_files = []
+        for _ in chunks:
+            temp_fd, temp_path = tempfile.mkstemp(suffix='.mp3', dir=temp_dir)
+            os.close(temp_fd)
+            temp_files.append(temp_path)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def synthesize(chunk, temp_path):
+            async with semaphore:
+                if not await generate_chunk_cached_async(client, chunk, temp_path, model, voice, chunk_cache):
+                    raise Exception("Failed to generate speech for chunk")
+
+        tasks = [asyncio.ensure_future(synthesize(chunk, temp_path)) for chunk, temp_path in zip(chunks, temp_files)]
+        try:
+            await asyncio.gather(*tasks)
+            if alignment_path:
+                await loop.run_in_executor(None, write_alignment_safely, input_text, plan, temp_files, alignment_path)
+            # pydub decoding and encoding is CPU-bound, keep it off the event loop
+            stitch_args = (temp_files, speech_file_path, peaks_path) if peaks_path else (temp_files, speech_file_path)
+            success = await loop.run_in_executor(None, stitch_audio_files, *stitch_args)
+            if not success:
+                raise Exception("Failed to stitch audio files together")
+            return True
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
 
 def main(args=None):
     """Main function to generate speech from text."""
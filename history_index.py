@@ -0,0 +1,177 @@
+import re
+import html
+import sqlite3
+from contextlib import closing
+
+# Constants
+SEARCH_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+SNIPPET_TOKENS = 16  # Approximate number of words around each match in a snippet
+MAX_PER_PAGE = 100
+# Control characters mark matches in raw snippets; they become <mark> tags only after the text is escaped
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    filename TEXT UNIQUE NOT NULL,
+    timestamp TEXT,
+    voice TEXT,
+    model TEXT,
+    source_type TEXT,
+    original_filename TEXT,
+    text_id TEXT,
+    text_length INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    text,
+    original_filename,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def highlight_snippet(raw):
+    """Return a raw FTS snippet as safe HTML: user text escaped, matches wrapped in <mark>."""
+    if raw is None:
+        return None
+    text = html.escape(raw)
+    return text.replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+def build_match_query(query):
+    """Turn free-form user input into a safe FTS5 MATCH expression.
+
+    Every word must match; the last word also matches as a prefix so results
+    show up while the operator is still typing. Returns None if the query has
+    no searchable words.
+    """
+    tokens = SEARCH_TOKEN_PATTERN.findall(query or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens[:-1]]
+    terms.append(f'"{tokens[-1]}"*')
+    return ' AND '.join(terms)
+
+
+class HistoryIndex:
+    """SQLite FTS5 index over generation history, kept up to date incrementally.
+
+    Each history entry is indexed once when it is saved, using the full text from
+    the text store when available, and removed again when it is deleted.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def is_built(self):
+        """Check whether the index has been populated from history at least once."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'built'").fetchone()
+            return row is not None
+
+    def _add(self, conn, entry, full_text):
+        self._remove(conn, entry['filename'])
+        cursor = conn.execute(
+            "INSERT INTO entries (filename, timestamp, voice, model, source_type, original_filename, text_id, text_length) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                entry['filename'],
+                entry.get('timestamp'),
+                entry.get('voice'),
+                entry.get('model'),
+                entry.get('source_type'),
+                entry.get('original_filename'),
+                entry.get('text_id'),
+                entry.get('text_length', len(full_text or '')),
+            ),
+        )
+        conn.execute(
+            "INSERT INTO entries_fts (rowid, text, original_filename) VALUES (?, ?, ?)",
+            (cursor.lastrowid, full_text or entry.get('text', ''), entry.get('original_filename', '')),
+        )
+
+    def _remove(self, conn, filename):
+        row = conn.execute("SELECT id FROM entries WHERE filename = ?", (filename,)).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM entries_fts WHERE rowid = ?", (row['id'],))
+            conn.execute("DELETE FROM entries WHERE id = ?", (row['id'],))
+
+    def add(self, entry, full_text=None):
+        """Index a history entry (replacing any previous entry with the same filename)."""
+        with closing(self._connect()) as conn, conn:
+            self._add(conn, entry, full_text)
+
+    def remove(self, filename):
+        """Remove a history entry from the index."""
+        with closing(self._connect()) as conn, conn:
+            self._remove(conn, filename)
+
+    def clear(self):
+        """Remove every entry from the index."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM entries_fts")
+            conn.execute("DELETE FROM entries")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built', '1')")
+
+    def rebuild(self, history, load_text=None):
+        """Re-index a full history list in one transaction.
+
+        load_text is an optional callable that returns the full text for a
+        text id; entries without a stored text fall back to their preview.
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM entries_fts")
+            conn.execute("DELETE FROM entries")
+            for entry in history:
+                full_text = load_text(entry.get('text_id')) if load_text and entry.get('text_id') else None
+                self._add(conn, entry, full_text)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built', '1')")
+
+    def search(self, query, page=1, per_page=20):
+        """Return (total, results) for a query, best matches first.
+
+        Results are dicts with the entry metadata, a highlighted snippet and
+        the bm25 score (lower is better, as reported by SQLite).
+        """
+        match = build_match_query(query)
+        if match is None:
+            return 0, []
+
+        page = max(1, int(page))
+        per_page = max(1, min(int(per_page), MAX_PER_PAGE))
+        offset = (page - 1) * per_page
+
+        with closing(self._connect()) as conn:
+            total = conn.execute(
+                "SELECT count(*) FROM entries_fts WHERE entries_fts MATCH ?", (match,)
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT e.*, bm25(entries_fts, 1.0, 2.0) AS score, "
+                "snippet(entries_fts, 0, ?, ?, '...', ?) AS snippet "
+                "FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid "
+                "WHERE entries_fts MATCH ? "
+                "ORDER BY score LIMIT ? OFFSET ?",
+                (MATCH_START, MATCH_END, SNIPPET_TOKENS, match, per_page, offset),
+            ).fetchall()
+
+        results = []
+        for row in rows:
+            result = dict(row)
+            result.pop('id', None)
+            result['snippet'] = highlight_snippet(result['snippet'])
+            results.append(result)
+        return total, results
@@ -0,0 +1,151 @@
+"""HTTP Live Streaming (HLS) output for generated speech.
+
+Chunk audio is cut at MP3 frame boundaries into short packed-audio segments
+as each chunk finishes, and the playlist is rewritten after every segment.
+Players can start after the first segment and seeking only fetches the
+segments around the new position, instead of large byte ranges of one
+multi-hour MP3. Playlists and segments are ordinary objects in the audio
+storage backend, named after the audio file:
+
+    <stem>.m3u8, <stem>.seg00000.mpa, <stem>.seg00001.mpa, ...
+"""
+import os
+import re
+import struct
+import tempfile
+import mp3_frames
+
+# Constants
+SEGMENT_SECONDS = 10  # Longest segment; also the playlist's target duration
+PLAYLIST_SUFFIX = '.m3u8'
+SEGMENT_SUFFIX = '.mpa'
+PLAYLIST_MIMETYPE = 'application/vnd.apple.mpegurl'
+SEGMENT_MIMETYPE = 'audio/mpeg'
+TIMESTAMP_OWNER = b'com.apple.streaming.transportStreamTimestamp'
+SEGMENT_NAME_PATTERN = re.compile(r'^(?P<stem>.+)\.seg\d{5}\.mpa$')
+
+
+def playlist_name(audio_filename):
+    return os.path.splitext(audio_filename)[0] + PLAYLIST_SUFFIX
+
+
+def segment_name(audio_filename, index):
+    return f"{os.path.splitext(audio_filename)[0]}.seg{index:05d}{SEGMENT_SUFFIX}"
+
+
+def is_hls_name(name):
+    return name.endswith(PLAYLIST_SUFFIX) or bool(SEGMENT_NAME_PATTERN.match(name))
+
+
+def timestamp_tag(seconds):
+    """Return the ID3 tag packed audio segments start with: the segment's start on a 90 kHz clock."""
+    timestamp = int(round(seconds * 90000)) & 0x1FFFFFFFF  # 33-bit MPEG-2 timestamp
+    payload = TIMESTAMP_OWNER + b'\0' + struct.pack('>Q', timestamp)
+    frame = b'PRIV' + _synchsafe(len(payload)) + b'\0\0' + payload
+    return b'ID3\x04\x00\x00' + _synchsafe(len(frame)) + frame
+
+
+def _synchsafe(value):
+    return bytes(((value >> shift) & 0x7F) for shift in (21, 14, 7, 0))
+
+
+class HlsWriter:
+    """Segments chunk audio for one output file and publishes it to a storage backend.
+
+    Call add_chunk() with each chunk's MP3 in document order, then finish().
+    Frames left over at the end of a chunk are carried into the next segment,
+    so every segment but the last is close to SEGMENT_SECONDS long.
+    """
+
+    def __init__(self, storage, audio_filename, segment_seconds=SEGMENT_SECONDS):
+        self.storage = storage
+        self.audio_filename = audio_filename
+        self.segment_seconds = segment_seconds
+        self.segments = []  # (name, duration)
+        self._pending = []  # (frame bytes, duration) not yet in a segment
+        self._pending_seconds = 0.0
+        self._elapsed = 0.0
+
+    @property
+    def playlist_name(self):
+        return playlist_name(self.audio_filename)
+
+    def add_chunk(self, mp3_path):
+        """Segment the audio of one more chunk and update the playlist."""
+        with open(mp3_path, 'rb') as f:
+            data = f.read()
+        added = False
+        for frame in mp3_frames.iter_frames(data):
+            if frame.is_info:
+                continue
+            if self._pending and self._pending_seconds + frame.duration > self.segment_seconds:
+                self._write_segment()
+                added = True
+            self._pending.append((data[frame.offset:frame.offset + frame.size], frame.duration))
+            self._pending_seconds += frame.duration
+        if added:
+            self._write_playlist(finished=False)
+
+    def finish(self):
+        """Write the last segment and mark the playlist complete."""
+        if self._pending:
+            self._write_segment()
+        self._write_playlist(finished=True)
+
+    def _write_segment(self):
+        name = segment_name(self.audio_filename, len(self.segments))
+        self._put(name, timestamp_tag(self._elapsed) + b''.join(data for data, _ in self._pending))
+        self.segments.append((name, self._pending_seconds))
+        self._elapsed += self._pending_seconds
+        self._pending = []
+        self._pending_seconds = 0.0
+
+    def _write_playlist(self, finished):
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{self.segment_seconds}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            # Segments are only ever appended; ENDLIST marks the end of synthesis
+            '#EXT-X-PLAYLIST-TYPE:EVENT',
+        ]
+        for name, seconds in self.segments:
+            lines += [f'#EXTINF:{seconds:.3f},', name]
+        if finished:
+            lines.append('#EXT-X-ENDLIST')
+        self._put(self.playlist_name, ('\n'.join(lines) + '\n').encode('utf-8'))
+
+    def _put(self, name, data):
+        # Next to local audio, so publishing is an atomic rename that players never see half-done
+        directory = self.storage.root if self.storage.is_local else None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory, prefix='temp_hls_', suffix='.mp3')  # Swept by the janitor if left behind
+        try:
+            with os.fdopen(temp_fd, 'wb') as f:
+                f.write(data)
+            self.storage.put_file(name, temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def list_segments(playlist_text):
+    """Return the segment names listed in a playlist."""
+    return [line.strip() for line in playlist_text.splitlines() if line.strip() and not line.startswith('#')]
+
+
+def delete_hls(storage, audio_filename):
+    """Remove the playlist and segments of an audio file, if it has any."""
+    name = playlist_name(audio_filename)
+    try:
+        playlist = b''.join(storage.iter_range(name)).decode('utf-8')
+    except Exception:
+        return False
+    for segment in list_segments(playlist):
+        try:
+            storage.delete(segment)
+        except Exception:
+            pass
+    storage.delete(name)
+    return True
@@ -0,0 +1,231 @@
+import os
+import glob
+import time
+import shutil
+import logging
+import threading
+from metrics import metrics as default_metrics
+from locks import FileLock, TEMP_DIR_LOCK_NAME
+
+# Constants
+AUDIO_PATTERN = '*.mp3'
+TEMP_AUDIO_PREFIX = 'temp_'  # Per-chunk files written next to the final audio
+ORPHAN_GRACE_SECONDS = 3600  # Unreferenced files younger than this may still be in use
+DEFAULT_INTERVAL_SECONDS = 600
+LOCK_FILENAME = '.janitor.lock'
+
+logger = logging.getLogger(__name__)
+
+
+def reclaimed_metric(name):
+    """Return the counter of bytes reclaimed by one collector: 'orphan', 'audio' or an extra collector's __name__."""
+    return f"janitor_{name}_reclaimed_bytes_total"
+
+
+def touch_access_time(path):
+    """Record that a file was just read, without changing its modification time.
+
+    Many filesystems are mounted noatime/relatime, so the access time used for
+    LRU eviction is set explicitly when audio is served.
+    """
+    try:
+        stat = os.stat(path)
+        os.utime(path, (time.time(), stat.st_mtime))
+    except OSError:
+        pass
+
+
+class OutputJanitor:
+    """Garbage collector for generated audio in the output folder.
+
+    - max_age: audio not modified for this many seconds is removed (0 disables)
+    - max_bytes: when the audio total exceeds this, least recently accessed
+      files are removed first (0 disables)
+    - orphaned temporary files are removed once they are older than orphan_grace;
+      so is audio that no history entry refers to, with sweep_unreferenced
+
+    list_referenced() returns the filenames the history knows about and
+    on_remove(filenames) is called with every batch of removed audio files so
+    the history (and anything derived from it) stays consistent. A temp_patterns
+    match may be a directory: it is removed as a whole, unless the job using it
+    still holds the TEMP_DIR_LOCK_NAME lock inside it. Each callable
+    in extra_collectors (e.g. a cache prune) runs on every pass and returns the
+    bytes it reclaimed.
+
+    Reclaimed bytes are counted per collector (janitor_<name>_reclaimed_bytes_total,
+    see reclaimed_metric) as well as in janitor_reclaimed_bytes_total.
+
+    With several worker processes only one of them runs a pass at a time.
+    """
+
+    def __init__(self, folder, max_bytes=0, max_age=0, list_referenced=None, on_remove=None,
+                 temp_patterns=(), orphan_grace=ORPHAN_GRACE_SECONDS, metrics=None, extra_collectors=(),
+                 sweep_unreferenced=False):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.list_referenced = list_referenced or (lambda: set())
+        self.on_remove = on_remove or (lambda filenames: None)
+        self.temp_patterns = list(temp_patterns)
+        self.orphan_grace = orphan_grace
+        self.sweep_unreferenced = sweep_unreferenced
+        self.metrics = metrics or default_metrics
+        self.extra_collectors = list(extra_collectors)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _remove_file(self, path):
+        """Delete a file and return the number of bytes reclaimed."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        self.metrics.increment('janitor_files_removed_total')
+        return size
+
+    def _count_reclaimed(self, name, reclaimed):
+        self.metrics.increment(reclaimed_metric(name), reclaimed)
+        self.metrics.increment('janitor_reclaimed_bytes_total', reclaimed)
+
+    def _remove_temp_dir(self, path, cutoff):
+        """Delete an orphaned temp directory older than cutoff, unless its lock is held; return the bytes reclaimed."""
+        lock = FileLock(os.path.join(path, TEMP_DIR_LOCK_NAME))
+        if not lock.acquire(blocking=False):
+            return 0
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                return 0
+            size = sum(os.path.getsize(os.path.join(directory, name))
+                       for directory, _, names in os.walk(path) for name in names)
+        except OSError:
+            return 0
+        finally:
+            lock.release()
+        shutil.rmtree(path, ignore_errors=True)
+        self.metrics.increment('janitor_files_removed_total')
+        return size
+
+    def _audio_files(self):
+        """Return (filename, path, stat) for every final audio file in the folder."""
+        files = []
+        for path in glob.glob(os.path.join(self.folder, AUDIO_PATTERN)):
+            filename = os.path.basename(path)
+            if filename.startswith(TEMP_AUDIO_PREFIX):
+                continue
+            try:
+                files.append((filename, path, os.stat(path)))
+            except OSError:
+                continue
+        return files
+
+    def sweep_orphans(self, now=None):
+        """Remove stale temporary chunk files and, with sweep_unreferenced, audio missing from the history."""
+        now = now if now is not None else time.time()
+        cutoff = now - self.orphan_grace
+        reclaimed = 0
+
+        patterns = [os.path.join(self.folder, TEMP_AUDIO_PREFIX + AUDIO_PATTERN)]
+        patterns += [os.path.join(directory, pattern) for directory, pattern in self.temp_patterns]
+        for pattern in patterns:
+            for path in glob.glob(pattern):
+                if os.path.isdir(path):
+                    reclaimed += self._remove_temp_dir(path, cutoff)
+                    continue
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        reclaimed += self._remove_file(path)
+                except OSError:
+                    continue
+
+        if self.sweep_unreferenced:
+            referenced = self.list_referenced()
+            for filename, path, stat in self._audio_files():
+                if filename not in referenced and stat.st_mtime < cutoff:
+                    reclaimed += self._remove_file(path)
+
+        self._count_reclaimed('orphan', reclaimed)
+        return reclaimed
+
+    def collect(self, now=None):
+        """Apply the TTL and the byte quota; return the number of bytes reclaimed."""
+        now = now if now is not None else time.time()
+        files = self._audio_files()
+        referenced = self.list_referenced()
+        present = {filename for filename, _, _ in files}
+        removed = [filename for filename in referenced if filename not in present]
+        reclaimed = 0
+
+        if self.max_age:
+            cutoff = now - self.max_age
+            expired = [item for item in files if item[2].st_mtime < cutoff]
+            for filename, path, stat in expired:
+                reclaimed += self._remove_file(path)
+                removed.append(filename)
+            files = [item for item in files if item[2].st_mtime >= cutoff]
+
+        total_bytes = sum(stat.st_size for _, _, stat in files)
+        if self.max_bytes and total_bytes > self.max_bytes:
+            # Least recently accessed first
+            for filename, path, stat in sorted(files, key=lambda item: item[2].st_atime):
+                if total_bytes <= self.max_bytes:
+                    break
+                reclaimed += self._remove_file(path)
+                total_bytes -= stat.st_size
+                removed.append(filename)
+
+        if removed:
+            self.on_remove(removed)
+        self.metrics.set_gauge('output_audio_bytes', total_bytes)
+        self._count_reclaimed('audio', reclaimed)
+        return reclaimed
+
+    def run_once(self, now=None):
+        """Run one full pass (orphans, then TTL and quota) and return the bytes reclaimed.
+
+        Returns 0 without doing anything if another process is running a pass.
+        """
+        process_lock = FileLock(os.path.join(self.folder, LOCK_FILENAME))
+        with self._lock:
+            if not process_lock.acquire(blocking=False):
+                return 0
+            try:
+                start = time.time()
+                reclaimed = self.sweep_orphans(now) + self.collect(now)
+                for collector in self.extra_collectors:
+                    collected = collector()
+                    self._count_reclaimed(collector.__name__, collected)
+                    reclaimed += collected
+            finally:
+                process_lock.release()
+            self.metrics.increment('janitor_runs_total')
+            self.metrics.set_gauge('janitor_last_run_seconds', time.time() - start)
+            self.metrics.set_gauge('janitor_last_run_timestamp', time.time())
+        if reclaimed:
+            logger.info(f"Janitor reclaimed {reclaimed} bytes from {self.folder}")
+        return reclaimed
+
+    def _run(self, interval):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Janitor pass failed: {str(e)}")
+            if self._stop.wait(interval):
+                break
+
+    def start(self, interval=DEFAULT_INTERVAL_SECONDS):
+        """Run a pass now (sweeping files orphaned by crashed workers) and then every interval seconds."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='output-janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,98 @@
+import os
+import json
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Constants
+TEMP_DIR_LOCK_NAME = '.lock'  # Held inside a temp directory by the job still using it
+CHUNK_TEMP_PREFIX = 'tts_chunk_'  # Prefix of per-job chunk temp directories, so orphans can be swept
+
+
+class FileLock:
+    """Exclusive lock held on a lock file, shared by every process on the host.
+
+    Each FileLock opens its own file descriptor, so two instances also exclude
+    each other within one process (threads of the same worker included).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, blocking=True):
+        """Take the lock; with blocking=False return False instead of waiting."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            if blocking:
+                raise
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.release()
+        return False
+
+
+def process_alive(pid):
+    """Return False if no process with this pid runs on the host."""
+    if os.name == 'nt':
+        return True  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temporary file next to path and rename it into place.
+
+    Readers in other processes see either the old or the new content, never a
+    partially written file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    temp_fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(temp_fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,42 @@
+import threading
+
+
+class Metrics:
+    """Thread-safe process-wide counters and gauges, reported by /api/metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+
+    def increment(self, name, value=1):
+        """Add value to a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name, default=0):
+        """Return the current value of a counter or gauge."""
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            return self._gauges.get(name, default)
+
+    def snapshot(self):
+        """Return a copy of all counters and gauges."""
+        with self._lock:
+            return {'counters': dict(self._counters), 'gauges': dict(self._gauges)}
+
+    def reset(self):
+        """Forget all recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+
+
+# Registry shared by the whole process
+metrics = Metrics()
@@ -0,0 +1,153 @@
+"""Minimal MPEG audio (MP3) frame header parsing.
+
+Only frame headers are read, never audio data, so durations and frame
+boundaries of the speech files can be found without decoding (or ffmpeg).
+"""
+
+# Constants
+BITRATES_KBPS = {
+    # (MPEG-1, layer) and (MPEG-2/2.5, layer); index 0 is "free format" and unsupported
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+VERSIONS = {0b11: 1, 0b10: 2, 0b00: 25}  # 0b01 is reserved
+LAYERS = {0b11: 1, 0b10: 2, 0b01: 3}  # 0b00 is reserved
+ID3V2_HEADER_SIZE = 10
+XING_FIELD_SIZES = ((0x1, 4), (0x2, 4), (0x4, 100), (0x8, 4))  # frames, bytes, TOC, quality
+LAME_DELAY_OFFSET = 21  # From the start of the encoder string in a LAME tag
+
+
+class Frame:
+    """One MPEG audio frame: where it is in the file and how much audio it holds."""
+
+    __slots__ = ('offset', 'size', 'samples', 'sample_rate', 'is_info')
+
+    def __init__(self, offset, size, samples, sample_rate, is_info=False):
+        self.offset = offset
+        self.size = size
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.is_info = is_info  # Xing/Info/VBRI metadata frame; decoders output no audio for it
+
+    @property
+    def duration(self):
+        return 0.0 if self.is_info else self.samples / self.sample_rate
+
+
+def parse_header(header):
+    """Parse 4 header bytes into (size, samples, sample rate, side info length), or None if invalid."""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = VERSIONS.get((header[1] >> 3) & 0b11)
+    layer = LAYERS.get((header[1] >> 1) & 0b11)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0b11
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = BITRATES_KBPS[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 1
+    mono = (header[3] >> 6) == 0b11
+
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate, 0
+    if layer == 2:
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate, 0
+    if version == 1:
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate, 17 if mono else 32
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate, 9 if mono else 17
+
+
+def id3v2_size(data):
+    """Return the length of a leading ID3v2 tag (0 if there is none)."""
+    if len(data) < ID3V2_HEADER_SIZE or data[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return ID3V2_HEADER_SIZE + size + footer
+
+
+def iter_frames(data):
+    """Yield every frame of MP3 bytes in order, skipping ID3v2 tags and junk between frames.
+
+    A candidate header is trusted if the previous frame ended right before it,
+    or if another header (or the end of the data) follows right after it, so
+    stray 0xFF bytes are not taken for frames.
+    """
+    offset = id3v2_size(data)
+    first = True
+    synced = False
+    end = len(data)
+    while offset + 4 <= end:
+        parsed = parse_header(data[offset:offset + 4])
+        if parsed is not None:
+            size, samples, sample_rate, side_info = parsed
+            next_offset = offset + size
+            if next_offset <= end and (synced or next_offset == end or parse_header(data[next_offset:next_offset + 4])
+                                       or data[next_offset:next_offset + 3] in (b'TAG', b'ID3')):
+                tag_offset = offset + 4 + side_info
+                is_info = first and (data[tag_offset:tag_offset + 4] in (b'Xing', b'Info')
+                                      or data[offset + 36:offset + 40] == b'VBRI')
+                yield Frame(offset, size, samples, sample_rate, is_info)
+                first = False
+                synced = True
+                offset = next_offset
+                continue
+        synced = False
+        if data[offset:offset + 3] == b'ID3':
+            offset += max(id3v2_size(data[offset:offset + ID3V2_HEADER_SIZE]), 1)
+            continue
+        offset += 1
+
+
+def encoder_padding(data, frame):
+    """Return (delay, padding) samples recorded in the LAME tag of an Info frame, or (0, 0).
+
+    Gapless decoders drop these samples, so they are not part of the audio a player outputs.
+    """
+    parsed = parse_header(data[frame.offset:frame.offset + 4]) if frame.is_info else None
+    if parsed is None:
+        return 0, 0
+    tag_offset = frame.offset + 4 + parsed[3]
+    if data[tag_offset:tag_offset + 4] not in (b'Xing', b'Info'):
+        return 0, 0
+    flags = int.from_bytes(data[tag_offset + 4:tag_offset + 8], 'big')
+    position = tag_offset + 8 + sum(size for flag, size in XING_FIELD_SIZES if flags & flag)
+    if data[position:position + 4] != b'LAME' and data[position:position + 3] != b'Lav':
+        return 0, 0
+    packed = int.from_bytes(data[position + LAME_DELAY_OFFSET:position + LAME_DELAY_OFFSET + 3], 'big')
+    return packed >> 12, packed & 0xFFF
+
+
+def playing_duration(data):
+    """Return the seconds of audio a gapless decoder outputs for MP3 bytes."""
+    frames = list(iter_frames(data))
+    seconds = duration(frames)
+    if frames and frames[0].is_info:
+        delay, padding = encoder_padding(data, frames[0])
+        seconds -= (delay + padding) / frames[0].sample_rate
+    return max(seconds, 0.0)
+
+
+def read_playing_duration(path):
+    """Return the playing time in seconds of an MP3 file."""
+    with open(path, 'rb') as f:
+        return playing_duration(f.read())
+
+
+def read_frames(path):
+    """Return the frames of an MP3 file."""
+    with open(path, 'rb') as f:
+        return list(iter_frames(f.read()))
+
+
+def duration(frames):
+    """Return the playing time in seconds of a list of frames."""
+    return sum(frame.duration for frame in frames)
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Constants
+PDF_SIGNATURE = b'%PDF-'
+SIGNATURE_SEARCH_BYTES = 1024  # The PDF header may be preceded by some junk bytes
+HASH_BLOCK_SIZE = 1024 * 1024
+MAX_MEMORY_CHARS = 50 * 1000 * 1000  # Upper bound on characters held by the in-memory LRU
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600  # Entries not read for this long are pruned
+
+
+def text_holder(pdf_hash):
+    """Name under which the cache entry of a PDF holds its text in the shared TextStore."""
+    return f"pdf-{pdf_hash}"
+
+
+def hash_pdf_file(pdf_file):
+    """Return the SHA-256 hex digest of a PDF file object, or None if it is not a PDF.
+
+    The file is read in blocks and rewound afterwards so it can still be parsed.
+    """
+    if not hasattr(pdf_file, 'read') or not hasattr(pdf_file, 'seek'):
+        return None
+
+    pdf_file.seek(0)
+    header = pdf_file.read(SIGNATURE_SEARCH_BYTES)
+    if PDF_SIGNATURE not in header:
+        pdf_file.seek(0)
+        return None
+
+    digest = hashlib.sha256(header)
+    for block in iter(lambda: pdf_file.read(HASH_BLOCK_SIZE), b''):
+        digest.update(block)
+    pdf_file.seek(0)
+    return digest.hexdigest()
+
+
+class PdfTextCache:
+    """Two-level cache of extracted PDF text keyed by the SHA-256 of the PDF bytes.
+
+    The first level is an in-process LRU bounded by total characters. The second
+    level maps the PDF hash to a text id on disk, with the text itself kept in the
+    shared TextStore, so every process and restart benefits from one extraction.
+    Each entry holds its text until prune() removes the entry.
+    """
+
+    def __init__(self, root, text_store, max_memory_chars=MAX_MEMORY_CHARS):
+        self.root = root
+        self.text_store = text_store
+        self.max_memory_chars = max_memory_chars
+        self._memory = OrderedDict()
+        self._memory_chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _index_path(self, pdf_hash):
+        return os.path.join(self.root, pdf_hash[:2], f"{pdf_hash}.json")
+
+    def _remember(self, pdf_hash, text):
+        with self._lock:
+            if pdf_hash in self._memory:
+                self._memory.move_to_end(pdf_hash)
+                return
+            if len(text) > self.max_memory_chars:
+                return
+            self._memory[pdf_hash] = text
+            self._memory_chars += len(text)
+            while self._memory_chars > self.max_memory_chars:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_chars -= len(evicted)
+
+    def get(self, pdf_hash):
+        """Return cached text for a PDF hash, or None on a miss."""
+        with self._lock:
+            text = self._memory.get(pdf_hash)
+            if text is not None:
+                self._memory.move_to_end(pdf_hash)
+                self.hits += 1
+        if text is not None:
+            self._touch(pdf_hash)
+            return text
+
+        try:
+            with open(self._index_path(pdf_hash), 'r') as f:
+                text_id = json.load(f)['text_id']
+        except (OSError, ValueError, KeyError):
+            text_id = None
+
+        text = self.text_store.get(text_id) if text_id else None
+        if text is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self._remember(pdf_hash, text)
+        self._touch(pdf_hash)
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def _touch(self, pdf_hash):
+        """Record a read of an entry, so prune() keeps it."""
+        try:
+            os.utime(self._index_path(pdf_hash))
+        except OSError:
+            pass
+
+    def put(self, pdf_hash, text):
+        """Cache the extracted text of a PDF."""
+        text_id = self.text_store.put(text, holder=text_holder(pdf_hash))
+        index_path = self._index_path(pdf_hash)
+        directory = os.path.dirname(index_path)
+        os.makedirs(directory, exist_ok=True)
+
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(temp_fd, 'w') as f:
+            json.dump({'text_id': text_id, 'text_length': len(text)}, f)
+        os.replace(temp_path, index_path)
+
+        self._remember(pdf_hash, text)
+        return text_id
+
+    def prune(self, ttl=DEFAULT_TTL_SECONDS):
+        """Remove entries not read for ttl seconds and release their texts; return the bytes reclaimed."""
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - ttl
+        reclaimed = 0
+        for directory in os.listdir(self.root):
+            directory = os.path.join(self.root, directory)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(directory, name)
+                pdf_hash = name[:-len('.json')]
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime >= cutoff:
+                        continue
+                    with open(path, 'r') as f:
+                        text_id = json.load(f).get('text_id')
+                    os.remove(path)
+                except (OSError, ValueError, AttributeError):
+                    continue
+                reclaimed += stat.st_size
+                with self._lock:
+                    text = self._memory.pop(pdf_hash, None)
+                    if text is not None:
+                        self._memory_chars -= len(text)
+                if text_id:
+                    size = self.text_store.stored_size(text_id)
+                    if self.text_store.release(text_id, text_holder(pdf_hash)):
+                        reclaimed += size
+        return reclaimed
+
+    def clear_memory(self):
+        """Drop the in-process level (the on-disk level is kept)."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_chars = 0
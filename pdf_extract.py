@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+
+# Constants
+PARALLEL_MIN_PAGES = 64  # Below this, process start-up costs more than it saves
+PAGES_PER_TASK = 16  # Pages handed to a worker process at a time
+PAGE_SEPARATOR = "\n\n"
+
+
+def get_default_workers():
+    """Return the number of extraction processes to use (PDF_EXTRACT_WORKERS or CPU count)."""
+    configured = os.environ.get('PDF_EXTRACT_WORKERS')
+    if configured:
+        return max(1, int(configured))
+    return os.cpu_count() or 1
+
+
+def iter_pdf_pages(pdf_file):
+    """Yield the text of each page in order, one page at a time.
+
+    PyPDF2 parses pages lazily, so when pdf_file is a path or an on-disk file
+    handle only the current page is held in memory.
+    """
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    for page in pdf_reader.pages:
+        yield page.extract_text() or ""
+
+
+def _extract_page_range(pdf_path, start, end):
+    """Extract the text of pages [start, end) from a PDF on disk (runs in a worker process)."""
+    pdf_reader = PyPDF2.PdfReader(pdf_path)
+    return [pdf_reader.pages[page_num].extract_text() or "" for page_num in range(start, end)]
+
+
+def iter_pdf_pages_parallel(pdf_path, num_pages, max_workers=None, pages_per_task=PAGES_PER_TASK):
+    """Yield page texts in order while worker processes extract page ranges concurrently.
+
+    At most about two ranges per worker are in flight, so memory stays bounded
+    even for very long documents.
+    """
+    max_workers = max_workers or get_default_workers()
+    ranges = [(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)]
+    window = max_workers * 2
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = []
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            # Keep a bounded number of ranges submitted ahead of the consumer
+            while next_range < len(ranges) and len(pending) < window:
+                start, end = ranges[next_range]
+                pending.append(executor.submit(_extract_page_range, pdf_path, start, end))
+                next_range += 1
+            for page_text in pending.pop(0).result():
+                yield page_text
+
+
+def _spool_to_path(pdf_file):
+    """Return (path, is_temporary) for a PDF so worker processes can open it by name."""
+    if isinstance(pdf_file, (str, os.PathLike)):
+        return os.fspath(pdf_file), False
+
+    # Uploads already spooled to a named temporary file can be opened in place
+    stream = getattr(pdf_file, 'stream', pdf_file)
+    name = getattr(stream, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        if hasattr(stream, 'flush'):
+            stream.flush()
+        return name, False
+
+    if hasattr(pdf_file, 'seek'):
+        pdf_file.seek(0)
+    temp_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    with temp_file:
+        shutil.copyfileobj(pdf_file, temp_file, length=1024 * 1024)
+    return temp_file.name, True
+
+
+def extract_text(pdf_file, parallel=None, max_workers=None):
+    """Extract the text of a whole PDF, joining non-empty pages with blank lines.
+
+    parallel=None picks the process pool automatically for long documents on
+    multi-core machines; True or False forces a mode.
+    """
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    num_pages = len(pdf_reader.pages)
+
+    if parallel is None:
+        parallel = num_pages >= PARALLEL_MIN_PAGES and (max_workers or get_default_workers()) > 1
+
+    if not parallel:
+        page_texts = (page.extract_text() or "" for page in pdf_reader.pages)
+        return PAGE_SEPARATOR.join(text for text in page_texts if text).strip()
+
+    del pdf_reader
+    pdf_path, is_temporary = _spool_to_path(pdf_file)
+    try:
+        page_texts = iter_pdf_pages_parallel(pdf_path, num_pages, max_workers=max_workers)
+        return PAGE_SEPARATOR.join(text for text in page_texts if text).strip()
+    finally:
+        if is_temporary:
+            try:
+                os.remove(pdf_path)
+            except OSError:
+                pass
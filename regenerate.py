@@ -0,0 +1,85 @@
+"""Incremental regeneration: re-synthesize only the chunks of an edited text that changed.
+
+The chunk boundaries and audio times an output was made from are in its
+alignment index (see alignment.py), which serves as the chunk manifest.
+A new plan keeps every old chunk that lies entirely before or after the
+edited region, and only the region in between is split into new chunks.
+Planning the edited text from scratch would not do: chunks are packed
+greedily, so one inserted word can move every later boundary.
+
+Audio for kept chunks comes from the chunk cache, or, when it has been
+evicted, is cut from the previous output.
+"""
+import hashlib
+from generator import ChunkPlan, compute_chunk_boundaries, MAX_CHARS_PER_REQUEST
+
+# Constants
+COMPARE_BLOCK_CHARS = 4096  # Texts are compared a block at a time before the exact character is found
+
+
+def common_affixes(old_text, new_text):
+    """Return the lengths of the common prefix and (non-overlapping) common suffix of two texts."""
+    limit = min(len(old_text), len(new_text))
+    prefix = 0
+    while prefix + COMPARE_BLOCK_CHARS <= limit and \
+            old_text[prefix:prefix + COMPARE_BLOCK_CHARS] == new_text[prefix:prefix + COMPARE_BLOCK_CHARS]:
+        prefix += COMPARE_BLOCK_CHARS
+    while prefix < limit and old_text[prefix] == new_text[prefix]:
+        prefix += 1
+
+    limit -= prefix
+    old_end, new_end = len(old_text), len(new_text)
+    suffix = 0
+    while suffix + COMPARE_BLOCK_CHARS <= limit and \
+            old_text[old_end - suffix - COMPARE_BLOCK_CHARS:old_end - suffix] == \
+            new_text[new_end - suffix - COMPARE_BLOCK_CHARS:new_end - suffix]:
+        suffix += COMPARE_BLOCK_CHARS
+    while suffix < limit and old_text[old_end - suffix - 1] == new_text[new_end - suffix - 1]:
+        suffix += 1
+    return prefix, suffix
+
+
+def plan_regeneration(old_text, old_boundaries, new_text, max_chars=MAX_CHARS_PER_REQUEST):
+    """Plan new_text reusing the chunks of old_text that an edit left untouched.
+
+    Returns (ChunkPlan, reused), where reused maps new chunk indexes to the
+    indexes of the identical old chunks.
+    """
+    prefix, suffix = common_affixes(old_text, new_text)
+    shift = len(new_text) - len(old_text)
+
+    # Kept chunks must be followed (or preceded) by at least one unchanged character,
+    # so text typed right against a chunk joins the re-planned region
+    head = [i for i, (start, end) in enumerate(old_boundaries) if end < prefix]
+    tail = [i for i, (start, end) in enumerate(old_boundaries)
+            if start > len(old_text) - suffix and (not head or i > head[-1])]
+
+    region_start = old_boundaries[head[-1]][1] if head else 0
+    region_end = old_boundaries[tail[0]][0] + shift if tail else len(new_text)
+    while region_start < region_end and new_text[region_start].isspace():
+        region_start += 1
+    while region_end > region_start and new_text[region_end - 1].isspace():
+        region_end -= 1
+    middle = []
+    if region_end > region_start:
+        middle = [(region_start + start, region_start + end)
+                  for start, end in compute_chunk_boundaries(new_text[region_start:region_end], max_chars)]
+
+    boundaries = [old_boundaries[i] for i in head] + middle
+    reused = {i: i for i in head}
+    for i in tail:
+        start, end = old_boundaries[i]
+        reused[len(boundaries)] = i
+        boundaries.append((start + shift, end + shift))
+
+    text_id = hashlib.sha256(new_text.encode('utf-8')).hexdigest()
+    return ChunkPlan(text_id, len(new_text), boundaries, max_chars), reused
+
+
+def cut_chunk(audio_path, audio_start, duration, output_path):
+    """Export one chunk's span of a previous output as MP3; only that span is decoded."""
+    from pydub import AudioSegment
+
+    segment = AudioSegment.from_file(audio_path, format='mp3', start_second=audio_start, duration=duration)
+    segment.export(output_path, format='mp3')
+    return True
@@ -0,0 +1,145 @@
+"""Server-side sessions kept in SQLite.
+
+The browser cookie only carries a random session id; the session data lives
+in a table shared by every worker on the host, so per-user state can grow
+without bloating (or overflowing) the cookie sent with every request.
+Sessions expire after a period of inactivity and expired rows are purged
+periodically by whichever worker happens to be saving a session.
+"""
+import os
+import json
+import time
+import secrets
+import sqlite3
+import threading
+from contextlib import closing
+from flask.sessions import SessionInterface, SecureCookieSession
+
+# Constants
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600  # Sessions unused for this long are dropped
+PURGE_INTERVAL_SECONDS = 300  # How often a process deletes expired sessions
+SESSION_ID_BYTES = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires);
+"""
+
+
+class SessionStore:
+    """Session data by id in a SQLite database, with a time-to-live per session."""
+
+    def __init__(self, db_path, ttl=DEFAULT_TTL_SECONDS):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._last_purge = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def load(self, session_id, now=None):
+        """Return (data, expires) for a live session, or None if it is unknown or expired."""
+        now = now if now is not None else time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT data, expires FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError:
+            return None
+
+    def save(self, session_id, data, now=None):
+        """Store the session data and push its expiry back to now + ttl."""
+        now = now if now is not None else time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)",
+                         (session_id, json.dumps(data), now + self.ttl))
+        if now - self._last_purge >= PURGE_INTERVAL_SECONDS:
+            self.purge_expired(now)
+
+    def delete(self, session_id):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def purge_expired(self, now=None):
+        """Delete every expired session and return how many were removed."""
+        now = now if now is not None else time.time()
+        self._last_purge = now
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("DELETE FROM sessions WHERE expires <= ?", (now,)).rowcount
+
+    def count(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class ServerSideSession(SecureCookieSession):
+    """A session dict (tracking changes and reads like Flask's own) that remembers its id."""
+
+    def __init__(self, initial=None, session_id=None, expires=None):
+        super().__init__(initial)
+        self.session_id = session_id
+        self.expires = expires
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Flask session interface storing sessions in SESSION_FILE, expiring after SESSION_TTL seconds."""
+
+    def __init__(self):
+        self._stores = {}
+        self._stores_lock = threading.Lock()
+
+    def get_store(self, app):
+        key = (app.config['SESSION_FILE'], app.config['SESSION_TTL'])
+        with self._stores_lock:
+            if key not in self._stores:
+                self._stores[key] = SessionStore(*key)
+            return self._stores[key]
+
+    def open_session(self, app, request):
+        session_id = request.cookies.get(self.get_cookie_name(app))
+        if session_id and os.path.exists(app.config['SESSION_FILE']):
+            loaded = self.get_store(app).load(session_id)
+            if loaded is not None:
+                data, expires = loaded
+                return ServerSideSession(data, session_id=session_id, expires=expires)
+        # Unknown or expired ids are never reused, so a client cannot pick its own id
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.session_id:
+                self.get_store(app).delete(session.session_id)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        store = self.get_store(app)
+        # Refresh unchanged sessions only once half their lifetime is used, not on every request
+        if not session.modified and session.expires and session.expires - time.time() > store.ttl / 2:
+            return
+
+        new_session = session.session_id is None
+        if new_session:
+            session.session_id = secrets.token_urlsafe(SESSION_ID_BYTES)
+        store.save(session.session_id, dict(session))
+        if new_session or self.should_set_cookie(app, session):
+            response.set_cookie(name, session.session_id, expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
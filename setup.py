@@ -14,6 +14,7 @@ setup(
     entry_points={
         "console_scripts": [
             "tts-generate=generator:main",
+            "tts-bench=bench:main",
         ],
     },
     python_requires=">=3.7",
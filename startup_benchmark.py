@@ -0,0 +1,81 @@
+"""Measure how long a web worker takes to start and to answer its first request.
+
+Each measurement runs in a fresh Python process, so nothing is shared with an
+earlier run:
+
+- import: importing app.py
+- create_app: configuring the app without warm-up
+- warm_up: each warm-up step (what gunicorn --preload pays once, before forking)
+- first_request_cold / first_request_warm: GET / on a worker without / with warm-up
+
+Usage:
+    python startup_benchmark.py --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+PROBE = r'''
+import json, os, sys, time
+start = time.perf_counter()
+import app as app_module
+result = {'import': time.perf_counter() - start}
+folder = sys.argv[1]
+config = {'UPLOAD_FOLDER': folder, 'HISTORY_FILE': os.path.join(folder, 'history.json'),
+          'HISTORY_INDEX_FILE': os.path.join(folder, 'history_index.sqlite3'),
+          'TEXT_STORE_FOLDER': os.path.join(folder, 'texts'), 'JANITOR_INTERVAL': 0,
+          'LOG_LEVEL': 'WARNING', 'WARM_UP': False}
+start = time.perf_counter()
+app = app_module.create_app(config)
+result['create_app'] = time.perf_counter() - start
+if sys.argv[2] == 'warm':
+    for name, seconds in app_module.warm_up().items():
+        result['warm_up.' + name] = seconds
+start = time.perf_counter()
+response = app.test_client().get('/')
+result['first_request_' + sys.argv[2]] = time.perf_counter() - start
+assert response.status_code == 200, response.status_code
+print(json.dumps(result))
+'''
+
+
+def probe(mode):
+    """Start a fresh interpreter, time its startup phases and return them."""
+    with tempfile.TemporaryDirectory() as folder:
+        env = dict(os.environ, OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'sk-benchmark'))
+        output = subprocess.run([sys.executable, '-c', PROBE, folder, mode], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_benchmark(runs=3):
+    """Return {phase: [seconds per run]} over runs cold and runs warm worker starts."""
+    samples = {}
+    for _ in range(runs):
+        for mode in ('cold', 'warm'):
+            for phase, seconds in probe(mode).items():
+                samples.setdefault(phase, []).append(seconds)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark web worker startup')
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per mode')
+    parser.add_argument('--json', action='store_true', help='print raw samples as JSON')
+    args = parser.parse_args()
+
+    samples = run_benchmark(args.runs)
+    if args.json:
+        print(json.dumps(samples, indent=2))
+        return
+    print(f"{'phase':<28}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for phase, values in samples.items():
+        print(f"{phase:<28}{statistics.median(values) * 1000:>12.1f}{min(values) * 1000:>10.1f}{max(values) * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
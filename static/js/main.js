@@ -31,6 +31,159 @@ function setupCharacterCounter() {
     }
 }
 
+// Texts at least this long are uploaded once as a document and previewed through small edits
+const DOCUMENT_UPLOAD_THRESHOLD = 20000;
+
+// Re-upload a text document once the pending edit grows beyond this many characters
+const DOCUMENT_MAX_EDIT_SIZE = 2000;
+
+// Documents already uploaded to /api/documents for the current form
+const uploadedDocuments = {
+    text: null,  // { id, text }
+    pdf: null    // { id, file }
+};
+
+// Compute a single {offset, delete, insert} edit turning baseText into newText
+function computeTextEdit(baseText, newText) {
+    let prefix = 0;
+    const maxPrefix = Math.min(baseText.length, newText.length);
+    while (prefix < maxPrefix && baseText[prefix] === newText[prefix]) {
+        prefix++;
+    }
+    
+    let suffix = 0;
+    const maxSuffix = Math.min(baseText.length, newText.length) - prefix;
+    while (suffix < maxSuffix &&
+           baseText[baseText.length - 1 - suffix] === newText[newText.length - 1 - suffix]) {
+        suffix++;
+    }
+    
+    return {
+        offset: prefix,
+        delete: baseText.length - prefix - suffix,
+        insert: newText.slice(prefix, newText.length - suffix)
+    };
+}
+
+// Get the CSRF token from the form
+function getCsrfToken() {
+    const csrfInput = document.querySelector('input[name="csrf_token"]');
+    return csrfInput ? csrfInput.value : '';
+}
+
+// Remember the uploaded PDF so the form submits its id instead of the file
+function setPdfDocumentId(documentId) {
+    const pdfDocumentInput = document.getElementById('pdf-document-id');
+    if (pdfDocumentInput) {
+        pdfDocumentInput.value = documentId || '';
+    }
+}
+
+// Show preview data returned by the server
+function renderCostPreview(data) {
+    const previewLength = document.getElementById('preview-length');
+    const previewChunks = document.getElementById('preview-chunks');
+    const previewCost = document.getElementById('preview-cost');
+    
+    console.log('Response data:', data);
+    if (data.error) {
+        console.error('Error from server:', data.error);
+        return;
+    }
+    
+    previewLength.textContent = data.text_length;
+    previewChunks.textContent = data.num_chunks;
+    previewCost.textContent = data.cost.toFixed(4);
+}
+
+// POST to a preview endpoint and return the parsed JSON
+function postPreviewRequest(url, body, contentType) {
+    const headers = { 'X-CSRFToken': getCsrfToken() };
+    if (contentType) {
+        headers['Content-Type'] = contentType;
+    }
+    
+    return fetch(url, {
+        method: 'POST',
+        headers: headers,
+        body: body
+    })
+    .then(response => {
+        console.log('Response status:', response.status);
+        return response.json();
+    });
+}
+
+// Preview a PDF, uploading it once and then referring to it by document id
+function previewPdf(file, text, model) {
+    const cached = uploadedDocuments.pdf;
+    
+    // A different file was selected: forget the old upload before anything can submit it
+    if (cached && cached.file !== file) {
+        uploadedDocuments.pdf = null;
+        setPdfDocumentId('');
+    }
+    
+    if (cached && cached.file === file) {
+        console.log('Previewing uploaded PDF document', cached.id);
+        const params = { 'document_id': cached.id, 'model': model };
+        if (text.length > 0) {
+            params['text'] = text;
+        }
+        return postPreviewRequest('/preview', new URLSearchParams(params), 'application/x-www-form-urlencoded')
+            .then(renderCostPreview);
+    }
+    
+    console.log('Uploading PDF document to server');
+    const formData = new FormData();
+    formData.append('pdf_file', file);
+    formData.append('model', model);
+    
+    return postPreviewRequest('/api/documents', formData)
+        .then(data => {
+            if (data.error || !data.document_id) {
+                renderCostPreview(data);
+                return;
+            }
+            
+            uploadedDocuments.pdf = { id: data.document_id, file: file };
+            setPdfDocumentId(data.document_id);
+            
+            // Text typed next to the PDF is small enough to send along with the id
+            if (text.length > 0) {
+                return previewPdf(file, text, model);
+            }
+            renderCostPreview(data);
+        });
+}
+
+// Preview a long text, uploading it once and then sending only edits
+function previewLongText(text, model) {
+    const cached = uploadedDocuments.text;
+    
+    if (cached) {
+        const edit = computeTextEdit(cached.text, text);
+        if (edit.delete + edit.insert.length <= DOCUMENT_MAX_EDIT_SIZE) {
+            console.log('Previewing text document with edit', edit.offset, edit.delete, edit.insert.length);
+            return postPreviewRequest('/preview', new URLSearchParams({
+                'document_id': cached.id,
+                'edits': JSON.stringify([edit]),
+                'model': model
+            }), 'application/x-www-form-urlencoded')
+            .then(renderCostPreview);
+        }
+    }
+    
+    console.log('Uploading text document to server');
+    return postPreviewRequest('/api/documents', JSON.stringify({ 'text': text, 'model': model }), 'application/json')
+        .then(data => {
+            if (data.document_id) {
+                uploadedDocuments.text = { id: data.document_id, text: text };
+            }
+            renderCostPreview(data);
+        });
+}
+
 // Helper function to update cost preview
 function updateCostPreview() {
     const textInput = document.getElementById('text-input');
@@ -57,6 +210,10 @@ function updateCostPreview() {
     if (hasPdf) {
         console.log('PDF file name:', pdfFileInput.files[0].name);
         console.log('PDF file size:', pdfFileInput.files[0].size);
+    } else if (uploadedDocuments.pdf) {
+        // The PDF was cleared, so the form must not reference it any more
+        uploadedDocuments.pdf = null;
+        setPdfDocumentId('');
     }
     
     // If there's no text and no PDF file, display zeros
@@ -68,81 +225,24 @@ function updateCostPreview() {
         return;
     }
     
-    // If we have a PDF file, we need to use FormData to send it
+    let request;
     if (hasPdf) {
-        console.log('Sending PDF file to server');
-        const formData = new FormData();
-        formData.append('pdf_file', pdfFileInput.files[0]);
-        formData.append('model', model);
-        if (text.length > 0) {
-            console.log('Also sending text with PDF');
-            formData.append('text', text);
-        }
-        
-        console.log('FormData created:', formData);
-        
-        fetch('/preview', {
-            method: 'POST',
-            headers: {
-                'X-CSRFToken': document.querySelector('input[name="csrf_token"]').value
-            },
-            body: formData
-        })
-        .then(response => {
-            console.log('Response status:', response.status);
-            return response.json();
-        })
-        .then(data => {
-            console.log('Response data:', data);
-            if (data.error) {
-                console.error('Error from server:', data.error);
-                return;
-            }
-            
-            previewLength.textContent = data.text_length;
-            previewChunks.textContent = data.num_chunks;
-            previewCost.textContent = data.cost.toFixed(4);
-            // Don't set display here
-            // costPreview.style.display = 'block';
-        })
-        .catch(error => {
-            console.error('Fetch error:', error);
-        });
+        request = previewPdf(pdfFileInput.files[0], text, model);
+    } else if (text.length >= DOCUMENT_UPLOAD_THRESHOLD) {
+        request = previewLongText(text, model);
     } else {
-        // Use the existing URLSearchParams approach for text input
+        // Short texts are cheaper to send in full than to upload as documents
         console.log('Sending text only to server');
-        fetch('/preview', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'X-CSRFToken': document.querySelector('input[name="csrf_token"]').value
-            },
-            body: new URLSearchParams({
-                'text': text,
-                'model': model
-            })
-        })
-        .then(response => {
-            console.log('Response status:', response.status);
-            return response.json();
-        })
-        .then(data => {
-            console.log('Response data:', data);
-            if (data.error) {
-                console.error('Error from server:', data.error);
-                return;
-            }
-            
-            previewLength.textContent = data.text_length;
-            previewChunks.textContent = data.num_chunks;
-            previewCost.textContent = data.cost.toFixed(4);
-            // Don't set display here
-            // costPreview.style.display = 'block';
-        })
-        .catch(error => {
-            console.error('Fetch error:', error);
-        });
+        request = postPreviewRequest('/preview', new URLSearchParams({
+            'text': text,
+            'model': model
+        }), 'application/x-www-form-urlencoded')
+        .then(renderCostPreview);
     }
+    
+    return request.catch(error => {
+        console.error('Fetch error:', error);
+    });
 }
 
 // Cost preview
@@ -188,6 +288,13 @@ function setupProcessingIndicator() {
     
     if (form && processingIndicator && submitBtn) {
         form.addEventListener('submit', function() {
+            // The PDF was already uploaded for the preview; submit its id instead of the file
+            const pdfFileInput = document.getElementById('pdf-file');
+            const pdfDocumentInput = document.getElementById('pdf-document-id');
+            if (pdfFileInput && pdfDocumentInput && pdfDocumentInput.value) {
+                pdfFileInput.disabled = true;
+            }
+            
             processingIndicator.style.display = 'block';
             submitBtn.disabled = true;
         });
@@ -238,7 +345,8 @@ function playVoiceSample(voice, voiceElement) {
     }
     
     // Create and play new audio element
-    const audio = new Audio(`/static/audio/samples/${voice}.mp3`);
+    const sampleUrl = (voiceElement && voiceElement.dataset.sampleUrl) || `/voice-samples/${voice}.mp3`;
+    const audio = new Audio(sampleUrl);
     audio.className = 'voice-sample-audio';
     document.body.appendChild(audio);
     
@@ -259,6 +367,72 @@ function playVoiceSample(voice, voiceElement) {
     });
 }
 
+// Draw flat [min, max, ...] peaks (-127..127) on a canvas; the part before progress (0..1) is highlighted
+function drawWaveform(canvas, peaks, progress) {
+    const context = canvas.getContext('2d');
+    const width = canvas.width = canvas.clientWidth * (window.devicePixelRatio || 1);
+    const height = canvas.height;
+    const middle = height / 2;
+    const count = peaks.length / 2;
+    context.clearRect(0, 0, width, height);
+    for (let x = 0; x < width; x++) {
+        // Every pixel column covers one or more peaks; draw the widest of them
+        const first = Math.floor(x * count / width);
+        const last = Math.max(first + 1, Math.floor((x + 1) * count / width));
+        let low = 0;
+        let high = 0;
+        for (let i = first; i < last && i < count; i++) {
+            low = Math.min(low, peaks[2 * i]);
+            high = Math.max(high, peaks[2 * i + 1]);
+        }
+        context.fillStyle = x / width < (progress || 0) ? '#0d6efd' : '#adb5bd';
+        context.fillRect(x, middle - high / 127 * middle, 1, Math.max(1, (high - low) / 127 * middle));
+    }
+}
+
+// Fetch and draw the stored peaks of every waveform canvas once it is scrolled into view.
+// A canvas with data-audio-id follows that player's progress and seeks it when clicked.
+function setupWaveforms() {
+    const canvases = document.querySelectorAll('canvas.waveform[data-peaks-url]');
+    if (!canvases.length) {
+        return;
+    }
+
+    function load(canvas) {
+        fetch(canvas.dataset.peaksUrl)
+            .then(response => response.ok ? response.json() : Promise.reject(response.status))
+            .then(data => {
+                const audio = canvas.dataset.audioId ? document.getElementById(canvas.dataset.audioId) : null;
+                const progress = () => audio && data.duration ? audio.currentTime / data.duration : 0;
+                drawWaveform(canvas, data.peaks, progress());
+                if (!audio) {
+                    return;
+                }
+                audio.addEventListener('timeupdate', () => drawWaveform(canvas, data.peaks, progress()));
+                canvas.addEventListener('click', event => {
+                    const rect = canvas.getBoundingClientRect();
+                    audio.currentTime = (event.clientX - rect.left) / rect.width * data.duration;
+                    audio.play();
+                });
+            })
+            .catch(() => canvas.classList.add('d-none'));
+    }
+
+    if (!('IntersectionObserver' in window)) {
+        canvases.forEach(load);
+        return;
+    }
+    const observer = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                load(entry.target);
+            }
+        });
+    });
+    canvases.forEach(canvas => observer.observe(canvas));
+}
+
 // Initialize all functionality
 function initApp() {
     setCurrentYear();
@@ -266,6 +440,7 @@ function initApp() {
     setupCostPreview();
     setupProcessingIndicator();
     setupVoiceSamples();
+    setupWaveforms();
 }
 
 // Run initialization when DOM is loaded
@@ -278,9 +453,13 @@ if (typeof module !== 'undefined' && module.exports) {
         setupCharacterCounter,
         setupCostPreview,
         updateCostPreview,
+        computeTextEdit,
+        uploadedDocuments,
         setupProcessingIndicator,
         setupVoiceSamples,
         playVoiceSample,
+        drawWaveform,
+        setupWaveforms,
         initApp
     };
 } 
\ No newline at end of file
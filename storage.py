@@ -0,0 +1,244 @@
+import os
+import re
+import shutil
+
+# Constants
+STREAM_BLOCK_SIZE = 1024 * 1024  # Bytes read at a time when streaming objects
+MULTIPART_PART_SIZE = 8 * 1024 * 1024  # S3 requires parts of at least 5 MB (except the last)
+PRESIGNED_URL_EXPIRES = 3600  # Seconds a presigned download URL stays valid
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+def is_valid_name(name):
+    """Return True if name is a plain object name (no directories or traversal)."""
+    return isinstance(name, str) and bool(NAME_PATTERN.match(name)) and '..' not in name
+
+
+def parse_range_header(header, size):
+    """Parse a single 'bytes=start-end' Range header into an inclusive (start, end) pair.
+
+    Returns None when there is no usable range, so the full object is served.
+    Raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start_text, _, end_text = header[len('bytes='):].strip().partition('-')
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+
+class LocalStorage:
+    """Finished audio kept in a local directory (the default single-node setup)."""
+
+    is_local = True
+
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, name):
+        """Return the filesystem path of an object."""
+        if not is_valid_name(name):
+            raise ValueError(f"Invalid object name: {name!r}")
+        return os.path.join(self.root, name)
+
+    def put_file(self, name, local_path):
+        """Store a finished local file under name (moving it into place if needed)."""
+        path = self.path_for(name)
+        if os.path.abspath(local_path) != os.path.abspath(path):
+            os.makedirs(self.root, exist_ok=True)
+            shutil.move(local_path, path)
+
+    def exists(self, name):
+        return os.path.exists(self.path_for(name))
+
+    def size(self, name):
+        """Return the object size in bytes, or 0 if it does not exist."""
+        path = self.path_for(name)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def delete(self, name):
+        path = self.path_for(name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def download_url(self, name, as_attachment=False):
+        """Local files are served by the app itself, so there is no external URL."""
+        return None
+
+    def iter_range(self, name, start=0, end=None, block_size=STREAM_BLOCK_SIZE):
+        """Yield the bytes of [start, end] (inclusive) one block at a time."""
+        with open(self.path_for(name), 'rb') as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                block = f.read(block_size if remaining is None else min(block_size, remaining))
+                if not block:
+                    break
+                if remaining is not None:
+                    remaining -= len(block)
+                yield block
+
+
+class S3MultipartWriter:
+    """File-like writer that uploads to S3 in parts as data arrives.
+
+    At most one part is buffered in memory. Use as a context manager: the
+    upload is completed on a clean exit and aborted if an exception escapes.
+    """
+
+    def __init__(self, client, bucket, key, part_size=MULTIPART_PART_SIZE, content_type='audio/mpeg'):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.content_type = content_type
+        self.parts = []
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+
+    def _upload_part(self, data):
+        if self._upload_id is None:
+            response = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                                           ContentType=self.content_type)
+            self._upload_id = response['UploadId']
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                           PartNumber=part_number, Body=bytes(data))
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def close(self):
+        """Upload the last part and complete the upload."""
+        if self._upload_id is None:
+            # Small objects fit in a single request
+            self.client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer),
+                                   ContentType=self.content_type)
+        else:
+            if self._buffer:
+                self._upload_part(self._buffer)
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                                  MultipartUpload={'Parts': self.parts})
+        self._buffer = bytearray()
+
+    def abort(self):
+        if self._upload_id is not None:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class S3Storage:
+    """Finished audio kept in an S3-compatible bucket, so app nodes can be stateless."""
+
+    is_local = False
+
+    def __init__(self, bucket, prefix='', client=None, endpoint_url=None, part_size=MULTIPART_PART_SIZE,
+                 url_expires=PRESIGNED_URL_EXPIRES, presigned_urls=True):
+        if client is None:
+            try:
+                import boto3  # Optional dependency, imported here so app startup does not pay for it
+            except ImportError:
+                raise RuntimeError("The S3 storage backend requires boto3 (pip install boto3)")
+            client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = part_size
+        self.url_expires = url_expires
+        self.presigned_urls = presigned_urls
+
+    def key_for(self, name):
+        if not is_valid_name(name):
+            raise ValueError(f"Invalid object name: {name!r}")
+        return self.prefix + name
+
+    def open_writer(self, name):
+        """Return a multipart writer for a new object."""
+        return S3MultipartWriter(self.client, self.bucket, self.key_for(name), part_size=self.part_size)
+
+    def put_file(self, name, local_path):
+        """Stream a local file up in parts and remove the local copy."""
+        with self.open_writer(name) as writer, open(local_path, 'rb') as f:
+            for block in iter(lambda: f.read(self.part_size), b''):
+                writer.write(block)
+        os.remove(local_path)
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.key_for(name))
+        except self.client.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        head = self._head(name)
+        return head['ContentLength'] if head else 0
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key_for(name))
+
+    def download_url(self, name, as_attachment=False):
+        """Return a presigned GET URL, or None when objects are streamed through the app."""
+        if not self.presigned_urls:
+            return None
+        params = {'Bucket': self.bucket, 'Key': self.key_for(name), 'ResponseContentType': 'audio/mpeg'}
+        if as_attachment:
+            params['ResponseContentDisposition'] = f'attachment; filename="{name}"'
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.url_expires)
+
+    def iter_range(self, name, start=0, end=None, block_size=STREAM_BLOCK_SIZE):
+        """Yield the bytes of [start, end] (inclusive) using a ranged GET."""
+        byte_range = f'bytes={start}-' + ('' if end is None else str(end))
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key_for(name), Range=byte_range)
+        body = response['Body']
+        try:
+            for block in iter(lambda: body.read(block_size), b''):
+                yield block
+        finally:
+            body.close()
+
+
+def create_storage(config):
+    """Build the storage backend selected by STORAGE_BACKEND in a Flask config mapping."""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'])
+    if backend == 's3':
+        return S3Storage(config['S3_BUCKET'],
+                         prefix=config.get('S3_PREFIX', ''),
+                         endpoint_url=config.get('S3_ENDPOINT_URL') or None,
+                         presigned_urls=config.get('S3_PRESIGNED_URLS', True))
+    raise ValueError(f"Unknown storage backend: {backend}")
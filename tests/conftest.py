@@ -0,0 +1,40 @@
+import os
+import sys
+import pytest
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Every file and folder the app writes to, relative to its output folder
+OUTPUT_PATHS = {
+    'HISTORY_FILE': 'history.json',
+    'TEXT_STORE_FOLDER': 'texts',
+    'PDF_CACHE_FOLDER': 'pdf_cache',
+    'DOCUMENTS_FOLDER': 'documents',
+    'HISTORY_INDEX_FILE': 'history_index.sqlite3',
+    'CHUNK_CACHE_FOLDER': 'chunk_cache',
+    'SESSION_FILE': 'sessions.sqlite3',
+    'TRANSCODE_FOLDER': 'variants',
+    'BATCH_FOLDER': 'batches',
+    'WEBHOOK_DEAD_LETTER_FILE': 'webhooks_dead_letter.jsonl',
+}
+
+
+@pytest.fixture(autouse=True)
+def isolated_output(tmp_path):
+    """Point the app's output folder, caches and ledgers at a temporary directory, so no test writes to output/.
+
+    Fixtures of the test modules may still override any of these keys.
+    """
+    from app import app
+    keys = ['UPLOAD_FOLDER'] + list(OUTPUT_PATHS)
+    original_config = {key: app.config[key] for key in keys}
+    output_dir = tmp_path / 'app_output'
+    app.config['UPLOAD_FOLDER'] = str(output_dir)
+    app.config.update({key: str(output_dir / name) for key, name in OUTPUT_PATHS.items()})
+    # Created up front, as some tests mock os.path.exists
+    for key, name in OUTPUT_PATHS.items():
+        if key.endswith('_FOLDER'):
+            (output_dir / name).mkdir(parents=True)
+    yield output_dir
+    app.config.update(original_config)
@@ -0,0 +1,36 @@
+"""Helpers for building small, real PDF documents in tests."""
+
+
+def make_text_pdf(page_texts):
+    """Return the bytes of a valid PDF with one line of text per page."""
+    num_pages = len(page_texts)
+    # Object numbers: 1 catalog, 2 pages, 3 font, then (page, content) pairs
+    page_ids = [4 + 2 * i for i in range(num_pages)]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{page_id} 0 R" for page_id in page_ids), num_pages)).encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for page_id, text in zip(page_ids, page_texts):
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode("latin-1")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode()
+        objects[page_id + 1] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(output)
+        output += b"%d 0 obj\n" % obj_id + objects[obj_id] + b"\nendobj\n"
+
+    xref_offset = len(output)
+    size = max(objects) + 1
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for obj_id in range(1, size):
+        output += b"%010d 00000 n \n" % offsets[obj_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_offset)
+    return bytes(output)
@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import asyncio
+import time
+import threading
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app
+from admission import AdmissionController, AdmissionRejected
+from metrics import Metrics
+
+
+@pytest.fixture
+def controller(tmp_path):
+    return AdmissionController(str(tmp_path / 'admission.json'), soft_chars=1000, hard_chars=2000,
+                               soft_chunks=10, hard_chunks=20, max_queue_wait=5, chars_per_second=100,
+                               metrics=Metrics())
+
+
+@pytest.fixture
+def client(tmp_path):
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'CHUNK_CACHE_FOLDER',
+            'ADMISSION_ROUTES')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        UPLOAD_FOLDER=str(tmp_path),
+        HISTORY_FILE=str(tmp_path / 'history.json'),
+        TEXT_STORE_FOLDER=str(tmp_path / 'texts'),
+        HISTORY_INDEX_FILE=str(tmp_path / 'history_index.sqlite3'),
+        CHUNK_CACHE_FOLDER=str(tmp_path / 'chunk_cache'),
+        ADMISSION_ROUTES={'api_generate': {'soft_chars': 100, 'hard_chars': 200, 'max_queue_wait': 0.2}},
+    )
+    (tmp_path / 'history.json').write_text('[]')
+
+    with app.test_client() as client:
+        yield client
+
+    app.config.update(original_config)
+
+
+def test_work_below_soft_limit_starts_immediately(controller):
+    """Test that tickets are admitted and released without waiting."""
+    first = controller.acquire(400, 4)
+    second = controller.acquire(500, 5)
+    assert controller.metrics.get('admission_inflight_chars') == 900
+    assert controller.metrics.get('admission_queued_total') == 0
+
+    controller.release(first)
+    controller.release(second)
+    assert controller.metrics.get('admission_inflight_chars') == 0
+    assert controller.metrics.get('admission_admitted_total') == 2
+
+
+def test_work_above_soft_limit_waits_for_capacity(controller):
+    """Test that queued work starts once running work is released, and the wait is reported."""
+    running = controller.acquire(800, 2)
+    threading.Timer(0.3, controller.release, args=(running,)).start()
+
+    start = time.time()
+    with controller.admit(500, 2):
+        waited = time.time() - start
+        assert controller.metrics.get('admission_inflight_chars') == 500
+
+    assert waited >= 0.25
+    assert controller.metrics.get('admission_queued_total') == 1
+    assert controller.metrics.get('admission_queue_wait_seconds_total') >= 0.25
+
+
+def test_work_above_hard_limit_is_rejected_with_retry_after(controller):
+    """Test that work pushing the node over its hard limit is rejected with an estimate."""
+    controller.acquire(1500, 2)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire(800, 2)
+
+    # 1500 + 800 - 1000 characters must drain at 100 characters per second
+    assert excinfo.value.retry_after == 13
+    assert controller.metrics.get('admission_rejected_total') == 1
+
+
+def test_chunk_limits_apply_independently(controller):
+    """Test that the chunk count alone can trigger a rejection."""
+    controller.acquire(10, 15)
+    with pytest.raises(AdmissionRejected):
+        controller.acquire(10, 6)
+
+
+def test_queue_timeout_rejects_and_releases(controller):
+    """Test that a request still queued after max_queue_wait gets a 429 and leaves no ticket behind."""
+    controller.max_queue_wait = 0.2
+    controller.acquire(900, 1)
+    with pytest.raises(AdmissionRejected):
+        controller.acquire(500, 1)
+
+    with open(controller.ledger_path) as f:
+        assert [ticket['chars'] for ticket in json.load(f).values()] == [900]
+
+
+def test_cancelled_async_wait_releases_its_ticket(controller):
+    """Test that cancelling a queued acquire_async (e.g. a client disconnect) leaves no ticket behind."""
+    running = controller.acquire(900, 1)
+
+    async def cancel_queued():
+        task = asyncio.ensure_future(controller.acquire_async(500, 1))
+        await asyncio.sleep(0.2)
+        assert controller.metrics.get('admission_queued_chars') == 500
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_queued())
+    controller.release(running)
+    with open(controller.ledger_path) as f:
+        assert json.load(f) == {}
+
+
+def test_idle_node_admits_oversized_request(controller):
+    """Test that a request larger than the hard limit still runs when nothing else does."""
+    with controller.admit(5000, 50):
+        assert controller.metrics.get('admission_inflight_chars') == 5000
+
+
+def test_tickets_of_dead_processes_are_dropped(controller):
+    """Test that work registered by a crashed worker does not hold capacity forever."""
+    with open(controller.ledger_path, 'w') as f:
+        json.dump({'dead': {'pid': 2 ** 22 + 1, 'chars': 1900, 'chunks': 1, 'state': 'running',
+                            'created': time.time()}}, f)
+
+    controller.release(controller.acquire(900, 1))
+    assert controller.metrics.get('admission_queued_total') == 0
+
+
+def test_api_generate_returns_429_when_node_is_busy(client, tmp_path):
+    """Test that the API rejects work above the per-route hard limit with Retry-After."""
+    busy = AdmissionController(str(tmp_path / 'admission.json'), hard_chars=1000)
+    busy.acquire(150, 1)
+
+    with patch('app.generate_speech') as mock_generate:
+        response = client.post('/api/generate', json={'text': 'x' * 80})
+
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.json['retry_after'] == int(response.headers['Retry-After'])
+    mock_generate.assert_not_called()
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mp3_frames
+from alignment import Alignment, read_alignment
+from app import app
+from generator import generate_speech, plan_chunks
+
+FRAME_HEADER = b'\xff\xfb\x90\x00'  # MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo
+FRAME_SIZE = 417
+FRAME_SECONDS = 1152 / 44100
+
+
+def mp3_bytes(frames):
+    return (FRAME_HEADER + b'\x01' * (FRAME_SIZE - 4)) * frames
+
+
+def fake_chunk(client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+    """Write one frame of audio per character, so chunk durations follow their lengths."""
+    with open(output_file_path, 'wb') as f:
+        f.write(mp3_bytes(len(chunk_text)))
+    return True
+
+
+def fake_stitch(chunk_files, output_file_path, peaks_path=None):
+    with open(output_file_path, 'wb') as out:
+        for path in chunk_files:
+            with open(path, 'rb') as f:
+                out.write(f.read())
+            os.remove(path)
+    return True
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client with output in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / 'history.json').write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'CHUNK_CACHE_FOLDER')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        CHUNK_CACHE_FOLDER=str(output_dir / 'chunk_cache'),
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def test_lookups_interpolate_within_chunks():
+    """Test offset -> time and time -> offset, including the whitespace between chunks."""
+    index = Alignment.from_chunks([(0, 100), (101, 301), (302, 402)], [10.0, 20.0, 5.0], text_length=402)
+    assert index.duration == 35.0
+    assert index.time_for_offset(0) == 0.0
+    assert index.time_for_offset(50) == 5.0
+    assert index.time_for_offset(100) == 10.0  # Between chunks: the end of the previous one
+    assert index.time_for_offset(201) == 20.0
+    assert index.time_for_offset(10 ** 6) == 35.0
+    assert index.offset_for_time(15.0) == 151
+    assert index.offset_for_time(30.0) == 302
+    assert index.segment_for_time(-1) == 0 and index.segment_for_offset(402) == 2
+
+    restored = read_alignment(json.dumps(index.to_dict()).encode('utf-8'))
+    assert restored.segments == index.segments and restored.text_length == 402
+
+
+def test_playing_duration_subtracts_lame_delay_and_padding():
+    """Test that encoder delay and padding from a LAME tag are not counted as audio."""
+    # Xing tag with the frames flag only, then the LAME tag: delay 576, padding 1152
+    lame = b'LAME3.100' + b'\0' * 12 + ((576 << 12) | 1152).to_bytes(3, 'big')
+    tag = b'Info' + (1).to_bytes(4, 'big') + (11).to_bytes(4, 'big') + lame
+    info_frame = FRAME_HEADER + b'\0' * 32 + tag + b'\0' * (FRAME_SIZE - 36 - len(tag))
+    data = info_frame + mp3_bytes(10)
+
+    assert mp3_frames.encoder_padding(data, next(mp3_frames.iter_frames(data))) == (576, 1152)
+    assert mp3_frames.playing_duration(data) == pytest.approx((10 * 1152 - 576 - 1152) / 44100)
+    assert mp3_frames.playing_duration(mp3_bytes(10)) == pytest.approx(10 * FRAME_SECONDS)
+
+
+def test_generate_speech_writes_alignment_from_chunk_frames(tmp_path):
+    """Test that every chunk's text range is paired with its audio start and duration."""
+    text = "First sentence here. Second one. Third and last sentence."
+    plan = plan_chunks(text, max_chars=24)
+    alignment_path = tmp_path / 'speech.align.json'
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk), \
+         patch('generator.stitch_audio_files', side_effect=fake_stitch):
+        assert generate_speech(text, str(tmp_path / 'speech.mp3'), plan=plan, client=object(),
+                               alignment_path=str(alignment_path))
+
+    index = read_alignment(alignment_path.read_bytes())
+    assert [segment[:2] for segment in index.segments] == [tuple(boundary) for boundary in plan.boundaries]
+    elapsed = 0.0
+    for start, end, audio_start, duration in index.segments:
+        assert audio_start == pytest.approx(elapsed, abs=0.002)
+        assert duration == pytest.approx((end - start) * FRAME_SECONDS, abs=0.001)
+        elapsed += duration
+    assert index.text_length == len(text)
+
+
+def test_api_alignment(client):
+    """Test the alignment API and that the index is stored and deleted with the audio."""
+    text = "Long enough to need several chunks. " * 200
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk), \
+         patch('generator.stitch_audio_files', side_effect=fake_stitch):
+        data = client.post('/api/generate', json={'text': text}).get_json()
+    filename = data['filename']
+
+    full = client.get(f'/api/alignment/{filename}')
+    assert full.status_code == 200 and 'immutable' in full.headers['Cache-Control']
+    index = full.get_json()
+    assert len(index['segments']) == plan_chunks(text).num_chunks
+    assert index['duration'] == pytest.approx(sum(segment[3] for segment in index['segments']), abs=0.01)
+
+    second_start, _, second_audio_start, _ = index['segments'][1]
+    lookup = client.get(f'/api/alignment/{filename}?offset={second_start}').get_json()
+    assert lookup == {'offset': second_start, 'time': second_audio_start, 'segment': 1}
+    lookup = client.get(f'/api/alignment/{filename}?time={second_audio_start + 0.001}').get_json()
+    assert lookup['segment'] == 1 and lookup['offset'] >= second_start
+    assert client.get(f'/api/alignment/{filename}?time=soon').status_code == 400
+    assert client.get('/api/alignment/missing.mp3').status_code == 404
+
+    result_page = client.get(f"/result?filename={filename}&text_id={data['text_id']}").data.decode('utf-8')
+    assert f'data-alignment-url="/api/alignment/{filename}"' in result_page
+
+    client.get(f'/delete/{filename}')
+    assert not [name for name in os.listdir(app.config['UPLOAD_FOLDER']) if name.startswith(data['file_id'])]
@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+from app import app, create_app, warm_up
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def fresh_folder(tmp_path):
+    """Point the app at a folder that does not exist yet."""
+    output_dir = tmp_path / 'output'
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'HISTORY_INDEX_FILE', 'WARM_UP')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+    )
+    yield output_dir
+    app.config.update(original_config)
+
+
+def test_import_has_no_side_effects():
+    """Test that importing app.py creates no folders or files, no client and needs no API key."""
+    script = (
+        "import json, os\n"
+        "created = []\n"
+        "makedirs = os.makedirs\n"
+        "os.makedirs = lambda path, *args, **kwargs: (created.append(str(path)), makedirs(path, *args, **kwargs))\n"
+        "import app\n"
+        "print(json.dumps({'created': created, 'client': app.client._client is not None,\n"
+        "                  'handler': getattr(app.app, '_log_handler', None) is not None}))\n"
+    )
+    env = {key: value for key, value in os.environ.items() if key != 'OPENAI_API_KEY'}
+    output = subprocess.run([sys.executable, '-c', script], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == {'created': [], 'client': False, 'handler': False}
+
+
+def test_create_app_prepares_and_warms_up(fresh_folder):
+    """Test that the factory creates the output folder, warms caches and configures logging once."""
+    assert create_app({'WARM_UP': True}) is app
+    assert json.loads((fresh_folder / 'history.json').read_text()) == []
+    assert (fresh_folder / 'history_index.sqlite3').exists()
+    assert 'index.html' in {template.name for template in app.jinja_env.cache.values()}
+
+    handlers = list(app.logger.handlers)
+    create_app({'WARM_UP': False})
+    assert app.logger.handlers == handlers
+
+
+def test_warm_up_reports_step_timings(fresh_folder):
+    """Test that warm_up returns how long every step took."""
+    timings = warm_up()
+    assert set(timings) == {'output_folder', 'templates', 'storage', 'history_index', 'voice_samples'}
+    assert all(seconds >= 0 for seconds in timings.values())
+
+
+def test_warm_up_needs_no_api_key(fresh_folder, monkeypatch):
+    """Test that warming up leaves the OpenAI client to the first request, so no API key is needed."""
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    app_module.client.reset()
+    create_app({'WARM_UP': True})
+    assert app_module.client._client is None
+
+
+def test_first_request_creates_missing_output_folder(fresh_folder):
+    """Test that a worker that skipped the factory still gets its folder on the first request."""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        assert client.get('/history').status_code == 200
+    assert (fresh_folder / 'history.json').exists()
+
+
+def test_openai_client_is_created_lazily_and_can_be_reset():
+    """Test that the client proxy builds the real client on first use and drops it on reset (as forked workers do)."""
+    proxy = app_module.LazyOpenAIClient()
+    assert proxy._client is None
+    assert proxy.audio is proxy.get().audio
+    proxy.reset()
+    assert proxy._client is None
@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip('starlette')
+pytest.importorskip('a2wsgi')
+from starlette.testclient import TestClient
+
+import asgi
+from app import app
+from generator import generate_speech_async, iter_speech_async, plan_chunks
+
+
+class FakeStreamingResponse:
+    """Stands in for the AsyncOpenAI streamed speech response."""
+
+    def __init__(self, audio):
+        self.audio = audio
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def stream_to_file(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.audio)
+
+    async def read(self):
+        return self.audio
+
+
+class FakeAsyncSpeech:
+    """Records calls and how many requests were in flight at the same time."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.inputs = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def create(self, model, voice, input):
+        self.inputs.append(input)
+        speech = self
+
+        class Context(FakeStreamingResponse):
+            async def __aenter__(self):
+                speech.in_flight += 1
+                speech.max_in_flight = max(speech.max_in_flight, speech.in_flight)
+                await asyncio.sleep(speech.delay)
+                speech.in_flight -= 1
+                return self
+
+        return Context(f"[{input[:10]}]".encode())
+
+
+class FakeAsyncClient:
+    """Minimal AsyncOpenAI stand-in exposing audio.speech.with_streaming_response.create."""
+
+    def __init__(self, delay=0.01):
+        self.speech = FakeAsyncSpeech(delay)
+        self.audio = SimpleNamespace(speech=SimpleNamespace(with_streaming_response=self.speech))
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create an ASGI test client whose output lives in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    history_file = output_dir / 'history.json'
+    history_file.write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE',
+            'PDF_CACHE_FOLDER', 'DOCUMENTS_FOLDER')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        PDF_CACHE_FOLDER=str(output_dir / 'pdf_cache'),
+        DOCUMENTS_FOLDER=str(output_dir / 'documents'),
+    )
+    fake_client = FakeAsyncClient()
+    with patch('asgi.get_async_client', return_value=fake_client), TestClient(asgi.application) as test_client:
+        test_client.fake = fake_client
+        yield test_client
+    app.config.update(original_config)
+
+
+def test_generate_speech_async_limits_concurrency(tmp_path):
+    """Test that chunks run concurrently up to the limit and are stitched in order."""
+    text = "abcdefghij" * 6
+    plan = plan_chunks(text, max_chars=10)
+    fake = FakeAsyncClient()
+    stitched = []
+
+    def fake_stitch(files, output_path):
+        stitched.extend(open(path, 'rb').read() for path in files)
+        return True
+
+    with patch('generator.stitch_audio_files', side_effect=fake_stitch):
+        asyncio.run(generate_speech_async(text, str(tmp_path / 'out.mp3'), client=fake, plan=plan, max_concurrency=3))
+
+    assert fake.speech.max_in_flight == 3
+    assert stitched == [b"[abcdefghij]"] * 6
+
+
+def test_iter_speech_async_yields_chunks_in_order():
+    """Test that streamed audio keeps chunk order even when fetched concurrently."""
+    text = "one two three four five six"
+    plan = plan_chunks(text, max_chars=5)
+
+    async def collect():
+        return [piece async for piece in iter_speech_async(text, client=FakeAsyncClient(), plan=plan)]
+
+    assert asyncio.run(collect()) == [f"[{chunk}]".encode() for chunk in plan.chunk_texts(text)]
+
+
+def test_async_generate_stores_audio_and_history(client):
+    """Test the async /api/generate route end to end with a fake upstream."""
+    response = client.post('/api/generate', json={'text': 'Async hello', 'voice': 'nova'})
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data['success'] is True
+    assert data['url'].endswith(f"/get-audio/{data['filename']}")
+
+    history = client.get('/api/history').json()
+    assert [item['filename'] for item in history] == [data['filename']]
+    assert history[0]['voice'] == 'nova'
+
+    audio = client.get(f"/get-audio/{data['filename']}", headers={'Range': 'bytes=0-3'})
+    assert audio.status_code == 206
+    assert audio.content == b"[Asy"
+
+
+def test_async_generate_validates_input(client):
+    """Test error responses of the async generation route."""
+    assert client.post('/api/generate', json={}).status_code == 400
+    assert client.post('/api/generate', json={'document_id': 'f' * 64}).status_code == 404
+    assert client.post('/api/generate', content=b'text', headers={'Content-Type': 'text/plain'}).status_code == 415
+
+
+def test_async_routes_refuse_cross_site_and_oversized_bodies(client):
+    """Test that only JSON and raw PDF bodies are read, and never past MAX_CONTENT_LENGTH."""
+    for path in ('/api/generate', '/api/generate-stream', '/api/preview-cost'):
+        response = client.post(path, content=b'{"text": "hi"}', headers={'Content-Type': 'text/plain'})
+        assert response.status_code == 415
+        assert client.post(path, data={'text': 'hi'}).status_code == 415
+    assert client.post('/api/preview-cost', content=b'{', headers={'Content-Type': 'application/json'}).status_code == 400
+
+    original_limit = app.config['MAX_CONTENT_LENGTH']
+    app.config['MAX_CONTENT_LENGTH'] = 100
+    try:
+        assert client.post('/api/preview-cost', json={'text': 'x' * 200}).status_code == 413
+        response = client.post('/api/generate', content=b'%PDF-' + b'0' * 200,
+                               headers={'Content-Type': 'application/pdf'})
+        assert response.status_code == 413
+        assert client.post('/api/preview-cost', json={'text': 'x' * 50}).status_code == 200
+    finally:
+        app.config['MAX_CONTENT_LENGTH'] = original_limit
+
+
+def test_generate_stream_returns_audio_pieces(client):
+    """Test that the streaming route returns the audio of every chunk."""
+    text = "Stream me. " * 400
+    response = client.post('/api/generate-stream', json={'text': text})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'audio/mpeg'
+    assert int(response.headers['x-chunk-count']) == plan_chunks(text).num_chunks
+    assert response.content.count(b"[Stream me") == plan_chunks(text).num_chunks
+
+
+def test_generation_routes_shed_load_and_release_capacity(client):
+    """Test that the async routes return 429 when the node is full and free their work when done."""
+    admission = asgi.get_admission_controller('api_generate_stream')
+    ticket = admission.acquire(app.config['ADMISSION_HARD_CHARS'], 1)
+    for path in ('/api/generate', '/api/generate-stream'):
+        response = client.post(path, json={'text': 'Busy. ' * 10})
+        assert response.status_code == 429
+        assert int(response.headers['retry-after']) >= 1
+    admission.release(ticket)
+
+    assert client.post('/api/generate-stream', json={'text': 'Free. ' * 10}).status_code == 200
+    with open(admission.ledger_path) as f:
+        assert json.load(f) == {}
+
+
+def test_preview_cost_and_flask_ui_are_served(client):
+    """Test the async preview route and that the Flask UI still answers through the adapter."""
+    data = client.post('/api/preview-cost', json={'text': 'x' * 5000, 'model': 'tts-1-hd'}).json()
+    assert data['num_chunks'] == 2
+    assert data['estimated_cost'] == 5000 * 0.000030
+
+    page = client.get('/')
+    assert page.status_code == 200
+    assert b'<form' in page.content
+
+    document = client.post('/api/documents', json={'text': 'Through Flask'})
+    assert document.status_code == 201
+    assert json.loads(document.content)['text_length'] == len('Through Flask')
@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import threading
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, prune_batch_manifests, get_batch_runner
+from batch import BatchStore, BatchRunner, DONE, FAILED, RUNNING, ABANDONED_ERROR
+from text_store import TextStore
+
+FRAME = b'\xff\xfb\x90\x00' + b'\x01' * 413  # One MPEG-1 Layer III frame
+
+
+def fake_stitch(chunk_files, output_file_path, peaks_path=None):
+    with open(output_file_path, 'wb') as out:
+        for path in chunk_files:
+            with open(path, 'rb') as f:
+                out.write(f.read())
+            os.remove(path)
+    return True
+
+
+class FakeSynthesis:
+    """Stands in for the TTS API: records concurrency and fails chunks containing FAIL while failing is set."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.calls = 0
+        self.failing = True
+
+    def __call__(self, client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+        with self.lock:
+            self.running += 1
+            self.calls += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(0.02)
+            if self.failing and 'FAIL' in chunk_text:
+                raise Exception("Upstream error")
+            with open(output_file_path, 'wb') as f:
+                f.write(FRAME)
+            return True
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client with output in a temporary directory and two shared chunk workers."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / 'history.json').write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'CHUNK_CACHE_FOLDER',
+            'BATCH_FOLDER', 'BATCH_CHUNK_WORKERS')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        CHUNK_CACHE_FOLDER=str(output_dir / 'chunk_cache'),
+        BATCH_FOLDER=str(output_dir / 'batches'),
+        BATCH_CHUNK_WORKERS=2,
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+@pytest.fixture
+def synthesis():
+    fake = FakeSynthesis()
+    with patch('generator.generate_speech_for_chunk', side_effect=fake), \
+         patch('generator.stitch_audio_files', side_effect=fake_stitch):
+        yield fake
+
+
+def wait_for_batch(client, status_url, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        manifest = client.get(status_url).get_json()
+        if manifest['status'] != 'running':
+            return manifest
+        time.sleep(0.05)
+    raise AssertionError("Batch did not finish")
+
+
+def test_batch_runs_items_through_shared_chunk_budget(client, synthesis):
+    """Test that all items finish with URLs and timings, and chunks never exceed the shared budget."""
+    long_text = "A sentence of the long item. " * 300
+    items = [{'text': long_text}, {'text': long_text.upper(), 'voice': 'nova'},
+             {'text': 'Short item.', 'format': 'opus', 'bitrate': '24k'}]
+    response = client.post('/api/generate-batch', json={'items': items})
+    assert response.status_code == 202
+    status_url = response.headers['Location']
+
+    manifest = wait_for_batch(client, status_url)
+    assert manifest['status'] == DONE and manifest['counts'][DONE] == 3
+    assert synthesis.max_running == 2
+    for item in manifest['items']:
+        assert item['filename'] and item['elapsed_seconds'] is not None and item['attempts'] == 1
+        assert 'input' not in item
+    assert manifest['items'][1]['voice'] == 'nova'
+    assert 'format=opus' in manifest['items'][2]['url'] and 'bitrate=24k' in manifest['items'][2]['url']
+    assert client.get(f"/get-audio/{manifest['items'][0]['filename']}").status_code == 200
+
+
+def test_failed_item_can_be_retried_alone(client, synthesis):
+    """Test that a failing item is reported and can be retried without rerunning the others."""
+    items = [{'text': 'First good item.'}, {'text': 'This one will FAIL.'}, {'text': 'Third good item.'}]
+    response = client.post('/api/generate-batch', json={'items': items})
+    manifest = wait_for_batch(client, response.headers['Location'])
+    assert manifest['status'] == FAILED
+    failed = manifest['items'][1]
+    assert failed['status'] == FAILED and 'Upstream error' in failed['error']
+    assert manifest['counts'][DONE] == 2
+
+    calls_before = synthesis.calls
+    synthesis.failing = False
+    assert 'retry_url' not in manifest['items'][0]
+    assert client.post(f"/api/batches/{manifest['batch_id']}/items/0/retry").status_code == 409
+    assert client.post(failed['retry_url']).status_code == 202
+    manifest = wait_for_batch(client, response.headers['Location'])
+    assert manifest['status'] == DONE
+    assert manifest['items'][1]['attempts'] == 2
+    assert synthesis.calls == calls_before + 1
+
+
+def test_invalid_batches_are_rejected(client, synthesis):
+    """Test validation of the batch and its items."""
+    assert client.post('/api/generate-batch', json={'items': []}).status_code == 400
+    response = client.post('/api/generate-batch', json={'items': [{'text': 'ok'}, {'text': ''},
+                                                                  {'text': 'x', 'format': 'wav'}]})
+    assert response.status_code == 400
+    assert [error['index'] for error in response.get_json()['items']] == [1, 2]
+    assert client.get('/api/batches/unknown-batch-id-0000').status_code == 404
+    assert client.get('/api/batches/bad!').status_code == 400
+
+
+def test_runner_records_results(tmp_path):
+    """Test the manifest lifecycle of BatchRunner on its own, and pruning of old manifests."""
+    store = BatchStore(str(tmp_path))
+    runner = BatchRunner(store, lambda item_input: {'filename': item_input['name']}, item_workers=1)
+    manifest = store.create([{'name': 'a.mp3'}, {'name': 'b.mp3'}])
+    for future in runner.submit_batch(manifest):
+        assert future.result()
+    manifest = store.load(manifest['batch_id'])
+    assert [item['filename'] for item in manifest['items']] == ['a.mp3', 'b.mp3']
+    assert manifest['status'] == DONE and manifest['finished_at']
+
+    path = store.path_for(manifest['batch_id'])
+    os.utime(path, (1, 1))
+    removed = []
+    assert store.prune(ttl=3600, on_remove=removed.append) > 0
+    assert store.load(manifest['batch_id']) is None
+    assert [removed_manifest['batch_id'] for removed_manifest in removed] == [manifest['batch_id']]
+
+
+def test_items_of_dead_workers_fail_and_can_be_retried(tmp_path):
+    """Test that items left queued or running by a crashed worker are reported as failed and run again on retry."""
+    store = BatchStore(str(tmp_path))
+    runner = BatchRunner(store, lambda item_input: {'filename': item_input['name']}, item_workers=1)
+    manifest = store.create([{'name': 'a.mp3'}, {'name': 'b.mp3'}, {'name': 'c.mp3'}])
+    batch_id = manifest['batch_id']
+    store.update_item(batch_id, 0, status=RUNNING, pid=2 ** 22 + 1)
+    store.update_item(batch_id, 1, queued_at='2000-01-01T00:00:00')
+
+    manifest = store.load(batch_id)
+    assert [item['status'] for item in manifest['items']] == [FAILED, FAILED, 'queued']
+    assert manifest['items'][0]['error'] == ABANDONED_ERROR
+    assert store.load(batch_id)['counts'][FAILED] == 2
+
+    assert runner.retry(batch_id, 0).result()
+    assert store.load(batch_id)['items'][0]['status'] == DONE
+
+
+def test_pruned_batch_releases_its_texts(client, synthesis):
+    """Test that pruning a batch manifest deletes the item texts only it was holding."""
+    response = client.post('/api/generate-batch', json={'items': [{'text': 'Batch only text.'}]})
+    manifest = wait_for_batch(client, response.headers['Location'])
+    text_id = BatchStore(app.config['BATCH_FOLDER']).load(manifest['batch_id'])['items'][0]['input']['text_id']
+    store = TextStore(app.config['TEXT_STORE_FOLDER'])
+    assert 'batch-' + manifest['batch_id'] in store.holders(text_id)
+
+    os.utime(BatchStore(app.config['BATCH_FOLDER']).path_for(manifest['batch_id']), (1, 1))
+    prune_batch_manifests()
+    assert store.holders(text_id) == ['history']
+    assert store.get(text_id) == 'Batch only text.'
+
+
+def test_missing_manifest_or_text_fails_the_item(client, synthesis, tmp_path):
+    """Test that a removed manifest or stored text ends an item quietly instead of raising in the worker."""
+    store = BatchStore(str(tmp_path / 'batches'))
+    runner = BatchRunner(store, lambda item_input: {}, item_workers=1)
+    manifest = store.create([{'name': 'a.mp3'}])
+    os.remove(store.path_for(manifest['batch_id']))
+    assert runner.submit_batch(manifest)[0].result() is False
+    assert store.update_item(manifest['batch_id'], 0, status=DONE) is None
+
+    response = client.post('/api/generate-batch', json={'items': [{'text': 'This one will FAIL.'}]})
+    manifest = wait_for_batch(client, response.headers['Location'])
+    failed = manifest['items'][0]
+    text_id = BatchStore(app.config['BATCH_FOLDER']).load(manifest['batch_id'])['items'][0]['input']['text_id']
+    TextStore(app.config['TEXT_STORE_FOLDER']).delete(text_id)
+    assert client.post(failed['retry_url']).status_code == 410
+
+    synthesis.failing = False
+    get_batch_runner().retry(manifest['batch_id'], 0).result()
+    item = wait_for_batch(client, response.headers['Location'])['items'][0]
+    assert item['status'] == FAILED and 'no longer stored' in item['error']
@@ -0,0 +1,99 @@
+import io
+import os
+import sys
+import threading
+import pytest
+from werkzeug.serving import make_server
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, client as openai_client
+from bench import FakeUpstream, run_load, run_replay, parse_weights, percentile, make_pdf, make_text
+from pdf_extract import extract_text
+from traces import read_trace
+
+
+@pytest.fixture
+def upstream():
+    server = FakeUpstream(latency=0.01, chars_per_second=1000000).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def server(tmp_path, upstream, monkeypatch):
+    """Serve the app over HTTP, backed by the fake upstream, recording a request trace."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / 'history.json').write_text('[]')
+
+    monkeypatch.setenv('OPENAI_BASE_URL', upstream.base_url)
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-bench')
+    openai_client.reset()
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'CHUNK_CACHE_FOLDER',
+            'SESSION_FILE', 'REQUEST_TRACE_FILE', 'WTF_CSRF_ENABLED')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=True,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        CHUNK_CACHE_FOLDER=str(output_dir / 'chunk_cache'),
+        SESSION_FILE=str(output_dir / 'sessions.sqlite3'),
+        REQUEST_TRACE_FILE=str(tmp_path / 'trace.jsonl'),
+    )
+    http_server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{http_server.server_port}"
+    http_server.shutdown()
+    app.config.update(original_config)
+    openai_client.reset()
+
+
+def test_helpers():
+    """Test weight parsing, percentiles and the synthetic inputs."""
+    assert parse_weights('300:2,5000:1', int) == {300: 2.0, 5000: 1.0}
+    assert parse_weights('preview=1,get_audio') == {'preview': 1.0, 'get_audio': 1.0}
+    with pytest.raises(ValueError):
+        parse_weights('preview=0')
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 99), percentile([], 50)) == (50, 99, None)
+
+    import random
+    text = make_text(4000, random.Random(1))
+    assert len(text) == 4000
+    assert extract_text(io.BytesIO(make_pdf(text))).startswith(text[:100])
+
+
+def test_load_reports_every_endpoint(server, upstream):
+    """Test a load run across all endpoints, including the CSRF-protected form and PDFs."""
+    report = run_load(server, users=3, requests=24, sizes='200:1,2000:1', pdf_ratio=0.3, seed=7)
+    endpoints = report['endpoints']
+    assert endpoints['all']['requests'] == 24
+    assert endpoints['all']['errors'] == 0, endpoints
+    assert set(endpoints) == {'index', 'api_generate', 'preview', 'get_audio', 'all'}
+    assert endpoints['all']['p50'] <= endpoints['all']['p99'] <= endpoints['all']['max']
+    assert upstream.requests > 0
+    assert report['server_metrics'] is not None
+
+
+def test_replay_follows_recorded_trace(server):
+    """Test that the app records a trace and that replaying it sends the same traffic."""
+    run_load(server, users=2, requests=10, mix='api_generate=1,preview=1,get_audio=1', sizes='500:1', seed=3)
+    records = read_trace(app.config['REQUEST_TRACE_FILE'])
+    # The requests, the audio generated up front for get_audio, and each user's page load for a CSRF token
+    assert len([record for record in records if record['endpoint'] != 'index']) == 11
+    assert [record['method'] for record in records if record['endpoint'] == 'index'] == ['GET'] * 3
+    assert all(record['status'] in (200, 206) for record in records)
+    assert all(record['text_length'] for record in records if record['endpoint'] in ('api_generate', 'preview'))
+
+    report = run_replay(server, app.config['REQUEST_TRACE_FILE'], speed=20, seed=3)
+    replayed = {name: row['requests'] for name, row in report['endpoints'].items() if name != 'all'}
+    recorded = {}
+    for record in records:
+        recorded[record['endpoint']] = recorded.get(record['endpoint'], 0) + 1
+    assert replayed == recorded
+    assert report['endpoints']['all']['errors'] == 0
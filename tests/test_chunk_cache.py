@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to sys.path to import the generator module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from chunk_cache import ChunkAudioCache
+from generator import generate_speech, plan_chunks
+from metrics import Metrics
+
+
+def fake_chunk(client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+    """Write placeholder audio derived from the chunk text."""
+    with open(output_file_path, 'wb') as f:
+        f.write(chunk_text.encode())
+    return True
+
+
+def test_repeated_chunks_are_synthesized_once(tmp_path):
+    """Test that a second generation of the same chunks is served from the cache."""
+    cache = ChunkAudioCache(str(tmp_path / 'cache'), metrics=Metrics())
+    text = "same words " * 3
+
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk) as mock_chunk:
+        generate_speech(text, str(tmp_path / 'first.mp3'), client=MagicMock(), chunk_cache=cache)
+        generate_speech(text, str(tmp_path / 'second.mp3'), client=MagicMock(), chunk_cache=cache)
+        generate_speech(text, str(tmp_path / 'third.mp3'), voice='nova', client=MagicMock(), chunk_cache=cache)
+
+    assert mock_chunk.call_count == 2  # The voice is part of the key
+    assert (tmp_path / 'second.mp3').read_bytes() == (tmp_path / 'first.mp3').read_bytes()
+    assert cache.metrics.get('chunk_cache_hits_total') == 1
+
+
+def test_multi_chunk_generation_uses_cache_per_chunk(tmp_path):
+    """Test that chunks shared between two texts are reused."""
+    cache = ChunkAudioCache(str(tmp_path / 'cache'), metrics=Metrics())
+    first = plan_chunks("aaaa bbbb", max_chars=4)
+    second = plan_chunks("aaaa cccc", max_chars=4)
+
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk) as mock_chunk, \
+         patch('generator.stitch_audio_files', return_value=True):
+        generate_speech("aaaa bbbb", str(tmp_path / 'a.mp3'), client=MagicMock(), plan=first, chunk_cache=cache)
+        generate_speech("aaaa cccc", str(tmp_path / 'b.mp3'), client=MagicMock(), plan=second, chunk_cache=cache)
+
+    assert [call.args[1] for call in mock_chunk.call_args_list] == ["aaaa", "bbbb", "cccc"]
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    """Test that pruning keeps recently read entries and removes stale temp files."""
+    cache = ChunkAudioCache(str(tmp_path / 'cache'), metrics=Metrics())
+    source = tmp_path / 'source.mp3'
+    source.write_bytes(b'x' * 100)
+    keys = [cache.key_for('tts-1', 'alloy', text) for text in ('old', 'new')]
+    for key in keys:
+        cache.put_from(key, str(source))
+    past = time.time() - 1000
+    os.utime(cache.path_for(keys[0]), (past, past))
+
+    stale_temp = os.path.join(os.path.dirname(cache.path_for(keys[1])), 'leftover.tmp')
+    with open(stale_temp, 'wb') as f:
+        f.write(b'y' * 10)
+    os.utime(stale_temp, (past - 5000, past - 5000))
+
+    assert cache.prune(150) == 110
+    assert not os.path.exists(cache.path_for(keys[0]))
+    assert os.path.exists(cache.path_for(keys[1]))
+    assert not os.path.exists(stale_temp)
@@ -0,0 +1,106 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to sys.path to import the generator module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import generator
+from generator import plan_chunks, compute_chunk_boundaries, split_text_into_chunks, generate_speech, calculate_cost
+from app import app
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client whose output lives in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    history_file = output_dir / 'history.json'
+    history_file.write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE',
+            'PDF_CACHE_FOLDER', 'DOCUMENTS_FOLDER')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        PDF_CACHE_FOLDER=str(output_dir / 'pdf_cache'),
+        DOCUMENTS_FOLDER=str(output_dir / 'documents'),
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def test_boundaries_prefer_sentences_then_words():
+    """Test that chunks end at sentence ends, then spaces, then hard limits."""
+    text = "One two. Three four five."
+    assert compute_chunk_boundaries(text, max_chars=12) == [(0, 8), (9, 19), (20, 25)]
+    assert compute_chunk_boundaries("abcdefghij", max_chars=4) == [(0, 4), (4, 8), (8, 10)]
+
+
+def test_boundaries_cover_text_and_respect_limit():
+    """Test that every chunk fits and only whitespace is left out between chunks."""
+    text = "".join(f"Sentence number {i} is here.  " for i in range(500))
+    boundaries = compute_chunk_boundaries(text, max_chars=300)
+
+    assert all(0 < end - start <= 300 for start, end in boundaries)
+    previous_end = 0
+    for start, end in boundaries:
+        assert text[previous_end:start].strip() == ''
+        previous_end = end
+    assert text[previous_end:].strip() == ''
+
+
+def test_plan_is_cached_by_text_hash():
+    """Test that the same text reuses one plan and reports cost and duration."""
+    text = "Plan me once. " * 400
+    plan = plan_chunks(text)
+
+    assert plan_chunks(text) is plan
+    assert plan.text_length == len(text)
+    assert plan.num_chunks == len(split_text_into_chunks(text))
+    assert plan.cost('tts-1-hd') == calculate_cost(len(text), 'tts-1-hd')
+    assert plan.estimated_duration == sum(plan.char_counts) / generator.CHARS_PER_SECOND
+    assert plan.to_dict('tts-1')['chunk_lengths'] == plan.char_counts
+
+
+def test_generate_speech_uses_given_plan():
+    """Test that a precomputed plan is used instead of splitting the text again."""
+    text = "a" * 10
+    plan = plan_chunks(text, max_chars=4)
+
+    with patch('generator.split_text_into_chunks') as mock_split, \
+         patch('generator.generate_speech_for_chunk', return_value=True) as mock_chunk, \
+         patch('generator.stitch_audio_files', return_value=True):
+        assert generate_speech(text, 'out.mp3', client=MagicMock(), plan=plan)
+
+    mock_split.assert_not_called()
+    assert [call.args[1] for call in mock_chunk.call_args_list] == ["aaaa", "aaaa", "aa"]
+
+
+def test_preview_and_generation_share_the_plan(client):
+    """Test that /preview reports the chunks that generation then sends."""
+    text = "Shared plan sentence. " * 400
+    preview = client.post('/preview', data={'text': text, 'model': 'tts-1'}).get_json()
+
+    seen_plans = []
+
+    def fake_generate_speech(text, output_path, **kwargs):
+        seen_plans.append(kwargs['plan'])
+        with open(output_path, 'wb') as f:
+            f.write(b'ID3')
+        return True
+
+    with patch('app.generate_speech', side_effect=fake_generate_speech):
+        response = client.post('/', data={'text': text, 'voice': 'alloy', 'model': 'tts-1'})
+
+    assert response.status_code == 302
+    assert seen_plans[0].char_counts == preview['chunk_lengths']
+    assert preview['num_chunks'] == seen_plans[0].num_chunks
+    assert 'num_chunks=%d' % preview['num_chunks'] in response.headers['Location']
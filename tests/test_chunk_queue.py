@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import time
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to sys.path to import the generator module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from chunk_queue import ChunkQueue, ChunkJobError, StorageChunkStore
+from generator import generate_speech, plan_chunks
+from metrics import Metrics
+from storage import LocalStorage
+
+
+def fake_chunk(client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+    """Write placeholder audio derived from the chunk text."""
+    with open(output_file_path, 'wb') as f:
+        f.write(f"[{chunk_text}]".encode())
+    return True
+
+
+def fake_stitch(chunk_files, output_file_path):
+    """Concatenate chunk files in order, like stitch_audio_files does with audio."""
+    with open(output_file_path, 'wb') as out:
+        for path in chunk_files:
+            with open(path, 'rb') as f:
+                out.write(f.read())
+            os.remove(path)
+    return True
+
+
+@pytest.fixture
+def queue(tmp_path):
+    """A queue on an in-process Redis stand-in, with chunk audio in a local 'shared' folder."""
+    store = StorageChunkStore(LocalStorage(str(tmp_path / 'shared')))
+    return ChunkQueue(fakeredis.FakeRedis(), store, visibility_timeout=60, metrics=Metrics())
+
+
+@pytest.fixture
+def workers(queue):
+    """Run two worker threads (standing in for worker nodes) for the duration of a test."""
+    stop_event = threading.Event()
+    threads = [threading.Thread(target=queue.work, args=(MagicMock(), None, stop_event)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    yield
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_distributed_generation_stitches_chunks_in_order(queue, workers, tmp_path):
+    """Test that chunks synthesized by queue workers are stitched in document order."""
+    text = " ".join(f"part{i}" for i in range(12))
+    plan = plan_chunks(text, max_chars=12)
+    output_path = str(tmp_path / 'speech.mp3')
+
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk), \
+         patch('generator.stitch_audio_files', side_effect=fake_stitch):
+        assert generate_speech(text, output_path, plan=plan, chunk_queue=queue)
+
+    expected = "".join(f"[{chunk}]" for chunk in plan.chunk_texts(text))
+    with open(output_path) as f:
+        assert f.read() == expected
+    assert queue.metrics.get('chunk_queue_processed_total') == plan.num_chunks
+    # Chunk objects are removed from shared storage once stitched
+    assert os.listdir(tmp_path / 'shared') == []
+
+
+def test_crashed_worker_task_is_delivered_again(queue, tmp_path):
+    """Test that a task claimed by a worker that never finishes returns to the queue."""
+    queue.redis.lpush(queue._key('pending'), json.dumps({'job': 'j1', 'index': 0, 'text': 'hello',
+                                                         'model': 'tts-1', 'voice': 'alloy', 'attempt': 0}))
+    raw = queue.claim(timeout=1)
+    assert raw is not None
+
+    assert queue.requeue_expired() == 0  # Still within the visibility timeout
+    assert queue.requeue_expired(now=time.time() + 61) == 1
+    assert queue.redis.llen(queue._key('processing')) == 0
+
+    # Another worker picks it up and the result reaches the coordinator's list
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk):
+        queue.process(queue.claim(timeout=1), MagicMock())
+    result = json.loads(queue.redis.lpop(queue._key('job', 'j1', 'results')))
+    assert result == {'index': 0, 'name': StorageChunkStore.name_for('j1', 0)}
+    assert queue.metrics.get('chunk_queue_redelivered_total') == 1
+
+
+def test_claim_without_deadline_gets_one(queue):
+    """Test that a task left in processing without a deadline is given one instead of being lost."""
+    raw = json.dumps({'job': 'j2', 'index': 0, 'text': 'x', 'model': 'tts-1', 'voice': 'alloy', 'attempt': 0})
+    queue.redis.lpush(queue._key('processing'), raw)
+
+    now = time.time()
+    assert queue.requeue_expired(now=now) == 0
+    assert queue.redis.zscore(queue._key('deadlines'), raw) == pytest.approx(now + 60)
+    assert queue.requeue_expired(now=now + 61) == 1
+
+
+def test_failing_chunk_is_retried_then_fails_the_job(queue, workers, tmp_path):
+    """Test that a chunk failing on every attempt fails the job and the rest of it is skipped."""
+    def failing_chunk(client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+        if chunk_text == 'bad':
+            raise ValueError("upstream rejected the input")
+        return fake_chunk(client, chunk_text, output_file_path)
+
+    with patch('generator.generate_speech_for_chunk', side_effect=failing_chunk):
+        with pytest.raises(ChunkJobError, match="upstream rejected"):
+            queue.run_job(['good', 'bad'], 'tts-1', 'alloy', timeout=10)
+
+    assert queue.metrics.get('chunk_queue_retries_total') == queue.max_attempts - 1
@@ -0,0 +1,167 @@
+import io
+import os
+import sys
+import json
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, apply_text_edits, document_metadata_path, prune_documents, get_document_text
+from tests.pdf_helpers import make_text_pdf
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client whose output lives in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    history_file = output_dir / 'history.json'
+    history_file.write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE',
+            'PDF_CACHE_FOLDER', 'DOCUMENTS_FOLDER')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        PDF_CACHE_FOLDER=str(output_dir / 'pdf_cache'),
+        DOCUMENTS_FOLDER=str(output_dir / 'documents'),
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def fake_generate_speech(text, output_path, **kwargs):
+    """Write a placeholder audio file instead of calling the API."""
+    with open(output_path, 'wb') as f:
+        f.write(b'ID3')
+    return True
+
+
+def test_apply_text_edits():
+    """Test applying offset/delete/insert edits in order."""
+    assert apply_text_edits("hello world", [{'offset': 6, 'delete': 0, 'insert': 'brave '}]) == "hello brave world"
+    assert apply_text_edits("abc", json.dumps([{'offset': 1, 'delete': 1, 'insert': 'X'},
+                                               {'offset': 3, 'delete': 0, 'insert': '!'}])) == "aXc!"
+    assert apply_text_edits("abc", None) == "abc"
+    for edits in ([{'offset': 2, 'delete': 5}], [1], {'offset': 0}, [{'offset': 0, 'insert': 5}],
+                  [{'offset': '1'}], [{'offset': 0, 'delete': True}], '{"offset": 0}'):
+        with pytest.raises(ValueError):
+            apply_text_edits("abc", edits)
+
+
+def test_create_text_document_returns_plan_and_cost(client):
+    """Test that a text upload returns an id with its precomputed preview."""
+    text = "x" * 9000
+    response = client.post('/api/documents', json={'text': text, 'model': 'tts-1-hd'})
+
+    assert response.status_code == 201
+    data = response.get_json()
+    assert len(data['document_id']) == 64
+    assert data['text_length'] == 9000
+    assert data['num_chunks'] == len(data['chunk_lengths'])
+    assert sum(data['chunk_lengths']) == 9000
+    assert data['cost'] == pytest.approx(9000 * 0.000030)
+
+    # The metadata can be fetched again without re-uploading
+    again = client.get(f"/api/documents/{data['document_id']}?model=tts-1-hd").get_json()
+    assert again['text_length'] == 9000
+    assert again['cost'] == data['cost']
+
+
+def test_preview_with_document_id_and_edits(client):
+    """Test that /preview accepts a document id plus a small edit instead of the full text."""
+    text = "word " * 10000
+    document_id = client.post('/api/documents', json={'text': text}).get_json()['document_id']
+
+    response = client.post('/preview', data={
+        'document_id': document_id,
+        'model': 'tts-1',
+        'edits': json.dumps([{'offset': len(text), 'delete': 0, 'insert': 'more'}]),
+    })
+    data = response.get_json()
+    assert data['text_length'] == len(text) + 4
+    assert data['cost'] == pytest.approx((len(text) + 4) * 0.000015)
+
+
+def test_preview_rejects_unknown_document_and_bad_edits(client):
+    """Test error responses for stale ids and out-of-range edits."""
+    response = client.post('/preview', data={'document_id': '0' * 64, 'model': 'tts-1'})
+    assert response.status_code == 404
+
+    document_id = client.post('/api/documents', json={'text': 'abc'}).get_json()['document_id']
+    response = client.post('/preview', data={
+        'document_id': document_id,
+        'edits': json.dumps([{'offset': 10, 'delete': 1, 'insert': ''}]),
+    })
+    assert response.status_code == 400
+
+    # Malformed edits are client errors too, on every route that takes them
+    for edits in ([1], [{'offset': 0, 'insert': 5}]):
+        response = client.post('/preview', data={'document_id': document_id, 'edits': json.dumps(edits)})
+        assert response.status_code == 400
+        response = client.post('/api/generate-batch', json={'items': [{'document_id': document_id, 'edits': edits}]})
+        assert response.status_code == 400
+
+
+def test_unused_documents_are_pruned(client):
+    """Test that documents unused for DOCUMENT_TTL are removed, and documents in use are kept."""
+    old_id = client.post('/api/documents', json={'text': 'Old document'}).get_json()['document_id']
+    used_id = client.post('/api/documents', json={'text': 'Used document'}).get_json()['document_id']
+    for document_id in (old_id, used_id):
+        os.utime(document_metadata_path(document_id), (1, 1))
+    client.post('/preview', data={'document_id': used_id, 'model': 'tts-1'})
+
+    assert prune_documents() > 0
+    assert client.post('/preview', data={'document_id': old_id, 'model': 'tts-1'}).status_code == 404
+    assert get_document_text(old_id) is None
+    assert client.post('/preview', data={'document_id': used_id, 'model': 'tts-1'}).status_code == 200
+
+
+def test_pdf_document_is_parsed_once_for_preview_and_generation(client):
+    """Test that a PDF uploaded as a document is reused by preview, the API and the form."""
+    pdf_bytes = make_text_pdf(["First page", "Second page"])
+    response = client.post('/api/documents', data={
+        'pdf_file': (io.BytesIO(pdf_bytes), 'report.pdf'),
+        'model': 'tts-1',
+    }, content_type='multipart/form-data')
+    data = response.get_json()
+    assert data['source_type'] == 'PDF'
+    document_id = data['document_id']
+
+    with patch('app.extract_text_from_pdf') as mock_extract, \
+         patch('app.generate_speech', side_effect=fake_generate_speech):
+        preview = client.post('/preview', data={'document_id': document_id, 'model': 'tts-1-hd'}).get_json()
+        assert preview['text_length'] == len("First page\n\nSecond page")
+
+        generated = client.post('/api/generate', json={'document_id': document_id, 'voice': 'nova'}).get_json()
+        assert generated['success'] is True
+        assert generated['source_type'] == 'PDF'
+        assert generated['original_filename'] == 'report.pdf'
+
+        form_response = client.post('/', data={
+            'text': '',
+            'voice': 'alloy',
+            'model': 'tts-1',
+            'pdf_document_id': document_id,
+        })
+        assert form_response.status_code == 302
+
+    mock_extract.assert_not_called()
+
+    with open(app.config['HISTORY_FILE']) as f:
+        history = json.load(f)
+    assert [item['original_filename'] for item in history] == ['report.pdf', 'report.pdf']
+
+
+def test_generate_with_unknown_document(client):
+    """Test that generation with an unknown document id fails cleanly."""
+    response = client.post('/api/generate', json={'document_id': 'f' * 64})
+    assert response.status_code == 404
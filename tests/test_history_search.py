@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import pytest
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, save_to_history
+from history_index import HistoryIndex, build_match_query
+
+
+@pytest.fixture
+def index(tmp_path):
+    """Create an empty history index in a temporary directory."""
+    return HistoryIndex(str(tmp_path / 'index.sqlite3'))
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client whose history lives in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    history_file = output_dir / 'history.json'
+    history_file.write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def make_entry(filename, **kwargs):
+    """Build a minimal history entry."""
+    entry = {
+        'filename': filename,
+        'timestamp': '2024-01-01T12:00:00',
+        'voice': 'alloy',
+        'model': 'tts-1',
+        'source_type': 'Text',
+        'original_filename': 'Direct text input',
+    }
+    entry.update(kwargs)
+    return entry
+
+
+def test_build_match_query_is_safe():
+    """Test that FTS5 syntax in user input is neutralised."""
+    assert build_match_query('contract "week') == '"contract" AND "week"*'
+    assert build_match_query('NEAR(a b) OR *') == '"NEAR" AND "a" AND "b" AND "OR"*'
+    assert build_match_query('  ;-- ') is None
+
+
+def test_search_ranks_and_paginates(index):
+    """Test that better matches come first and pages do not overlap."""
+    index.add(make_entry('a.mp3'), "The supplier contract was signed last week.")
+    index.add(make_entry('b.mp3'), "Contract, contract, contract: a contract about contracts.")
+    index.add(make_entry('c.mp3'), "Nothing relevant here at all.")
+
+    total, results = index.search('contract')
+    assert total == 2
+    assert [r['filename'] for r in results] == ['b.mp3', 'a.mp3']
+    assert '<mark>' in results[0]['snippet']
+
+    total, first_page = index.search('contract', page=1, per_page=1)
+    _, second_page = index.search('contract', page=2, per_page=1)
+    assert total == 2
+    assert first_page[0]['filename'] != second_page[0]['filename']
+
+
+def test_search_matches_original_filename_and_prefix(index):
+    """Test that PDF names are searchable and the last word matches as a prefix."""
+    index.add(make_entry('a.mp3', source_type='PDF', original_filename='Quarterly_Report.pdf'), "Revenue grew.")
+
+    assert index.search('quarterly')[0] == 1
+    assert index.search('revenu')[0] == 1
+
+
+def test_remove_and_replace_entries(index):
+    """Test that the index is updated incrementally."""
+    index.add(make_entry('a.mp3'), "first version")
+    index.add(make_entry('a.mp3'), "second version")
+    assert index.search('first')[0] == 0
+    assert index.search('second')[0] == 1
+
+    index.remove('a.mp3')
+    assert index.search('second')[0] == 0
+
+
+def test_search_stays_fast_on_large_history(index):
+    """Test that searching a sizeable index takes milliseconds, not seconds."""
+    words = ['invoice', 'contract', 'meeting', 'report', 'lecture', 'chapter', 'memo', 'letter']
+    history = [
+        make_entry(f'{i}.mp3', text=f"{words[i % len(words)]} number {i} about item {i * 7}")
+        for i in range(20000)
+    ]
+    index.rebuild(history)
+
+    start = time.time()
+    total, results = index.search('contract', per_page=20)
+    elapsed = time.time() - start
+
+    assert total == 2500
+    assert len(results) == 20
+    assert elapsed < 0.5
+
+
+def test_search_endpoint_uses_full_stored_text(client):
+    """Test that text beyond the history preview is searchable through the API."""
+    long_text = ("Filler sentence. " * 200) + "The hidden keyword zanzibar appears late."
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], 'hidden.mp3'), 'wb') as f:
+        f.write(b'ID3')
+    save_to_history(long_text, 'alloy', 'tts-1', 'hidden.mp3', 3)
+
+    with open(app.config['HISTORY_FILE']) as f:
+        assert 'zanzibar' not in json.load(f)[0]['text']
+
+    response = client.get('/api/history/search?q=zanzibar')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['total'] == 1
+    assert data['results'][0]['file_id'] == 'hidden'
+    assert data['results'][0]['url'].endswith('/get-audio/hidden.mp3')
+
+    client.get('/delete/hidden.mp3')
+    assert client.get('/api/history/search?q=zanzibar').get_json()['total'] == 0
+
+
+def test_search_endpoint_builds_index_from_existing_history(client):
+    """Test that history written before the index existed is searchable."""
+    with open(app.config['HISTORY_FILE'], 'w') as f:
+        json.dump([make_entry('old.mp3', text='An old podcast transcript', file_size=1)], f)
+
+    data = client.get('/api/history/search?q=podcast').get_json()
+    assert data['total'] == 1
+
+
+def test_search_endpoint_validates_parameters(client):
+    """Test error responses for missing or malformed parameters."""
+    assert client.get('/api/history/search').status_code == 400
+    assert client.get('/api/history/search?q=a&page=x').status_code == 400
+    assert client.get('/api/history/search?q=a&per_page=0').status_code == 400
+
+
+def test_snippet_escapes_text(index):
+    """Test that markup in the indexed text is escaped around the highlighted match."""
+    index.add(make_entry('x.mp3'), 'Click <img src=x onerror="alert(1)"> for the contract & terms.')
+    _, results = index.search('contract')
+    snippet = results[0]['snippet']
+    assert '<img' not in snippet and '&lt;img' in snippet
+    assert '<mark>contract</mark>' in snippet and '&amp;' in snippet
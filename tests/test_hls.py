@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mp3_frames
+from app import app
+from generator import generate_speech, plan_chunks
+from hls import HlsWriter, list_segments, timestamp_tag
+from storage import LocalStorage
+
+FRAME_HEADER = b'\xff\xfb\x90\x00'  # MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo
+FRAME_SIZE = 417
+FRAME_SECONDS = 1152 / 44100
+
+
+def mp3_bytes(seconds, fill=b'\x01'):
+    """Build MP3 data of whole frames lasting about the given number of seconds."""
+    frame = FRAME_HEADER + fill * (FRAME_SIZE - 4)
+    return frame * int(round(seconds / FRAME_SECONDS))
+
+
+def fake_chunk(client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+    """Write 4 seconds of audio for every chunk."""
+    with open(output_file_path, 'wb') as f:
+        f.write(mp3_bytes(4))
+    return True
+
+
+def fake_stitch(chunk_files, output_file_path, peaks_path=None):
+    with open(output_file_path, 'wb') as out:
+        for path in chunk_files:
+            with open(path, 'rb') as f:
+                out.write(f.read())
+            os.remove(path)
+    return True
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client with HLS output enabled and output in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / 'history.json').write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'CHUNK_CACHE_FOLDER', 'HLS_OUTPUT')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        CHUNK_CACHE_FOLDER=str(output_dir / 'chunk_cache'),
+        HLS_OUTPUT=True,
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def test_frames_are_found_past_tags_and_junk():
+    """Test that frame parsing skips ID3 tags, junk bytes and the Xing/Info frame."""
+    info_frame = FRAME_HEADER + b'\0' * 32 + b'Info' + b'\0' * (FRAME_SIZE - 40)
+    id3 = b'ID3\x04\x00\x00\x00\x00\x00\x05' + b'\xff' * 5
+    data = id3 + info_frame + mp3_bytes(1) + b'\xff\x00junk' + mp3_bytes(1)
+
+    frames = list(mp3_frames.iter_frames(data))
+    assert frames[0].is_info and frames[0].offset == len(id3)
+    audio_frames = frames[1:]
+    assert len(audio_frames) == 2 * int(round(1 / FRAME_SECONDS))
+    assert all(frame.size == FRAME_SIZE for frame in audio_frames)
+    assert mp3_frames.duration(frames) == pytest.approx(len(audio_frames) * FRAME_SECONDS)
+
+
+def test_writer_segments_at_frame_boundaries(tmp_path):
+    """Test that chunks become segments of at most the target duration, in order, with timestamps."""
+    storage = LocalStorage(str(tmp_path / 'audio'))
+    writer = HlsWriter(storage, 'speech.mp3', segment_seconds=10)
+    chunk = tmp_path / 'chunk.mp3'
+    chunk.write_bytes(mp3_bytes(4))
+
+    for _ in range(6):
+        writer.add_chunk(str(chunk))
+    playlist = (tmp_path / 'audio' / 'speech.m3u8').read_text()
+    assert '#EXT-X-PLAYLIST-TYPE:EVENT' in playlist
+    assert '#EXT-X-ENDLIST' not in playlist
+    assert len(list_segments(playlist)) == 2  # Playable while the rest is still being added
+
+    writer.finish()
+    playlist = (tmp_path / 'audio' / 'speech.m3u8').read_text()
+    assert playlist.rstrip().endswith('#EXT-X-ENDLIST')
+    segments = list_segments(playlist)
+    assert segments[0] == 'speech.seg00000.mpa'
+    durations = [seconds for _, seconds in writer.segments]
+    assert all(seconds <= 10 for seconds in durations)
+    assert sum(durations) == pytest.approx(6 * 4, abs=0.1)
+
+    # Each segment is a timestamp tag followed by whole frames; together they are the chunks' audio
+    audio = b''
+    elapsed = 0.0
+    for name, seconds in writer.segments:
+        data = (tmp_path / 'audio' / name).read_bytes()
+        tag = timestamp_tag(elapsed)
+        assert data.startswith(tag)
+        audio += data[len(tag):]
+        elapsed += seconds
+    assert audio == chunk.read_bytes() * 6
+
+
+def test_generate_speech_publishes_playlist_while_synthesizing(tmp_path):
+    """Test that the playlist lists segments before the last chunk is synthesized."""
+    storage = LocalStorage(str(tmp_path / 'audio'))
+    writer = HlsWriter(storage, 'speech.mp3', segment_seconds=5)
+    text = " ".join(f"part{i}" for i in range(8))
+    playlist_path = tmp_path / 'audio' / 'speech.m3u8'
+    seen = []
+
+    def chunk_and_observe(client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+        seen.append(len(list_segments(playlist_path.read_text())) if playlist_path.exists() else 0)
+        return fake_chunk(client, chunk_text, output_file_path)
+
+    with patch('generator.generate_speech_for_chunk', side_effect=chunk_and_observe), \
+         patch('generator.stitch_audio_files', side_effect=fake_stitch):
+        assert generate_speech(text, str(tmp_path / 'speech.mp3'), plan=plan_chunks(text, max_chars=12),
+                               client=object(), hls_writer=writer)
+
+    assert seen[0] == 0 and seen[-1] > 0
+    assert '#EXT-X-ENDLIST' in playlist_path.read_text()
+
+
+def test_api_generate_serves_and_deletes_hls(client):
+    """Test the HLS URLs returned by the API and that deleting the audio removes its segments."""
+    text = "Long enough to need several chunks. " * 200
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk), \
+         patch('generator.stitch_audio_files', side_effect=fake_stitch):
+        response = client.post('/api/generate', json={'text': text})
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert data['hls_url'].endswith(f"/hls/{data['file_id']}.m3u8")
+
+    playlist = client.get(f"/hls/{data['file_id']}.m3u8")
+    assert playlist.mimetype == 'application/vnd.apple.mpegurl'
+    assert playlist.headers['Cache-Control'] == 'no-cache'
+    segments = list_segments(playlist.data.decode('utf-8'))
+    segment = client.get(f'/hls/{segments[0]}')
+    assert segment.status_code == 200 and segment.mimetype == 'audio/mpeg'
+    assert 'immutable' in segment.headers['Cache-Control']
+    assert client.get('/hls/history.json').status_code == 404
+
+    result_page = client.get(f"/result?filename={data['filename']}&text_id={data['text_id']}")
+    assert f'data-hls-url="/hls/{data["file_id"]}.m3u8"' in result_page.data.decode('utf-8')
+
+    client.get(f"/delete/{data['filename']}")
+    remaining = os.listdir(app.config['UPLOAD_FOLDER'])
+    assert not [name for name in remaining if name.startswith(data['file_id'])]
+    with open(app.config['HISTORY_FILE']) as f:
+        assert json.load(f) == []
@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import pytest
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+from app import app
+from generator import chunk_temp_dir
+from janitor import OutputJanitor, touch_access_time, reclaimed_metric
+from locks import FileLock, TEMP_DIR_LOCK_NAME, CHUNK_TEMP_PREFIX
+from metrics import Metrics
+
+
+def write_file(path, size, age=0, accessed_ago=None):
+    """Create a file of the given size with its modification/access times in the past."""
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    now = time.time()
+    accessed_ago = age if accessed_ago is None else accessed_ago
+    os.utime(path, (now - accessed_ago, now - age))
+    return path
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    folder = tmp_path / 'output'
+    folder.mkdir()
+    return folder
+
+
+def test_ttl_removes_old_audio_and_reports_history(output_dir):
+    """Test that expired audio is deleted and handed to on_remove."""
+    write_file(output_dir / 'old.mp3', 100, age=7200)
+    write_file(output_dir / 'new.mp3', 100, age=10)
+    removed = []
+    metrics = Metrics()
+    janitor = OutputJanitor(str(output_dir), max_age=3600, list_referenced=lambda: {'old.mp3', 'new.mp3'},
+                            on_remove=removed.extend, metrics=metrics)
+
+    assert janitor.collect() == 100
+    assert removed == ['old.mp3']
+    assert not (output_dir / 'old.mp3').exists()
+    assert (output_dir / 'new.mp3').exists()
+    assert metrics.get('janitor_reclaimed_bytes_total') == 100
+    assert metrics.get(reclaimed_metric('audio')) == 100
+
+
+def test_quota_evicts_least_recently_accessed_first(output_dir):
+    """Test that a file played recently survives while stale ones are evicted."""
+    for name in ('a.mp3', 'b.mp3', 'c.mp3'):
+        write_file(output_dir / name, 1000, age=600)
+    touch_access_time(str(output_dir / 'a.mp3'))
+    os.utime(output_dir / 'b.mp3', (time.time() - 300, time.time() - 600))
+
+    removed = []
+    janitor = OutputJanitor(str(output_dir), max_bytes=1500, list_referenced=lambda: {'a.mp3', 'b.mp3', 'c.mp3'},
+                            on_remove=removed.extend, metrics=Metrics())
+    janitor.collect()
+
+    assert removed == ['c.mp3', 'b.mp3']
+    assert sorted(os.listdir(output_dir)) == ['a.mp3']
+
+
+def test_touch_access_time_keeps_modification_time(output_dir):
+    """Test that serving a file does not reset its TTL."""
+    path = write_file(output_dir / 'a.mp3', 10, age=5000)
+    mtime = os.path.getmtime(path)
+    touch_access_time(str(path))
+
+    assert os.path.getmtime(path) == mtime
+    assert os.path.getatime(path) > mtime + 4000
+
+
+def test_sweep_orphans_respects_grace_period(output_dir, tmp_path):
+    """Test that stale temp files and unreferenced audio go, but fresh ones stay."""
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+    write_file(output_dir / 'temp_crashed.mp3', 50, age=7200)
+    write_file(output_dir / 'temp_in_progress.mp3', 50, age=5)
+    write_file(temp_dir / 'tts_chunk_abc.mp3', 70, age=7200)
+    write_file(temp_dir / 'unrelated.mp3', 70, age=7200)
+    write_file(output_dir / 'unreferenced.mp3', 30, age=7200)
+    write_file(output_dir / 'kept.mp3', 30, age=7200)
+
+    janitor = OutputJanitor(str(output_dir), list_referenced=lambda: {'kept.mp3'},
+                            temp_patterns=[(str(temp_dir), 'tts_chunk_*')], metrics=Metrics(),
+                            sweep_unreferenced=True)
+
+    assert janitor.sweep_orphans() == 150
+    assert sorted(os.listdir(output_dir)) == ['kept.mp3', 'temp_in_progress.mp3']
+    assert os.listdir(temp_dir) == ['unrelated.mp3']
+
+
+def test_unreferenced_audio_is_kept_by_default(output_dir):
+    """Test that audio missing from the history is only swept when asked for."""
+    write_file(output_dir / 'unreferenced.mp3', 30, age=7200)
+    janitor = OutputJanitor(str(output_dir), list_referenced=lambda: set(), metrics=Metrics())
+
+    assert janitor.sweep_orphans() == 0
+    assert os.listdir(output_dir) == ['unreferenced.mp3']
+
+
+def test_locked_chunk_directories_survive(tmp_path):
+    """Test that an old chunk directory is kept while its job holds the lock, and swept once released."""
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+    chunk_dir = temp_dir / 'tts_chunk_job'
+    chunk_dir.mkdir()
+    write_file(chunk_dir / 'chunk0.mp3', 40, age=7200)
+    os.utime(chunk_dir, (time.time() - 7200, time.time() - 7200))
+    janitor = OutputJanitor(str(tmp_path / 'output'), temp_patterns=[(str(temp_dir), 'tts_chunk_*')],
+                            metrics=Metrics())
+
+    lock = FileLock(str(chunk_dir / TEMP_DIR_LOCK_NAME))
+    lock.acquire()
+    try:
+        assert janitor.sweep_orphans() == 0
+        assert (chunk_dir / 'chunk0.mp3').exists()
+    finally:
+        lock.release()
+    os.utime(chunk_dir, (time.time() - 7200, time.time() - 7200))
+    assert janitor.sweep_orphans() == 40
+    assert os.listdir(temp_dir) == []
+
+
+def test_chunk_temp_dir_is_held_while_in_use():
+    """Test that a job's chunk directory is locked while it is used and removed afterwards."""
+    with chunk_temp_dir() as directory:
+        assert os.path.basename(directory).startswith(CHUNK_TEMP_PREFIX)
+        assert not FileLock(os.path.join(directory, TEMP_DIR_LOCK_NAME)).acquire(blocking=False)
+    assert not os.path.exists(directory)
+
+
+def test_app_janitor_keeps_history_consistent(output_dir, tmp_path, monkeypatch):
+    """Test that evicted audio disappears from history.json and the metrics endpoint."""
+    history_file = output_dir / 'history.json'
+    write_file(output_dir / 'old.mp3', 100, age=7200)
+    write_file(output_dir / 'new.mp3', 100, age=10)
+    history_file.write_text(json.dumps([
+        {'timestamp': '2024-01-01T00:00:00', 'text': 'old', 'voice': 'alloy', 'model': 'tts-1',
+         'filename': 'old.mp3', 'file_size': 100},
+        {'timestamp': '2024-01-02T00:00:00', 'text': 'new', 'voice': 'alloy', 'model': 'tts-1',
+         'filename': 'new.mp3', 'file_size': 100},
+        {'timestamp': '2024-01-03T00:00:00', 'text': 'gone', 'voice': 'alloy', 'model': 'tts-1',
+         'filename': 'missing.mp3', 'file_size': 100},
+    ]))
+
+    # Chunk temp files of other runs in the system temp directory must not be swept here
+    (tmp_path / 'tmp').mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path / 'tmp'))
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'OUTPUT_MAX_AGE')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        OUTPUT_MAX_AGE=3600,
+    )
+    try:
+        before = {name: app_module.metrics.get(reclaimed_metric(name))
+                  for name in ('audio', 'orphan', 'prune_chunk_cache')}
+        app_module.get_janitor().run_once()
+
+        history = json.loads(history_file.read_text())
+        assert [item['filename'] for item in history] == ['new.mp3']
+
+        with app.test_client() as client:
+            data = client.get('/api/metrics').get_json()
+        reclaimed = {name: data['counters'].get(reclaimed_metric(name), 0) - before[name] for name in before}
+        assert reclaimed == {'audio': 100, 'orphan': 0, 'prune_chunk_cache': 0}
+        assert data['gauges']['output_audio_bytes'] == 100
+    finally:
+        app.config.update(original_config)
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import multiprocessing
+import pytest
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+from app import app, save_to_history, remove_from_history
+from chunk_cache import ChunkAudioCache
+from locks import FileLock
+from text_store import compute_text_id
+
+WORKERS = 4
+ENTRIES_PER_WORKER = 25
+
+if 'fork' not in multiprocessing.get_all_start_methods():
+    pytest.skip("The stress test forks worker processes", allow_module_level=True)
+
+
+@pytest.fixture
+def shared_output(tmp_path):
+    """Point the app at a temporary output folder that forked workers inherit."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    history_file = output_dir / 'history.json'
+    history_file.write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'CHUNK_CACHE_FOLDER')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        CHUNK_CACHE_FOLDER=str(output_dir / 'chunk_cache'),
+    )
+    yield output_dir
+    app.config.update(original_config)
+
+
+def history_worker(worker_id, start_event):
+    """Add entries and remove every other one, racing the other workers."""
+    start_event.wait()
+    for i in range(ENTRIES_PER_WORKER):
+        filename = f"w{worker_id}-{i}.mp3"
+        text = f"Worker {worker_id} entry {i}"
+        text_id = app_module.get_text_store().put(text)
+        save_to_history(text, 'alloy', 'tts-1', filename, 10, text_id=text_id)
+        if i % 2:
+            remove_from_history(filename)
+
+
+def chunk_cache_worker(root, audio, start_event, results):
+    """Write and read the same cache entry concurrently; every hit must be complete."""
+    cache = ChunkAudioCache(root)
+    key = cache.key_for('tts-1', 'alloy', 'shared chunk')
+    start_event.wait()
+    output_path = os.path.join(root, f"read-{os.getpid()}.bin")
+    for _ in range(50):
+        if cache.get_to(key, output_path):
+            with open(output_path, 'rb') as f:
+                results.put(f.read() == audio)
+        source_path = os.path.join(root, f"write-{os.getpid()}.bin")
+        with open(source_path, 'wb') as f:
+            f.write(audio)
+        cache.put_from(key, source_path)
+
+
+def run_workers(target, args_for):
+    context = multiprocessing.get_context('fork')
+    start_event = context.Event()
+    processes = [context.Process(target=target, args=args_for(worker_id, start_event))
+                 for worker_id in range(WORKERS)]
+    for process in processes:
+        process.start()
+    start_event.set()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    return context
+
+
+def test_history_survives_concurrent_workers(shared_output):
+    """Test that no entry is lost or duplicated when workers update history at once."""
+    run_workers(history_worker, lambda worker_id, start_event: (worker_id, start_event))
+
+    with open(app.config['HISTORY_FILE']) as f:
+        history = json.load(f)
+    expected = {f"w{worker_id}-{i}.mp3" for worker_id in range(WORKERS)
+                for i in range(ENTRIES_PER_WORKER) if i % 2 == 0}
+    assert sorted(item['filename'] for item in history) == sorted(expected)
+
+    # The search index and the text store agree with history.json
+    total, _ = app_module.get_history_index().search('Worker', per_page=1)
+    assert total == len(expected)
+    store = app_module.get_text_store()
+    assert all(store.get(item['text_id']) == item['text'] for item in history)
+    assert store.get(compute_text_id("Worker 0 entry 1")) is None
+
+
+def test_chunk_cache_is_shared_without_partial_reads(shared_output):
+    """Test that concurrent writers and readers of one cache entry only ever see whole files."""
+    root = str(shared_output / 'chunk_cache')
+    os.makedirs(root)
+    audio = os.urandom(256 * 1024)
+    results = multiprocessing.get_context('fork').Queue()
+
+    run_workers(chunk_cache_worker, lambda worker_id, start_event: (root, audio, start_event, results))
+
+    hits = []
+    while not results.empty():
+        hits.append(results.get())
+    assert hits and all(hits)
+
+
+def test_file_lock_excludes_other_processes(tmp_path):
+    """Test that a lock held here cannot be taken by a child process."""
+    lock_path = str(tmp_path / 'janitor.lock')
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+
+    def try_lock():
+        lock = FileLock(lock_path)
+        results.put(lock.acquire(blocking=False))
+
+    with FileLock(lock_path):
+        child = context.Process(target=try_lock)
+        child.start()
+        child.join(timeout=30)
+        assert results.get(timeout=5) is False
+
+    child = context.Process(target=try_lock)
+    child.start()
+    child.join(timeout=30)
+    assert results.get(timeout=5) is True
@@ -0,0 +1,120 @@
+import io
+import os
+import sys
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pdf_extract
+from app import app
+from pdf_cache import PdfTextCache, hash_pdf_file
+from text_store import TextStore
+from tests.pdf_helpers import make_text_pdf
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Create an empty PDF text cache in a temporary directory."""
+    return PdfTextCache(str(tmp_path / 'pdf_cache'), TextStore(str(tmp_path / 'texts')))
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client whose output lives in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    history_file = output_dir / 'history.json'
+    history_file.write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'PDF_CACHE_FOLDER')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        PDF_CACHE_FOLDER=str(output_dir / 'pdf_cache'),
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def test_hash_pdf_file_rewinds_and_ignores_non_pdfs():
+    """Test hashing of PDF uploads."""
+    pdf_bytes = make_text_pdf(["Hello"])
+    pdf_file = io.BytesIO(pdf_bytes)
+
+    pdf_hash = hash_pdf_file(pdf_file)
+    assert len(pdf_hash) == 64
+    assert pdf_file.tell() == 0
+    assert hash_pdf_file(io.BytesIO(pdf_bytes)) == pdf_hash
+    assert hash_pdf_file(io.BytesIO(b"not a pdf")) is None
+
+
+def test_cache_survives_new_process_via_disk(cache, tmp_path):
+    """Test that a fresh cache instance (another worker) reads the on-disk level."""
+    cache.put('a' * 64, "Extracted text")
+    assert cache.get('a' * 64) == "Extracted text"
+
+    other_worker = PdfTextCache(cache.root, TextStore(str(tmp_path / 'texts')))
+    assert other_worker.get('a' * 64) == "Extracted text"
+    assert other_worker.get('b' * 64) is None
+    assert (other_worker.hits, other_worker.misses) == (1, 1)
+
+
+def test_memory_level_is_bounded(cache):
+    """Test that the in-memory LRU evicts least recently used texts."""
+    cache.max_memory_chars = 10
+    cache.put('a' * 64, "12345")
+    cache.put('b' * 64, "12345")
+    cache.get('a' * 64)
+    cache.put('c' * 64, "12345")
+
+    assert list(cache._memory) == ['a' * 64, 'c' * 64]
+    # Evicted entries are still served from disk
+    assert cache.get('b' * 64) == "12345"
+
+
+def test_prune_releases_unread_entries(cache):
+    """Test that entries not read within the TTL are removed with their stored texts."""
+    old_id = cache.put('a' * 64, "Old PDF text")
+    fresh_id = cache.put('b' * 64, "Fresh PDF text")
+    old_index = cache._index_path('a' * 64)
+    os.utime(old_index, (1, 1))
+
+    assert cache.prune(ttl=3600) > 0
+    assert not os.path.exists(old_index)
+    assert cache.get('a' * 64) is None
+    assert not cache.text_store.exists(old_id)
+    assert cache.get('b' * 64) == "Fresh PDF text" and cache.text_store.exists(fresh_id)
+
+
+def test_preview_and_generate_parse_pdf_once(client):
+    """Test that preview, re-preview and generation of the same PDF extract it once."""
+    pdf_bytes = make_text_pdf(["Cached page one", "Cached page two"])
+
+    def fake_generate_speech(text, output_path, **kwargs):
+        with open(output_path, 'wb') as f:
+            f.write(b'ID3')
+        return True
+
+    with patch('app.pdf_extract.extract_text', wraps=pdf_extract.extract_text) as mock_extract, \
+         patch('app.generate_speech', side_effect=fake_generate_speech):
+        for model in ('tts-1', 'tts-1-hd'):
+            response = client.post('/preview', data={
+                'model': model,
+                'pdf_file': (io.BytesIO(pdf_bytes), 'doc.pdf'),
+            }, content_type='multipart/form-data')
+            assert response.get_json()['text_length'] == len("Cached page one\n\nCached page two")
+
+        response = client.post('/api/generate', data={
+            'pdf_file': (io.BytesIO(pdf_bytes), 'doc.pdf'),
+        }, content_type='multipart/form-data')
+        assert response.get_json()['success'] is True
+
+    assert mock_extract.call_count == 1
@@ -0,0 +1,75 @@
+import io
+import os
+import sys
+import types
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the pdf_extract module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pdf_extract
+from tests.pdf_helpers import make_text_pdf
+
+
+@pytest.fixture
+def long_pdf():
+    """A real 100-page PDF with one line of text per page."""
+    return make_text_pdf([f"Line on page {i}" for i in range(100)])
+
+
+def test_iter_pdf_pages_yields_incrementally(long_pdf):
+    """Test that the generator API yields one page at a time, in order."""
+    pages = pdf_extract.iter_pdf_pages(io.BytesIO(long_pdf))
+    assert isinstance(pages, types.GeneratorType)
+    assert next(pages) == "Line on page 0"
+    assert next(pages) == "Line on page 1"
+    assert len(list(pages)) == 98
+
+
+def test_parallel_matches_sequential(long_pdf):
+    """Test that the process-pool mode returns exactly the sequential result."""
+    sequential = pdf_extract.extract_text(io.BytesIO(long_pdf), parallel=False)
+    parallel = pdf_extract.extract_text(io.BytesIO(long_pdf), parallel=True, max_workers=2)
+
+    assert parallel == sequential
+    assert sequential.startswith("Line on page 0\n\nLine on page 1")
+    assert sequential.endswith("Line on page 99")
+
+
+def test_parallel_from_path_keeps_order(tmp_path, long_pdf):
+    """Test that small tasks from several workers are stitched back in page order."""
+    pdf_path = tmp_path / 'long.pdf'
+    pdf_path.write_bytes(long_pdf)
+
+    pages = list(pdf_extract.iter_pdf_pages_parallel(str(pdf_path), 100, max_workers=3, pages_per_task=7))
+    assert pages == [f"Line on page {i}" for i in range(100)]
+
+
+def test_parallel_removes_spooled_temp_file(long_pdf):
+    """Test that file-like inputs are spooled to disk for workers and cleaned up."""
+    spooled = []
+    original_spool = pdf_extract._spool_to_path
+
+    def recording_spool(pdf_file):
+        path, is_temporary = original_spool(pdf_file)
+        spooled.append(path)
+        return path, is_temporary
+
+    with patch('pdf_extract._spool_to_path', side_effect=recording_spool):
+        pdf_extract.extract_text(io.BytesIO(long_pdf), parallel=True, max_workers=2)
+
+    assert len(spooled) == 1
+    assert not os.path.exists(spooled[0])
+
+
+def test_auto_mode_uses_pool_only_for_long_documents(long_pdf):
+    """Test that short documents never pay for process start-up."""
+    short_pdf = make_text_pdf(["One", "Two"])
+    with patch('pdf_extract.iter_pdf_pages_parallel') as mock_parallel:
+        assert pdf_extract.extract_text(io.BytesIO(short_pdf), max_workers=4) == "One\n\nTwo"
+        mock_parallel.assert_not_called()
+
+    with patch('pdf_extract.iter_pdf_pages_parallel', return_value=iter(["A", "", "B"])) as mock_parallel:
+        assert pdf_extract.extract_text(io.BytesIO(long_pdf), max_workers=4) == "A\n\nB"
+        mock_parallel.assert_called_once()
@@ -39,7 +39,7 @@ class TestPDFPreview:
         assert 'cost' in data
         assert data['text_length'] == 36  # Length of the sample text
         assert data['num_chunks'] == 1
-        assert data['cost'] == 36 * 0.000015  # Cost for tts-1 model
+        assert data['cost'] == pytest.approx(36 * 0.000015)  # Cost for tts-1 model
     
     def test_preview_with_pdf_only(self, client):
         """Test cost preview with PDF input only."""
@@ -69,7 +69,7 @@ class TestPDFPreview:
             assert data['text_length'] == len("PDF extracted text for testing")
             assert data['num_chunks'] == 1
             expected_cost = len("PDF extracted text for testing") * 0.000015
-            assert data['cost'] == expected_cost
+            assert data['cost'] == pytest.approx(expected_cost)
             
             # Verify the mock was called
             mock_extract.assert_called_once()
@@ -103,7 +103,7 @@ class TestPDFPreview:
             assert data['text_length'] == len(combined_text)
             assert data['num_chunks'] == 1
             expected_cost = len(combined_text) * 0.000015
-            assert data['cost'] == expected_cost
+            assert data['cost'] == pytest.approx(expected_cost)
             
             # Verify the mock was called
             mock_extract.assert_called_once()
@@ -165,7 +165,7 @@ class TestPDFPreview:
         assert response.status_code == 200
         data = json.loads(response.data)
         assert data['text_length'] == 36  # Length of the sample text
-        assert data['cost'] == 36 * 0.000030  # Cost for tts-1-hd model
+        assert data['cost'] == pytest.approx(36 * 0.000030)  # Cost for tts-1-hd model
     
     def test_preview_with_long_text_from_pdf(self, client):
         """Test cost preview with long text from PDF that spans multiple chunks."""
@@ -193,4 +193,4 @@ class TestPDFPreview:
             assert data['text_length'] == 5000
             assert data['num_chunks'] == 2  # Should be split into 2 chunks
             expected_cost = 5000 * 0.000015
-            assert data['cost'] == expected_cost 
\ No newline at end of file
+            assert data['cost'] == pytest.approx(expected_cost)
\ No newline at end of file
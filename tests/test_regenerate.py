@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import shutil
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app
+from generator import plan_chunks
+from regenerate import common_affixes, plan_regeneration
+
+FRAME = b'\xff\xfb\x90\x00' + b'\x01' * 413  # One MPEG-1 Layer III frame
+
+
+def make_text(sentences=400):
+    return " ".join(f"Sentence number {i} of the long document, with a few more words." for i in range(sentences))
+
+
+def fake_stitch(chunk_files, output_file_path, peaks_path=None):
+    with open(output_file_path, 'wb') as out:
+        for path in chunk_files:
+            with open(path, 'rb') as f:
+                out.write(f.read())
+            os.remove(path)
+    return True
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client with output and the chunk cache in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / 'history.json').write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'CHUNK_CACHE_FOLDER',
+            'CHUNK_CACHE_MAX_BYTES')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        CHUNK_CACHE_FOLDER=str(output_dir / 'chunk_cache'),
+        CHUNK_CACHE_MAX_BYTES=64 * 1024 * 1024,
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+@pytest.fixture
+def synthesized():
+    """Patch chunk synthesis and stitching; yields the list of chunk texts sent to the API."""
+    sent = []
+
+    def fake_chunk(client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+        sent.append(chunk_text)
+        with open(output_file_path, 'wb') as f:
+            f.write(FRAME * 10)
+        return True
+
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk), \
+         patch('generator.stitch_audio_files', side_effect=fake_stitch):
+        yield sent
+
+
+def test_common_affixes():
+    """Test prefix and suffix lengths across comparison blocks, without overlapping."""
+    old = "a" * 10000 + "typo" + "b" * 9000
+    new = "a" * 10000 + "type" + "b" * 9000
+    assert common_affixes(old, new) == (10003, 9000)
+    assert common_affixes("aaaa", "aa") == (2, 0)
+    assert common_affixes("same", "same") == (4, 0)
+
+
+def test_plan_keeps_chunks_outside_the_edit():
+    """Test that a one-word insertion re-plans only the chunk it falls in."""
+    old_text = make_text()
+    old_boundaries = plan_chunks(old_text).boundaries
+    position = old_text.index("Sentence number 200 ")
+    new_text = old_text[:position] + "Inserted words. " + old_text[position:]
+
+    plan, reused = plan_regeneration(old_text, old_boundaries, new_text)
+    assert len(reused) == len(old_boundaries) - 1
+    for new_index, old_index in reused.items():
+        start, end = plan.boundaries[new_index]
+        old_start, old_end = old_boundaries[old_index]
+        assert new_text[start:end] == old_text[old_start:old_end]
+    assert all(count <= plan.max_chars for count in plan.char_counts)
+    assert "Inserted words." in "".join(plan.chunk_texts(new_text))
+
+
+def test_regenerate_synthesizes_only_the_changed_chunk(client, synthesized):
+    """Test that fixing a typo sends one chunk to the API and replaces the history entry."""
+    text = make_text().replace("Sentence number 123 of", "Sentense number 123 of")
+    first = client.post('/api/generate', json={'text': text}).get_json()
+    num_chunks = len(synthesized)
+    assert num_chunks > 3
+    synthesized.clear()
+
+    offset = text.index("Sentense")
+    response = client.post(f"/api/history/{first['filename']}/regenerate",
+                           json={'edits': [{'offset': offset, 'delete': 8, 'insert': 'Sentence'}]})
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert len(synthesized) == 1 and "Sentence number 123 of" in synthesized[0]
+    assert data['chunks_changed'] == 1 and data['chunks_reused'] == num_chunks - 1
+
+    with open(app.config['HISTORY_FILE']) as f:
+        history = json.load(f)
+    assert [item['filename'] for item in history] == [data['filename']]
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], first['filename']))
+    assert client.get(f"/get-audio/{data['filename']}").status_code == 200
+
+
+def test_regenerate_cuts_evicted_chunks_from_previous_output(client, synthesized):
+    """Test that kept chunks missing from the chunk cache are cut from the old audio, not synthesized."""
+    text = make_text()
+    first = client.post('/api/generate', json={'text': text}).get_json()
+    shutil.rmtree(app.config['CHUNK_CACHE_FOLDER'])
+    synthesized.clear()
+    cuts = []
+
+    def fake_cut(audio_path, audio_start, duration, output_path):
+        cuts.append((audio_start, duration))
+        with open(output_path, 'wb') as f:
+            f.write(FRAME * 10)
+        return True
+
+    new_text = text.replace("Sentence number 5 of", "Sentence number five of")
+    with patch('app.cut_chunk', side_effect=fake_cut):
+        data = client.post(f"/api/history/{first['filename']}/regenerate", json={'text': new_text}).get_json()
+    assert len(synthesized) == 1
+    assert len(cuts) == data['chunks_reused'] == data['num_chunks'] - 1
+    assert cuts[0][0] > 0  # The first chunk changed; the next one starts after it
+
+
+def test_regenerate_errors(client, synthesized):
+    """Test unknown entries and bad edits."""
+    assert client.post('/api/history/missing.mp3/regenerate', json={'text': 'x'}).status_code == 404
+    first = client.post('/api/generate', json={'text': 'Short text.'}).get_json()
+    response = client.post(f"/api/history/{first['filename']}/regenerate",
+                           json={'edits': [{'offset': 500, 'delete': 1, 'insert': ''}]})
+    assert response.status_code == 400
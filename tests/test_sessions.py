@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app
+from session_store import SessionStore
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client whose sessions live in a temporary database."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / 'history.json').write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'SESSION_FILE', 'SESSION_TTL')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        SESSION_FILE=str(tmp_path / 'sessions.sqlite3'),
+        SESSION_TTL=3600,
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def fake_generate_speech(text, output_path, **kwargs):
+    """Write a placeholder audio file instead of calling the API."""
+    with open(output_path, 'wb') as f:
+        f.write(b'ID3fake')
+    return True
+
+
+def test_cookie_carries_only_a_session_id(client):
+    """Test that large session values stay on the server and the cookie only holds an id."""
+    large_text = "Server-side state. " * 50000
+    with client.session_transaction() as sess:
+        sess['last_generated_text'] = large_text
+
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+    assert len(cookie.value) < 64
+
+    store = SessionStore(app.config['SESSION_FILE'])
+    data, _ = store.load(cookie.value)
+    assert data['last_generated_text'] == large_text
+
+    with client.session_transaction() as sess:
+        assert sess['last_generated_text'] == large_text
+
+
+def test_generation_keeps_the_session_cookie_small(client):
+    """Test that a generation stores its state server-side and the result page still finds it."""
+    with patch('app.generate_speech', side_effect=fake_generate_speech):
+        response = client.post('/', data={'text': 'Remember me. ' * 5000, 'voice': 'alloy', 'model': 'tts-1'})
+    assert response.status_code == 302
+    for cookie in response.headers.getlist('Set-Cookie'):
+        assert len(cookie) < 256
+
+    with client.session_transaction() as sess:
+        assert sess['last_generated_filename']
+        filename = sess['last_generated_filename']
+    response = client.get(f'/result?filename={filename}')
+    assert 'Remember me.' in response.data.decode('utf-8')
+
+
+def test_unknown_and_expired_session_ids_start_a_new_session(client):
+    """Test that a forged or expired id never loads data and is replaced by a fresh id."""
+    with client.session_transaction() as sess:
+        sess['user_state'] = 'kept'
+    session_id = client.get_cookie(app.config['SESSION_COOKIE_NAME']).value
+
+    with patch('session_store.time.time', return_value=time.time() + 3601):
+        with client.session_transaction() as sess:
+            assert 'user_state' not in sess
+
+    client.set_cookie(app.config['SESSION_COOKIE_NAME'], 'forged-id')
+    with client.session_transaction() as sess:
+        assert 'user_state' not in sess
+        sess['user_state'] = 'new'
+    new_id = client.get_cookie(app.config['SESSION_COOKIE_NAME']).value
+    assert new_id not in ('forged-id', session_id)
+
+
+def test_expired_sessions_are_purged(tmp_path):
+    """Test that purging removes only expired sessions."""
+    store = SessionStore(str(tmp_path / 'sessions.sqlite3'), ttl=60)
+    now = time.time()
+    store.save('old', {'a': 1}, now=now - 120)
+    store.save('fresh', {'b': 2}, now=now)
+
+    assert store.load('old', now=now) is None
+    assert store.purge_expired(now=now) == 1
+    assert store.count() == 1
+    assert store.load('fresh', now=now)[0] == {'b': 2}
+
+
+def test_emptied_session_is_deleted(client):
+    """Test that clearing a session removes its row and its cookie."""
+    with client.session_transaction() as sess:
+        sess['user_state'] = 'temporary'
+    store = SessionStore(app.config['SESSION_FILE'])
+    assert store.count() == 1
+
+    with client.session_transaction() as sess:
+        sess.clear()
+    assert store.count() == 0
+    assert client.get_cookie(app.config['SESSION_COOKIE_NAME']) is None
@@ -0,0 +1,152 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app
+from storage import LocalStorage, S3Storage, parse_range_header
+
+moto = pytest.importorskip('moto')
+boto3 = pytest.importorskip('boto3')
+
+BUCKET = 'tts-audio'
+PART_SIZE = 5 * 1024 * 1024  # Smallest part size S3 accepts
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    """Create an in-process S3 stand-in with an empty bucket."""
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def client(tmp_path, s3_client):
+    """Create a test client that stores finished audio in the S3 stand-in."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    history_file = output_dir / 'history.json'
+    history_file.write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE',
+            'STORAGE_BACKEND', 'S3_BUCKET', 'S3_PREFIX', 'S3_PRESIGNED_URLS')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        STORAGE_BACKEND='s3',
+        S3_BUCKET=BUCKET,
+        S3_PREFIX='audio/',
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def fake_generate_speech(text, output_path, **kwargs):
+    """Write placeholder audio instead of calling the API."""
+    with open(output_path, 'wb') as f:
+        f.write(b'ID3' + bytes(range(256)) * 40)
+    return True
+
+
+def test_parse_range_header():
+    """Test the supported Range header forms."""
+    assert parse_range_header('bytes=0-99', 1000) == (0, 99)
+    assert parse_range_header('bytes=900-', 1000) == (900, 999)
+    assert parse_range_header('bytes=-100', 1000) == (900, 999)
+    assert parse_range_header('bytes=990-2000', 1000) == (990, 999)
+    assert parse_range_header(None, 1000) is None
+    with pytest.raises(ValueError):
+        parse_range_header('bytes=1000-', 1000)
+
+
+def test_local_storage_rejects_traversal(tmp_path):
+    """Test that object names cannot escape the storage root."""
+    storage = LocalStorage(str(tmp_path))
+    with pytest.raises(ValueError):
+        storage.path_for('../history.json')
+
+
+def test_multipart_writer_uploads_parts_as_data_arrives(s3_client, tmp_path):
+    """Test that a large file is sent in several parts and reassembled."""
+    storage = S3Storage(BUCKET, client=s3_client, part_size=PART_SIZE)
+    payload = os.urandom(2 * PART_SIZE + 1234)
+
+    with storage.open_writer('big.mp3') as writer:
+        writer.write(payload[:PART_SIZE + 10])
+        assert len(writer.parts) == 1  # The first part went up before the rest arrived
+        writer.write(payload[PART_SIZE + 10:])
+    assert len(writer.parts) == 3
+
+    assert storage.size('big.mp3') == len(payload)
+    assert b''.join(storage.iter_range('big.mp3', 10, 19)) == payload[10:20]
+
+    local_file = tmp_path / 'small.mp3'
+    local_file.write_bytes(b'small')
+    storage.put_file('small.mp3', str(local_file))
+    assert not local_file.exists()
+    assert storage.exists('small.mp3')
+
+
+def test_failed_multipart_upload_is_aborted(s3_client):
+    """Test that an error while writing leaves no object or pending upload behind."""
+    storage = S3Storage(BUCKET, client=s3_client, part_size=PART_SIZE)
+
+    with pytest.raises(RuntimeError):
+        with storage.open_writer('broken.mp3') as writer:
+            writer.write(b'x' * PART_SIZE)
+            raise RuntimeError("generation failed")
+
+    assert not storage.exists('broken.mp3')
+    assert not s3_client.list_multipart_uploads(Bucket=BUCKET).get('Uploads')
+
+
+def test_generated_audio_is_uploaded_and_served_by_presigned_url(client, s3_client):
+    """Test that finished audio leaves the local disk and downloads redirect to the bucket."""
+    with patch('app.generate_speech', side_effect=fake_generate_speech):
+        data = client.post('/api/generate', json={'text': 'Stored remotely'}).get_json()
+
+    filename = data['filename']
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    head = s3_client.head_object(Bucket=BUCKET, Key='audio/' + filename)
+    assert head['ContentLength'] == 3 + 256 * 40
+
+    response = client.get(f'/download/{filename}')
+    assert response.status_code == 302
+    assert 'audio/' + filename in response.headers['Location']
+    assert 'Signature=' in response.headers['Location']
+
+    client.get(f'/delete/{filename}')
+    assert s3_client.list_objects_v2(Bucket=BUCKET).get('KeyCount') == 0
+
+
+def test_audio_is_streamed_with_ranges_without_presigned_urls(client):
+    """Test ranged streaming through the app when presigned URLs are disabled."""
+    app.config['S3_PRESIGNED_URLS'] = False
+    with patch('app.generate_speech', side_effect=fake_generate_speech):
+        filename = client.post('/api/generate', json={'text': 'Streamed'}).get_json()['filename']
+
+    response = client.get(f'/get-audio/{filename}', headers={'Range': 'bytes=3-6'})
+    assert response.status_code == 206
+    assert response.data == bytes(range(4))
+    assert response.headers['Content-Range'] == f'bytes 3-6/{3 + 256 * 40}'
+
+    full = client.get(f'/get-audio/{filename}')
+    assert full.status_code == 200
+    assert len(full.data) == 3 + 256 * 40
+
+    assert client.get(f'/get-audio/{filename}', headers={'Range': 'bytes=99999-'}).status_code == 416
+    assert client.get('/get-audio/missing.mp3').status_code == 404
@@ -0,0 +1,234 @@
+import os
+import sys
+import gzip
+import json
+import pytest
+from unittest.mock import patch
+from urllib.parse import urlparse, parse_qs
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, get_document_text
+from text_store import TextStore, compute_text_id, is_valid_text_id
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Create a text store in a temporary directory."""
+    return TextStore(str(tmp_path / 'texts'))
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client whose output lives in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    history_file = output_dir / 'history.json'
+    history_file.write_text('[]')
+
+    original_config = {key: app.config[key] for key in ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER')}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def fake_generate_speech(text, output_path, **kwargs):
+    """Write a placeholder audio file instead of calling the API."""
+    with open(output_path, 'wb') as f:
+        f.write(b'ID3fake')
+    return True
+
+
+def test_put_and_get_roundtrip(store):
+    """Test that stored text comes back unchanged and compressed on disk."""
+    text = "Hello world. " * 10000
+    text_id = store.put(text)
+
+    assert text_id == compute_text_id(text)
+    assert store.get(text_id) == text
+
+    # The blob is gzip-compressed and much smaller than the text
+    path = store.path_for(text_id)
+    assert os.path.getsize(path) < len(text) // 10
+    with gzip.open(path, 'rb') as f:
+        assert f.read().decode('utf-8') == text
+
+
+def test_put_is_idempotent(store):
+    """Test that the same text is only stored once."""
+    first_id = store.put("Same text")
+    mtime = os.path.getmtime(store.path_for(first_id))
+    second_id = store.put("Same text")
+
+    assert first_id == second_id
+    assert os.path.getmtime(store.path_for(second_id)) == mtime
+
+
+def test_invalid_and_unknown_ids(store):
+    """Test that invalid or unknown ids never touch the filesystem outside the store."""
+    assert not is_valid_text_id('../../etc/passwd')
+    assert store.get('../../etc/passwd') is None
+    assert store.get('0' * 64) is None
+    assert not store.exists('0' * 64)
+    with pytest.raises(ValueError):
+        store.path_for('not-a-hash')
+
+
+def test_index_redirect_references_text_by_id(client):
+    """Test that a large text is not carried in the redirect URL or the session cookie."""
+    large_text = "This sentence is long enough to matter. " * 2000
+
+    with patch('app.generate_speech', side_effect=fake_generate_speech):
+        response = client.post('/', data={'text': large_text, 'voice': 'alloy', 'model': 'tts-1'})
+
+    assert response.status_code == 302
+    location = response.headers['Location']
+    params = parse_qs(urlparse(location).query)
+    assert 'text' not in params
+    assert params['text_id'] == [compute_text_id(large_text)]
+    assert len(location) < 2000
+
+    for cookie in response.headers.getlist('Set-Cookie'):
+        assert len(cookie) < 4096
+
+    # The result page renders from the stored text
+    result_page = client.get(location)
+    assert result_page.status_code == 200
+    assert large_text[:200] in result_page.data.decode('utf-8')
+
+
+def test_download_text_returns_full_text_from_history(client):
+    """Test that download-text serves the full text even after the session is gone."""
+    large_text = "Full text survives history truncation. " * 500
+
+    with patch('app.generate_speech', side_effect=fake_generate_speech):
+        response = client.post('/', data={'text': large_text, 'voice': 'alloy', 'model': 'tts-1'})
+    filename = parse_qs(urlparse(response.headers['Location']).query)['filename'][0]
+
+    with client.session_transaction() as sess:
+        sess.clear()
+
+    response = client.get(f'/download-text/{filename}')
+    assert response.status_code == 200
+    assert response.data.decode('utf-8') == large_text
+
+    with open(app.config['HISTORY_FILE']) as f:
+        entry = json.load(f)[0]
+    assert entry['text_id'] == compute_text_id(large_text)
+    assert entry['text_length'] == len(large_text)
+
+
+def test_deleting_last_reference_removes_stored_text(client):
+    """Test that deleting a generation removes its stored text when nothing else uses it."""
+    with patch('app.generate_speech', side_effect=fake_generate_speech):
+        response = client.post('/', data={'text': 'Short text', 'voice': 'alloy', 'model': 'tts-1'})
+    params = parse_qs(urlparse(response.headers['Location']).query)
+    store = TextStore(app.config['TEXT_STORE_FOLDER'])
+    assert store.exists(params['text_id'][0])
+
+    client.get(f"/delete/{params['filename'][0]}")
+    assert not store.exists(params['text_id'][0])
+
+
+def test_holders_keep_a_shared_text(store):
+    """Test that a text is only deleted once every holder has released it."""
+    text_id = store.put("Shared text", holder='history')
+    assert store.put("Shared text", holder='document') == text_id
+    assert store.holders(text_id) == ['document', 'history']
+
+    assert not store.release(text_id, 'history')
+    assert store.get(text_id) == "Shared text"
+    assert store.release(text_id, 'document')
+    assert not store.exists(text_id) and store.holders(text_id) == []
+    with pytest.raises(ValueError):
+        store.put("Shared text", holder='../escape')
+
+
+def test_deleting_generation_keeps_document_text(client):
+    """Test that deleting a generation keeps its text when an uploaded document still uses it."""
+    assert get_document_text(compute_text_id('Short text')) is None  # A miss is not cached
+    document_id = client.post('/api/documents', json={'text': 'Short text'}).get_json()['document_id']
+    assert get_document_text(document_id) == 'Short text'
+    with patch('app.generate_speech', side_effect=fake_generate_speech):
+        response = client.post('/', data={'text': 'Short text', 'voice': 'alloy', 'model': 'tts-1'})
+    params = parse_qs(urlparse(response.headers['Location']).query)
+    assert params['text_id'][0] == document_id
+
+    client.get(f"/delete/{params['filename'][0]}")
+    assert TextStore(app.config['TEXT_STORE_FOLDER']).get(document_id) == 'Short text'
+    assert client.post('/preview', data={'document_id': document_id, 'model': 'tts-1'}).status_code == 200
+
+
+def test_read_range_and_length(store):
+    """Test that windows are cut on characters, not bytes, and that the length is kept beside the blob."""
+    text = "Grüße, 世界! " * 30000
+    text_id = store.put(text)
+
+    assert store.read_range(text_id, 0, 10) == text[:10]
+    assert store.read_range(text_id, 150001, 7000) == text[150001:157001]
+    assert store.read_range(text_id, len(text) - 3, 100) == text[-3:]
+    assert store.read_range(text_id, len(text) + 1, 100) == ''
+    assert store.read_range('0' * 64, 0, 10) is None
+
+    assert store.length(text_id) == len(text)
+    # Blobs stored before lengths were recorded are counted once
+    os.remove(os.path.join(os.path.dirname(store.path_for(text_id)), f"{text_id}.len"))
+    assert store.length(text_id) == len(text)
+    assert os.path.exists(os.path.join(os.path.dirname(store.path_for(text_id)), f"{text_id}.len"))
+
+    store.delete(text_id)
+    assert store.length(text_id) is None
+    assert os.listdir(os.path.dirname(store.path_for(text_id))) == []
+
+
+def test_text_range_endpoint(client):
+    """Test that /api/text returns consecutive windows that add up to the stored text."""
+    text = "Ünïcode window test. " * 2000
+    text_id = TextStore(app.config['TEXT_STORE_FOLDER']).put(text)
+
+    windows = []
+    offset = 0
+    while offset is not None:
+        response = client.get(f'/api/text/{text_id}?offset={offset}&length=7000')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['total_length'] == len(text)
+        windows.append(data['text'])
+        offset = data['next_offset']
+    assert len(windows) == 6
+    assert ''.join(windows) == text
+
+    # Windows never change, so a revalidation is answered without a body
+    response = client.get(f'/api/text/{text_id}?offset=0&length=7000')
+    assert 'immutable' in response.headers['Cache-Control']
+    cached = client.get(f'/api/text/{text_id}?offset=0&length=7000',
+                        headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+    assert client.get(f"/api/text/{'0' * 64}").status_code == 404
+    assert client.get(f'/api/text/{text_id}?offset=-1').status_code == 400
+    assert client.get(f'/api/text/{text_id}?length=abc').status_code == 400
+
+
+def test_result_page_renders_only_first_window(client):
+    """Test that the result page does not load the whole stored text, whatever its size."""
+    text = "".join(f"Sentence number {i}. " for i in range(20000))
+    text_id = TextStore(app.config['TEXT_STORE_FOLDER']).put(text)
+
+    with patch('app.TextStore.get', side_effect=AssertionError("full text loaded")):
+        response = client.get(f'/result?filename=missing.mp3&text_id={text_id}')
+    html = response.data.decode('utf-8')
+
+    assert response.status_code == 200
+    assert text[:200] in html
+    assert "Sentence number 19999." not in html
+    assert f"{len(text)} characters" in html
+    assert f'data-url="/api/text/{text_id}"' in html
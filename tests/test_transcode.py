@@ -0,0 +1,173 @@
+import os
+import sys
+import shutil
+import subprocess
+import threading
+import pytest
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app
+from metrics import Metrics
+from transcode import Transcoder, TranscodeError, parse_variant
+
+# Stands in for ffmpeg: records each run and writes the container name followed by the input
+FAKE_FFMPEG = """#!{python}
+import sys, time
+args = sys.argv[1:]
+with open({log!r}, 'a') as log:
+    log.write(' '.join(args) + '\\n')
+time.sleep(0.2)
+with open(args[args.index('-i') + 1], 'rb') as source, open(args[-1], 'wb') as output:
+    output.write(args[args.index('-f') + 1].encode() + b':' + source.read())
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    """Write a fake ffmpeg executable; returns (path, log path)."""
+    log_path = tmp_path / 'ffmpeg.log'
+    script = tmp_path / 'ffmpeg'
+    script.write_text(FAKE_FFMPEG.format(python=sys.executable, log=str(log_path)))
+    script.chmod(0o755)
+    return str(script), log_path
+
+
+def ffmpeg_runs(log_path):
+    return len(log_path.read_text().splitlines()) if log_path.exists() else 0
+
+
+@pytest.fixture
+def client(tmp_path, fake_ffmpeg):
+    """Create a test client with one stored MP3 and the fake ffmpeg."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / 'history.json').write_text('[]')
+    (output_dir / 'speech.mp3').write_bytes(b'ID3source-audio')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'TRANSCODE_FOLDER',
+            'FFMPEG_BINARY')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        TRANSCODE_FOLDER=str(output_dir / 'variants'),
+        FFMPEG_BINARY=fake_ffmpeg[0],
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def test_parse_variant():
+    """Test that formats and bitrates are validated and defaulted."""
+    assert parse_variant('opus') == ('opus', '32k')
+    assert parse_variant('MP3', '64') == ('mp3', '64k')
+    assert parse_variant('flac') == ('flac', None)
+    for audio_format, bitrate in (('wav', None), ('opus', '33k'), ('flac', '128k')):
+        with pytest.raises(ValueError):
+            parse_variant(audio_format, bitrate)
+
+
+def test_variant_is_transcoded_once_then_served_from_cache(client, fake_ffmpeg):
+    """Test that the first request runs ffmpeg and repeat requests are plain file sends."""
+    _, log_path = fake_ffmpeg
+    response = client.get('/get-audio/speech.mp3?format=opus&bitrate=24k')
+    assert response.status_code == 200
+    assert response.mimetype == 'audio/ogg'
+    assert response.data == b'ogg:ID3source-audio'
+    assert '-b:a 24k' in log_path.read_text()
+
+    response = client.get('/download/speech.mp3?format=opus&bitrate=24k')
+    assert response.data == b'ogg:ID3source-audio'
+    assert 'speech-24k.opus' in response.headers['Content-Disposition']
+    assert ffmpeg_runs(log_path) == 1
+
+    # Another bitrate is another variant; the original is still served untouched
+    assert client.get('/get-audio/speech.mp3?format=opus&bitrate=48k').status_code == 200
+    assert ffmpeg_runs(log_path) == 2
+    assert client.get('/get-audio/speech.mp3').data == b'ID3source-audio'
+
+
+def test_variant_errors(client):
+    """Test bad variants, missing audio and a failing ffmpeg."""
+    assert client.get('/get-audio/speech.mp3?format=wav').status_code == 400
+    assert client.get('/get-audio/missing.mp3?format=opus').status_code == 404
+
+    app.config['FFMPEG_BINARY'] = os.path.join(app.config['UPLOAD_FOLDER'], 'no-such-ffmpeg')
+    response = client.get('/get-audio/speech.mp3?format=flac')
+    assert response.status_code == 500
+    cached = [name for _, _, names in os.walk(app.config['TRANSCODE_FOLDER']) for name in names]
+    assert not [name for name in cached if name.endswith('.flac')]
+
+
+def test_concurrent_identical_requests_run_ffmpeg_once(tmp_path, fake_ffmpeg):
+    """Test that concurrent requests for the same variant share one ffmpeg run."""
+    ffmpeg, log_path = fake_ffmpeg
+    source = tmp_path / 'speech.mp3'
+    source.write_bytes(b'ID3audio')
+    opened = []
+
+    def open_source():
+        opened.append(1)
+        return str(source), lambda: None
+
+    transcoder = Transcoder(str(tmp_path / 'variants'), ffmpeg=ffmpeg, metrics=Metrics())
+    # A second transcoder stands in for another worker process on the host
+    other_worker = Transcoder(str(tmp_path / 'variants'), ffmpeg=ffmpeg, metrics=Metrics())
+    results = []
+    threads = [threading.Thread(target=lambda t=t: results.append(t.get('speech.mp3', 8, open_source, 'aac', '64k')))
+               for t in (transcoder,) * 4 + (other_worker,) * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 1 and len(results) == 6
+    assert ffmpeg_runs(log_path) == 1
+    assert len(opened) == 1
+    assert transcoder.metrics.get('transcode_deduplicated_total') + \
+        other_worker.metrics.get('transcode_deduplicated_total') >= 4
+
+
+def test_prune_evicts_least_recently_used_variants(tmp_path, fake_ffmpeg):
+    """Test that pruning keeps the cache within its cap and leaves lock files alone."""
+    ffmpeg, _ = fake_ffmpeg
+    source = tmp_path / 'speech.mp3'
+    source.write_bytes(b'x' * 1000)
+    transcoder = Transcoder(str(tmp_path / 'variants'), ffmpeg=ffmpeg, metrics=Metrics())
+
+    old = transcoder.get('speech.mp3', 1000, lambda: (str(source), lambda: None), 'mp3', '64k')
+    os.utime(old, (1, os.path.getmtime(old)))
+    new = transcoder.get('speech.mp3', 1000, lambda: (str(source), lambda: None), 'mp3', '96k')
+
+    assert transcoder.prune(max_bytes=1500) > 0
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
+    assert os.listdir(tmp_path / 'variants' / 'locks')
+
+
+def test_failed_transcode_caches_nothing(tmp_path):
+    """Test that an ffmpeg failure raises TranscodeError and caches nothing."""
+    source = tmp_path / 'speech.mp3'
+    source.write_bytes(b'ID3audio')
+    transcoder = Transcoder(str(tmp_path / 'variants'), ffmpeg=str(tmp_path / 'missing'), metrics=Metrics())
+    with pytest.raises(TranscodeError):
+        transcoder.get('speech.mp3', 8, lambda: (str(source), lambda: None), 'flac')
+    assert transcoder._inflight == {}
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg is not installed")
+def test_real_ffmpeg_produces_opus(tmp_path):
+    """Test the ffmpeg command line against a real ffmpeg."""
+    source = tmp_path / 'tone.mp3'
+    subprocess.run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-f', 'lavfi', '-i', 'sine=duration=1',
+                    str(source)], check=True)
+    transcoder = Transcoder(str(tmp_path / 'variants'), metrics=Metrics())
+    path = transcoder.get('tone.mp3', source.stat().st_size, lambda: (str(source), lambda: None), 'opus', '24k')
+    with open(path, 'rb') as f:
+        assert f.read(4) == b'OggS'
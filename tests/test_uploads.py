@@ -0,0 +1,170 @@
+import io
+import os
+import sys
+import base64
+import tracemalloc
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+from app import app
+from uploads import Base64StreamDecoder, decode_base64_to_tempfile, spool_stream_to_tempfile
+from tests.pdf_helpers import make_text_pdf
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client whose output lives in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    history_file = output_dir / 'history.json'
+    history_file.write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE',
+            'PDF_CACHE_FOLDER', 'DOCUMENTS_FOLDER')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(history_file),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        PDF_CACHE_FOLDER=str(output_dir / 'pdf_cache'),
+        DOCUMENTS_FOLDER=str(output_dir / 'documents'),
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def fake_generate_speech(text, output_path, **kwargs):
+    """Write a placeholder audio file instead of calling the API."""
+    with open(output_path, 'wb') as f:
+        f.write(b'ID3')
+    return True
+
+
+def test_base64_decoder_handles_arbitrary_pieces_and_whitespace():
+    """Test that pieces split mid-group and MIME line breaks decode correctly."""
+    payload = os.urandom(10000)
+    encoded = base64.encodebytes(payload).decode('ascii')  # 76-char lines
+
+    decoder = Base64StreamDecoder()
+    decoded = b''
+    for start in range(0, len(encoded), 333):
+        decoded += decoder.feed(encoded[start:start + 333])
+    decoded += decoder.finish()
+
+    assert decoded == payload
+
+
+def test_decode_base64_to_tempfile_keeps_memory_bounded():
+    """Test that decoding never materialises the whole decoded payload in memory."""
+    payload = os.urandom(8 * 1024 * 1024)
+    encoded = base64.b64encode(payload).decode('ascii')
+
+    tracemalloc.start()
+    with decode_base64_to_tempfile(encoded) as decoded_file:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert decoded_file.read() == payload
+
+    # One decoding block (~1 MB of base64) at a time, far below the 8 MB payload
+    assert peak < 4 * 1024 * 1024
+
+
+def test_spool_stream_to_tempfile_is_named_and_removed():
+    """Test that request bodies are copied to a named file that disappears on close."""
+    with spool_stream_to_tempfile(io.BytesIO(b"x" * 3000000), block_size=65536) as spooled:
+        path = spooled.name
+        assert os.path.getsize(path) == 3000000
+        assert spooled.read(3) == b"xxx"
+    assert not os.path.exists(path)
+
+
+def test_raw_pdf_body_generation(client):
+    """Test the raw binary upload path with options in the query string."""
+    pdf_bytes = make_text_pdf(["Raw body page"])
+
+    with patch('app.generate_speech', side_effect=fake_generate_speech) as mock_generate:
+        response = client.post('/api/generate?voice=echo&model=tts-1-hd&filename=raw.pdf',
+                               data=pdf_bytes, content_type='application/pdf')
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['source_type'] == 'PDF'
+    assert data['original_filename'] == 'raw.pdf'
+    assert data['text_length'] == len("Raw body page")
+    assert mock_generate.call_args.kwargs['voice'] == 'echo'
+    assert mock_generate.call_args.kwargs['model'] == 'tts-1-hd'
+
+
+def test_raw_pdf_body_document_upload(client):
+    """Test that documents can be created from a raw PDF body."""
+    pdf_bytes = make_text_pdf(["Document body"])
+    response = client.post('/api/documents?filename=body.pdf', data=pdf_bytes, content_type='application/pdf')
+
+    assert response.status_code == 201
+    assert response.get_json()['original_filename'] == 'body.pdf'
+
+    response = client.post('/api/documents', data=b'not a pdf', content_type='application/pdf')
+    assert response.status_code == 400
+
+
+def test_oversized_pdf_uploads_get_413(client):
+    """Test that bodies over MAX_CONTENT_LENGTH are refused as too large, not as bad PDFs."""
+    pdf_bytes = make_text_pdf(["Big page"]) + b"%" + b"0" * 2048
+    original_limit = app.config['MAX_CONTENT_LENGTH']
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    try:
+        for path in ('/api/generate', '/api/documents'):
+            assert client.post(path, data=pdf_bytes, content_type='application/pdf').status_code == 413
+            response = client.post(path, data={'pdf_file': (io.BytesIO(pdf_bytes), 'big.pdf')},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 413
+    finally:
+        app.config['MAX_CONTENT_LENGTH'] = original_limit
+
+
+def test_base64_json_path_extracts_from_file_handle(client):
+    """Test that the JSON path hands PyPDF2 an on-disk file instead of an in-memory copy."""
+    pdf_bytes = make_text_pdf(["JSON page"])
+    seen = []
+    original_extract = app_module.pdf_extract.extract_text
+
+    def recording_extract(pdf_file, *args, **kwargs):
+        seen.append(pdf_file)
+        return original_extract(pdf_file, *args, **kwargs)
+
+    with patch('app.pdf_extract.extract_text', side_effect=recording_extract), \
+         patch('app.generate_speech', side_effect=fake_generate_speech):
+        response = client.post('/api/generate', json={
+            'pdf_base64': base64.b64encode(pdf_bytes).decode('ascii'),
+            'filename': 'json.pdf',
+        })
+
+    assert response.get_json()['text_length'] == len("JSON page")
+    assert not isinstance(seen[0], io.BytesIO)
+    assert seen[0].name.endswith('.pdf')
+
+
+def test_large_multipart_upload_is_spooled_to_named_file(client):
+    """Test that big multipart files arrive as named temp files that workers can open."""
+    pdf_bytes = make_text_pdf(["Padded page"]) + b"%" + b"0" * (600 * 1024)
+    seen = []
+
+    def recording_extract(pdf_file):
+        seen.append(pdf_file.stream.name)
+        return "Padded page"
+
+    with patch('app.extract_text_from_pdf', side_effect=recording_extract):
+        response = client.post('/api/documents', data={
+            'pdf_file': (io.BytesIO(pdf_bytes), 'big.pdf'),
+        }, content_type='multipart/form-data')
+
+    assert response.status_code == 201
+    assert isinstance(seen[0], str) and seen[0].endswith('.upload')
@@ -6,13 +6,27 @@ from unittest.mock import patch, MagicMock
 from app import app, client, generate_voice_samples, SUPPORTED_VOICES
 
 @pytest.fixture
-def client():
+def client(tmp_path):
     app.config['TESTING'] = True
     app.config['WTF_CSRF_ENABLED'] = False
+    original_cache_folder = app.config['CHUNK_CACHE_FOLDER']
+    app.config['CHUNK_CACHE_FOLDER'] = str(tmp_path / 'chunk_cache')
     
     with app.test_client() as client:
         with app.app_context():
             yield client
+    
+    app.config['CHUNK_CACHE_FOLDER'] = original_cache_folder
+
+def mock_streaming_create(content=b'mock audio content'):
+    """Mock for client.audio.speech.with_streaming_response.create that writes content"""
+    def stream_to_file(path):
+        with open(path, 'wb') as f:
+            f.write(content)
+    
+    create = MagicMock()
+    create.return_value.__enter__.return_value.stream_to_file.side_effect = stream_to_file
+    return create
 
 def test_generate_voice_samples_route_disabled(client):
     """Test that voice sample generation is disabled by default"""
@@ -25,13 +39,9 @@ def test_generate_voice_samples_route_disabled(client):
 
 def test_generate_voice_samples_route_enabled(client):
     """Test that voice sample generation works when enabled"""
-    # Mock the OpenAI client response
-    mock_response = MagicMock()
-    mock_response.content = b'mock audio content'
-    
     # Mock the OpenAI client
     with patch.dict(os.environ, {'ALLOW_SAMPLE_GENERATION': 'true'}):
-        with patch('app.client.audio.speech.create', return_value=mock_response):
+        with patch('app.client.audio.speech.with_streaming_response.create', mock_streaming_create()):
             with tempfile.TemporaryDirectory() as temp_dir:
                 # Patch the static folder to use our temp directory
                 with patch('app.app.static_folder', temp_dir):
@@ -64,7 +74,7 @@ def test_generate_voice_samples_handles_errors(client):
     
     # Mock the OpenAI client
     with patch.dict(os.environ, {'ALLOW_SAMPLE_GENERATION': 'true'}):
-        with patch('app.client.audio.speech.create', side_effect=mock_create_error):
+        with patch('app.client.audio.speech.with_streaming_response.create', side_effect=mock_create_error):
             with tempfile.TemporaryDirectory() as temp_dir:
                 # Patch the static folder to use our temp directory
                 with patch('app.app.static_folder', temp_dir):
@@ -79,4 +89,55 @@ def test_generate_voice_samples_handles_errors(client):
                     assert response.status_code == 200
                     
                     # Response should include error information
-                    assert b'error:' in response.data 
\ No newline at end of file
+                    assert b'error:' in response.data
+
+def test_voice_samples_are_only_generated_when_intro_changes(client, tmp_path):
+    """Test that re-running sample generation makes no API calls unless an intro text changes"""
+    create = mock_streaming_create()
+    with patch.dict(os.environ, {'ALLOW_SAMPLE_GENERATION': 'true'}), \
+         patch('app.client.audio.speech.with_streaming_response.create', create), \
+         patch('app.get_samples_dir', return_value=str(tmp_path / 'samples')):
+        client.get('/generate-voice-samples')
+        assert create.call_count == len(SUPPORTED_VOICES)
+        
+        client.get('/generate-voice-samples')
+        assert create.call_count == len(SUPPORTED_VOICES)
+        
+        with patch.dict('app.VOICE_SAMPLE_INTROS', {'nova': "Hi, I'm Nova, with a new introduction."}):
+            client.get('/generate-voice-samples')
+        assert create.call_count == len(SUPPORTED_VOICES) + 1
+        assert create.call_args.kwargs['voice'] == 'nova'
+        
+        # A lost samples folder is restored from the chunk cache
+        for voice in SUPPORTED_VOICES:
+            os.remove(tmp_path / 'samples' / f"{voice}.mp3")
+        client.get('/generate-voice-samples')
+        assert create.call_count == len(SUPPORTED_VOICES) + 1
+        assert (tmp_path / 'samples' / 'alloy.mp3').read_bytes() == b'mock audio content'
+
+def test_voice_sample_route_sets_cache_headers(client, tmp_path):
+    """Test that versioned sample URLs are cached long-term and revalidated by ETag"""
+    with patch.dict(os.environ, {'ALLOW_SAMPLE_GENERATION': 'true'}), \
+         patch('app.client.audio.speech.with_streaming_response.create', mock_streaming_create()), \
+         patch('app.get_samples_dir', return_value=str(tmp_path / 'samples')):
+        client.get('/generate-voice-samples')
+        
+        page = client.get('/')
+        assert b'data-sample-url="/voice-samples/alloy.mp3?v=' in page.data
+        url = page.data.split(b'data-sample-url="/voice-samples/alloy.mp3')[1].split(b'"')[0].decode()
+        
+        response = client.get('/voice-samples/alloy.mp3' + url)
+        assert response.status_code == 200
+        assert response.data == b'mock audio content'
+        assert response.mimetype == 'audio/mpeg'
+        assert 'immutable' in response.headers['Cache-Control']
+        assert 'max-age=31536000' in response.headers['Cache-Control']
+        etag = response.headers['ETag']
+        
+        unversioned = client.get('/voice-samples/alloy.mp3')
+        assert 'no-cache' in unversioned.headers['Cache-Control']
+        
+        revalidated = client.get('/voice-samples/alloy.mp3', headers={'If-None-Match': etag})
+        assert revalidated.status_code == 304
+        
+        assert client.get('/voice-samples/robot.mp3').status_code == 404
@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+np = pytest.importorskip('numpy')
+from pydub import AudioSegment
+
+import waveform
+from app import app
+from generator import stitch_audio_files
+
+SAMPLE_RATE = 24000
+
+
+def tone(seconds, amplitude=16384):
+    """Return a mono 16-bit AudioSegment of a square wave at the given amplitude."""
+    samples = np.where(np.arange(int(seconds * SAMPLE_RATE)) % 48 < 24, amplitude, -amplitude).astype(np.int16)
+    return AudioSegment(samples.tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1)
+
+
+def read_file_range(path):
+    data = open(path, 'rb').read()
+    return lambda start, end: data[start:end + 1]
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client with output in a temporary directory."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / 'history.json').write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'CHUNK_CACHE_FOLDER',
+            'WAVEFORM_PEAKS')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        CHUNK_CACHE_FOLDER=str(output_dir / 'chunk_cache'),
+        WAVEFORM_PEAKS=True,
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+def test_compute_levels_reduces_pcm_to_min_max_pairs():
+    """Test peak values, block sizes and that each level is ZOOM_FACTOR times coarser."""
+    loud = np.full(SAMPLE_RATE * 30, 16384, dtype=np.int16)
+    loud[::2] = -32768
+    loud[SAMPLE_RATE * 10:SAMPLE_RATE * 20] = 0  # Ten seconds of silence in the middle
+
+    levels = waveform.compute_levels(loud, SAMPLE_RATE)
+    samples_per_peak, pairs = levels[0]
+    assert samples_per_peak == SAMPLE_RATE // waveform.PEAKS_PER_SECOND
+    assert len(pairs) == 2 * 30 * waveform.PEAKS_PER_SECOND
+    assert list(pairs[:2]) == [-127, 64]
+    assert list(pairs[2 * 750:2 * 751]) == [0, 0]
+
+    for (finer, finer_pairs), (coarser, coarser_pairs) in zip(levels, levels[1:]):
+        assert coarser == finer * waveform.ZOOM_FACTOR
+        assert len(coarser_pairs) == 2 * -(-len(finer_pairs) // 2 // waveform.ZOOM_FACTOR)
+    assert len(levels[-1][1]) // 2 <= waveform.OVERVIEW_PEAKS
+
+
+def test_peaks_file_roundtrip_reads_only_requested_ranges(tmp_path):
+    """Test that levels written to a peaks file are read back exactly, in slices."""
+    audio = tone(3)
+    path = str(tmp_path / 'speech.peaks')
+    waveform.write_peaks_for_audio(audio, path)
+
+    reads = []
+    read_all = read_file_range(path)
+
+    def read_range(start, end):
+        reads.append(end - start + 1)
+        return read_all(start, end)
+
+    header = waveform.read_header(read_range)
+    assert header['sample_rate'] == SAMPLE_RATE and header['samples'] == 3 * SAMPLE_RATE
+    expected = waveform.compute_levels(np.frombuffer(audio.raw_data, dtype=np.int16), SAMPLE_RATE)
+    assert [level['samples_per_peak'] for level in header['levels']] == [spp for spp, _ in expected]
+    assert waveform.read_level(read_range, header, 0) == list(expected[0][1])
+    assert waveform.read_level(read_range, header, 0, 10, 20) == list(expected[0][1][20:40])
+    assert reads[-1] == 20
+    assert waveform.read_level(read_range, header, 0, 1000, 2000) == []
+
+
+def test_stitch_writes_peaks_from_decoded_audio(tmp_path):
+    """Test that stitching writes the peaks of the combined audio without decoding it again."""
+    chunks = []
+    for i in range(2):
+        chunk = tmp_path / f'chunk{i}.mp3'
+        chunk.write_bytes(b'mp3')
+        chunks.append(str(chunk))
+
+    def export(self, path, format=None):
+        with open(path, 'wb') as f:
+            f.write(b'stitched')
+
+    peaks_path = str(tmp_path / 'speech.peaks')
+    with patch.object(AudioSegment, 'from_mp3', side_effect=lambda path: tone(1.5)), \
+         patch.object(AudioSegment, 'export', export):
+        assert stitch_audio_files(chunks, str(tmp_path / 'speech.mp3'), peaks_path=peaks_path)
+
+    header = waveform.read_header(read_file_range(peaks_path))
+    assert header['samples'] == 3 * SAMPLE_RATE
+
+
+def test_api_peaks_and_deletion(client):
+    """Test that generated audio gets peaks served by the API and deleted with the audio."""
+    def fake_chunk(client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+        with open(output_file_path, 'wb') as f:
+            f.write(b'chunk')
+        return True
+
+    def fake_stitch(chunk_files, output_file_path, peaks_path=None):
+        for path in chunk_files:
+            os.remove(path)
+        with open(output_file_path, 'wb') as f:
+            f.write(b'stitched')
+        waveform.write_peaks_for_audio(tone(60), peaks_path)
+        return True
+
+    text = "Long enough to need several chunks. " * 200
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk), \
+         patch('generator.stitch_audio_files', side_effect=fake_stitch):
+        data = client.post('/api/generate', json={'text': text}).get_json()
+    peaks_file = os.path.join(app.config['UPLOAD_FOLDER'], f"{data['file_id']}.peaks")
+    assert os.path.exists(peaks_file)
+
+    response = client.get(f"/api/peaks/{data['filename']}")
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    peaks = response.get_json()
+    assert peaks['duration'] == pytest.approx(60)
+    assert peaks['levels'][0]['length'] == 60 * waveform.PEAKS_PER_SECOND
+    assert peaks['level'] == len(peaks['levels']) - 1
+    assert len(peaks['peaks']) == 2 * peaks['levels'][-1]['length']
+    assert client.get(f"/api/peaks/{data['filename']}",
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    window = client.get(f"/api/peaks/{data['filename']}?level=0&start=10&end=12").get_json()
+    assert window['start_index'] == 10 * waveform.PEAKS_PER_SECOND
+    assert len(window['peaks']) == 2 * 2 * waveform.PEAKS_PER_SECOND
+    assert client.get(f"/api/peaks/{data['filename']}?level=99").status_code == 400
+    assert client.get('/api/peaks/missing.mp3').status_code == 404
+
+    result_page = client.get(f"/result?filename={data['filename']}&text_id={data['text_id']}").data.decode('utf-8')
+    assert f'data-peaks-url="/api/peaks/{data["filename"]}"' in result_page
+
+    client.get(f"/delete/{data['filename']}")
+    assert not os.path.exists(peaks_file)
+    with open(app.config['HISTORY_FILE']) as f:
+        assert json.load(f) == []
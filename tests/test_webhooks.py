@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app
+from metrics import Metrics
+from webhooks import WebhookDispatcher, sign, verify, validate_callback_url, SIGNATURE_HEADER, TIMESTAMP_HEADER
+
+SECRET = 'test-webhook-secret'
+FRAME = b'\xff\xfb\x90\x00' + b'\x01' * 413  # One MPEG-1 Layer III frame
+
+
+class Receiver:
+    """A local webhook receiver answering with scripted status codes (200 once they run out)."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                receiver.requests.append((self.headers, body))
+                self.send_response(receiver.statuses.pop(0) if receiver.statuses else 200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def events(self):
+        return [json.loads(body) for _, body in self.requests]
+
+
+@pytest.fixture
+def receiver():
+    receiver = Receiver()
+    yield receiver
+    receiver.server.shutdown()
+
+
+def make_dispatcher(tmp_path, **kwargs):
+    kwargs.setdefault('allow_private', True)
+    return WebhookDispatcher(SECRET, str(tmp_path / 'dead_letter.jsonl'), base_delay=0.01, metrics=Metrics(), **kwargs)
+
+
+def test_delivery_is_signed(tmp_path, receiver):
+    """Test that the receiver gets the event with a signature it can verify."""
+    dispatcher = make_dispatcher(tmp_path)
+    delivery = dispatcher.dispatch(receiver.url, 'generation.completed', {'filename': 'a.mp3'})
+    assert dispatcher.wait(timeout=10)
+
+    headers, body = receiver.requests[0]
+    assert verify(SECRET, headers[TIMESTAMP_HEADER], body, headers[SIGNATURE_HEADER])
+    assert not verify('other-secret', headers[TIMESTAMP_HEADER], body, headers[SIGNATURE_HEADER])
+    assert not verify(SECRET, int(time.time()) - 3600, body, sign(SECRET, int(time.time()) - 3600, body))
+    event = json.loads(body)
+    assert event['id'] == delivery.id and event['event'] == 'generation.completed'
+    assert event['data'] == {'filename': 'a.mp3'}
+    assert dispatcher.metrics.get('webhook_delivered_total') == 1
+
+
+def test_failed_deliveries_are_retried_then_dead_lettered(tmp_path, receiver):
+    """Test retries on 5xx and 429, and the dead-letter log for exhausted retries and client errors."""
+    dispatcher = make_dispatcher(tmp_path, max_attempts=3)
+    receiver.statuses = [500, 429]
+    dispatcher.dispatch(receiver.url, 'generation.completed', {'n': 1})
+    assert dispatcher.wait(timeout=10)
+    assert len(receiver.requests) == 3
+    assert len({headers['X-TTS-Delivery'] for headers, _ in receiver.requests}) == 1
+    assert not os.path.exists(dispatcher.dead_letter_path)
+
+    receiver.requests.clear()
+    receiver.statuses = [503, 503, 503, 400]
+    dispatcher.dispatch(receiver.url, 'generation.completed', {'n': 2})
+    assert dispatcher.wait(timeout=10)
+    dispatcher.dispatch(receiver.url, 'generation.failed', {'n': 3})
+    assert dispatcher.wait(timeout=10)
+    assert len(receiver.requests) == 4
+
+    with open(dispatcher.dead_letter_path) as f:
+        records = [json.loads(line) for line in f]
+    assert [(record['attempts'], record['error']) for record in records] == [(3, 'HTTP 503'), (1, 'HTTP 400')]
+    assert json.loads(records[0]['body'])['data'] == {'n': 2}
+    assert dispatcher.metrics.get('webhook_dead_letters_total') == 2
+
+
+def test_callback_url_validation():
+    """Test that only http(s) URLs to public hosts are accepted unless private hosts are allowed."""
+    for url in ('ftp://example.com/hook', 'not a url', 'http://127.0.0.1/hook', 'http://10.0.0.5/hook',
+                'http://169.254.169.254/latest'):
+        with pytest.raises(ValueError):
+            validate_callback_url(url)
+    assert validate_callback_url('http://127.0.0.1:8080/hook', allow_private=True)
+
+    public = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('93.184.216.34', 80))]
+    with patch('socket.getaddrinfo', return_value=public) as getaddrinfo:
+        validate_callback_url('http://example.com/hook')
+        validate_callback_url('https://example.com/hook')
+    assert [call.args[1] for call in getaddrinfo.call_args_list] == [80, 443]
+
+
+def test_delivery_rechecks_address_when_connecting(tmp_path, receiver):
+    """Test that a host resolving to a local address at delivery time is refused (DNS rebinding)."""
+    dispatcher = make_dispatcher(tmp_path, allow_private=False, max_attempts=3)
+    dispatcher.dispatch(receiver.url, 'generation.completed', {'n': 1})
+    assert dispatcher.wait(timeout=10)
+    assert receiver.requests == []
+    with open(dispatcher.dead_letter_path) as f:
+        record = json.loads(f.readline())
+    assert record['attempts'] == 1 and 'private or local' in record['error']
+
+    # Connections go through the same check, so an address it accepts is delivered to
+    with patch('webhooks.resolve_public', side_effect=lambda host, port: socket.getaddrinfo(host, port)):
+        dispatcher.dispatch(receiver.url, 'generation.completed', {'n': 2})
+        assert dispatcher.wait(timeout=10)
+    assert [event['data'] for event in receiver.events()] == [{'n': 2}]
+
+
+def test_wait_returns_when_dead_letter_log_fails(tmp_path, receiver):
+    """Test that a delivery still counts as finished when its dead letter cannot be written."""
+    dispatcher = make_dispatcher(tmp_path, max_attempts=1)
+    receiver.statuses = [500]
+    with patch.object(dispatcher, '_dead_letter', side_effect=OSError("disk full")):
+        dispatcher.dispatch(receiver.url, 'generation.completed', {'n': 1})
+        assert dispatcher.wait(timeout=10)
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create a test client with output in a temporary directory and webhooks to local receivers enabled."""
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / 'history.json').write_text('[]')
+
+    keys = ('UPLOAD_FOLDER', 'HISTORY_FILE', 'TEXT_STORE_FOLDER', 'HISTORY_INDEX_FILE', 'CHUNK_CACHE_FOLDER',
+            'BATCH_FOLDER', 'WEBHOOK_SECRET', 'WEBHOOK_DEAD_LETTER_FILE', 'WEBHOOK_ALLOW_PRIVATE')
+    original_config = {key: app.config[key] for key in keys}
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(output_dir),
+        HISTORY_FILE=str(output_dir / 'history.json'),
+        TEXT_STORE_FOLDER=str(output_dir / 'texts'),
+        HISTORY_INDEX_FILE=str(output_dir / 'history_index.sqlite3'),
+        CHUNK_CACHE_FOLDER=str(output_dir / 'chunk_cache'),
+        BATCH_FOLDER=str(output_dir / 'batches'),
+        WEBHOOK_SECRET=SECRET,
+        WEBHOOK_DEAD_LETTER_FILE=str(output_dir / 'webhooks_dead_letter.jsonl'),
+        WEBHOOK_ALLOW_PRIVATE=True,
+    )
+    with app.test_client() as client:
+        yield client
+    app.config.update(original_config)
+
+
+@pytest.fixture
+def synthesis():
+    def fake_chunk(client, chunk_text, output_file_path, model='tts-1', voice='alloy'):
+        if 'FAIL' in chunk_text:
+            raise Exception("Upstream error")
+        with open(output_file_path, 'wb') as f:
+            f.write(FRAME * 10)
+        return True
+
+    with patch('generator.generate_speech_for_chunk', side_effect=fake_chunk):
+        yield
+
+
+def wait_for_events(receiver, count, timeout=10):
+    deadline = time.time() + timeout
+    while len(receiver.requests) < count and time.time() < deadline:
+        time.sleep(0.02)
+    return receiver.events()
+
+
+def test_generate_posts_result_to_callback_url(client, synthesis, receiver):
+    """Test that /api/generate posts the job result, and failures, to the callback URL."""
+    data = client.post('/api/generate', json={'text': 'Hello webhook.', 'callback_url': receiver.url}).get_json()
+    event = wait_for_events(receiver, 1)[0]
+    assert event['event'] == 'generation.completed'
+    result = event['data']
+    assert result['filename'] == data['filename'] and result['url'] == data['url']
+    assert result['text_length'] == len('Hello webhook.')
+    assert result['duration'] > 0 and result['processing_time'] >= 0
+
+    response = client.post('/api/generate', json={'text': 'This will FAIL.', 'callback_url': receiver.url})
+    assert response.status_code == 500
+    event = wait_for_events(receiver, 2)[1]
+    assert event['event'] == 'generation.failed' and 'Upstream error' in event['data']['error']
+
+
+def test_batch_callbacks(client, synthesis, receiver):
+    """Test a webhook per finished batch item and one for the finished batch."""
+    items = [{'text': 'First item.'}, {'text': 'Second item will FAIL.'}]
+    response = client.post('/api/generate-batch', json={'items': items, 'callback_url': receiver.url})
+    assert response.status_code == 202
+    events = wait_for_events(receiver, 3)
+    assert sorted(event['event'] for event in events) == ['batch.completed', 'generation.completed',
+                                                          'generation.failed']
+    completed = next(event['data'] for event in events if event['event'] == 'generation.completed')
+    assert completed['index'] == 0 and completed['url'].startswith('http://localhost/get-audio/')
+    batch_event = next(event['data'] for event in events if event['event'] == 'batch.completed')
+    assert batch_event['status'] == 'failed' and batch_event['counts']['done'] == 1
+
+
+def test_callback_url_rejected(client, synthesis):
+    """Test that unusable callback URLs, or callbacks without a configured secret, are refused up front."""
+    assert client.post('/api/generate', json={'text': 'x', 'callback_url': 'ftp://x/hook'}).status_code == 400
+    app.config['WEBHOOK_SECRET'] = None
+    response = client.post('/api/generate', json={'text': 'x', 'callback_url': 'http://127.0.0.1:1/hook'})
+    assert response.status_code == 400
+    assert client.post('/api/generate-batch', json={'items': [{'text': 'x'}],
+                                                    'callback_url': 'http://127.0.0.1:1/hook'}).status_code == 400
@@ -0,0 +1,210 @@
+import os
+import re
+import gzip
+import codecs
+import hashlib
+import tempfile
+from locks import FileLock
+
+# Constants
+TEXT_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')  # SHA-256 hex digest
+HOLDER_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,80}$')
+COMPRESSION_LEVEL = 6  # gzip level; good ratio on prose without slowing down writes
+READ_BLOCK_SIZE = 64 * 1024  # Compressed bytes decompressed at a time by read_range()
+
+
+def compute_text_id(text):
+    """Return the content address (SHA-256 hex digest) of a text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def is_valid_text_id(text_id):
+    """Check that a text id looks like a SHA-256 hex digest."""
+    return bool(text_id) and bool(TEXT_ID_PATTERN.match(text_id))
+
+
+class TextStore:
+    """Compressed, content-addressed store for full input texts.
+
+    Texts are written once under output/texts/<id[:2]>/<id>.txt.gz, where the id
+    is the SHA-256 of the text. Identical texts share a single blob, and only the
+    short id needs to travel in URLs, cookies and history entries. The character
+    count is kept next to the blob in <id>.len, so it is known without
+    decompressing the text.
+
+    Because identical texts share a blob, several users may depend on one: the
+    history, uploaded documents, batch items and the PDF text cache. Each puts
+    the text with its holder name, which leaves an empty <id>.ref-<holder>
+    file, and release() only removes the blob once no holder is left.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, text_id):
+        """Return the blob path for a text id."""
+        if not is_valid_text_id(text_id):
+            raise ValueError(f"Invalid text id: {text_id!r}")
+        return os.path.join(self.root, text_id[:2], f"{text_id}.txt.gz")
+
+    def _reference_path(self, text_id, holder):
+        if not HOLDER_PATTERN.match(holder):
+            raise ValueError(f"Invalid text holder: {holder!r}")
+        return os.path.join(self.root, text_id[:2], f"{text_id}.ref-{holder}")
+
+    def _lock(self, text_id):
+        # One lock per shard directory orders puts and releases of the same blob
+        return FileLock(os.path.join(self.root, text_id[:2], '.lock'))
+
+    def _length_path(self, text_id):
+        return os.path.join(self.root, text_id[:2], f"{text_id}.len")
+
+    def _write_length(self, text_id, length):
+        directory = os.path.dirname(self._length_path(text_id))
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(temp_fd, 'w') as f:
+            f.write(str(length))
+        os.replace(temp_path, self._length_path(text_id))
+
+    def put(self, text, holder=None):
+        """Store a text and return its id. Storing the same text twice is a no-op.
+
+        With a holder, the text is also recorded as used by it until
+        release(text_id, holder) is called.
+        """
+        text_id = compute_text_id(text)
+        if holder is None:
+            self._write(text_id, text)
+            return text_id
+        reference_path = self._reference_path(text_id, holder)
+        with self._lock(text_id):
+            self._write(text_id, text)
+            with open(reference_path, 'a'):
+                pass
+        return text_id
+
+    def release(self, text_id, holder):
+        """Drop a holder's reference; the blob is deleted once no holder is left. Returns True if it was."""
+        if not is_valid_text_id(text_id):
+            return False
+        reference_path = self._reference_path(text_id, holder)
+        with self._lock(text_id):
+            try:
+                os.remove(reference_path)
+            except OSError:
+                pass
+            if self.holders(text_id):
+                return False
+            return self.delete(text_id)
+
+    def holders(self, text_id):
+        """Return the names of the holders that keep a text."""
+        prefix = f"{text_id}.ref-"
+        try:
+            names = os.listdir(os.path.join(self.root, text_id[:2]))
+        except OSError:
+            return []
+        return sorted(name[len(prefix):] for name in names if name.startswith(prefix))
+
+    def _write(self, text_id, text):
+        path = self.path_for(text_id)
+        if os.path.isfile(path):
+            return
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial blob
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(temp_fd, 'wb') as raw_file:
+                with gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=COMPRESSION_LEVEL, mtime=0) as gz_file:
+                    gz_file.write(text.encode('utf-8'))
+            os.replace(temp_path, path)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self._write_length(text_id, len(text))
+
+    def get(self, text_id):
+        """Return the stored text for an id, or None if it is unknown."""
+        if not is_valid_text_id(text_id):
+            return None
+        try:
+            with gzip.open(self.path_for(text_id), 'rb') as gz_file:
+                return gz_file.read().decode('utf-8')
+        except (OSError, EOFError):
+            return None
+
+    def read_range(self, text_id, offset=0, length=None):
+        """Return up to length characters starting at character offset, or None if the id is unknown.
+
+        Only the start of the blob, up to offset + length, is decompressed.
+        """
+        if not is_valid_text_id(text_id):
+            return None
+        end = None if length is None else offset + length
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        parts = []
+        position = 0
+        try:
+            with gzip.open(self.path_for(text_id), 'rb') as gz_file:
+                while end is None or position < end:
+                    block = gz_file.read(READ_BLOCK_SIZE)
+                    chars = decoder.decode(block, final=not block)
+                    start = max(offset - position, 0)
+                    if start < len(chars):
+                        parts.append(chars[start:] if end is None else chars[start:end - position])
+                    position += len(chars)
+                    if not block:
+                        break
+        except (OSError, EOFError):
+            return None
+        return ''.join(parts)
+
+    def length(self, text_id):
+        """Return the number of characters of a stored text, or None if the id is unknown."""
+        if not self.exists(text_id):
+            return None
+        try:
+            with open(self._length_path(text_id), 'r') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            pass
+        # Blobs written before lengths were recorded are counted once
+        text = self.get(text_id)
+        if text is None:
+            return None
+        try:
+            self._write_length(text_id, len(text))
+        except OSError:
+            pass
+        return len(text)
+
+    def exists(self, text_id):
+        """Check whether a text id is present in the store."""
+        return is_valid_text_id(text_id) and os.path.isfile(self.path_for(text_id))
+
+    def stored_size(self, text_id):
+        """Return the bytes a stored text takes on disk (0 if it is not stored)."""
+        try:
+            return os.path.getsize(self.path_for(text_id)) + os.path.getsize(self._length_path(text_id))
+        except (OSError, ValueError):
+            return 0
+
+    def delete(self, text_id):
+        """Remove a stored text whatever holds it (see release()). Returns True if a blob was deleted."""
+        if not is_valid_text_id(text_id):
+            return False
+        try:
+            os.remove(self._length_path(text_id))
+        except OSError:
+            pass
+        try:
+            os.remove(self.path_for(text_id))
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,42 @@
+"""Request traces: the shape of production traffic, recorded for tts-bench to replay.
+
+Each traced request is one JSON line with its arrival time, endpoint, status,
+server time and input size, but never the text itself:
+
+    {"t": 1700000000.123, "endpoint": "api_generate", "method": "POST", "status": 200,
+     "elapsed": 1.234, "text_length": 5120, "pdf": false, "range": false}
+
+Lines are appended under a FileLock, so every worker on a host can share one file.
+"""
+import os
+import json
+from locks import FileLock
+
+
+class TraceRecorder:
+    """Appends request records to a JSON-lines trace file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def record(self, **fields):
+        line = json.dumps(fields, separators=(',', ':')) + '\n'
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with FileLock(self.path + '.lock'):
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+def read_trace(path):
+    """Return the records of a trace file in arrival order, skipping lines that do not parse."""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash
+            if isinstance(record, dict) and 't' in record and 'endpoint' in record:
+                records.append(record)
+    records.sort(key=lambda record: record['t'])
+    return records
@@ -0,0 +1,195 @@
+"""On-demand transcoding of generated MP3 audio into other formats and bitrates.
+
+Variants are produced by ffmpeg the first time they are requested and kept
+in an on-disk cache shared by every worker on the host, so later requests are
+plain file sends. Concurrent requests for the same variant are collapsed into
+one ffmpeg run: within a process the followers wait on the leader's future,
+across processes a lock file makes late arrivals find the finished file. At most max_workers ffmpeg processes run on the host at once.
+"""
+import os
+import time
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import Future
+from chunk_cache import prune_lru
+from locks import FileLock
+from metrics import metrics as default_metrics
+
+# Constants
+FORMATS = {
+    # name: (file extension, mimetype, ffmpeg codec arguments, takes a bitrate)
+    'mp3': ('mp3', 'audio/mpeg', ['-c:a', 'libmp3lame'], True),
+    'opus': ('opus', 'audio/ogg', ['-c:a', 'libopus', '-vbr', 'on'], True),
+    'aac': ('m4a', 'audio/mp4', ['-c:a', 'aac', '-movflags', '+faststart'], True),
+    'flac': ('flac', 'audio/flac', ['-c:a', 'flac'], False),
+}
+CONTAINERS = {'mp3': 'mp3', 'opus': 'ogg', 'aac': 'ipod', 'flac': 'flac'}  # ffmpeg muxer per format
+DEFAULT_BITRATES = {'mp3': '128k', 'opus': '32k', 'aac': '64k'}
+ALLOWED_BITRATES = ('16k', '24k', '32k', '48k', '64k', '96k', '128k', '160k', '192k', '256k', '320k')
+DEFAULT_WORKERS = 2  # ffmpeg processes allowed to run at once on the host
+TRANSCODE_TIMEOUT_SECONDS = 300
+SLOT_POLL_SECONDS = 0.05
+LOCK_FOLDER = 'locks'
+
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg could not produce a variant."""
+
+
+def parse_variant(audio_format, bitrate=None):
+    """Validate a requested format and bitrate; return (format, bitrate or None).
+
+    Only a fixed set of bitrates is accepted, so clients cannot fill the cache
+    with near-identical variants. Raises ValueError for anything else.
+    """
+    audio_format = (audio_format or 'mp3').lower()
+    if audio_format not in FORMATS:
+        raise ValueError(f"Unsupported format: {audio_format}. Use one of {', '.join(FORMATS)}")
+    if not FORMATS[audio_format][3]:
+        if bitrate:
+            raise ValueError(f"{audio_format} is lossless and takes no bitrate")
+        return audio_format, None
+    bitrate = (bitrate or DEFAULT_BITRATES[audio_format]).lower()
+    if not bitrate.endswith('k'):
+        bitrate += 'k'
+    if bitrate not in ALLOWED_BITRATES:
+        raise ValueError(f"Unsupported bitrate: {bitrate}. Use one of {', '.join(ALLOWED_BITRATES)}")
+    return audio_format, bitrate
+
+
+class Transcoder:
+    """Produces and caches variants under root/<key[:2]>/<key>.<ext>.
+
+    A variant key covers the source name and size, so audio regenerated under
+    the same name never serves a stale variant.
+    """
+
+    def __init__(self, root, max_workers=DEFAULT_WORKERS, ffmpeg='ffmpeg', metrics=None):
+        self.root = root
+        self.max_workers = max_workers
+        self.ffmpeg = ffmpeg
+        self.metrics = metrics or default_metrics
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    @staticmethod
+    def key_for(source_name, source_size, audio_format, bitrate):
+        digest = hashlib.sha256()
+        for part in (source_name, str(source_size), audio_format, bitrate or ''):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path_for(self, key, audio_format):
+        return os.path.join(self.root, key[:2], f"{key}.{FORMATS[audio_format][0]}")
+
+    def get(self, source_name, source_size, open_source, audio_format, bitrate=None):
+        """Return the path of a cached variant, transcoding it first if needed.
+
+        open_source() must return a local path to the source MP3 and a callback
+        that releases it; it is only called on a cache miss.
+        """
+        key = self.key_for(source_name, source_size, audio_format, bitrate)
+        path = self.path_for(key, audio_format)
+        if self._touch(path):
+            self.metrics.increment('transcode_cache_hits_total')
+            return path
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            self.metrics.increment('transcode_deduplicated_total')
+            return future.result()
+
+        try:
+            self._produce(path, open_source, audio_format, bitrate)
+            future.set_result(path)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+        return path
+
+    def _touch(self, path):
+        try:
+            # Record the hit for LRU pruning (many filesystems do not update atime)
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+            return True
+        except OSError:
+            return False
+
+    def _produce(self, path, open_source, audio_format, bitrate):
+        # Another worker on the host may be producing the same variant. Locks are
+        # per key prefix, so there are at most 256 lock files.
+        key = os.path.basename(path).split('.')[0]
+        with FileLock(os.path.join(self.root, LOCK_FOLDER, f"{key[:2]}.lock")):
+            if self._touch(path):
+                self.metrics.increment('transcode_deduplicated_total')
+                return
+            source_path, release_source = open_source()
+            try:
+                slot = self._acquire_worker_slot()
+                try:
+                    self.metrics.increment('transcode_runs_total')
+                    started = time.time()
+                    self._run_ffmpeg(source_path, path, audio_format, bitrate)
+                    self.metrics.increment('transcode_seconds_total', time.time() - started)
+                finally:
+                    slot.release()
+            finally:
+                release_source()
+
+    def _acquire_worker_slot(self):
+        """Wait for one of the host's max_workers ffmpeg slots and return its held lock."""
+        deadline = time.time() + TRANSCODE_TIMEOUT_SECONDS
+        while True:
+            for slot in range(self.max_workers):
+                lock = FileLock(os.path.join(self.root, LOCK_FOLDER, f"slot-{slot}.lock"))
+                if lock.acquire(blocking=False):
+                    return lock
+            if time.time() > deadline:
+                raise TranscodeError("Timed out waiting for a transcoding slot")
+            time.sleep(SLOT_POLL_SECONDS)
+
+    def build_command(self, source_path, output_path, audio_format, bitrate):
+        _, _, codec_args, _ = FORMATS[audio_format]
+        command = [self.ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y', '-i', source_path,
+                   '-vn'] + codec_args
+        if bitrate:
+            command += ['-b:a', bitrate]
+        # The temporary output file has no telling extension, so name the container
+        return command + ['-f', CONTAINERS[audio_format], output_path]
+
+    def _run_ffmpeg(self, source_path, path, audio_format, bitrate):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(temp_fd)
+        try:
+            try:
+                completed = subprocess.run(self.build_command(source_path, temp_path, audio_format, bitrate),
+                                           capture_output=True, timeout=TRANSCODE_TIMEOUT_SECONDS)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                raise TranscodeError(f"Could not run ffmpeg: {str(e)}")
+            if completed.returncode != 0 or not os.path.getsize(temp_path):
+                message = completed.stderr.decode('utf-8', 'replace').strip() or f"exit status {completed.returncode}"
+                raise TranscodeError(f"ffmpeg failed: {message}")
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def prune(self, max_bytes):
+        """Remove least recently used variants until the cache fits in max_bytes; return bytes reclaimed."""
+        suffixes = tuple('.' + extension for extension, _, _, _ in FORMATS.values())
+        reclaimed, total_bytes = prune_lru(self.root, max_bytes, suffixes, keep_suffixes=('.lock',))
+        self.metrics.set_gauge('transcode_cache_bytes', total_bytes)
+        self.metrics.increment('transcode_reclaimed_bytes_total', reclaimed)
+        return reclaimed
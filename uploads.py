@@ -0,0 +1,88 @@
+import re
+import base64
+import tempfile
+from flask import Request
+
+# Constants
+UPLOAD_BLOCK_SIZE = 1024 * 1024  # Bytes copied per read when spooling request bodies
+BASE64_BLOCK_CHARS = 4 * 256 * 1024  # Base64 characters decoded per step (a multiple of 4)
+IN_MEMORY_UPLOAD_LIMIT = 500 * 1024  # Multipart files above this go straight to a named temp file
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def spool_stream_to_tempfile(stream, block_size=UPLOAD_BLOCK_SIZE, suffix='.pdf'):
+    """Copy a request body stream into a named temporary file, one block at a time.
+
+    The returned file is rewound and deleted when closed, so callers should use
+    it as a context manager.
+    """
+    temp_file = tempfile.NamedTemporaryFile('w+b', suffix=suffix)
+    try:
+        for block in iter(lambda: stream.read(block_size), b''):
+            temp_file.write(block)
+        temp_file.flush()
+        temp_file.seek(0)
+    except Exception:
+        temp_file.close()
+        raise
+    return temp_file
+
+
+class Base64StreamDecoder:
+    """Decode base64 text incrementally.
+
+    Input may be fed in arbitrary pieces and may contain whitespace or line
+    breaks; leftover characters that do not form a full 4-character group are
+    carried over to the next call.
+    """
+
+    def __init__(self):
+        self._pending = ''
+
+    def feed(self, text):
+        """Decode as much of the accumulated input as possible and return the bytes."""
+        text = self._pending + WHITESPACE_PATTERN.sub('', text)
+        usable = len(text) - len(text) % 4
+        self._pending = text[usable:]
+        return base64.b64decode(text[:usable]) if usable else b''
+
+    def finish(self):
+        """Decode any remaining input, tolerating missing padding."""
+        pending, self._pending = self._pending, ''
+        if not pending:
+            return b''
+        return base64.b64decode(pending + '=' * (-len(pending) % 4))
+
+
+def decode_base64_to_tempfile(b64_text, block_chars=BASE64_BLOCK_CHARS, suffix='.pdf'):
+    """Decode a base64 string into a named temporary file without holding the decoded bytes.
+
+    Only one block of decoded data is in memory at a time. The returned file is
+    rewound and deleted when closed.
+    """
+    decoder = Base64StreamDecoder()
+    temp_file = tempfile.NamedTemporaryFile('w+b', suffix=suffix)
+    try:
+        for start in range(0, len(b64_text), block_chars):
+            temp_file.write(decoder.feed(b64_text[start:start + block_chars]))
+        temp_file.write(decoder.finish())
+        temp_file.flush()
+        temp_file.seek(0)
+    except Exception:
+        temp_file.close()
+        raise
+    return temp_file
+
+
+class SpoolingRequest(Request):
+    """Request that spools large multipart files to named temporary files.
+
+    Werkzeug already moves big uploads out of memory, but into anonymous files.
+    Named files let PDF extraction workers open the upload by path instead of
+    copying it once more.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is None or total_content_length > IN_MEMORY_UPLOAD_LIMIT:
+            return tempfile.NamedTemporaryFile('w+b', suffix='.upload')
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
@@ -0,0 +1,123 @@
+"""Waveform peaks computed once per output, so pages can draw audio without decoding it.
+
+The decoded PCM is reduced to (min, max) pairs per block of samples at several
+zoom levels: the finest has PEAKS_PER_SECOND pairs per second, and each next
+level merges ZOOM_FACTOR pairs, down to a level of at most OVERVIEW_PEAKS
+pairs for the whole file. Values are scaled to signed bytes.
+
+File layout (little-endian), stored next to the MP3 as <stem>.peaks:
+    b'TTSP', uint16 version, uint16 level count, uint32 sample rate, uint64 samples
+    per level: uint32 samples per peak, uint32 peak count
+    per level: peak count (min, max) int8 pairs
+"""
+import os
+import struct
+
+# Constants
+PEAKS_SUFFIX = '.peaks'
+PEAKS_PER_SECOND = 50  # Finest zoom level
+ZOOM_FACTOR = 4  # Each level has this many times fewer peaks than the previous one
+OVERVIEW_PEAKS = 1000  # The coarsest level has at most this many peaks
+MAGIC = b'TTSP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIQ')
+LEVEL_HEADER = struct.Struct('<II')
+HEADER_READ_SIZE = 1024  # Enough for the header and every level header
+
+
+def peaks_name(audio_filename):
+    return os.path.splitext(audio_filename)[0] + PEAKS_SUFFIX
+
+
+def compute_levels(samples, sample_rate, sample_width=2, channels=1):
+    """Return [(samples per peak, int8 array of min/max pairs)] from finest to coarsest.
+
+    samples is a NumPy array of interleaved integer PCM.
+    """
+    import numpy as np  # Optional dependency, only needed where outputs are generated
+
+    frames = samples.reshape(-1, channels) if channels > 1 else samples.reshape(-1, 1)
+    scale = 127.0 / float(2 ** (8 * sample_width - 1))
+    samples_per_peak = max(sample_rate // PEAKS_PER_SECOND, 1)
+
+    count = -(-len(frames) // samples_per_peak)
+    mins = np.zeros(count, dtype=np.int8)
+    maxs = np.zeros(count, dtype=np.int8)
+    # Decimate one block of peaks at a time, so a long file is never copied whole
+    block = samples_per_peak * 4096
+    for start in range(0, len(frames), block):
+        part = frames[start:start + block]
+        whole = len(part) // samples_per_peak * samples_per_peak
+        first = start // samples_per_peak
+        if whole:
+            shaped = part[:whole].reshape(-1, samples_per_peak * part.shape[1])
+            mins[first:first + len(shaped)] = np.round(shaped.min(axis=1) * scale)
+            maxs[first:first + len(shaped)] = np.round(shaped.max(axis=1) * scale)
+        if whole < len(part):
+            mins[count - 1] = round(part[whole:].min() * scale)
+            maxs[count - 1] = round(part[whole:].max() * scale)
+
+    levels = [(samples_per_peak, mins, maxs)]
+    while len(mins) > OVERVIEW_PEAKS:
+        pad = -len(mins) % ZOOM_FACTOR
+        mins = np.pad(mins, (0, pad), mode='edge').reshape(-1, ZOOM_FACTOR).min(axis=1)
+        maxs = np.pad(maxs, (0, pad), mode='edge').reshape(-1, ZOOM_FACTOR).max(axis=1)
+        samples_per_peak *= ZOOM_FACTOR
+        levels.append((samples_per_peak, mins, maxs))
+    return [(spp, np.column_stack((level_mins, level_maxs)).reshape(-1)) for spp, level_mins, level_maxs in levels]
+
+
+def write_peaks(path, levels, sample_rate, total_samples):
+    """Write computed levels to a peaks file (atomically)."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(levels), sample_rate, total_samples))
+        for samples_per_peak, pairs in levels:
+            f.write(LEVEL_HEADER.pack(samples_per_peak, len(pairs) // 2))
+        for _, pairs in levels:
+            f.write(pairs.astype('int8').tobytes())
+    os.replace(temp_path, path)
+
+
+def write_peaks_for_audio(audio, path):
+    """Compute and write the peaks of a pydub AudioSegment."""
+    import numpy as np
+
+    samples = np.frombuffer(audio.raw_data, dtype={1: np.int8, 2: np.int16, 4: np.int32}[audio.sample_width])
+    levels = compute_levels(samples, audio.frame_rate, audio.sample_width, audio.channels)
+    write_peaks(path, levels, audio.frame_rate, len(samples) // audio.channels)
+
+
+def write_peaks_for_mp3(mp3_path, path):
+    """Decode an MP3 (with ffmpeg, through pydub) and write its peaks."""
+    from pydub import AudioSegment
+
+    write_peaks_for_audio(AudioSegment.from_mp3(mp3_path), path)
+
+
+def read_header(read_range):
+    """Read the header of a peaks file through read_range(start, end) -> bytes (end inclusive).
+
+    Returns {'sample_rate', 'samples', 'levels': [{'samples_per_peak', 'count', 'offset'}]}.
+    """
+    data = read_range(0, HEADER_READ_SIZE - 1)
+    magic, version, level_count, sample_rate, total_samples = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a peaks file")
+    levels = []
+    offset = HEADER.size + level_count * LEVEL_HEADER.size
+    for index in range(level_count):
+        samples_per_peak, count = LEVEL_HEADER.unpack_from(data, HEADER.size + index * LEVEL_HEADER.size)
+        levels.append({'samples_per_peak': samples_per_peak, 'count': count, 'offset': offset})
+        offset += 2 * count
+    return {'sample_rate': sample_rate, 'samples': total_samples, 'levels': levels}
+
+
+def read_level(read_range, header, level, start=0, end=None):
+    """Return peaks [start, end) of a level as a flat list of min, max values; only those bytes are read."""
+    info = header['levels'][level]
+    end = info['count'] if end is None else min(end, info['count'])
+    if start >= end:
+        return []
+    data = read_range(info['offset'] + 2 * start, info['offset'] + 2 * end - 1)
+    return list(struct.unpack(f'<{len(data)}b', data))
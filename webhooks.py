@@ -0,0 +1,266 @@
+"""Outbound webhooks: POST a JSON event to a client's callback URL when a job finishes.
+
+Deliveries run on the dispatcher's own worker pool, never on request threads.
+Each request is signed with HMAC-SHA256 over "<timestamp>.<body>", so receivers
+can check both origin and freshness:
+
+    X-TTS-Event: generation.completed
+    X-TTS-Delivery: <unique id, the same for every attempt>
+    X-TTS-Timestamp: <unix seconds>
+    X-TTS-Signature: sha256=<hex digest>
+
+Network errors, timeouts, 429 and 5xx responses are retried with exponential
+backoff and jitter; other responses (redirects included, which are never
+followed) and exhausted retries are appended to a dead-letter log (JSON lines)
+for inspection or replay.
+
+Unless private targets are allowed, the callback host is resolved again when
+each attempt connects and the connection goes to an address checked then, so
+a host that re-resolves to an internal address after validation (DNS
+rebinding) is refused. Such deliveries bypass HTTP proxies.
+"""
+import os
+import hmac
+import json
+import time
+import heapq
+import random
+import socket
+import hashlib
+import secrets
+import ipaddress
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from locks import FileLock
+from metrics import metrics as default_metrics
+
+# Constants
+MAX_ATTEMPTS = 6
+BASE_DELAY_SECONDS = 1.0  # Delay before the first retry; doubled for every further one
+MAX_DELAY_SECONDS = 300.0
+TIMEOUT_SECONDS = 10
+USER_AGENT = 'tts-webhooks/1'
+SIGNATURE_HEADER = 'X-TTS-Signature'
+TIMESTAMP_HEADER = 'X-TTS-Timestamp'
+
+
+def sign(secret, timestamp, body):
+    """Return the signature header value for a request body sent at a timestamp."""
+    message = str(timestamp).encode('ascii') + b'.' + body
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def verify(secret, timestamp, body, signature, tolerance=300):
+    """Check a signature the way a receiver should: constant-time, and only for recent timestamps."""
+    try:
+        if abs(time.time() - int(timestamp)) > tolerance:
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), signature or '')
+
+
+def validate_callback_url(url, allow_private=False):
+    """Raise ValueError unless url is an http(s) URL whose host resolves to public addresses.
+
+    Private, loopback and link-local targets are refused unless allow_private is
+    set, so callbacks cannot be aimed at services inside the deployment.
+    """
+    parsed = urllib.parse.urlsplit(url or '')
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError("callback_url must be an http or https URL")
+    if allow_private:
+        return url
+    resolve_public(parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80))
+    return url
+
+
+def resolve_public(host, port):
+    """Return getaddrinfo() results for a TCP connection to host, raising ValueError unless all are public."""
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError(f"callback_url host does not resolve: {host}")
+    for info in infos:
+        ip = ipaddress.ip_address(info[4][0].split('%')[0])
+        if not ip.is_global:
+            raise ValueError("callback_url must not point to a private or local address")
+    return infos
+
+
+def _create_public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """socket.create_connection, to one of the public addresses the host resolves to right now."""
+    host, port = address
+    error = None
+    for info in resolve_public(host, port):
+        try:
+            return socket.create_connection(info[4][:2], timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    """Connects to a checked address; TLS still verifies the certificate for the URL's host."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    """Report redirects as errors: a validated callback URL must not lead elsewhere."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Delivery:
+    """One event for one URL, with its attempts so far."""
+
+    def __init__(self, url, event, payload):
+        self.id = secrets.token_hex(16)
+        self.url = url
+        self.event = event
+        self.body = json.dumps({'id': self.id, 'event': event, 'created_at': datetime.now().isoformat(),
+                                'data': payload}).encode('utf-8')
+        self.attempts = 0
+        self.last_error = None
+
+    def __lt__(self, other):  # Ties in the schedule heap
+        return self.id < other.id
+
+
+class WebhookDispatcher:
+    """Delivers webhook events in the background, with retries and a dead-letter log."""
+
+    def __init__(self, secret, dead_letter_path, workers=2, max_attempts=MAX_ATTEMPTS,
+                 base_delay=BASE_DELAY_SECONDS, max_delay=MAX_DELAY_SECONDS, timeout=TIMEOUT_SECONDS, metrics=None,
+                 allow_private=False):
+        self.secret = secret
+        self.dead_letter_path = dead_letter_path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.metrics = metrics or default_metrics
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        if allow_private:
+            self._opener = urllib.request.build_opener(_NoRedirects)
+        else:
+            self._opener = urllib.request.build_opener(_NoRedirects, urllib.request.ProxyHandler({}),
+                                                       _PublicHTTPHandler, _PublicHTTPSHandler)
+        self._schedule = []  # (due time, delivery) heap of retries
+        self._pending = 0  # Deliveries not yet delivered or dead-lettered
+        self._condition = threading.Condition()
+        self._scheduler = None
+
+    def dispatch(self, url, event, payload):
+        """Queue an event for delivery and return its Delivery."""
+        delivery = Delivery(url, event, payload)
+        with self._condition:
+            self._pending += 1
+        self.executor.submit(self._attempt, delivery)
+        return delivery
+
+    def wait(self, timeout=None):
+        """Block until every queued delivery has been delivered or dead-lettered; returns True if so."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def _attempt(self, delivery):
+        delivery.attempts += 1
+        timestamp = int(time.time())
+        request = urllib.request.Request(delivery.url, data=delivery.body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'User-Agent': USER_AGENT,
+            'X-TTS-Event': delivery.event,
+            'X-TTS-Delivery': delivery.id,
+            TIMESTAMP_HEADER: str(timestamp),
+            SIGNATURE_HEADER: sign(self.secret, timestamp, delivery.body),
+        })
+        retryable = True
+        try:
+            with self._opener.open(request, timeout=self.timeout) as response:
+                response.read()
+            self.metrics.increment('webhook_delivered_total')
+            self._done()
+            return
+        except urllib.error.HTTPError as e:
+            delivery.last_error = f"HTTP {e.code}"
+            retryable = e.code == 429 or e.code >= 500
+        except ValueError as e:  # The host now resolves to an address that is not public
+            delivery.last_error = str(e)
+            retryable = False
+        except Exception as e:  # Connection errors and timeouts
+            delivery.last_error = str(e) or e.__class__.__name__
+        self.metrics.increment('webhook_failed_attempts_total')
+
+        if retryable and delivery.attempts < self.max_attempts:
+            self._retry_later(delivery)
+        else:
+            try:
+                self._dead_letter(delivery)
+            finally:
+                self._done()
+
+    def _retry_later(self, delivery):
+        delay = min(self.base_delay * 2 ** (delivery.attempts - 1), self.max_delay)
+        delay *= random.uniform(0.5, 1.0)  # Jitter, so a receiver coming back is not hit all at once
+        with self._condition:
+            heapq.heappush(self._schedule, (time.monotonic() + delay, delivery))
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._run_schedule, name='webhook-scheduler', daemon=True)
+                self._scheduler.start()
+            self._condition.notify_all()
+
+    def _run_schedule(self):
+        """Hand retries to the worker pool when they are due."""
+        while True:
+            with self._condition:
+                while not self._schedule or self._schedule[0][0] > time.monotonic():
+                    self._condition.wait(self._schedule[0][0] - time.monotonic() if self._schedule else None)
+                _, delivery = heapq.heappop(self._schedule)
+            self.executor.submit(self._attempt, delivery)
+
+    def _dead_letter(self, delivery):
+        self.metrics.increment('webhook_dead_letters_total')
+        record = {'id': delivery.id, 'url': delivery.url, 'event': delivery.event, 'attempts': delivery.attempts,
+                  'error': delivery.last_error, 'failed_at': datetime.now().isoformat(),
+                  'body': delivery.body.decode('utf-8')}
+        os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True)
+        with FileLock(self.dead_letter_path + '.lock'):
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def _done(self):
+        with self._condition:
+            self._pending -= 1
+            self._condition.notify_all()